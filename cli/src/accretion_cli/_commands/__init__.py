@@ -2,6 +2,7 @@
 import click
 
 from .add import add_to_deployment_file
+from .base_layer import base_layer
 from .destroy import destroy_project
 from .init import init_deployment_file
 from .publish import publish_new_layer
@@ -18,5 +19,6 @@ cli.add_command(init_deployment_file)
 cli.add_command(add_to_deployment_file)
 cli.add_command(destroy_project)
 cli.add_command(publish_new_layer)
+cli.add_command(base_layer)
 cli.add_command(update_deployment)
 cli.add_command(raw_cli)
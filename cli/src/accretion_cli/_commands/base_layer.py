@@ -0,0 +1,70 @@
+"""Commands for ``accretion base-layer``."""
+import json
+from typing import IO, Optional
+
+import click
+from accretion_common.constants import ARTIFACT_MANIFESTS_PREFIX
+
+from .._util import DeploymentFile
+from .._util.base_layers import propose_base_layer
+from .._util.cloudformation import artifacts_bucket
+from .._util.s3 import load_manifests
+
+__all__ = ("base_layer",)
+
+
+@click.group("base-layer")
+def base_layer():
+    """Manage base layers that other layers are built on top of."""
+
+
+@base_layer.command("propose")
+@click.argument("deployment_file", required=True, type=click.File("r", encoding="utf-8"))
+@click.option("--region", type=click.STRING, help="Region to read manifests from (default: the first deployed region).")
+@click.option(
+    "--min-projects",
+    type=click.IntRange(min=2),
+    default=2,
+    show_default=True,
+    help="Fewest projects that must use a distribution for it to be shared.",
+)
+@click.option(
+    "--min-size",
+    type=click.IntRange(min=0),
+    default=1024 * 1024,
+    show_default=True,
+    help="Fewest installed bytes that a distribution must take for it to be shared.",
+)
+@click.option(
+    "--output",
+    type=click.File("w", encoding="utf-8"),
+    default="-",
+    help="File to write the proposed base layer requirements to (default: stdout).",
+)
+def propose(deployment_file: IO, region: Optional[str], min_projects: int, min_size: int, output: IO):
+    """Propose a base layer from the most recent builds of every project in DEPLOYMENT_FILE.
+    The proposal is written in the requirements.txt format,
+    ready to request with ``accretion request requirements``.
+    """
+    record = DeploymentFile.from_dict(json.load(deployment_file))
+    deployed = [name for name, regional_record in record.Deployments.items() if regional_record.Core is not None]
+    if region is None:
+        if not deployed:
+            raise click.UsageError("Accretion is not deployed in any region.")
+        region = deployed[0]
+    elif region not in deployed:
+        raise click.BadParameter(f"Accretion is not deployed in {region}.", param_hint="--region")
+
+    bucket = artifacts_bucket(region=region, regional_record=record.Deployments[region])
+    manifests = load_manifests(region=region, bucket=bucket, prefix=ARTIFACT_MANIFESTS_PREFIX)
+    proposal = propose_base_layer(manifests, min_projects=min_projects, min_size=min_size)
+
+    for distribution in proposal:
+        click.echo(
+            f"{distribution['Name']} {distribution['Version']}: used by {len(distribution['Projects'])} projects, "
+            f"saves {distribution['Saved']} bytes",
+            err=True,
+        )
+    click.echo(f"Proposed {len(proposal)} distributions from {len(manifests)} manifests in {region}", err=True)
+    for distribution in sorted(proposal, key=lambda distribution: distribution["Name"]):
+        click.echo(f"{distribution['Name']}=={distribution['Version']}", file=output)
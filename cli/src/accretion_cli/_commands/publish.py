@@ -1,7 +1,7 @@
 """Command for ``accretion publish``."""
 import json
 import sys
-from typing import IO
+from typing import IO, Dict, List, Optional, Tuple
 
 import click
 
@@ -10,6 +10,19 @@ from .._util.cloudformation import artifact_builder_state_machine
 from .._util.step_functions import start_execution
 
 
+def _file_filter_overrides(
+    ctx, param, value: Tuple[str, ...]
+) -> Dict[str, List[str]]:  # pylint: disable=unused-argument
+    """Collect ``RULE=PACKAGE`` pairs into the packages that each rule must not apply to."""
+    overrides: Dict[str, List[str]] = {}
+    for pair in value:
+        rule, separator, package = pair.partition("=")
+        if not separator or not rule or not package:
+            raise click.BadParameter(f"Overrides must be formatted as RULE=PACKAGE: {pair!r}")
+        overrides.setdefault(rule, []).append(package)
+    return overrides
+
+
 def _publish_in_single_region(*, region: str, regional_record: Deployment, request: str):
     """"""
     # find the ArtifactBuilderStateMachine physical name
@@ -57,6 +70,17 @@ def publish_raw_request(deployment_file: IO, request_file: IO):
             "Requirements": {
                 "Type": "requirements.txt",
                 "Requirements": "Raw contents of requirements.txt file format"
+            },
+            "Options": {
+                "Precompile": false,
+                "ValidateDelta": false,
+                "ResolutionTTL": 0,
+                "Shards": 1,
+                "ExcludeRuntimeProvided": false,
+                "BaseLayer": null,
+                "Reproducible": false,
+                "FileFilter": null,
+                "FileFilterOverrides": null
             }
         }
 
@@ -66,6 +90,10 @@ def publish_raw_request(deployment_file: IO, request_file: IO):
         `runtime prefix <https://docs.aws.amazon.com/lambda/latest/dg/lambda-runtimes.html>`_
         (ex: "python", "java", etc).
 
+    .. note::
+
+        Options are optional. Any options that are not set use their defaults.
+
     """
     record = DeploymentFile.from_dict(json.load(deployment_file))
 
@@ -79,15 +107,90 @@ def publish_raw_request(deployment_file: IO, request_file: IO):
 @click.argument("deployment_file", required=True, type=click.File("r", encoding="utf-8"))
 @click.argument("layer_name", required=True, type=click.STRING)
 @click.argument("requirements_file", required=True, type=click.File("r", encoding="utf-8"))
-def publish_requirements_request(deployment_file: IO, layer_name: str, requirements_file: IO):
+@click.option("--precompile", is_flag=True, help="Compile all modules to bytecode for each target runtime.")
+@click.option(
+    "--validate-delta",
+    is_flag=True,
+    help="Check any artifact built on top of a previous artifact against a clean build.",
+)
+@click.option(
+    "--resolution-ttl",
+    type=click.IntRange(min=0),
+    help="Seconds that builders may reuse a cached resolution of these requirements (default 0: never reuse).",
+)
+@click.option(
+    "--shards",
+    type=click.IntRange(min=1),
+    help="Split the install across up to this many parallel builders for each runtime.",
+)
+@click.option(
+    "--exclude-runtime-provided",
+    is_flag=True,
+    help="Leave out distributions that the Lambda runtime already provides, such as boto3.",
+)
+@click.option(
+    "--base-layer",
+    type=click.STRING,
+    help="Leave out distributions that the most recent build of this layer provides.",
+)
+@click.option(
+    "--reproducible",
+    is_flag=True,
+    help="Build the same artifact, byte for byte, whenever the same files are installed.",
+)
+@click.option(
+    "--file-filter",
+    type=click.STRING,
+    help="Leave out installed files that these rules match (ex: slim, minimal, slim+caches).",
+)
+@click.option(
+    "--file-filter-override",
+    "file_filter_overrides",
+    multiple=True,
+    callback=_file_filter_overrides,
+    help="Keep every file in a top-level package that a rule would leave out (ex: docs=mypackage). Repeatable.",
+)
+def publish_requirements_request(
+    deployment_file: IO,
+    layer_name: str,
+    requirements_file: IO,
+    precompile: bool,
+    validate_delta: bool,
+    resolution_ttl: Optional[int],
+    shards: Optional[int],
+    exclude_runtime_provided: bool,
+    base_layer: Optional[str],
+    reproducible: bool,
+    file_filter: Optional[str],
+    file_filter_overrides: Dict[str, List[str]],
+):
     """Request a new layer named LAYER_NAME in every region in DEPLOYMENT_FILE.
     The Layer requirements must be defined in the requirements.txt format in REQUIREMENTS_FILE.
     """
     record = DeploymentFile.from_dict(json.load(deployment_file))
 
     requirements = requirements_file.read()
+    options = dict(
+        Precompile=precompile,
+        ValidateDelta=validate_delta,
+        ExcludeRuntimeProvided=exclude_runtime_provided,
+        Reproducible=reproducible,
+    )
+    if resolution_ttl is not None:
+        options["ResolutionTTL"] = resolution_ttl
+    if shards is not None:
+        options["Shards"] = shards
+    if base_layer is not None:
+        options["BaseLayer"] = base_layer
+    if file_filter is not None:
+        options["FileFilter"] = file_filter
+    if file_filter_overrides:
+        options["FileFilterOverrides"] = file_filter_overrides
     request = dict(
-        Name=layer_name, Language="python", Requirements=dict(Type="requirements.txt", Requirements=requirements)
+        Name=layer_name,
+        Language="python",
+        Requirements=dict(Type="requirements.txt", Requirements=requirements),
+        Options=options,
     )
 
     _publish_to_all_regions(record=record, request=json.dumps(request))
@@ -5,7 +5,13 @@ from typing import Callable
 from troposphere import Parameter, Tags, Template, awslambda
 
 from accretion_cli._templates.services.awslambda import add_lambda_core, lambda_function
-from accretion_cli._templates.services.iam import s3_put_object_statement
+from accretion_cli._templates.services.iam import (
+    s3_abort_multipart_upload_statement,
+    s3_delete_object_statement,
+    s3_get_object_statement,
+    s3_list_bucket_statement,
+    s3_put_object_statement,
+)
 from accretion_cli._templates.services.stepfunctions import add_artifact_builder
 
 DEFAULT_TAGS = Tags(Accretion="ArtifactBuilder")
@@ -21,8 +27,20 @@ def _add_parse_requirements_resources(lambda_adder: Callable) -> awslambda.Funct
 
 def _add_build_python(lambda_adder: Callable, runtime: str, bucket_name: Parameter) -> awslambda.Function:
     base_name = "PythonBuilder" + runtime.replace(".", "").replace("python", "")
-    statements = s3_put_object_statement(
-        *[f"${{{bucket_name.title}}}/accretion/{group}/" for group in ("artifacts", "manifests")]
+    bucket = f"${{{bucket_name.title}}}"
+    prefixes = [
+        f"{bucket}/accretion/{group}/"
+        for group in ("artifacts", "checkpoints", "manifests", "resolutions", "shards", "wheels")
+    ]
+    statements = s3_put_object_statement(*prefixes)
+    statements.extend(s3_get_object_statement(*prefixes))
+    statements.extend(s3_delete_object_statement(f"{bucket}/accretion/checkpoints/", f"{bucket}/accretion/shards/"))
+    statements.extend(s3_list_bucket_statement(bucket, "accretion/manifests/", "accretion/wheels/"))
+    # Artifacts are streamed to S3 in parts, and a failed build abandons the upload.
+    statements.extend(
+        s3_abort_multipart_upload_statement(
+            f"{bucket}/accretion/artifacts/", f"{bucket}/accretion/checkpoints/", f"{bucket}/accretion/shards/"
+        )
     )
 
     return lambda_adder(
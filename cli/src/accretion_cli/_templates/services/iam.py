@@ -53,6 +53,25 @@ def s3_get_object_statement(*prefixes: str) -> Iterable[AWS.Statement]:
     return _s3_object_statement(S3.GetObject, *prefixes)
 
 
+def s3_delete_object_statement(*prefixes: str) -> Iterable[AWS.Statement]:
+    return _s3_object_statement(S3.DeleteObject, *prefixes)
+
+
+def s3_abort_multipart_upload_statement(*prefixes: str) -> Iterable[AWS.Statement]:
+    return _s3_object_statement(S3.AbortMultipartUpload, *prefixes)
+
+
+def s3_list_bucket_statement(bucket: str, *prefixes: str) -> Iterable[AWS.Statement]:
+    return [
+        AWS.Statement(
+            Effect=AWS.Allow,
+            Action=[S3.ListBucket],
+            Resource=[Sub(f"arn:${{{AWS_PARTITION}}}:s3:::{bucket}")],
+            Condition=AWS.Condition(AWS.StringLike("s3:prefix", [f"{pre}*" for pre in prefixes])),
+        )
+    ]
+
+
 def lambda_layer_permissions() -> Iterable[AWS.Statement]:
     return [
         AWS.Statement(
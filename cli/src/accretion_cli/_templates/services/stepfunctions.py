@@ -1,7 +1,8 @@
 """AWS Step Functions state machines."""
 import json
-from typing import Dict
+from typing import Dict, Optional
 
+from accretion_common.exceptions import FATAL_ERRORS, RETRIABLE_ERRORS
 from troposphere import AWSObject, Sub, Tags, Template, awslambda, sns, stepfunctions
 
 from .iam import invoke_statement_from_lambdas, publish_statement_from_topics, step_functions_role
@@ -15,32 +16,156 @@ def _resource_to_sub_arn(resource: AWSObject) -> str:
     return f"${{{resource.title}.Arn}}"
 
 
+# Lambda reports these when the invocation itself failed, before or after our code ran.
+_LAMBDA_SERVICE_ERRORS = (
+    "Lambda.ServiceException",
+    "Lambda.AWSLambdaException",
+    "Lambda.SdkClientException",
+    "Lambda.TooManyRequestsException",
+)
+
+
+def _classified_task(states: Dict, name: str, prefix: str = "", fallback: Optional[Dict] = None, **task) -> Dict:
+    """Add a Lambda task that retries transient failures and fails immediately on deterministic ones.
+
+    Workers raise exceptions from ``accretion_common.exceptions``,
+    and Step Functions matches them by the name of the exact exception class.
+    Failures that are not classified either way are not retried.
+
+    :param dict states: States in the scope that the task belongs to
+    :param str name: Task state name
+    :param str prefix: Prefix for the names of the Fail states that the task adds to ``states``
+    :param dict fallback: Catcher to continue with on any failure that is not retried, instead of failing
+    :param task: Task state definition
+    :returns: Task state definition
+    """
+    if fallback is not None:
+        catch = [dict(ErrorEquals=["States.ALL"], **fallback)]
+    else:
+        catch = [dict(ErrorEquals=[error], Next=f"{prefix}{error}") for error in FATAL_ERRORS]
+    states[name] = dict(
+        Type="Task",
+        Retry=[
+            dict(ErrorEquals=list(FATAL_ERRORS), MaxAttempts=0),
+            dict(
+                ErrorEquals=list(RETRIABLE_ERRORS + _LAMBDA_SERVICE_ERRORS),
+                IntervalSeconds=2,
+                MaxAttempts=3,
+                BackoffRate=2.0,
+            ),
+        ],
+        Catch=catch,
+        **task,
+    )
+    if fallback is None:
+        for error in FATAL_ERRORS:
+            states[f"{prefix}{error}"] = dict(Type="Fail", Error=error)
+    return states[name]
+
+
 def _artifact_builder_workflow(parse_requirements_arn: str, build_python_36_arn: str, build_python_37_arn: str) -> Dict:
     sm = dict(Comment="Artifact Builder", StartAt="ParseRequirements")
     sm["States"] = states = dict()
 
-    states["ParseRequirements"] = dict(Type="Task", Resource=parse_requirements_arn, Next="SelectLanguage")
+    _classified_task(states, "ParseRequirements", Resource=parse_requirements_arn, Next="SelectLanguage")
 
     states["SelectLanguage"] = dict(
         Type="Choice",
-        Choices=[dict(Variable="$.Language", StringEquals="python", Next="BuildPython")],
+        Choices=[dict(Variable="$.Language", StringEquals="python", Next="BuildPythonCrossRuntime")],
         Default="UnknownLanguage",
     )
 
     states["UnknownLanguage"] = dict(Type="Fail", Cause="Invalid language")
 
-    states["BuildPython"] = dict(
-        Type="Parallel",
-        Branches=[
-            dict(
-                StartAt="BuildPython36",
-                States=dict(BuildPython36=dict(Type="Task", Resource=build_python_36_arn, End=True)),
+    # Try to build every runtime from a single resolution first.
+    # Any runtime that cannot be built that way falls back to its own builder,
+    # as does every runtime if the cross-runtime build fails for any reason.
+    _classified_task(
+        states,
+        "BuildPythonCrossRuntime",
+        Resource=build_python_37_arn,
+        Parameters={
+            "Name.$": "$.Name",
+            "Requirements.$": "$.Requirements",
+            "Options.$": "$.Options",
+            "Targets": ["python3.6", "python3.7"],
+        },
+        ResultPath="$.CrossRuntimeBuild",
+        Next="BuildPython",
+        fallback=dict(ResultPath="$.CrossRuntimeBuild", Next="BuildPython"),
+    )
+
+    def _build_branch(runtime: str, build_arn: str) -> Dict:
+        branch_states = {
+            f"Check{runtime}": dict(
+                Type="Choice",
+                Choices=[
+                    dict(
+                        And=[
+                            dict(Variable=f"$.CrossRuntimeBuild.{runtime}.Built", IsPresent=True),
+                            dict(Variable=f"$.CrossRuntimeBuild.{runtime}.Built", BooleanEquals=True),
+                        ],
+                        Next=f"{runtime}Built",
+                    )
+                ],
+                Default=f"Build{runtime}",
             ),
-            dict(
-                StartAt="BuildPython37",
-                States=dict(BuildPython37=dict(Type="Task", Resource=build_python_37_arn, End=True)),
+            f"{runtime}Built": dict(Type="Pass", InputPath=f"$.CrossRuntimeBuild.{runtime}.Result", End=True),
+            # Builds that would not finish before the Lambda timeout checkpoint and ask to be resumed.
+            # Builds that are split into shards install each shard in parallel and then merge them.
+            f"{runtime}Progress": dict(
+                Type="Choice",
+                Choices=[
+                    dict(Variable="$.Build.Continue", BooleanEquals=True, Next=f"Resume{runtime}"),
+                    dict(Variable="$.Build.Distribute", BooleanEquals=True, Next=f"{runtime}Shards"),
+                ],
+                Default=f"{runtime}Finished",
             ),
-        ],
+            f"Resume{runtime}": dict(
+                Type="Pass",
+                Parameters={
+                    "Name.$": "$.Name",
+                    "Requirements.$": "$.Requirements",
+                    "Options.$": "$.Options",
+                    "Checkpoint.$": "$.Build.Checkpoint",
+                },
+                Next=f"Build{runtime}",
+            ),
+            f"{runtime}Finished": dict(Type="Pass", InputPath="$.Build", End=True),
+        }
+        _classified_task(
+            branch_states,
+            f"Build{runtime}",
+            prefix=runtime,
+            Resource=build_arn,
+            ResultPath="$.Build",
+            Next=f"{runtime}Progress",
+        )
+
+        shard_states = {}
+        _classified_task(shard_states, f"Build{runtime}Shard", prefix=f"{runtime}Shard", Resource=build_arn, End=True)
+        branch_states[f"{runtime}Shards"] = dict(
+            Type="Map",
+            ItemsPath="$.Build.Shards",
+            Parameters={"Shard.$": "$$.Map.Item.Value"},
+            Iterator=dict(StartAt=f"Build{runtime}Shard", States=shard_states),
+            ResultPath=None,
+            Next=f"Merge{runtime}",
+        )
+        _classified_task(
+            branch_states,
+            f"Merge{runtime}",
+            prefix=f"{runtime}Merge",
+            Resource=build_arn,
+            Parameters={"Merge.$": "$.Build.Plan"},
+            ResultPath="$.Build",
+            Next=f"{runtime}Finished",
+        )
+        return dict(StartAt=f"Check{runtime}", States=branch_states)
+
+    states["BuildPython"] = dict(
+        Type="Parallel",
+        Branches=[_build_branch("Python36", build_python_36_arn), _build_branch("Python37", build_python_37_arn)],
         ResultPath="$.BuildResults",
         End=True,
     )
@@ -79,7 +204,7 @@ def _replication_listener_workflow(
     sm = dict(Comment="Replication Listener", StartAt="Filter")
     sm["States"] = states = dict()
 
-    states["Filter"] = dict(Type="Task", Resource=filter_arn, ResultPath="$", Next="ShouldProcess")
+    _classified_task(states, "Filter", Resource=filter_arn, ResultPath="$", Next="ShouldProcess")
 
     states["ShouldProcess"] = dict(
         Type="Choice",
@@ -89,8 +214,8 @@ def _replication_listener_workflow(
 
     states["IgnoreEvent"] = dict(Type="Succeed", Comment="Ignore this event")
 
-    states["LocateArtifact"] = dict(
-        Type="Task", Resource=locate_artifact_arn, ResultPath="$.Artifact", Next="ArtifactCheck"
+    _classified_task(
+        states, "LocateArtifact", Resource=locate_artifact_arn, ResultPath="$.Artifact", Next="ArtifactCheck"
     )
 
     states["ArtifactCheck"] = dict(
@@ -112,7 +237,7 @@ def _replication_listener_workflow(
 
     states["WaitForReplication"] = dict(Type="Wait", Seconds=60, Next="LocateArtifact")
 
-    states["PublishNewVersion"] = dict(Type="Task", Resource=publish_layer_arn, ResultPath="$.Layer", Next="Notify")
+    _classified_task(states, "PublishNewVersion", Resource=publish_layer_arn, ResultPath="$.Layer", Next="Notify")
 
     states["Notify"] = dict(
         Type="Task",
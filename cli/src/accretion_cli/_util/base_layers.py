@@ -0,0 +1,76 @@
+"""Find distributions that are worth factoring out of many layers into a shared base layer."""
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from accretion_common.util import canonical_name
+
+__all__ = ("latest_manifests", "propose_base_layer")
+
+
+def latest_manifests(manifests: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Keep only the most recent artifact manifest of each project for each runtime.
+
+    :param manifests: Artifact manifests, newest first
+    :returns: Most recent manifests, newest first
+    """
+    seen: Set[Tuple[str, str]] = set()
+    latest = []
+    for manifest in manifests:
+        keys = {(manifest["ProjectName"], runtime) for runtime in manifest["Runtimes"]}
+        if keys - seen:
+            latest.append(manifest)
+        seen.update(keys)
+    return latest
+
+
+def _used(manifest: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    """Everything that a project needs at run time, including anything that its current base layer provides."""
+    yield from manifest["Installed"]
+    base = manifest.get("BaseLayer")
+    if base is not None:
+        for distribution in manifest.get("Excluded", []):
+            if distribution.get("ProvidedBy") == base["ProjectName"]:
+                yield dict(Name=distribution["Name"], Version=distribution["Provided"])
+
+
+def propose_base_layer(
+    manifests: Iterable[Dict[str, Any]], min_projects: int = 2, min_size: int = 0
+) -> List[Dict[str, Any]]:
+    """Propose the contents of a base layer that projects can share.
+
+    A distribution is proposed if at least ``min_projects`` projects use the same version of it
+    and it takes at least ``min_size`` bytes once installed.
+    If projects use different versions, only the version that the most projects use is considered.
+
+    :param manifests: Artifact manifests, newest first
+    :param int min_projects: Fewest projects that must use a distribution
+    :param int min_size: Fewest installed bytes that a distribution must take
+    :returns: Name, version, installed size, the projects that use it,
+        and the bytes that sharing it would save for each proposed distribution, largest savings first
+    """
+    projects: Dict[str, Dict[str, Set[str]]] = {}
+    sizes: Dict[Tuple[str, str], int] = {}
+    for manifest in latest_manifests(manifests):
+        for distribution in _used(manifest):
+            name = canonical_name(distribution["Name"])
+            version = distribution["Version"]
+            projects.setdefault(name, {}).setdefault(version, set()).add(manifest["ProjectName"])
+            if "InstalledSize" in distribution:
+                sizes[(name, version)] = max(sizes.get((name, version), 0), distribution["InstalledSize"])
+
+    proposal = []
+    for name, versions in projects.items():
+        version, users = max(versions.items(), key=lambda item: (len(item[1]), item[0]))
+        size = sizes.get((name, version), 0)
+        if len(users) < min_projects or size < min_size:
+            continue
+        proposal.append(
+            dict(
+                Name=name,
+                Version=version,
+                InstalledSize=size,
+                Projects=sorted(users),
+                Saved=size * (len(users) - 1),
+            )
+        )
+    proposal.sort(key=lambda distribution: (-distribution["Saved"], distribution["Name"]))
+    return proposal
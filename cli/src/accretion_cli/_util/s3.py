@@ -1,12 +1,14 @@
 """Utilities for working with S3."""
+import json
 import uuid
+from typing import Any, Dict, List
 
 import botocore.client
 import click
 
 from . import boto3_session
 
-__all__ = ("empty_bucket", "upload_artifact")
+__all__ = ("empty_bucket", "load_manifests", "upload_artifact")
 
 
 def _artifact_key(*, prefix: str) -> str:
@@ -26,6 +28,32 @@ def upload_artifact(*, region: str, bucket: str, prefix: str, artifact_data: byt
     return key
 
 
+def load_manifests(*, region: str, bucket: str, prefix: str) -> List[Dict[str, Any]]:
+    """Load every manifest under ``prefix`` in ``bucket``.
+
+    :param str region: Region to target
+    :param str bucket: Bucket to read from
+    :param str prefix: Prefix of manifest keys
+    :returns: Manifests, newest first
+    """
+    session = boto3_session(region=region)
+    s3_client = session.client("s3")
+
+    paginator = s3_client.get_paginator("list_objects_v2")
+    summaries = [
+        summary
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+        for summary in page.get("Contents", [])
+        if summary["Key"].endswith(".manifest")
+    ]
+    summaries.sort(key=lambda summary: summary["LastModified"], reverse=True)
+
+    return [
+        json.loads(s3_client.get_object(Bucket=bucket, Key=summary["Key"])["Body"].read().decode("utf-8"))
+        for summary in summaries
+    ]
+
+
 def _find_and_delete_versions(*, client: botocore.client.BaseClient, bucket: str):
     """"""
     response = client.list_object_versions(Bucket=bucket, MaxKeys=1000)
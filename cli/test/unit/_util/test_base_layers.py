@@ -0,0 +1,54 @@
+"""Unit tests for ``accretion_cli._util.base_layers``."""
+import pytest
+
+from accretion_cli._util.base_layers import latest_manifests, propose_base_layer
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+def _manifest(project, installed, runtimes=("python3.6",), **kwargs):
+    return dict(
+        ProjectName=project,
+        Runtimes=list(runtimes),
+        Installed=[dict(Name=name, Version=version, InstalledSize=size) for name, version, size in installed],
+        **kwargs,
+    )
+
+
+def test_latest_manifests():
+    newest = _manifest("a", [])
+    older = _manifest("a", [])
+    other_runtime = _manifest("a", [], runtimes=["python3.7"])
+
+    assert latest_manifests([newest, older, other_runtime]) == [newest, other_runtime]
+
+
+def test_propose_base_layer():
+    manifests = [
+        _manifest("a", [("numpy", "1.16.3", 50), ("six", "1.12.0", 1), ("attrs", "19.1.0", 5)]),
+        _manifest("b", [("numpy", "1.16.3", 50), ("six", "1.12.0", 1), ("attrs", "18.2.0", 5)]),
+        _manifest("c", [("numpy", "1.16.2", 50), ("six", "1.12.0", 1)]),
+        _manifest("a", [("pandas", "0.24.2", 100)]),
+    ]
+
+    test = propose_base_layer(manifests, min_projects=2, min_size=2)
+
+    assert test == [
+        dict(Name="numpy", Version="1.16.3", InstalledSize=50, Projects=["a", "b"], Saved=50),
+    ]
+
+
+def test_propose_base_layer_counts_current_base():
+    manifests = [
+        _manifest(
+            "a",
+            [],
+            BaseLayer=dict(ProjectName="base", ArtifactS3Key="key"),
+            Excluded=[dict(Name="numpy", Version="1.16.3", Provided="1.16.3", ProvidedBy="base")],
+        ),
+        _manifest("b", [("numpy", "1.16.3", 50)]),
+    ]
+
+    test = propose_base_layer(manifests)
+
+    assert [(distribution["Name"], distribution["Projects"]) for distribution in test] == [("numpy", ["a", "b"])]
@@ -4,3 +4,7 @@ ARTIFACTS_PREFIX = "accretion/artifacts/"
 ARTIFACT_MANIFESTS_PREFIX = "accretion/manifests/"
 SOURCE_PREFIX = "accretion/source/"
 LAYER_MANIFESTS_PREFIX = "accretion/layers/"
+WHEELS_PREFIX = "accretion/wheels/"
+RESOLUTIONS_PREFIX = "accretion/resolutions/"
+CHECKPOINTS_PREFIX = "accretion/checkpoints/"
+SHARDS_PREFIX = "accretion/shards/"
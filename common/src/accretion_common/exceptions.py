@@ -1,4 +1,42 @@
-"""Internal Accretion exceptions."""
+"""Internal Accretion exceptions.
+
+Failures are classified by whether retrying the same request could succeed.
+Workers raise :class:`RetriableError` and :class:`FatalError` subclasses by name,
+so that state machines can retry transient failures and fail immediately on deterministic ones.
+"""
+
+import functools
+from typing import Callable
+
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError, HTTPClientError
+
+__all__ = (
+    "AccretionError",
+    "ZipBuilderError",
+    "ExecutionError",
+    "RetriableError",
+    "FatalError",
+    "TransientExecutionError",
+    "InvalidRequestError",
+    "ResolutionError",
+    "BuildError",
+    "ResourceLimitError",
+    "RETRIABLE_ERRORS",
+    "FATAL_ERRORS",
+    "classify_error",
+    "classified_handler",
+)
+# S3 and Lambda report these when they are overloaded or briefly unavailable.
+_RETRIABLE_CLIENT_ERRORS = (
+    "InternalError",
+    "RequestTimeout",
+    "RequestTimeoutException",
+    "ServiceUnavailable",
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+    "TooManyRequestsException",
+)
 
 
 class AccretionError(Exception):
@@ -11,3 +49,86 @@ class ZipBuilderError(AccretionError):
 
 class ExecutionError(AccretionError):
     """Raised when a command fails to execute."""
+
+
+class RetriableError(AccretionError):
+    """Raised when a failure is transient and retrying the same request is likely to succeed."""
+
+
+class FatalError(AccretionError):
+    """Raised when a failure is deterministic and retrying the same request will fail the same way."""
+
+
+class TransientExecutionError(ExecutionError, RetriableError):
+    """Raised when a command fails for a transient reason, such as a network error reaching the package index."""
+
+
+class InvalidRequestError(FatalError):
+    """Raised when a request is malformed or asks for something that Accretion does not support."""
+
+
+class ResolutionError(ExecutionError, FatalError):
+    """Raised when the requested requirements cannot be resolved to a set of distributions."""
+
+
+class BuildError(ExecutionError, FatalError):
+    """Raised when a resolved distribution cannot be built or installed."""
+
+
+class ResourceLimitError(FatalError):
+    """Raised when a build cannot fit in the resources available to the builder."""
+
+
+# Step Functions matches errors by the name of the exact exception class that the worker raised.
+RETRIABLE_ERRORS = (RetriableError.__name__, TransientExecutionError.__name__)
+FATAL_ERRORS = (
+    FatalError.__name__,
+    InvalidRequestError.__name__,
+    ResolutionError.__name__,
+    BuildError.__name__,
+    ResourceLimitError.__name__,
+)
+
+
+def classify_error(error: Exception) -> Exception:
+    """Classify an unexpected worker failure as retriable or fatal, if we know which it is.
+
+    :param error: Exception raised by a worker
+    :returns: ``error`` if it is already classified or if we cannot tell;
+        otherwise a classified exception to raise from ``error``
+    """
+    if isinstance(error, (RetriableError, FatalError)):
+        return error
+
+    if isinstance(error, (BotocoreConnectionError, HTTPClientError)):
+        return RetriableError(str(error))
+
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code", "")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        if code in _RETRIABLE_CLIENT_ERRORS or status >= 500:
+            return RetriableError(str(error))
+
+    return error
+
+
+def classified_handler(handler: Callable) -> Callable:
+    """Decorate a Lambda handler so that it raises classified exceptions wherever we can classify them.
+
+    The state machine retries or fails fast based on the name of the exception that the handler raises.
+
+    :param handler: Lambda handler
+    :returns: Wrapped Lambda handler
+    """
+
+    @functools.wraps(handler)
+    def _classified(*args, **kwargs):
+        try:
+            return handler(*args, **kwargs)
+        except Exception as error:
+            classified = classify_error(error)
+            if classified is error:
+                raise
+            raise classified from error
+
+    return _classified
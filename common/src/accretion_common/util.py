@@ -1,10 +1,42 @@
 """Common internal Accretion utilities."""
-from typing import Dict
+import hashlib
+import re
+from typing import Any, Dict, Iterable, List, Optional, Union
 
 import attr
 from pkg_resources import Requirement
 
-__all__ = ("PackageDetails",)
+__all__ = ("BuildOptions", "InstalledDistribution", "PackageDetails", "canonical_name", "file_sha256")
+_CHUNK_SIZE = 1024 * 1024
+_FILE_FILTER_SEPARATOR = "+"
+
+
+def canonical_name(name: str) -> str:
+    """Normalize a package name as defined in PEP 503.
+
+    :param str name: Package name
+    :rtype: str
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def file_sha256(filename: str) -> str:
+    """Calculate the SHA256 hash of a file without reading it all into memory.
+
+    :param str filename: Path to the file
+    :returns: Hex digest
+    :rtype: str
+    """
+    hasher = hashlib.sha256()
+    with open(filename, "rb") as source:
+        for chunk in iter(lambda: source.read(_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _at_least_one(instance, attribute, value):  # pylint: disable=unused-argument
+    if value < 1:
+        raise ValueError(f"'{attribute.name}' must be at least 1")
 
 
 @attr.s(auto_attribs=True)
@@ -18,12 +50,6 @@ class PackageDetails:
     Name: str
     Details: str = attr.Factory(str)
 
-    @classmethod
-    def from_pip_log(cls, log_value: str) -> "PackageDetails":
-        """Read package name and version from a ``pip install`` log."""
-        name, version = log_value.rsplit("-", 1)
-        return PackageDetails(name, version)
-
     def to_dict(self) -> Dict[str, str]:
         """Pack information into a dictionary."""
         return dict(Name=self.Name, Details=self.Details)
@@ -36,3 +62,118 @@ class PackageDetails:
 
         details = requirement_line[len(name) :]
         return PackageDetails(Name=name, Details=details)
+
+
+@attr.s(auto_attribs=True)
+class InstalledDistribution:
+    """Container for information describing an installed distribution.
+
+    :param str Name: Canonical package name
+    :param str Version: Installed version
+    :param list Tags: Wheel tags that the installed distribution was built for
+    :param str Source: Filename of distribution that was installed (optional)
+    :param int DownloadSize: Size in bytes of distribution that was installed (optional)
+    :param int InstalledSize: Size in bytes of all installed files (optional)
+    """
+
+    Name: str
+    Version: str
+    Tags: List[str] = attr.Factory(list)
+    Source: Optional[str] = None
+    DownloadSize: Optional[int] = None
+    InstalledSize: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Union[str, int, Iterable[str], None]]:
+        """Pack information into a dictionary."""
+        return attr.asdict(self)
+
+
+def _canonical_file_filter(value: Any) -> Any:
+    """Order the parts of a file filter name so that equivalent names build the same artifact."""
+    if not isinstance(value, str):
+        return value
+    return _FILE_FILTER_SEPARATOR.join(sorted({part.strip() for part in value.split(_FILE_FILTER_SEPARATOR)}))
+
+
+def _canonical_file_filter_overrides(value: Any) -> Any:
+    """Order the packages for each rule so that equivalent overrides build the same artifact."""
+    if not isinstance(value, dict) or not all(isinstance(packages, list) for packages in value.values()):
+        return value
+    return {rule: sorted(set(packages)) for rule, packages in value.items()}
+
+
+@attr.s(auto_attribs=True)
+class BuildOptions:
+    """Container for options that change how an artifact is built.
+
+    :param bool Precompile: Should installed modules be compiled to bytecode for the target runtime?
+    :param bool ValidateDelta: Should artifacts built from a previous artifact be checked against a clean build?
+    :param int ResolutionTTL: Seconds that a cached resolution of the same request may be reused for
+        (default: 0, which disables the resolution cache)
+    :param int Shards: Maximum number of parallel builders to split installs across (1 disables distributed builds)
+    :param bool ExcludeRuntimeProvided: Should distributions that the Lambda runtime already provides be left out?
+    :param str BaseLayer: Project whose layer this layer is used with: distributions that it provides are left out
+    :param bool Reproducible: Should the artifact be the same, byte for byte, whenever the same files are installed?
+    :param str FileFilter: Rules and rule sets that leave installed files out of the artifact, joined by ``+``
+    :param dict FileFilterOverrides: Top-level packages that each named rule must not leave any files out of
+    """
+
+    Precompile: bool = attr.ib(default=False, validator=attr.validators.instance_of(bool))
+    # Validation only checks how the artifact was built; it never changes the artifact itself.
+    ValidateDelta: bool = attr.ib(
+        default=False, validator=attr.validators.instance_of(bool), metadata=dict(artifact=False)
+    )
+    # The artifact is determined by the resolved set, not by whether that set came from the resolution cache.
+    ResolutionTTL: int = attr.ib(default=0, validator=attr.validators.instance_of(int), metadata=dict(artifact=False))
+    # Shards are merged into the same artifact that a single builder would build.
+    Shards: int = attr.ib(
+        default=1, validator=[attr.validators.instance_of(int), _at_least_one], metadata=dict(artifact=False)
+    )
+    ExcludeRuntimeProvided: bool = attr.ib(default=False, validator=attr.validators.instance_of(bool))
+    BaseLayer: Optional[str] = attr.ib(
+        default=None, validator=attr.validators.optional(attr.validators.instance_of(str))
+    )
+    Reproducible: bool = attr.ib(default=False, validator=attr.validators.instance_of(bool))
+    FileFilter: Optional[str] = attr.ib(
+        default=None,
+        converter=_canonical_file_filter,
+        validator=attr.validators.optional(attr.validators.instance_of(str)),
+    )
+    FileFilterOverrides: Optional[Dict[str, List[str]]] = attr.ib(
+        default=None,
+        converter=_canonical_file_filter_overrides,
+        validator=attr.validators.optional(
+            attr.validators.deep_mapping(
+                key_validator=attr.validators.instance_of(str),
+                value_validator=attr.validators.deep_iterable(
+                    member_validator=attr.validators.instance_of(str),
+                    iterable_validator=attr.validators.instance_of(list),
+                ),
+                mapping_validator=attr.validators.instance_of(dict),
+            )
+        ),
+    )
+
+    @classmethod
+    def from_dict(cls, options: Optional[Dict[str, Any]]) -> "BuildOptions":
+        """Load and validate options from a dictionary. Any options that are not set use their defaults.
+
+        :raises ValueError: if any unknown options are set
+        :raises TypeError: if any options are set to values of the wrong type
+        """
+        options = dict(options or {})
+        unknown = set(options) - {attribute.name for attribute in attr.fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown build options: {', '.join(sorted(unknown))}")
+        return cls(**options)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Pack all options into a dictionary."""
+        return attr.asdict(self)
+
+    def artifact_options(self) -> Dict[str, Any]:
+        """Pack only the options that change the contents of the artifact and are not set to their defaults."""
+        return attr.asdict(
+            self,
+            filter=lambda attribute, value: attribute.metadata.get("artifact", True) and value != attribute.default,
+        )
@@ -2,92 +2,224 @@
 import logging
 import os
 import shutil
-import subprocess  # nosec : bandit B404 is addressed by only executing pre-defined commands
+import sys
 import tempfile
 import venv
-from typing import Dict, Iterable
+from typing import Callable, Dict, Iterable, List, Optional, Union
 
-from accretion_common.exceptions import ExecutionError
 from accretion_common.util import PackageDetails
 
-__all__ = ("build_requirements",)
+from .execution import execute_in_venv as _execute_in_venv
+from .installers import Installer, PipInstaller, build_requirements_file
+from .metadata import read_installed
+from .timeline import BuildTimeline
+from .wheel_cache import WheelCache, parse_distribution_filename
+
+__all__ = ("build_requirements", "resolve_requirements")
 _LOGGER = logging.getLogger(__name__)
+PIP_VERSION = "19.3.1"
+# Building wheels from legacy sdists needs the wheel package in the venv.
+WHEEL_VERSION = "0.33.6"
+_VENV_MARKER = ".accretion-venv"
 
 
-def _execute_command(command: str) -> (str, str):
-    _LOGGER.debug("Executing command: %s", command)
-    proc = subprocess.run(  # nosec : bandit B602 is addressed by only executing pre-defined commands
-        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding="utf-8", shell=True
-    )
-    _LOGGER.debug("============STDOUT============")
-    _LOGGER.debug(proc.stdout)
-    _LOGGER.debug("============STDERR============")
-    _LOGGER.debug(proc.stderr)
-    if proc.stderr:
-        raise ExecutionError("Failed to execute command")
-    return proc.stdout, proc.stderr
+def _venv_marker_contents() -> str:
+    """Identify the interpreter, pip version, and wheel version that a venv was built with."""
+    return f"{sys.version}\npip=={PIP_VERSION}\nwheel=={WHEEL_VERSION}\n"
+
 
+def _venv_is_valid(venv_dir: str) -> bool:
+    """Cheaply determine whether a previously built venv can be reused.
+
+    A venv is only considered valid if it was completely built by the current interpreter
+    with the pinned pip and wheel versions and its interpreter and pip are still present.
+    """
+    marker_file = os.path.join(venv_dir, _VENV_MARKER)
+    version_dir = f"python{sys.version_info.major}.{sys.version_info.minor}"
+    required_files = (
+        marker_file,
+        os.path.join(venv_dir, "bin", "python"),
+        os.path.join(venv_dir, "lib", version_dir, "site-packages", "pip", "__init__.py"),
+    )
+    if not all(os.path.isfile(filename) for filename in required_files):
+        return False
 
-def _execute_in_venv(venv_dir: str, command: str) -> (str, str):
-    return _execute_command(f"source {venv_dir}/bin/activate; {command}; deactivate")
+    with open(marker_file, "r") as marker:
+        return marker.read() == _venv_marker_contents()
 
 
 def _build_venv(venv_dir: str) -> (str, str):
     shutil.rmtree(venv_dir, ignore_errors=True)
     venv.create(venv_dir, clear=True, with_pip=True)
-    return _execute_in_venv(venv_dir=venv_dir, command="pip install --no-cache-dir --upgrade pip")
+    output = _execute_in_venv(
+        venv_dir=venv_dir,
+        command=["pip", "install", "--no-cache-dir", f"pip=={PIP_VERSION}", f"wheel=={WHEEL_VERSION}"],
+    )
 
+    # Only mark the venv once it is completely built so that partial builds are never reused.
+    with open(os.path.join(venv_dir, _VENV_MARKER), "w") as marker:
+        marker.write(_venv_marker_contents())
 
-def _build_requirements_file(requirements_file: str, *libraries: PackageDetails):
-    with open(requirements_file, "w") as requirements:
-        for library in libraries:
-            requirements.write(f"{library.Name}{library.Details}\n")
+    return output
 
 
-def _install_requirements_to_build(build_dir: str, requirements_file: str, log_file: str, venv_dir: str) -> (str, str):
-    return _execute_in_venv(
-        venv_dir=venv_dir,
-        # Do not cache in order to save what little disk space we have in Lambda.
-        command="pip install --no-cache-dir --upgrade --ignore-installed --no-compile "
-        f"--log {log_file} "
-        f"-r {requirements_file} --target {build_dir}",
-    )
+def _prepare_venv(venv_dir: str, persistent_venv: bool):
+    if persistent_venv and _venv_is_valid(venv_dir):
+        _LOGGER.debug("Reusing existing venv: %s", venv_dir)
+    else:
+        _build_venv(venv_dir)
+
+
+def _collect_resolution(resolution_dir: str, download_dir: Optional[str]) -> List[PackageDetails]:
+    """Read the pinned requirements from a resolution and move any new distribution files to ``download_dir``."""
+    pinned = []
+    for filename in sorted(os.listdir(resolution_dir)):
+        name, version = parse_distribution_filename(filename)
+        pinned.append(PackageDetails(Name=name, Details=f"=={version}"))
+
+        if download_dir is not None and not os.path.exists(os.path.join(download_dir, filename)):
+            os.replace(os.path.join(resolution_dir, filename), os.path.join(download_dir, filename))
+
+    pinned.sort(key=lambda package: package.Name)
+    return pinned
+
+
+def _record_shared_download(timeline: BuildTimeline) -> Callable[[str, float, int], None]:
+    """Record distribution files pulled from the shared wheel cache as cache hits."""
+
+    def _record(filename: str, seconds: float, size: int):
+        timeline.record(
+            parse_distribution_filename(filename)[0], "download", seconds, bytes_transferred=size, cache="hit"
+        )
+
+    return _record
+
+
+def resolve_requirements(
+    venv_dir: str,
+    requirements: Iterable[PackageDetails],
+    persistent_venv: bool = False,
+    wheel_cache: Optional[WheelCache] = None,
+    timeline: Optional[BuildTimeline] = None,
+) -> List[PackageDetails]:
+    """Resolve the requested requirements to a complete set of exactly pinned requirements without installing anything.
+
+    Resolving also downloads every distribution in the resolved set.
+    If ``wheel_cache`` is provided, anything already in it is reused
+    and any newly downloaded distributions are added to it,
+    so a following :func:`build_requirements` call with ``resolved=True`` does not need to download anything.
 
+    :param str venv_dir: Path to directory to use for venv.
+    :param requirements: List of requirements to resolve.
+    :param bool persistent_venv: Should we reuse a valid existing venv?
+    :param WheelCache wheel_cache: Cache to use for distribution files (optional)
+    :param BuildTimeline timeline: Timeline to record how long each package took to resolve in (optional)
+    :returns: Complete set of pinned requirements, sorted by name
+    """
+    requirements = list(requirements)
+    timeline = timeline if timeline is not None else BuildTimeline()
+    _prepare_venv(venv_dir=venv_dir, persistent_venv=persistent_venv)
 
-def _parse_install_log(log_file: str) -> Iterable[Dict[str, str]]:
-    trigger = "Successfully installed"
-    installed = []
-    with open(log_file, "r") as logs:
-        for line in logs:
-            line = line.split(" ", 1)[-1].strip()
-            if line.startswith(trigger):
-                line = line[len(trigger) :].strip()
-                installed = line.split()
-                break
-    _LOGGER.debug("Installed to layer artifact: %s", installed)
-    return [PackageDetails.from_pip_log(log_entry).to_dict() for log_entry in installed]
+    download_dir = None
+    if wheel_cache is not None:
+        download_dir = wheel_cache.cache_dir
+        wheel_cache.prefetch(requirements, on_download=_record_shared_download(timeline))
+
+    # Resolve into an empty directory so that we know exactly which distributions make up the resolved set.
+    resolution_dir = tempfile.mkdtemp()
+    _, requirements_file = tempfile.mkstemp()
+    try:
+        build_requirements_file(requirements_file, *requirements)
+        source = [] if download_dir is None else ["--find-links", download_dir]
+        with timeline.pip_events("resolve") as on_event:
+            _execute_in_venv(
+                venv_dir=venv_dir,
+                command=["pip", "download", "--no-cache-dir", "--dest", resolution_dir]
+                + source
+                + ["-r", requirements_file],
+                on_event=on_event,
+            )
+        pinned = _collect_resolution(resolution_dir=resolution_dir, download_dir=download_dir)
+    finally:
+        shutil.rmtree(resolution_dir, ignore_errors=True)
+        os.remove(requirements_file)
+
+    _LOGGER.debug("Resolved requirements: %s", pinned)
+    return pinned
 
 
 def build_requirements(
-    build_dir: str, venv_dir: str, requirements: Iterable[PackageDetails]
-) -> Iterable[Dict[str, str]]:
+    build_dir: str,
+    venv_dir: str,
+    requirements: Iterable[PackageDetails],
+    persistent_venv: bool = False,
+    wheel_cache: Optional[WheelCache] = None,
+    resolved: bool = False,
+    installer: Optional[Installer] = None,
+    timeline: Optional[BuildTimeline] = None,
+) -> Iterable[Dict[str, Union[str, int, Iterable[str], None]]]:
     """Build the requested requirements into the target build directory using a newly created venv.
 
+    .. note::
+
+        If ``persistent_venv`` is set, an existing venv in ``venv_dir`` is reused
+        as long as it was built by this interpreter with the pinned pip version.
+        This lets warm Lambda containers skip rebuilding the venv on every invocation.
+
+    .. note::
+
+        All distributions are first collected into a download directory
+        and then installed from it without contacting the package index.
+        If ``wheel_cache`` is provided, its local tier is used as the download directory
+        and any newly downloaded distributions are written back to the cache.
+
+    .. note::
+
+        If ``resolved`` is set, ``requirements`` must be a complete set of exactly pinned requirements.
+        They are then downloaded and installed concurrently without any further dependency resolution.
+
+    .. note::
+
+        Requirements are installed by ``installer``, which defaults to a :class:`PipInstaller`.
+        A :class:`NativeWheelInstaller` avoids running pip for every compatible wheel in a resolved set.
+
     :param str build_dir: Path to directory into which to build requirements.
     :param str venv_dir: Path to directory to use for venv.
     :param requirements: List of requirements to install.
+    :param bool persistent_venv: Should we reuse a valid existing venv?
+    :param WheelCache wheel_cache: Cache to use for distribution files (optional)
+    :param bool resolved: Are the requirements already completely resolved?
+    :param Installer installer: Installer backend to use (optional: default is :class:`PipInstaller`)
+    :param BuildTimeline timeline: Timeline to record each download, build, and install in (optional)
+    :returns: Structured description of every installed distribution
     """
-    _build_venv(venv_dir)
-
-    _, requirements_file = tempfile.mkstemp()
-    _, log_file = tempfile.mkstemp()
+    requirements = list(requirements)
+    timeline = timeline if timeline is not None else BuildTimeline()
+    _prepare_venv(venv_dir=venv_dir, persistent_venv=persistent_venv)
 
+    download_dir = wheel_cache.cache_dir if wheel_cache is not None else tempfile.mkdtemp()
     try:
-        _build_requirements_file(requirements_file, *requirements)
-        _install_requirements_to_build(
-            build_dir=build_dir, requirements_file=requirements_file, log_file=log_file, venv_dir=venv_dir
+        if wheel_cache is not None:
+            wheel_cache.prefetch(requirements, on_download=_record_shared_download(timeline))
+
+        installer = installer if installer is not None else PipInstaller()
+        installer.install(
+            build_dir=build_dir,
+            venv_dir=venv_dir,
+            requirements=requirements,
+            download_dir=download_dir,
+            resolved=resolved,
+            timeline=timeline,
         )
-        return _parse_install_log(log_file=log_file)
+
+        installed = read_installed(build_dir=build_dir, download_dir=download_dir)
     finally:
-        os.remove(requirements_file)
-        os.remove(log_file)
+        if wheel_cache is None:
+            shutil.rmtree(download_dir, ignore_errors=True)
+
+    if wheel_cache is not None:
+        wheel_cache.mark_used(distribution.Source for distribution in installed if distribution.Source is not None)
+        wheel_cache.store()
+        wheel_cache.evict()
+
+    return [distribution.to_dict() for distribution in installed]
@@ -0,0 +1,105 @@
+"""Precompile installed modules to bytecode for the target runtime."""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from .execution import execute_command
+
+__all__ = ("precompile",)
+_LOGGER = logging.getLogger(__name__)
+_SKIPPED_ENTRIES = ("bin",)
+_METADATA_SUFFIXES = (".dist-info", ".egg-info")
+# Run by the target interpreter, so this must work on every supported runtime.
+# Files that fail to compile are skipped, just as pip does.
+_COMPILE_SCRIPT = """
+import compileall, os, py_compile, sys
+kwargs = {}
+if hasattr(py_compile, "PycInvalidationMode"):
+    # Unchecked hash-based pycs are used without ever checking the source.
+    kwargs["invalidation_mode"] = py_compile.PycInvalidationMode.UNCHECKED_HASH
+for path in sys.argv[1:]:
+    if os.path.isdir(path):
+        compileall.compile_dir(path, maxlevels=sys.getrecursionlimit(), quiet=2, **kwargs)
+    else:
+        compileall.compile_file(path, quiet=2, **kwargs)
+"""
+
+
+def _count_sources(path: str) -> int:
+    if not os.path.isdir(path):
+        return 1
+    return sum(1 for _root, _dirs, files in os.walk(path) for filename in files if filename.endswith(".py"))
+
+
+def _compile_targets(build_dir: str) -> Dict[str, int]:
+    """Find every top-level entry in ``build_dir`` that contains Python sources, along with how many it contains."""
+    targets = {}
+    for entry in os.listdir(build_dir):
+        path = os.path.join(build_dir, entry)
+        if entry in _SKIPPED_ENTRIES or entry.endswith(_METADATA_SUFFIXES):
+            continue
+        if os.path.isfile(path) and not entry.endswith(".py"):
+            continue
+
+        sources = _count_sources(path)
+        if sources:
+            targets[path] = sources
+    return targets
+
+
+def _partition(targets: Dict[str, int], groups: int) -> List[List[str]]:
+    """Split targets into at most ``groups`` groups with roughly equal numbers of sources."""
+    partitions: List[List[str]] = [[] for _ in range(groups)]
+    loads = [0] * groups
+    for path, sources in sorted(targets.items(), key=lambda item: (-item[1], item[0])):
+        lightest = loads.index(min(loads))
+        partitions[lightest].append(path)
+        loads[lightest] += sources
+    return [partition for partition in partitions if partition]
+
+
+def _normalize_source_mtimes(build_dir: str, source_mtime: Optional[int] = None):
+    """Round every source modification time down to an even second, or set them all to ``source_mtime``.
+
+    Zip files only store modification times with two second resolution.
+    Runtimes without hash-based pycs validate pycs against the source modification time,
+    so it must survive the trip through the zip file unchanged.
+    """
+    for root, _dirs, files in os.walk(build_dir):
+        for filename in files:
+            if not filename.endswith(".py"):
+                continue
+            path = os.path.join(root, filename)
+            mtime = int(os.stat(path).st_mtime) // 2 * 2 if source_mtime is None else source_mtime
+            os.utime(path, (mtime, mtime))
+
+
+def _compile(python: str, paths: Iterable[str]):
+    execute_command([python, "-c", _COMPILE_SCRIPT, *paths])
+
+
+def precompile(build_dir: str, python: str, max_workers: Optional[int] = None, source_mtime: Optional[int] = None):
+    """Compile every Python source in ``build_dir`` to bytecode for the runtime of ``python``.
+
+    Bytecode is written to the standard ``__pycache__`` locations next to each source,
+    where the runtime import system looks for it.
+    The work is split across ``max_workers`` concurrent interpreter processes.
+
+    Reproducible zips replace every timestamp, so when ``source_mtime`` is set,
+    every source gets that modification time before it is compiled
+    and any pyc that records it still matches its source once the zip is extracted.
+
+    :param str build_dir: Directory containing installed requirements
+    :param str python: Path to Python interpreter for the target runtime
+    :param int max_workers: Maximum number of concurrent compiler processes (optional: default is one per CPU)
+    :param int source_mtime: Modification time to give every source (optional: default is to keep them)
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    _normalize_source_mtimes(build_dir, source_mtime)
+    partitions = _partition(_compile_targets(build_dir), max_workers)
+    _LOGGER.debug("Precompiling %s in %d processes", build_dir, len(partitions))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Consume the results so that any failures are raised here.
+        list(executor.map(lambda paths: _compile(python, paths), partitions))
@@ -0,0 +1,108 @@
+"""Determine whether a resolution for this runtime can be reused to build for another runtime."""
+import logging
+import os
+import re
+from typing import Dict, Iterable, Optional
+
+from packaging.markers import Marker
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.specifiers import SpecifierSet
+
+from accretion_common.util import PackageDetails
+
+from .metadata import select_wheel, wheel_metadata
+from .targets import RuntimeTarget
+
+__all__ = ("cross_runtime_blocker",)
+_LOGGER = logging.getLogger(__name__)
+_EXTRA_PATTERN = re.compile(r"""extra\s*==\s*["']([^"']+)["']""")
+
+
+def _marker_differs(marker: Marker, host: Dict[str, str], target: Dict[str, str]) -> bool:
+    """Determine whether a marker could select different requirements in the two environments."""
+    extras = [""] + _EXTRA_PATTERN.findall(str(marker))
+    return any(
+        marker.evaluate(dict(host, extra=extra)) != marker.evaluate(dict(target, extra=extra)) for extra in extras
+    )
+
+
+def _requested_blocker(
+    requirements: Iterable[PackageDetails], host: Dict[str, str], target: Dict[str, str]
+) -> Optional[str]:
+    for requirement in requirements:
+        try:
+            parsed = Requirement(f"{requirement.Name}{requirement.Details}")
+        except InvalidRequirement:
+            return f"Unable to evaluate requirement: {requirement.Name}{requirement.Details}"
+        if parsed.marker is not None and _marker_differs(parsed.marker, host, target):
+            return f"Requirement markers select different dependencies: {requirement.Name}{requirement.Details}"
+    return None
+
+
+def _resolved_blocker(
+    package: PackageDetails,
+    download_dir: str,
+    filenames: Iterable[str],
+    host: RuntimeTarget,
+    target: RuntimeTarget,
+) -> Optional[str]:
+    wheel = select_wheel(package, filenames, host.tags())
+    if wheel is None:
+        return f"No wheel available to read dependencies from: {package.Name}{package.Details}"
+
+    metadata = wheel_metadata(os.path.join(download_dir, wheel))
+    if metadata is None:
+        return f"Unable to read metadata from wheel: {wheel}"
+
+    requires_python = metadata.get("Requires-Python")
+    target_version = target.marker_environment()["python_full_version"]
+    if requires_python and target_version not in SpecifierSet(requires_python):
+        return f"{package.Name} requires Python {requires_python}"
+
+    host_environment = host.marker_environment()
+    target_environment = target.marker_environment()
+    for requirement in metadata.get_all("Requires-Dist", []):
+        try:
+            marker = Requirement(requirement).marker
+        except InvalidRequirement:
+            return f"{package.Name} has a dependency that we cannot evaluate: {requirement}"
+        if marker is not None and _marker_differs(marker, host_environment, target_environment):
+            return f"{package.Name} dependency markers select different dependencies: {requirement}"
+
+    return None
+
+
+def cross_runtime_blocker(
+    requirements: Iterable[PackageDetails],
+    resolved: Iterable[PackageDetails],
+    download_dir: str,
+    host: RuntimeTarget,
+    target: RuntimeTarget,
+) -> Optional[str]:
+    """Determine whether anything prevents reusing the host resolution of ``requirements`` for ``target``.
+
+    Resolution evaluates dependency markers and Python version requirements against the host interpreter,
+    so the resolved set is only valid for the target if none of those would evaluate differently there.
+    We can only read the dependencies of wheels, so anything resolved to an sdist also blocks reuse.
+
+    :param requirements: Requirements as they were requested
+    :param resolved: Pinned requirements that ``requirements`` resolved to on the host
+    :param str download_dir: Directory containing the resolved distribution files
+    :param RuntimeTarget host: Runtime that the resolution was done in
+    :param RuntimeTarget target: Runtime that we want to build for
+    :returns: Reason that the resolution cannot be reused or ``None`` if it can
+    """
+    if target == host:
+        return None
+
+    blocker = _requested_blocker(requirements, host.marker_environment(), target.marker_environment())
+    if blocker is not None:
+        return blocker
+
+    filenames = os.listdir(download_dir)
+    for package in resolved:
+        blocker = _resolved_blocker(package, download_dir, filenames, host, target)
+        if blocker is not None:
+            _LOGGER.debug("Unable to reuse resolution for %s: %s", target.runtime, blocker)
+            return blocker
+    return None
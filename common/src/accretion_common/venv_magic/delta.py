@@ -0,0 +1,196 @@
+"""Reuse unchanged distributions from a previous artifact when building a new one."""
+import csv
+import hashlib
+import io
+import logging
+import posixpath
+from typing import IO, Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+from zipfile import ZipFile
+
+import attr
+
+from accretion_common.util import PackageDetails, canonical_name
+
+from .filters import FileFilter
+
+__all__ = ("DeltaPlan", "plan_delta", "compare_archives")
+_LOGGER = logging.getLogger(__name__)
+_RECORD_SUFFIX = ".dist-info/RECORD"
+# pip --target installs into a temporary ``lib/python`` directory and records scripts relative to it.
+_TARGET_SCRIPTS_PREFIX = "../../"
+# Python 3.7 added a flags field to the pyc header (PEP 552).
+_PYC_FLAGS_MAGIC = 3390
+
+
+@attr.s(auto_attribs=True)
+class DeltaPlan:
+    """Description of how to build an artifact on top of a previous artifact.
+
+    :param str previous_artifact: Path to previous artifact zip
+    :param list reused: Installed distribution descriptions from the previous artifact that are reused unchanged
+    :param list members: Previous artifact members that belong to the reused distributions
+    :param list install: Pinned requirements that still need to be installed
+    :param int reused_size: Total compressed size of the reused members
+    :param str source: Where the previous artifact was downloaded from, such as its S3 key (optional)
+    """
+
+    previous_artifact: str
+    reused: List[Dict[str, Any]]
+    members: List[str]
+    install: List[PackageDetails]
+    reused_size: int = 0
+    source: Optional[str] = None
+
+
+def _index_records(names: Iterable[str], prefix: str) -> Dict[Tuple[str, str], str]:
+    """Map the name and version of every wheel-installed distribution to its RECORD member."""
+    records = {}
+    for name in names:
+        if not (name.startswith(prefix) and name.endswith(_RECORD_SUFFIX)):
+            continue
+        dist_info = name[len(prefix) : -len(_RECORD_SUFFIX)]
+        if "/" in dist_info:
+            continue
+        project, _, version = dist_info.rpartition("-")
+        records[(canonical_name(project), version)] = name
+    return records
+
+
+def _index_bytecode(names: Iterable[str]) -> Dict[str, List[str]]:
+    """Map every source member to the cached bytecode members compiled from it."""
+    bytecode: Dict[str, List[str]] = {}
+    for name in names:
+        directory, filename = posixpath.split(name)
+        if not (filename.endswith(".pyc") and posixpath.basename(directory) == "__pycache__"):
+            continue
+        source = posixpath.join(posixpath.dirname(directory), filename.split(".", 1)[0] + ".py")
+        bytecode.setdefault(source, []).append(name)
+    return bytecode
+
+
+def _distribution_members(
+    archive: ZipFile,
+    record: str,
+    prefix: str,
+    names: Set[str],
+    bytecode: Dict[str, List[str]],
+    file_filter: Optional[FileFilter] = None,
+) -> Optional[List[str]]:
+    """List every member that belongs to a distribution.
+
+    :returns: Distribution members, or ``None`` if any recorded file that was kept is not in the archive
+    """
+    with archive.open(record) as raw_record:
+        rows = list(csv.reader(io.TextIOWrapper(raw_record, encoding="utf-8", newline="")))
+
+    members = []
+    for row in rows:
+        if not row:
+            continue
+        path = row[0]
+        if path.startswith(_TARGET_SCRIPTS_PREFIX):
+            path = path[len(_TARGET_SCRIPTS_PREFIX) :]
+        path = posixpath.normpath(path)
+        member = prefix + path
+        if file_filter is not None and member not in names and file_filter.drops(path):
+            continue
+        if path.startswith("../") or member not in names:
+            _LOGGER.debug("Recorded file not found in previous artifact: %s", path)
+            return None
+        members.append(member)
+        # Bytecode compiled after installation is not recorded.
+        members.extend(bytecode.get(member, []))
+    return members
+
+
+def plan_delta(
+    previous_artifact: str,
+    previous_installed: Iterable[Dict[str, Any]],
+    resolved: Iterable[PackageDetails],
+    prefix: str = "python/",
+    file_filter: Optional[FileFilter] = None,
+) -> DeltaPlan:
+    """Determine which distributions in a previous artifact can be reused for a new resolved set.
+
+    A distribution is reused if exactly the same version is still resolved
+    and every file that it recorded is present in the previous artifact,
+    other than files that ``file_filter`` left out of it.
+    Everything else needs to be installed.
+
+    :param str previous_artifact: Path to previous artifact zip
+    :param previous_installed: Installed distribution descriptions from the previous artifact manifest
+    :param resolved: Pinned requirements for the new artifact
+    :param str prefix: Prefix of every member in the previous artifact
+    :param FileFilter file_filter: Rules that the previous artifact was built with (optional)
+    :returns: Plan for building the new artifact
+    """
+    resolved = list(resolved)
+    pinned = {(canonical_name(package.Name), package.Details[2:]) for package in resolved}
+
+    reused = []
+    members: Set[str] = set()
+    with ZipFile(previous_artifact) as archive:
+        names = set(archive.namelist())
+        records = _index_records(names, prefix)
+        bytecode = _index_bytecode(names)
+        for distribution in previous_installed:
+            key = (distribution["Name"], distribution["Version"])
+            if key not in pinned or key not in records:
+                continue
+
+            distribution_members = _distribution_members(archive, records[key], prefix, names, bytecode, file_filter)
+            if distribution_members is None:
+                continue
+
+            reused.append(distribution)
+            members.update(distribution_members)
+
+        reused_size = sum(archive.getinfo(member).compress_size for member in members)
+
+    reused_keys = {(distribution["Name"], distribution["Version"]) for distribution in reused}
+    install = [
+        package for package in resolved if (canonical_name(package.Name), package.Details[2:]) not in reused_keys
+    ]
+    _LOGGER.debug("Reusing %d distributions and installing %d", len(reused), len(install))
+    return DeltaPlan(
+        previous_artifact=previous_artifact,
+        reused=reused,
+        members=sorted(members),
+        install=install,
+        reused_size=reused_size,
+    )
+
+
+def _bytecode_digest(data: bytes) -> str:
+    """Hash compiled bytecode without the header that records the source timestamp or hash."""
+    header_size = 16 if int.from_bytes(data[:2], "little") >= _PYC_FLAGS_MAGIC else 12
+    return hashlib.sha256(data[header_size:]).hexdigest()
+
+
+def _archive_contents(archive_file: Union[str, IO]) -> Dict[str, Union[Tuple[int, int], str]]:
+    with ZipFile(archive_file) as archive:
+        return {
+            info.filename: (
+                _bytecode_digest(archive.read(info)) if info.filename.endswith(".pyc") else (info.CRC, info.file_size)
+            )
+            for info in archive.infolist()
+        }
+
+
+def compare_archives(left: Union[str, IO], right: Union[str, IO]) -> List[str]:
+    """Find every member whose contents differ between two artifacts.
+
+    .. note::
+
+        Timestamps are not compared because no two builds share them.
+        For the same reason, bytecode is compared without its header.
+
+    :param left: Path to or file-like of first artifact zip
+    :param right: Path to or file-like of second artifact zip
+    :returns: Sorted names of members that differ or that are only in one artifact
+    """
+    left_contents = _archive_contents(left)
+    right_contents = _archive_contents(right)
+    return sorted(
+        name for name in set(left_contents) | set(right_contents) if left_contents.get(name) != right_contents.get(name)
+    )
@@ -0,0 +1,252 @@
+"""Concurrent download and install engine for fully resolved requirements."""
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from accretion_common.exceptions import ExecutionError, FatalError
+from accretion_common.util import PackageDetails, canonical_name
+
+from .execution import execute_in_venv
+from .timeline import BuildTimeline
+from .wheel_cache import parse_distribution_filename
+
+__all__ = ("fetch_resolved", "install_resolved")
+_LOGGER = logging.getLogger(__name__)
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_RETRIES = 3
+_RETRY_BACKOFF = 0.5
+
+
+def _pinned_version(package: PackageDetails) -> str:
+    """Read the pinned version from a resolved requirement."""
+    details = package.Details.strip()
+    if not details.startswith("=="):
+        raise ExecutionError(f"Requirement is not pinned: {package.Name}{package.Details}")
+    return details[2:].strip()
+
+
+def _with_retries(func: Callable, retries: int):
+    """Call ``func``, retrying with exponential backoff if it fails to execute.
+
+    Failures that are known to be deterministic are never retried.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except ExecutionError as error:
+            if attempt == retries or isinstance(error, FatalError):
+                raise
+            delay = _RETRY_BACKOFF * 2**attempt
+            _LOGGER.debug("Attempt %d failed. Retrying in %s seconds.", attempt + 1, delay)
+            time.sleep(delay)
+
+
+def _download(venv_dir: str, download_dir: str, package: PackageDetails, offline: bool, pip_args: List[str]):
+    source = ["--no-index"] if offline else []
+    execute_in_venv(
+        venv_dir=venv_dir,
+        command=["pip", "download", "--no-deps", "--no-cache-dir"]
+        + source
+        + pip_args
+        + ["--find-links", download_dir, "--dest", download_dir, f"{package.Name}{package.Details}"],
+    )
+
+
+def _package_files(download_dir: str, package: PackageDetails) -> Dict[str, int]:
+    """Find the sizes of every distribution file in ``download_dir`` for a pinned requirement."""
+    pinned = (canonical_name(package.Name), _pinned_version(package))
+    files = {}
+    for filename in os.listdir(download_dir):
+        try:
+            if parse_distribution_filename(filename) == pinned:
+                files[filename] = os.path.getsize(os.path.join(download_dir, filename))
+        except (ValueError, OSError):
+            continue
+    return files
+
+
+def _fetch(
+    venv_dir: str,
+    download_dir: str,
+    package: PackageDetails,
+    retries: int,
+    pip_args: List[str],
+    timeline: BuildTimeline,
+):
+    """Make sure that a compatible distribution file for ``package`` is present in ``download_dir``."""
+    with timeline.measure(package.Name, "download") as entry:
+        try:
+            # Let pip decide whether anything already present is compatible without touching the index.
+            _download(venv_dir=venv_dir, download_dir=download_dir, package=package, offline=True, pip_args=pip_args)
+            entry.Cache = "hit"
+            entry.Bytes = 0
+            return
+        except ExecutionError:
+            _LOGGER.debug("No local distribution found for %s%s", package.Name, package.Details)
+
+        entry.Cache = "miss"
+        existing = _package_files(download_dir, package)
+        _with_retries(
+            lambda: _download(
+                venv_dir=venv_dir, download_dir=download_dir, package=package, offline=False, pip_args=pip_args
+            ),
+            retries=retries,
+        )
+        entry.Bytes = sum(
+            size for filename, size in _package_files(download_dir, package).items() if filename not in existing
+        )
+
+
+def _install(
+    venv_dir: str, download_dir: str, staging_dir: str, package: PackageDetails, timeline: BuildTimeline
+) -> str:
+    target = os.path.join(staging_dir, canonical_name(package.Name))
+    with timeline.measure(package.Name, "install"):
+        execute_in_venv(
+            venv_dir=venv_dir,
+            command=["pip", "install", "--no-cache-dir", "--no-deps", "--no-index", "--ignore-installed"]
+            + ["--no-compile", "--find-links", download_dir, "--target", target, f"{package.Name}{package.Details}"],
+        )
+    return target
+
+
+def _merge_tree(source: str, target: str):
+    """Move everything in ``source`` into ``target``, merging any directories that already exist."""
+    for root, _dirs, files in os.walk(source):
+        destination = os.path.join(target, os.path.relpath(root, source))
+        os.makedirs(destination, exist_ok=True)
+        for filename in files:
+            os.replace(os.path.join(root, filename), os.path.join(destination, filename))
+
+
+def _check_pinned(resolved: Iterable[PackageDetails]):
+    for package in resolved:
+        _pinned_version(package)
+
+
+def _fetch_all(
+    executor: ThreadPoolExecutor,
+    venv_dir: str,
+    resolved: List[PackageDetails],
+    download_dir: str,
+    retries: int,
+    pip_args: Optional[List[str]] = None,
+    timeline: Optional[BuildTimeline] = None,
+):
+    os.makedirs(download_dir, exist_ok=True)
+    pip_args = list(pip_args or [])
+    timeline = timeline if timeline is not None else BuildTimeline()
+    # Consume the results so that any failures are raised here.
+    list(
+        executor.map(
+            lambda package: _fetch(
+                venv_dir=venv_dir,
+                download_dir=download_dir,
+                package=package,
+                retries=retries,
+                pip_args=pip_args,
+                timeline=timeline,
+            ),
+            resolved,
+        )
+    )
+
+
+def fetch_resolved(
+    venv_dir: str,
+    resolved: Iterable[PackageDetails],
+    download_dir: str,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    retries: int = DEFAULT_RETRIES,
+    pip_args: Optional[Iterable[str]] = None,
+    timeline: Optional[BuildTimeline] = None,
+):
+    """Concurrently make sure that a compatible distribution file for every resolved requirement is in ``download_dir``.
+
+    :param str venv_dir: Path to directory containing venv to use.
+    :param resolved: Fully resolved requirements.
+    :param str download_dir: Path to directory in which to collect distribution files.
+    :param int max_workers: Maximum number of concurrent downloads.
+    :param int retries: Number of times to retry a failed download.
+    :param pip_args: Additional arguments that control which distributions pip selects (optional)
+    :param BuildTimeline timeline: Timeline to record each download in (optional)
+    """
+    resolved = list(resolved)
+    _check_pinned(resolved)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        _fetch_all(
+            executor=executor,
+            venv_dir=venv_dir,
+            resolved=resolved,
+            download_dir=download_dir,
+            retries=retries,
+            pip_args=pip_args,
+            timeline=timeline,
+        )
+
+
+def install_resolved(
+    build_dir: str,
+    venv_dir: str,
+    resolved: Iterable[PackageDetails],
+    download_dir: str,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    retries: int = DEFAULT_RETRIES,
+    timeline: Optional[BuildTimeline] = None,
+):
+    """Concurrently download and install a fully resolved set of requirements into ``build_dir``.
+
+    Every requirement must be pinned to an exact version and the set must include all dependencies:
+    nothing is resolved here.
+    Compatible distribution files that are already present in ``download_dir`` are not downloaded again.
+
+    Each distribution is installed into its own staging directory in parallel
+    and the results are merged into ``build_dir`` once all installs finish.
+
+    :param str build_dir: Path to directory into which to install requirements.
+    :param str venv_dir: Path to directory containing venv to use.
+    :param resolved: Fully resolved requirements.
+    :param str download_dir: Path to directory in which to collect distribution files.
+    :param int max_workers: Maximum number of concurrent downloads and installs.
+    :param int retries: Number of times to retry a failed download.
+    :param BuildTimeline timeline: Timeline to record each download and install in (optional)
+    """
+    resolved = list(resolved)
+    # Check that everything is pinned before we do any work.
+    _check_pinned(resolved)
+    timeline = timeline if timeline is not None else BuildTimeline()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        _fetch_all(
+            executor=executor,
+            venv_dir=venv_dir,
+            resolved=resolved,
+            download_dir=download_dir,
+            retries=retries,
+            timeline=timeline,
+        )
+
+        staging_dir = tempfile.mkdtemp()
+        try:
+            staged: List[str] = list(
+                executor.map(
+                    lambda package: _install(
+                        venv_dir=venv_dir,
+                        download_dir=download_dir,
+                        staging_dir=staging_dir,
+                        package=package,
+                        timeline=timeline,
+                    ),
+                    resolved,
+                )
+            )
+            os.makedirs(build_dir, exist_ok=True)
+            for target in staged:
+                _merge_tree(target, build_dir)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
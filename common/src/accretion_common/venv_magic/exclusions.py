@@ -0,0 +1,209 @@
+"""Leave distributions that the Lambda runtime already provides out of artifacts."""
+import csv
+import logging
+import os
+import posixpath
+import shutil
+from email.parser import HeaderParser
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from zipfile import ZipFile
+
+from packaging.requirements import InvalidRequirement, Requirement
+
+from accretion_common.util import PackageDetails, canonical_name
+
+from .targets import RUNTIME_TARGETS
+
+__all__ = ("RUNTIME_PROVIDED", "installed_requires", "archive_requires", "plan_exclusions", "remove_distribution")
+_LOGGER = logging.getLogger(__name__)
+_METADATA_SUFFIX = ".dist-info/METADATA"
+# pip --target installs into a temporary ``lib/python`` directory and records scripts relative to it.
+_TARGET_SCRIPTS_PREFIX = "../../"
+# The AWS SDK and its dependencies, as provided by the Lambda Python runtimes.
+# Lambda updates the SDK in each runtime independently and without notice, so this inventory drifts.
+# To refresh it, run ``pip freeze --path /var/runtime`` in a function on each runtime
+# and update the shared inventory, adding an entry to _RUNTIME_SDK_OVERRIDES for any runtime that differs from it.
+_AWS_SDK = {
+    "boto3": "1.9.42",
+    "botocore": "1.12.42",
+    "docutils": "0.14",
+    "jmespath": "0.9.3",
+    "python-dateutil": "2.7.5",
+    "s3transfer": "0.1.13",
+    "six": "1.11.0",
+    "urllib3": "1.24.1",
+}
+# Versions that a runtime provides that differ from _AWS_SDK.
+_RUNTIME_SDK_OVERRIDES: Dict[str, Dict[str, str]] = {}
+RUNTIME_PROVIDED = {runtime: {**_AWS_SDK, **_RUNTIME_SDK_OVERRIDES.get(runtime, {})} for runtime in RUNTIME_TARGETS}
+
+
+def _read_requires(metadata: str) -> Tuple[str, List[str]]:
+    headers = HeaderParser().parsestr(metadata)
+    return canonical_name(headers["Name"]), headers.get_all("Requires-Dist", [])
+
+
+def installed_requires(build_dir: str) -> Dict[str, List[str]]:
+    """Read what every distribution that was installed into ``build_dir`` from a wheel depends on.
+
+    :param str build_dir: Directory that distributions were installed into
+    :returns: Requirement strings for each canonical distribution name
+    """
+    requires = {}
+    for entry in sorted(os.listdir(build_dir)):
+        if not entry.endswith(".dist-info"):
+            continue
+        with open(os.path.join(build_dir, entry, "METADATA"), "r", encoding="utf-8") as metadata:
+            name, requirements = _read_requires(metadata.read())
+        requires[name] = requirements
+    return requires
+
+
+def archive_requires(archive: str, members: Iterable[str], prefix: str = "python/") -> Dict[str, List[str]]:
+    """Read what every distribution among some members of an artifact depends on.
+
+    :param str archive: Path to artifact zip
+    :param members: Artifact members to read distributions from
+    :param str prefix: Prefix of every member in the artifact
+    :returns: Requirement strings for each canonical distribution name
+    """
+    requires = {}
+    with ZipFile(archive) as source:
+        for member in members:
+            if member.endswith(_METADATA_SUFFIX) and member.count("/") == prefix.count("/") + 1:
+                name, requirements = _read_requires(source.read(member).decode("utf-8"))
+                requires[name] = requirements
+    return requires
+
+
+def _parse(requirement: str) -> Optional[Requirement]:
+    try:
+        return Requirement(requirement)
+    except InvalidRequirement:
+        _LOGGER.debug("Unable to read requirement: %s", requirement)
+        return None
+
+
+def _satisfied_by(requirement: Optional[Requirement], version: str) -> bool:
+    return requirement is not None and not requirement.url and requirement.specifier.contains(version, prereleases=True)
+
+
+def plan_exclusions(
+    installed: Iterable[Dict[str, Any]],
+    requires: Dict[str, List[str]],
+    requested: Iterable[PackageDetails],
+    provided: Dict[str, str],
+) -> List[Dict[str, str]]:
+    """Determine which installed distributions can be left for the runtime to provide.
+
+    A distribution is left out only if the version that the runtime provides satisfies
+    what was requested and what every distribution that is kept depends on.
+    Markers are not evaluated, so every dependency counts, whether or not it applies.
+    The runtime's own distributions are assumed to work with each other,
+    so what left out distributions depend on does not count.
+
+    :param installed: Installed distribution descriptions
+    :param dict requires: Requirement strings for each installed distribution
+    :param requested: Requirements as they were requested
+    :param dict provided: Versions of the distributions that the runtime provides
+    :returns: Name, installed version, and provided version of each distribution to leave out, sorted by name
+    """
+    versions = {distribution["Name"]: distribution["Version"] for distribution in installed}
+    constraints: Dict[str, List[Tuple[Optional[str], Optional[Requirement]]]] = {
+        name: [] for name in versions if name in provided
+    }
+    for package in requested:
+        name = canonical_name(package.Name)
+        if name in constraints:
+            constraints[name].append((None, _parse(f"{package.Name}{package.Details}")))
+    for dependent, requirements in requires.items():
+        for requirement in requirements:
+            parsed = _parse(requirement)
+            name = canonical_name(parsed.name) if parsed is not None else None
+            if name in constraints and name != dependent:
+                constraints[name].append((dependent, parsed))
+
+    excluded = set(constraints)
+    changed = True
+    while changed:
+        changed = False
+        for name in sorted(excluded):
+            if not all(
+                _satisfied_by(requirement, provided[name])
+                for dependent, requirement in constraints[name]
+                if dependent not in excluded
+            ):
+                # Once it is kept, what it depends on counts too.
+                excluded.remove(name)
+                changed = True
+
+    return [dict(Name=name, Version=versions[name], Provided=provided[name]) for name in sorted(excluded)]
+
+
+def _remove_file(build_dir: str, path: str, parents: Set[str]):
+    if os.path.isfile(path):
+        os.remove(path)
+    directory = os.path.dirname(path)
+    while directory != build_dir and directory.startswith(build_dir + os.sep):
+        parents.add(directory)
+        directory = os.path.dirname(directory)
+
+
+def _find_dist_info(build_dir: str, name: str, version: str) -> str:
+    for entry in os.listdir(build_dir):
+        if not entry.endswith(".dist-info"):
+            continue
+        project, _, entry_version = entry[: -len(".dist-info")].rpartition("-")
+        if canonical_name(project) == name and entry_version == version:
+            return os.path.join(build_dir, entry)
+    raise ValueError(f"Unable to find installed distribution: {name} {version}")
+
+
+def _recorded_paths(dist_info: str) -> Iterator[str]:
+    """Read the paths, relative to the build directory, of every file that a distribution installed there."""
+    with open(os.path.join(dist_info, "RECORD"), "r", encoding="utf-8", newline="") as record:
+        paths = [row[0] for row in csv.reader(record) if row]
+
+    for path in paths:
+        if path.startswith(_TARGET_SCRIPTS_PREFIX):
+            path = path[len(_TARGET_SCRIPTS_PREFIX) :]
+        path = posixpath.normpath(path)
+        if not path.startswith("../"):
+            yield path
+
+
+def _remove_bytecode(build_dir: str, source: str, parents: Set[str]):
+    """Remove any bytecode compiled from a source, which RECORD does not list if it was compiled after install."""
+    cache_dir = os.path.join(os.path.dirname(source), "__pycache__")
+    stem = os.path.basename(source)[: -len(".py")]
+    if not os.path.isdir(cache_dir):
+        return
+    for cached in os.listdir(cache_dir):
+        if cached.startswith(f"{stem}.") and cached.endswith(".pyc"):
+            _remove_file(build_dir, os.path.join(cache_dir, cached), parents)
+
+
+def remove_distribution(build_dir: str, name: str, version: str):
+    """Remove every file that was installed for a distribution, along with any bytecode compiled from them.
+
+    :param str build_dir: Directory that the distribution was installed into
+    :param str name: Canonical distribution name
+    :param str version: Installed version
+    :raises ValueError: if the distribution was not installed into ``build_dir`` from a wheel
+    """
+    build_dir = os.path.abspath(build_dir)
+    dist_info = _find_dist_info(build_dir, name, version)
+
+    parents: Set[str] = set()
+    for path in _recorded_paths(dist_info):
+        full_path = os.path.join(build_dir, *path.split("/"))
+        _remove_file(build_dir, full_path, parents)
+        if full_path.endswith(".py"):
+            _remove_bytecode(build_dir, full_path, parents)
+
+    shutil.rmtree(dist_info, ignore_errors=True)
+    # Deepest first, so that directories which only contained empty directories are removed too.
+    for directory in sorted(parents, key=len, reverse=True):
+        if os.path.isdir(directory) and not os.listdir(directory):
+            os.rmdir(directory)
+    _LOGGER.debug("Removed %s %s from %s", name, version, build_dir)
@@ -0,0 +1,240 @@
+"""Tools for executing commands."""
+import collections
+import logging
+import os
+import queue
+import re
+import subprocess  # nosec : bandit B404 is addressed by only executing pre-defined commands
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import attr
+
+from accretion_common.exceptions import BuildError, ExecutionError, ResolutionError, TransientExecutionError
+
+__all__ = ("PipEvent", "execute_command", "execute_in_venv", "parse_pip_line")
+_LOGGER = logging.getLogger(__name__)
+_TAIL_LINES = 200
+_STDOUT = "STDOUT"
+_STDERR = "STDERR"
+_PIP_EVENTS = (
+    ("collect", re.compile(r"^Collecting (?P<package>[^\s;]+)")),
+    ("download", re.compile(r"^\s*Downloading (?:\S+/)?(?P<package>[^\s/]+) \((?P<size>[^)]+)\)")),
+    ("download", re.compile(r"^\s*Downloading (?:\S+/)?(?P<package>[^\s/]+)$")),
+    ("cached", re.compile(r"^\s*File was already downloaded (?:\S+/)?(?P<package>[^\s/]+)")),
+    ("process", re.compile(r"^Processing (?:\S+/)?(?P<package>[^\s/]+)")),
+    ("saved", re.compile(r"^Saved (?:\S+/)?(?P<package>[^\s/]+)")),
+    ("build", re.compile(r"^\s*Building wheel for (?P<package>\S+) \(.*\): started")),
+    ("built", re.compile(r"^\s*Building wheel for (?P<package>\S+) \(.*\): finished")),
+    ("build-failed", re.compile(r"^\s*(?:ERROR: )?Failed building wheel for (?P<package>\S+)")),
+    ("install", re.compile(r"^\s*Running setup\.py install for (?P<package>\S+)")),
+    ("install", re.compile(r"^Installing collected packages: (?P<package>.+)$")),
+    ("installed", re.compile(r"^Successfully installed (?P<package>.+)$")),
+)
+_FATAL_PATTERNS = (
+    # Dependency resolution failures
+    (ResolutionError, re.compile(r"^ERROR: Could not find a version that satisfies the requirement")),
+    (ResolutionError, re.compile(r"^ERROR: No matching distribution found for")),
+    (ResolutionError, re.compile(r"^ERROR: Cannot install .* conflicting dependencies")),
+    (ResolutionError, re.compile(r"ResolutionImpossible")),
+)
+# Native compilation failures.
+# Distributions with optional C extensions report these too and then install without them,
+# so these only mean that a build failed if the command then fails.
+_BUILD_FAILURE_PATTERNS = (
+    re.compile(r"^\s*error: command '[^']+' failed with exit status"),
+    re.compile(r"^\s*Running setup\.py install for \S+ \.\.\. error"),
+)
+# pip reports these when it cannot reach the index.
+# pip also reports that nothing satisfies a requirement when it could not reach the index to look,
+# so once any of these are seen, every failure of the command is treated as transient.
+_TRANSIENT_PATTERNS = (
+    re.compile(r"Retrying \(Retry\(total="),
+    re.compile(r"Max retries exceeded"),
+    re.compile(r"(?:ConnectTimeout|ReadTimeout|NewConnection|Protocol|Connection)Error"),
+    re.compile(r"Read timed out"),
+    re.compile(r"Temporary failure in name resolution"),
+    re.compile(r"HTTP error 5\d\d"),
+    re.compile(r"\b5\d\d Server Error"),
+)
+
+
+@attr.s(auto_attribs=True)
+class PipEvent:
+    """Progress event parsed from pip output.
+
+    :param str Action: Action that pip reported
+    :param str Package: Package, distribution file, or list of packages that the action applies to
+    :param str Size: Size reported for downloads (optional)
+    :param float Timestamp: Time that the event was seen
+    """
+
+    Action: str
+    Package: str
+    Size: Optional[str] = None
+    Timestamp: float = attr.Factory(time.time)
+
+
+def parse_pip_line(line: str) -> Optional[PipEvent]:
+    """Parse a line of pip output into a progress event.
+
+    :param str line: Line of pip output
+    :returns: Parsed event or ``None`` if the line does not describe progress
+    """
+    for action, pattern in _PIP_EVENTS:
+        match = pattern.match(line)
+        if match is not None:
+            details = match.groupdict()
+            return PipEvent(Action=action, Package=details["package"], Size=details.get("size"))
+    return None
+
+
+def _fatal_error(line: str) -> Optional[type]:
+    """Find the type of error that a line of output reports, if it reports a fatal error."""
+    for error_type, pattern in _FATAL_PATTERNS:
+        if pattern.search(line):
+            return error_type
+    return None
+
+
+def _is_transient(line: str) -> bool:
+    return any(pattern.search(line) for pattern in _TRANSIENT_PATTERNS)
+
+
+def _is_build_failure(line: str) -> bool:
+    return any(pattern.search(line) for pattern in _BUILD_FAILURE_PATTERNS)
+
+
+def _read_stream(name: str, stream, lines: queue.Queue):
+    for line in stream:
+        lines.put((name, line.rstrip("\n")))
+    lines.put((name, None))
+
+
+def _kill(proc: subprocess.Popen):
+    proc.kill()
+    proc.wait()
+
+
+def _stream_output(
+    proc: subprocess.Popen, on_event: Callable[[PipEvent], None]
+) -> Tuple[Dict[str, Iterable[str]], bool, Optional[str]]:
+    """Consume output from both streams as it arrives, keeping only a bounded tail of each.
+
+    :returns: Tail of each stream, whether any transient errors were reported,
+        and the first reported build failure, if any
+    :raises ResolutionError: as soon as a resolution failure is reported
+    :raises TransientExecutionError: as soon as a fatal error is reported after a transient error
+    """
+    lines: queue.Queue = queue.Queue()
+    readers = [
+        threading.Thread(target=_read_stream, args=(_STDOUT, proc.stdout, lines), daemon=True),
+        threading.Thread(target=_read_stream, args=(_STDERR, proc.stderr, lines), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    tails = {_STDOUT: collections.deque(maxlen=_TAIL_LINES), _STDERR: collections.deque(maxlen=_TAIL_LINES)}
+    transient = False
+    build_failure = None
+    open_streams = len(readers)
+    while open_streams:
+        name, line = lines.get()
+        if line is None:
+            open_streams -= 1
+            continue
+
+        _LOGGER.debug("%s: %s", name, line)
+        tails[name].append(line)
+
+        transient = transient or _is_transient(line)
+        if build_failure is None and _is_build_failure(line):
+            build_failure = line.strip()
+        error_type = _fatal_error(line)
+        if error_type is not None:
+            _kill(proc)
+            if transient:
+                raise TransientExecutionError(f"Error reported after network errors: {line.strip()}")
+            raise error_type(f"Fatal error reported: {line.strip()}")
+
+        event = parse_pip_line(line)
+        if event is not None:
+            on_event(event)
+
+    return tails, transient, build_failure
+
+
+def _log_event(event: PipEvent):
+    _LOGGER.info("pip %s: %s", event.Action, event.Package)
+
+
+def execute_command(
+    command: List[str], env: Optional[Dict[str, str]] = None, on_event: Optional[Callable[[PipEvent], None]] = None
+) -> Tuple[str, str]:
+    """Execute a command, streaming its output.
+
+    Output is logged as it arrives and only a bounded tail of each stream is kept.
+    Any pip progress lines are parsed into :class:`PipEvent` s as they arrive.
+
+    :param list command: Command to execute
+    :param dict env: Environment to execute command in (optional: default is the current environment)
+    :param on_event: Callback to receive pip progress events (optional: default is to log them)
+    :returns: Tail of command STDOUT and STDERR
+    :raises ResolutionError: if the command reports that requirements cannot be resolved
+    :raises BuildError: if the command fails after reporting that a distribution could not be built
+    :raises TransientExecutionError: if the command fails after reporting network errors
+    :raises ExecutionError: if the command exits with a non-zero status for any other reason
+    """
+    _LOGGER.debug("Executing command: %s", command)
+    proc = subprocess.Popen(  # nosec : bandit B603 is addressed by only executing pre-defined commands
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+        encoding="utf-8",
+        errors="replace",
+        bufsize=1,
+    )
+    try:
+        tails, transient, build_failure = _stream_output(proc, on_event if on_event is not None else _log_event)
+    except BaseException:
+        if proc.poll() is None:
+            _kill(proc)
+        raise
+
+    returncode = proc.wait()
+    stdout = "\n".join(tails[_STDOUT])
+    stderr = "\n".join(tails[_STDERR])
+    if returncode != 0:
+        if transient:
+            error_type = TransientExecutionError
+        elif build_failure is not None:
+            error_type = BuildError
+        else:
+            error_type = ExecutionError
+        raise error_type(f"Failed to execute command (exit status {returncode}): {stderr[-1000:]}")
+    return stdout, stderr
+
+
+def execute_in_venv(
+    venv_dir: str,
+    command: List[str],
+    on_event: Optional[Callable[[PipEvent], None]] = None,
+    extra_env: Optional[Dict[str, str]] = None,
+) -> Tuple[str, str]:
+    """Execute a command from a venv, as if that venv were activated.
+
+    :param str venv_dir: Path to venv
+    :param list command: Command to execute: the executable is located in the venv
+    :param on_event: Callback to receive pip progress events (optional: default is to log them)
+    :param dict extra_env: Additional environment variables to execute command with (optional)
+    :returns: Tail of command STDOUT and STDERR
+    """
+    bin_dir = os.path.join(venv_dir, "bin")
+    env = dict(os.environ)
+    env.update(extra_env or {})
+    env.pop("PYTHONHOME", None)
+    env["VIRTUAL_ENV"] = venv_dir
+    env["PATH"] = os.pathsep.join((bin_dir, env.get("PATH", "")))
+    return execute_command([os.path.join(bin_dir, command[0]), *command[1:]], env=env, on_event=on_event)
@@ -0,0 +1,148 @@
+"""Rules that decide which installed files are left out of artifacts."""
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import attr
+
+from accretion_common.util import BuildOptions
+
+__all__ = ("FileFilter", "RULES", "RULE_SETS")
+_FILTER_SEPARATOR = "+"
+_DIST_INFO_SUFFIX = ".dist-info"
+# Metadata that the import system, entry points, or later builds of the same artifact read.
+_KEPT_DIST_INFO = frozenset(
+    ("METADATA", "RECORD", "WHEEL", "entry_points.txt", "top_level.txt", "namespace_packages.txt")
+)
+_TEST_DIRECTORIES = frozenset(("tests", "test"))
+_DOC_DIRECTORIES = frozenset(("docs", "doc"))
+_DOC_SUFFIXES = (".rst", ".md")
+# License files are always kept: redistributing a package usually requires shipping its license with it.
+_LICENSE_PREFIXES = ("LICENSE", "LICENCE", "COPYING", "NOTICE")
+_LICENSE_DIRECTORY = "licenses"
+_SOURCE_SUFFIXES = (".py", ".pyc", ".pyo", ".pyi")
+Rule = Callable[[List[str]], bool]
+
+
+def _in_dist_info(parts: List[str]) -> bool:
+    return parts[0].endswith(_DIST_INFO_SUFFIX)
+
+
+def _license(parts: List[str]) -> bool:
+    if parts[-1].endswith(_SOURCE_SUFFIXES):
+        return False
+    return parts[-1].upper().startswith(_LICENSE_PREFIXES) or (
+        _in_dist_info(parts) and _LICENSE_DIRECTORY in parts[1:-1]
+    )
+
+
+def _caches(parts: List[str]) -> bool:
+    return "__pycache__" in parts[:-1] or parts[-1].endswith((".pyc", ".pyo"))
+
+
+def _tests(parts: List[str]) -> bool:
+    return not _in_dist_info(parts) and bool(_TEST_DIRECTORIES.intersection(parts[:-1]))
+
+
+def _docs(parts: List[str]) -> bool:
+    if _in_dist_info(parts):
+        return False
+    return bool(_DOC_DIRECTORIES.intersection(parts[:-1])) or parts[-1].endswith(_DOC_SUFFIXES)
+
+
+def _stubs(parts: List[str]) -> bool:
+    return parts[-1].endswith(".pyi") or parts[-1] == "py.typed"
+
+
+def _dist_info(parts: List[str]) -> bool:
+    return _in_dist_info(parts) and not (len(parts) == 2 and parts[1] in _KEPT_DIST_INFO)
+
+
+RULES: Dict[str, Rule] = {
+    "caches": _caches,
+    "tests": _tests,
+    "docs": _docs,
+    "stubs": _stubs,
+    "dist-info": _dist_info,
+}
+RULE_SETS: Dict[str, Tuple[str, ...]] = {
+    "none": (),
+    "slim": ("tests", "docs", "stubs", "dist-info"),
+    "minimal": ("slim", "caches"),
+}
+# Top-level packages that need files that a rule would otherwise leave out, whatever overrides are requested.
+# boto3 and botocore import their ``docs`` packages to build client docstrings.
+_DEFAULT_OVERRIDES: Dict[str, FrozenSet[str]] = {"docs": frozenset(("boto3", "botocore"))}
+
+
+def _expand(name: str, seen: Tuple[str, ...] = ()) -> Tuple[str, ...]:
+    if name in RULES:
+        return (name,)
+    if name not in RULE_SETS or name in seen:
+        raise ValueError(f"Unknown file filter: {name!r}")
+    return tuple(rule for member in RULE_SETS[name] for rule in _expand(member, seen + (name,)))
+
+
+@attr.s(frozen=True)
+class FileFilter:
+    """Named combination of rules that each leave some installed files out of artifacts.
+
+    Names are rule names or rule set names, joined by ``+`` to combine them (ex: ``slim+caches``).
+    License files are never left out.
+
+    :param str name: Filter name, as requested
+    :param tuple rules: Names of every rule that the filter applies
+    :param dict overrides: Top-level packages that each rule does not apply to, by rule name
+    """
+
+    name: str = attr.ib()
+    rules: Tuple[str, ...] = attr.ib()
+    overrides: Dict[str, FrozenSet[str]] = attr.ib(default=attr.Factory(lambda: dict(_DEFAULT_OVERRIDES)))
+
+    @classmethod
+    def from_name(cls, name: Optional[str], overrides: Optional[Dict[str, Iterable[str]]] = None) -> "FileFilter":
+        """Load a filter by name.
+
+        :param str name: Filter name (optional: default is to keep every file)
+        :param dict overrides: Top-level packages that each rule must not apply to, by rule name,
+            in addition to the packages that always need the files that a rule would leave out (optional)
+        :raises ValueError: if any part of the name is not a known rule or rule set, or any override is not a rule
+        """
+        combined = dict(_DEFAULT_OVERRIDES)
+        for rule, packages in (overrides or {}).items():
+            if rule not in RULES:
+                raise ValueError(f"Unknown file filter rule in overrides: {rule!r}")
+            combined[rule] = combined.get(rule, frozenset()).union(packages)
+
+        if name is None:
+            return cls(name="none", rules=(), overrides=combined)
+        rules: List[str] = []
+        for part in name.split(_FILTER_SEPARATOR):
+            rules.extend(rule for rule in _expand(part.strip()) if rule not in rules)
+        return cls(name=name, rules=tuple(rules), overrides=combined)
+
+    @classmethod
+    def from_options(cls, options: BuildOptions) -> "FileFilter":
+        """Load the filter that build options request and check that it is compatible with the other options.
+
+        :param BuildOptions options: Build options
+        :raises ValueError: if the filter is unknown or conflicts with the other options
+        """
+        file_filter = cls.from_name(options.FileFilter, options.FileFilterOverrides)
+        if options.Precompile and "caches" in file_filter.rules:
+            raise ValueError("FileFilter must not leave out caches when Precompile is set")
+        return file_filter
+
+    def drops(self, path: str) -> bool:
+        """Determine whether a file should be left out.
+
+        :param str path: Path of file relative to the directory that distributions were installed into,
+            with ``/`` separators
+        """
+        parts = path.split("/")
+        if _license(parts):
+            return False
+        for rule in self.rules:
+            if parts[0] in self.overrides.get(rule, ()):
+                continue
+            if RULES[rule](parts):
+                return True
+        return False
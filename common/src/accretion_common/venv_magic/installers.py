@@ -0,0 +1,558 @@
+"""Installer backends that put distributions into a build directory."""
+import abc
+import base64
+import configparser
+import csv
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import HeaderParser
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import attr
+from packaging.tags import sys_tags
+
+from accretion_common.exceptions import BuildError, ExecutionError
+from accretion_common.util import PackageDetails, canonical_name
+
+from .engine import DEFAULT_MAX_WORKERS, DEFAULT_RETRIES, fetch_resolved, install_resolved
+from .execution import execute_in_venv as _execute_in_venv
+from .metadata import select_wheel
+from .source_builds import SourceBuildCache
+from .targets import RuntimeTarget
+from .timeline import BuildTimeline
+from .wheel_cache import parse_distribution_filename
+
+__all__ = ("Installer", "PipInstaller", "NativeWheelInstaller", "build_requirements_file", "install_wheel")
+_LOGGER = logging.getLogger(__name__)
+_CHUNK_SIZE = 1024 * 1024
+_INSTALLER_NAME = "accretion"
+# This matches the entry point scripts that pip generates.
+_SCRIPT_TEMPLATE = """#!{python}
+# -*- coding: utf-8 -*-
+import re
+import sys
+from {module} import {import_name}
+if __name__ == '__main__':
+    sys.argv[0] = re.sub(r'(-script\\.pyw|\\.exe)?$', '', sys.argv[0])
+    sys.exit({func}())
+"""
+
+
+def build_requirements_file(requirements_file: str, *libraries: PackageDetails):
+    """Write requirements to a pip requirements file.
+
+    :param str requirements_file: Path to file to write
+    :param libraries: Requirements to write
+    """
+    with open(requirements_file, "w") as requirements:
+        for library in libraries:
+            requirements.write(f"{library.Name}{library.Details}\n")
+
+
+def _download_requirements(
+    requirements_file: str, venv_dir: str, download_dir: str, timeline: BuildTimeline
+) -> (str, str):
+    with timeline.pip_events("download") as on_event:
+        return _execute_in_venv(
+            venv_dir=venv_dir,
+            # pip prefers --find-links candidates over index candidates of the same version,
+            # so anything already in the download directory is not downloaded again.
+            command=["pip", "download", "--no-cache-dir", "--find-links", download_dir, "--dest", download_dir]
+            + ["-r", requirements_file],
+            on_event=on_event,
+        )
+
+
+def _install_requirements_to_build(
+    build_dir: str, requirements_file: str, log_file: str, venv_dir: str, download_dir: str, timeline: BuildTimeline
+) -> (str, str):
+    with timeline.pip_events("install") as on_event:
+        return _execute_in_venv(
+            venv_dir=venv_dir,
+            # Do not use pip's cache in order to save what little disk space we have in Lambda.
+            # Everything we need is already in the download directory.
+            command=["pip", "install", "--no-cache-dir", "--upgrade", "--ignore-installed", "--no-compile"]
+            + ["--no-index", "--find-links", download_dir]
+            + ["--log", log_file, "-r", requirements_file, "--target", build_dir],
+            on_event=on_event,
+        )
+
+
+def _install_with_pip(
+    build_dir: str,
+    venv_dir: str,
+    requirements: Iterable[PackageDetails],
+    download_dir: str,
+    timeline: Optional[BuildTimeline] = None,
+):
+    """Resolve and install requirements into ``build_dir`` with pip."""
+    _, requirements_file = tempfile.mkstemp()
+    _, log_file = tempfile.mkstemp()
+    timeline = timeline if timeline is not None else BuildTimeline()
+
+    try:
+        build_requirements_file(requirements_file, *requirements)
+        _download_requirements(
+            requirements_file=requirements_file, venv_dir=venv_dir, download_dir=download_dir, timeline=timeline
+        )
+        _install_requirements_to_build(
+            build_dir=build_dir,
+            requirements_file=requirements_file,
+            log_file=log_file,
+            venv_dir=venv_dir,
+            download_dir=download_dir,
+            timeline=timeline,
+        )
+        # pip only logs the complete output, including anything that it did not print, to the log file.
+        with open(log_file, "r", encoding="utf-8", errors="replace") as log:
+            for line in log:
+                _LOGGER.debug("pip log: %s", line.rstrip("\n"))
+    finally:
+        os.remove(requirements_file)
+        os.remove(log_file)
+
+
+@attr.s
+class Installer(abc.ABC):
+    """Interface for backends that install requirements into a build directory."""
+
+    @abc.abstractmethod
+    def install(
+        self,
+        build_dir: str,
+        venv_dir: str,
+        requirements: Iterable[PackageDetails],
+        download_dir: str,
+        resolved: Optional[bool] = False,
+        timeline: Optional[BuildTimeline] = None,
+    ):
+        """Install requirements into ``build_dir``.
+
+        :param str build_dir: Path to directory into which to install requirements.
+        :param str venv_dir: Path to directory containing venv to use.
+        :param requirements: Requirements to install.
+        :param str download_dir: Path to directory in which to collect distribution files.
+        :param bool resolved: Are the requirements already completely resolved?
+        :param BuildTimeline timeline: Timeline to record each download, build, and install in (optional)
+        """
+
+
+@attr.s
+class PipInstaller(Installer):
+    """Install requirements with pip.
+
+    Unresolved requirements are resolved and installed by a single pip invocation.
+    Resolved requirements are downloaded and installed concurrently, one pip invocation per requirement.
+
+    :param int max_workers: Maximum number of concurrent downloads and installs.
+    :param int retries: Number of times to retry a failed download.
+    """
+
+    max_workers: int = attr.ib(default=DEFAULT_MAX_WORKERS)
+    retries: int = attr.ib(default=DEFAULT_RETRIES)
+
+    def install(
+        self,
+        build_dir: str,
+        venv_dir: str,
+        requirements: Iterable[PackageDetails],
+        download_dir: str,
+        resolved: Optional[bool] = False,
+        timeline: Optional[BuildTimeline] = None,
+    ):
+        """Install requirements into ``build_dir``.
+
+        :param str build_dir: Path to directory into which to install requirements.
+        :param str venv_dir: Path to directory containing venv to use.
+        :param requirements: Requirements to install.
+        :param str download_dir: Path to directory in which to collect distribution files.
+        :param bool resolved: Are the requirements already completely resolved?
+        :param BuildTimeline timeline: Timeline to record each download, build, and install in (optional)
+        """
+        if resolved:
+            install_resolved(
+                build_dir=build_dir,
+                venv_dir=venv_dir,
+                resolved=requirements,
+                download_dir=download_dir,
+                max_workers=self.max_workers,
+                retries=self.retries,
+                timeline=timeline,
+            )
+        else:
+            _install_with_pip(
+                build_dir=build_dir,
+                venv_dir=venv_dir,
+                requirements=requirements,
+                download_dir=download_dir,
+                timeline=timeline,
+            )
+
+
+def _record_hash(digest: bytes) -> str:
+    return "sha256=" + base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def _wheel_dist_info(wheel: zipfile.ZipFile) -> str:
+    """Locate the ``.dist-info`` directory in a wheel and make sure that we understand the wheel format."""
+    candidates = [
+        name.split("/")[0]
+        for name in wheel.namelist()
+        if name.count("/") == 1 and name.split("/")[0].endswith(".dist-info") and name.endswith("/WHEEL")
+    ]
+    if len(candidates) != 1:
+        raise BuildError(f"Unable to locate .dist-info directory in wheel: {wheel.filename}")
+
+    dist_info = candidates[0]
+    wheel_metadata = HeaderParser().parsestr(wheel.read(f"{dist_info}/WHEEL").decode("utf-8"))
+    version = wheel_metadata.get("Wheel-Version", "1.0").strip()
+    if version.split(".")[0] != "1":
+        raise BuildError(f"Unsupported wheel version {version} in wheel: {wheel.filename}")
+    return dist_info
+
+
+def _destination(member: str, data_dir: str, project_name: str) -> Tuple[str, bool]:
+    """Determine where a wheel member is installed, relative to the target directory.
+
+    This mirrors where ``pip install --target`` places each install scheme.
+
+    :returns: Relative destination and whether the member is a script
+    """
+    if not member.startswith(f"{data_dir}/"):
+        return member, False
+
+    scheme, _, path = member[len(data_dir) + 1 :].partition("/")
+    if scheme in ("purelib", "platlib", "data"):
+        return path, False
+    if scheme == "scripts":
+        return f"bin/{path}", True
+    if scheme == "headers":
+        return f"include/python/{project_name}/{path}", False
+    raise BuildError(f"Unknown install scheme in wheel: {member}")
+
+
+def _safe_path(target_dir: str, relative: str) -> str:
+    path = os.path.normpath(os.path.join(target_dir, relative))
+    if os.path.isabs(relative) or not path.startswith(os.path.normpath(target_dir) + os.sep):
+        raise BuildError(f"Refusing to install file outside of target directory: {relative}")
+    return path
+
+
+def _write_member(
+    wheel: zipfile.ZipFile, info: zipfile.ZipInfo, path: str, python: str, script: bool
+) -> Tuple[str, int]:
+    """Write a single wheel member to ``path``, rewriting script shebangs the way pip does.
+
+    :returns: RECORD hash and size of the written file
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    hasher = hashlib.sha256()
+    size = 0
+    with wheel.open(info) as source, open(path, "wb") as target:
+        if script:
+            first_line = source.readline()
+            if first_line.startswith(b"#!python"):
+                first_line = b"#!" + python.encode("utf-8") + first_line[len(b"#!python") :]
+            hasher.update(first_line)
+            target.write(first_line)
+            size += len(first_line)
+
+        for chunk in iter(lambda: source.read(_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+            target.write(chunk)
+            size += len(chunk)
+
+    mode = (info.external_attr >> 16) & 0o777
+    if script or mode & 0o111:
+        os.chmod(path, 0o755)
+    return _record_hash(hasher.digest()), size
+
+
+def _write_generated(path: str, contents: bytes, mode: int) -> Tuple[str, int]:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as target:
+        target.write(contents)
+    os.chmod(path, mode)
+    return _record_hash(hashlib.sha256(contents).digest()), len(contents)
+
+
+def _entry_point_scripts(wheel: zipfile.ZipFile, dist_info: str, python: str) -> Dict[str, bytes]:
+    """Generate the console and GUI scripts that pip would generate for a distribution's entry points."""
+    try:
+        raw_entry_points = wheel.read(f"{dist_info}/entry_points.txt").decode("utf-8")
+    except KeyError:
+        return {}
+
+    entry_points = configparser.ConfigParser(delimiters=("=",))
+    entry_points.optionxform = str
+    entry_points.read_string(raw_entry_points)
+
+    scripts = {}
+    for section in ("console_scripts", "gui_scripts"):
+        if not entry_points.has_section(section):
+            continue
+        for name, value in entry_points.items(section):
+            module, _, func = value.split("[")[0].strip().partition(":")
+            scripts[f"bin/{name}"] = _SCRIPT_TEMPLATE.format(
+                python=python, module=module.strip(), import_name=func.strip().split(".")[0], func=func.strip()
+            ).encode("utf-8")
+    return scripts
+
+
+def install_wheel(wheel_file: str, target_dir: str, python: str):
+    """Install a wheel by unpacking it directly into ``target_dir``.
+
+    The result matches what ``pip install --no-deps --no-compile --target`` produces:
+    ``.data`` directories are mapped to their install schemes,
+    script shebangs and entry point scripts point at ``python``,
+    and the ``.dist-info`` directory gets an ``INSTALLER`` file and a ``RECORD`` listing every installed file.
+
+    :param str wheel_file: Path to wheel to install
+    :param str target_dir: Directory into which to install the wheel
+    :param str python: Path to Python interpreter to use in scripts
+    :raises BuildError: if the wheel cannot be safely installed
+    """
+    with zipfile.ZipFile(wheel_file) as wheel:
+        dist_info = _wheel_dist_info(wheel)
+        data_dir = f"{dist_info[: -len('.dist-info')]}.data"
+        project_name = dist_info.split("-")[0]
+        record_name = f"{dist_info}/RECORD"
+
+        records = []
+        for info in wheel.infolist():
+            if info.filename.endswith("/") or info.filename == record_name:
+                continue
+            relative, script = _destination(info.filename, data_dir, project_name)
+            path = _safe_path(target_dir, relative)
+            records.append((relative, *_write_member(wheel, info, path, python, script)))
+
+        generated = _entry_point_scripts(wheel, dist_info, python)
+        generated[f"{dist_info}/INSTALLER"] = f"{_INSTALLER_NAME}\n".encode("utf-8")
+        for relative, contents in generated.items():
+            mode = 0o755 if relative.startswith("bin/") else 0o644
+            records.append((relative, *_write_generated(_safe_path(target_dir, relative), contents, mode)))
+
+    record_buffer = io.StringIO()
+    writer = csv.writer(record_buffer, lineterminator="\n")
+    for relative, digest, size in sorted(records):
+        writer.writerow((relative, digest, size))
+    writer.writerow((record_name, "", ""))
+    with open(_safe_path(target_dir, record_name), "w", encoding="utf-8", newline="") as record:
+        record.write(record_buffer.getvalue())
+
+
+def _timed_install_wheel(wheel_file: str, target_dir: str, python: str, timeline: BuildTimeline):
+    with timeline.measure(parse_distribution_filename(os.path.basename(wheel_file))[0], "install"):
+        install_wheel(wheel_file, target_dir, python)
+
+
+def _supported_tags() -> Dict[str, int]:
+    """Map every tag supported by this interpreter to its priority: lower is better."""
+    return {str(tag): rank for rank, tag in enumerate(sys_tags())}
+
+
+@attr.s
+class NativeWheelInstaller(Installer):
+    """Install resolved requirements by unpacking compatible wheels directly, without running pip for each one.
+
+    Requirements that do not have a compatible wheel (ex: sdist-only releases),
+    as well as unresolved requirements, are installed by the ``fallback`` installer.
+    If ``source_builds`` is set, wheels are built from sdists (or found in that cache) and unpacked instead.
+
+    If ``target`` is set, wheels are selected for that runtime rather than for this interpreter.
+    This lets us install for a runtime other than the one we are running in,
+    but only wheels can be installed this way: there is no fallback.
+
+    :param int max_workers: Maximum number of concurrent downloads and installs.
+    :param int retries: Number of times to retry a failed download.
+    :param Installer fallback: Installer to use for anything that is not a compatible wheel
+        (optional: default is :class:`PipInstaller`)
+    :param RuntimeTarget target: Runtime to install for (optional: default is this interpreter)
+    :param SourceBuildCache source_builds: Cache of wheels built from sdists (optional)
+    """
+
+    max_workers: int = attr.ib(default=DEFAULT_MAX_WORKERS)
+    retries: int = attr.ib(default=DEFAULT_RETRIES)
+    fallback: Installer = attr.ib(default=attr.Factory(PipInstaller))
+    target: Optional[RuntimeTarget] = attr.ib(default=None)
+    source_builds: Optional[SourceBuildCache] = attr.ib(default=None)
+
+    @staticmethod
+    def _select_wheels(
+        requirements: Iterable[PackageDetails], download_dir: str, supported: Dict[str, int]
+    ) -> Tuple[List[str], List[PackageDetails]]:
+        """Split requirements into compatible wheel files in ``download_dir`` and requirements without one."""
+        filenames = os.listdir(download_dir) if os.path.isdir(download_dir) else []
+        wheels: List[str] = []
+        missing: List[PackageDetails] = []
+        for package in requirements:
+            wheel = select_wheel(package, filenames, supported)
+            if wheel is None:
+                missing.append(package)
+            else:
+                wheels.append(os.path.join(download_dir, wheel))
+        return wheels, missing
+
+    def _fetch_target_wheels(
+        self,
+        venv_dir: str,
+        missing: List[PackageDetails],
+        download_dir: str,
+        supported: Dict[str, int],
+        timeline: BuildTimeline,
+    ) -> Tuple[List[str], List[PackageDetails]]:
+        """Download wheels for the target runtime, trying each of its platforms in turn."""
+        wheels: List[str] = []
+        # Older platforms are tried first because that is where most wheels are published.
+        for platform in reversed(self.target.platforms):
+            try:
+                fetch_resolved(
+                    venv_dir=venv_dir,
+                    resolved=missing,
+                    download_dir=download_dir,
+                    max_workers=self.max_workers,
+                    # A missing wheel is expected here, so do not wait around retrying.
+                    retries=0,
+                    pip_args=self.target.pip_args(platform),
+                    timeline=timeline,
+                )
+            except ExecutionError:
+                _LOGGER.debug("Not all wheels are available for %s on %s", self.target.runtime, platform)
+
+            fetched, missing = self._select_wheels(missing, download_dir, supported)
+            wheels.extend(fetched)
+            if not missing:
+                break
+        return wheels, missing
+
+    def _build_source_wheels(
+        self,
+        venv_dir: str,
+        missing: List[PackageDetails],
+        download_dir: str,
+        supported: Dict[str, int],
+        timeline: BuildTimeline,
+    ) -> Tuple[List[str], List[PackageDetails]]:
+        """Find or build wheels from the sdists in ``download_dir``."""
+        sdists = {}
+        for filename in os.listdir(download_dir):
+            if filename.endswith(".whl"):
+                continue
+            try:
+                sdists[parse_distribution_filename(filename)] = filename
+            except ValueError:
+                continue
+
+        wheels: List[str] = []
+        remaining: List[PackageDetails] = []
+        for package in missing:
+            sdist = sdists.get((canonical_name(package.Name), package.Details[2:]))
+            if sdist is None:
+                remaining.append(package)
+                continue
+
+            try:
+                wheel = self.source_builds.wheel_for(
+                    venv_dir=venv_dir,
+                    sdist=os.path.join(download_dir, sdist),
+                    find_links=download_dir,
+                    timeline=timeline,
+                )
+            except ExecutionError:
+                _LOGGER.warning("Unable to build wheel from %s", sdist)
+                remaining.append(package)
+                continue
+
+            if select_wheel(package, [os.path.basename(wheel)], supported) is None:
+                _LOGGER.warning("Wheel built from %s is not compatible: %s", sdist, os.path.basename(wheel))
+                remaining.append(package)
+            else:
+                wheels.append(wheel)
+        return wheels, remaining
+
+    def install(
+        self,
+        build_dir: str,
+        venv_dir: str,
+        requirements: Iterable[PackageDetails],
+        download_dir: str,
+        resolved: Optional[bool] = False,
+        timeline: Optional[BuildTimeline] = None,
+    ):
+        """Install requirements into ``build_dir``.
+
+        :param str build_dir: Path to directory into which to install requirements.
+        :param str venv_dir: Path to directory containing venv to use.
+        :param requirements: Requirements to install.
+        :param str download_dir: Path to directory in which to collect distribution files.
+        :param bool resolved: Are the requirements already completely resolved?
+        :param BuildTimeline timeline: Timeline to record each download, build, and install in (optional)
+        :raises BuildError: if installing for a target runtime and a compatible wheel is not available
+        """
+        requirements = list(requirements)
+        timeline = timeline if timeline is not None else BuildTimeline()
+        if not resolved and self.target is not None:
+            raise ExecutionError(f"Requirements must be resolved to install for {self.target.runtime}")
+
+        if not resolved:
+            _LOGGER.debug("Requirements are not resolved: using fallback installer")
+            self.fallback.install(
+                build_dir=build_dir,
+                venv_dir=venv_dir,
+                requirements=requirements,
+                download_dir=download_dir,
+                resolved=resolved,
+                timeline=timeline,
+            )
+            return
+
+        if self.target is None:
+            supported = _supported_tags()
+        else:
+            supported = self.target.tags()
+
+        wheels, missing = self._select_wheels(requirements, download_dir, supported)
+        if missing and self.target is None:
+            # Only ask pip for anything that we do not already have a compatible wheel for.
+            fetch_resolved(
+                venv_dir=venv_dir,
+                resolved=missing,
+                download_dir=download_dir,
+                max_workers=self.max_workers,
+                retries=self.retries,
+                timeline=timeline,
+            )
+            fetched, remaining = self._select_wheels(missing, download_dir, supported)
+            wheels.extend(fetched)
+            if remaining and self.source_builds is not None:
+                built, remaining = self._build_source_wheels(venv_dir, remaining, download_dir, supported, timeline)
+                wheels.extend(built)
+        elif missing:
+            fetched, remaining = self._fetch_target_wheels(venv_dir, missing, download_dir, supported, timeline)
+            wheels.extend(fetched)
+            if remaining:
+                raise BuildError(f"No compatible wheels found for {self.target.runtime}: {remaining}")
+        else:
+            remaining = []
+
+        python = os.path.join(venv_dir, "bin", "python")
+        os.makedirs(build_dir, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Consume the results so that any failures are raised here.
+            list(executor.map(lambda wheel_file: _timed_install_wheel(wheel_file, build_dir, python, timeline), wheels))
+
+        if remaining:
+            _LOGGER.debug("No compatible wheels found for %s: using fallback installer", remaining)
+            self.fallback.install(
+                build_dir=build_dir,
+                venv_dir=venv_dir,
+                requirements=remaining,
+                download_dir=download_dir,
+                resolved=resolved,
+                timeline=timeline,
+            )
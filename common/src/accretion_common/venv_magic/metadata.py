@@ -0,0 +1,175 @@
+"""Read structured metadata for distributions installed into a build directory."""
+import csv
+import logging
+import os
+import zipfile
+from email.message import Message
+from email.parser import HeaderParser
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pkg_resources import Requirement
+
+from accretion_common.util import InstalledDistribution, PackageDetails, canonical_name
+
+from .wheel_cache import parse_distribution_filename
+
+__all__ = ("read_installed", "select_wheel", "wheel_filename_tags", "wheel_metadata")
+_LOGGER = logging.getLogger(__name__)
+
+
+def wheel_filename_tags(filename: str) -> Set[str]:
+    """Expand the compressed tag set in a wheel filename.
+
+    :param str filename: Wheel filename
+    :returns: All tags supported by the wheel
+    """
+    pythons, abis, platforms = filename[: -len(".whl")].split("-")[-3:]
+    return {
+        f"{python}-{abi}-{platform}"
+        for python in pythons.split(".")
+        for abi in abis.split(".")
+        for platform in platforms.split(".")
+    }
+
+
+def select_wheel(package: PackageDetails, filenames: Iterable[str], supported: Dict[str, int]) -> Optional[str]:
+    """Find the most specific compatible wheel for a pinned requirement.
+
+    :param PackageDetails package: Pinned requirement
+    :param filenames: Distribution filenames to choose from
+    :param dict supported: Mapping of each supported tag to its priority: lower is better
+    :returns: Filename of the best wheel, or ``None`` if none are compatible
+    """
+    requirement = Requirement.parse(f"{package.Name}{package.Details}")
+    name = canonical_name(package.Name)
+
+    best = None
+    for filename in filenames:
+        if not filename.endswith(".whl"):
+            continue
+        wheel_name, version = parse_distribution_filename(filename)
+        if wheel_name != name or version not in requirement:
+            continue
+
+        ranks = [supported[tag] for tag in wheel_filename_tags(filename) if tag in supported]
+        if ranks and (best is None or min(ranks) < best[0]):
+            best = (min(ranks), filename)
+
+    return None if best is None else best[1]
+
+
+def wheel_metadata(wheel_file: str) -> Optional[Message]:
+    """Read the core metadata from a wheel without installing it.
+
+    :param str wheel_file: Path to the wheel
+    :returns: Parsed ``METADATA`` headers, or ``None`` if the wheel has none
+    """
+    with zipfile.ZipFile(wheel_file) as wheel:
+        for name in wheel.namelist():
+            if name.count("/") == 1 and name.endswith(".dist-info/METADATA"):
+                return HeaderParser().parsestr(wheel.read(name).decode("utf-8"))
+    return None
+
+
+def _read_headers(filename: str):
+    with open(filename, "r", encoding="utf-8") as source:
+        return HeaderParser().parse(source)
+
+
+def _record_size(dist_info_dir: str) -> Optional[int]:
+    """Total the file sizes that pip recorded while installing the distribution."""
+    try:
+        with open(os.path.join(dist_info_dir, "RECORD"), "r", encoding="utf-8", newline="") as record:
+            return sum(int(row[2]) for row in csv.reader(record) if len(row) == 3 and row[2])
+    except FileNotFoundError:
+        return None
+
+
+def _installed_files_size(egg_info_dir: str) -> Optional[int]:
+    """Total the sizes of files listed in a legacy ``installed-files.txt``."""
+    try:
+        with open(os.path.join(egg_info_dir, "installed-files.txt"), "r", encoding="utf-8") as listing:
+            files = [os.path.join(egg_info_dir, line.strip()) for line in listing if line.strip()]
+    except FileNotFoundError:
+        return None
+    return sum(os.path.getsize(filename) for filename in files if os.path.isfile(filename))
+
+
+def _read_dist_info(dist_info_dir: str) -> InstalledDistribution:
+    metadata = _read_headers(os.path.join(dist_info_dir, "METADATA"))
+    try:
+        tags = sorted(_read_headers(os.path.join(dist_info_dir, "WHEEL")).get_all("Tag", []))
+    except FileNotFoundError:
+        tags = []
+    return InstalledDistribution(
+        Name=canonical_name(metadata["Name"]),
+        Version=metadata["Version"],
+        Tags=tags,
+        InstalledSize=_record_size(dist_info_dir),
+    )
+
+
+def _read_egg_info(egg_info_dir: str) -> InstalledDistribution:
+    metadata = _read_headers(os.path.join(egg_info_dir, "PKG-INFO"))
+    return InstalledDistribution(
+        Name=canonical_name(metadata["Name"]),
+        Version=metadata["Version"],
+        InstalledSize=_installed_files_size(egg_info_dir),
+    )
+
+
+def _index_downloads(download_dir: Optional[str]) -> Dict[Tuple[str, str], List[str]]:
+    downloads: Dict[Tuple[str, str], List[str]] = {}
+    if download_dir is None or not os.path.isdir(download_dir):
+        return downloads
+
+    for filename in sorted(os.listdir(download_dir)):
+        try:
+            downloads.setdefault(parse_distribution_filename(filename), []).append(filename)
+        except ValueError:
+            continue
+    return downloads
+
+
+def _find_source(distribution: InstalledDistribution, candidates: Iterable[str]) -> Optional[str]:
+    """Identify which of the candidate distribution files was installed."""
+    sdists = []
+    for filename in candidates:
+        if not filename.endswith(".whl"):
+            sdists.append(filename)
+        elif wheel_filename_tags(filename) & set(distribution.Tags):
+            return filename
+    # If no wheel matches, this was built from the sdist.
+    return sdists[0] if sdists else None
+
+
+def read_installed(build_dir: str, download_dir: Optional[str] = None) -> Iterable[InstalledDistribution]:
+    """Collect structured metadata for every distribution that pip installed into ``build_dir``.
+
+    Only the metadata directories that pip writes are read:
+    installed sizes come from the sizes pip recorded for each installed file.
+
+    :param str build_dir: Directory that distributions were installed into
+    :param str download_dir: Directory containing the distribution files that were installed (optional)
+    :returns: Installed distributions, sorted by name
+    """
+    downloads = _index_downloads(download_dir)
+    installed = []
+    for entry in sorted(os.listdir(build_dir)):
+        path = os.path.join(build_dir, entry)
+        if entry.endswith(".dist-info"):
+            distribution = _read_dist_info(path)
+        elif entry.endswith(".egg-info") and os.path.isdir(path):
+            distribution = _read_egg_info(path)
+        else:
+            continue
+
+        source = _find_source(distribution, downloads.get((distribution.Name, distribution.Version), []))
+        if source is not None:
+            distribution.Source = source
+            distribution.DownloadSize = os.path.getsize(os.path.join(download_dir, source))
+        installed.append(distribution)
+
+    installed.sort(key=lambda distribution: distribution.Name)
+    _LOGGER.debug("Installed to layer artifact: %s", installed)
+    return installed
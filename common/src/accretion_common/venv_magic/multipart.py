@@ -0,0 +1,148 @@
+"""Stream a file to S3 in parts while it is still being written."""
+import hashlib
+import io
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from botocore.client import BaseClient
+
+__all__ = ("DEFAULT_PART_SIZE", "MultipartUploadWriter")
+_LOGGER = logging.getLogger(__name__)
+# S3 rejects multipart uploads with any part other than the last smaller than this.
+_MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+
+class MultipartUploadWriter:
+    """Binary file-like that uploads everything written to it to an S3 object.
+
+    Whenever a full part has been written, it is uploaded on a background thread while writing continues,
+    so at most two parts are held in memory: one uploading and one filling.
+    If everything fits in one part, it is uploaded with a single ``PutObject`` call instead.
+
+    The object is only created when the writer exits without an error.
+    Otherwise the multipart upload is aborted.
+
+    .. code:: python
+
+        with MultipartUploadWriter(s3_client, bucket_name, key) as upload:
+            build_zip(build_dir, output=upload)
+        checksum = upload.sha256
+
+    :param s3_client: Boto3 client to use for S3 interaction
+    :param str bucket_name: S3 bucket to upload to
+    :param str key: S3 key to upload to
+    :param int part_size: Size in bytes of each part but the last
+    """
+
+    def __init__(self, s3_client: BaseClient, bucket_name: str, key: str, part_size: int = DEFAULT_PART_SIZE):
+        if part_size < _MIN_PART_SIZE:
+            raise ValueError(f"Parts must be at least {_MIN_PART_SIZE} bytes")
+        self._s3 = s3_client
+        self._bucket_name = bucket_name
+        self._key = key
+        self._part_size = part_size
+        self._buffer = bytearray()
+        self._hasher = hashlib.sha256()
+        self._size = 0
+        self._upload_id: Optional[str] = None
+        self._parts: List[Dict[str, Any]] = []
+        self._uploading: Optional[Future] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def sha256(self) -> str:
+        """Hex SHA-256 digest of everything written so far."""
+        return self._hasher.hexdigest()
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        raise io.UnsupportedOperation("Multipart uploads can only be written in order")
+
+    def tell(self) -> int:
+        return self._size
+
+    def flush(self):
+        """Parts are uploaded as soon as they are full, so there is nothing to flush."""
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        self._hasher.update(data)
+        self._size += len(data)
+        while len(self._buffer) >= self._part_size:
+            part = bytes(self._buffer[: self._part_size])
+            del self._buffer[: self._part_size]
+            self._upload_part(part)
+        return len(data)
+
+    def _wait(self):
+        if self._uploading is not None:
+            self._parts.append(self._uploading.result())
+            self._uploading = None
+
+    def _send_part(self, number: int, part: bytes) -> Dict[str, Any]:
+        response = self._s3.upload_part(
+            Bucket=self._bucket_name, Key=self._key, UploadId=self._upload_id, PartNumber=number, Body=part
+        )
+        _LOGGER.debug("Uploaded part %d of %s: %d bytes", number, self._key, len(part))
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    def _upload_part(self, part: bytes):
+        if self._upload_id is None:
+            self._upload_id = self._s3.create_multipart_upload(Bucket=self._bucket_name, Key=self._key)["UploadId"]
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        # Only one part is in flight at a time, which bounds memory use to two parts.
+        self._wait()
+        number = len(self._parts) + 1
+        self._uploading = self._executor.submit(self._send_part, number, part)
+
+    def complete(self):
+        """Upload whatever is left and create the object."""
+        if self._upload_id is None:
+            self._s3.put_object(Bucket=self._bucket_name, Key=self._key, Body=bytes(self._buffer))
+        else:
+            self._wait()
+            if self._buffer or not self._parts:
+                self._parts.append(self._send_part(len(self._parts) + 1, bytes(self._buffer)))
+            self._s3.complete_multipart_upload(
+                Bucket=self._bucket_name,
+                Key=self._key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+        self._buffer = bytearray()
+        _LOGGER.debug("Uploaded %d bytes to %s in %d parts", self._size, self._key, max(len(self._parts), 1))
+
+    def abort(self):
+        """Abandon the upload so that S3 does not keep the parts that were already uploaded."""
+        self._buffer = bytearray()
+        if self._upload_id is None:
+            return
+        if self._uploading is not None:
+            self._uploading.exception()
+            self._uploading = None
+        self._s3.abort_multipart_upload(Bucket=self._bucket_name, Key=self._key, UploadId=self._upload_id)
+        _LOGGER.debug("Aborted upload to %s", self._key)
+
+    def __enter__(self) -> "MultipartUploadWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.complete()
+            else:
+                self.abort()
+        except Exception:
+            if exc_type is None:
+                self.abort()
+            raise
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
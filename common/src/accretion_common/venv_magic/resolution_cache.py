@@ -0,0 +1,141 @@
+"""Share dependency resolutions between builders so that the same request is only resolved once per TTL window."""
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import attr
+from botocore.client import BaseClient
+from botocore.exceptions import ClientError
+
+from accretion_common.constants import RESOLUTIONS_PREFIX
+from accretion_common.util import PackageDetails, canonical_name
+
+from .builder import PIP_VERSION
+
+__all__ = ("ResolutionCache", "ResolutionLookup", "resolution_key")
+_LOGGER = logging.getLogger(__name__)
+
+
+def resolution_key(requirements: Iterable[PackageDetails], runtime_name: str) -> str:
+    """Construct a deterministic S3 key for a requested set of requirements in a runtime.
+
+    Names are canonicalized and whitespace is ignored,
+    so requests that only differ in how they are written share a resolution.
+    Resolution depends on the resolver as well as on the request, so the pip version is part of the key.
+
+    :param requirements: Requested requirements, before resolution
+    :param str runtime_name: Lambda runtime that the requirements are resolved for
+    :rtype: str
+    """
+    hasher = hashlib.sha256()
+
+    hasher.update(b"===REQUESTED===")
+    for statement in sorted(
+        canonical_name(package.Name) + "".join(package.Details.split()) for package in requirements
+    ):
+        hasher.update(statement.encode("utf-8"))
+
+    hasher.update(b"===RUNTIME===")
+    hasher.update(runtime_name.encode("utf-8"))
+
+    hasher.update(b"===RESOLVER===")
+    hasher.update(f"pip=={PIP_VERSION}".encode("utf-8"))
+
+    return f"{RESOLUTIONS_PREFIX}{hasher.hexdigest()}.json"
+
+
+@attr.s(auto_attribs=True)
+class ResolutionLookup:
+    """Result of looking up a resolution in the cache.
+
+    :param str Status: ``hit``, ``miss``, ``expired``, or ``disabled``
+    :param int TTL: Seconds that cached resolutions were valid for
+    :param float Age: Seconds since the cached resolution was stored, if there was one (optional)
+    :param list Resolved: Cached resolution, if it is still valid (optional)
+    """
+
+    Status: str
+    TTL: int
+    Age: Optional[float] = None
+    Resolved: Optional[List[PackageDetails]] = None
+
+    @property
+    def hit(self) -> bool:
+        """Whether a valid cached resolution was found."""
+        return self.Resolved is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Pack the lookup result, without the resolution itself, into a dictionary."""
+        return dict(Status=self.Status, TTL=self.TTL, Age=self.Age)
+
+
+@attr.s
+class ResolutionCache:
+    """Cache of dependency resolutions in the artifacts bucket.
+
+    Resolutions are stored under ``accretion/resolutions/{key}.json``
+    and are keyed by the canonical request and the runtime, as described in :func:`resolution_key`.
+    Each resolution records when it was stored, so the same stored resolution can be checked against any TTL.
+
+    :param s3_client: Boto3 client to use for S3 interaction
+    :param str bucket_name: S3 bucket containing cached resolutions
+    """
+
+    s3_client: BaseClient = attr.ib()
+    bucket_name: str = attr.ib()
+
+    def lookup(self, requirements: Iterable[PackageDetails], runtime_name: str, ttl: int) -> ResolutionLookup:
+        """Find a cached resolution of ``requirements`` that was stored less than ``ttl`` seconds ago.
+
+        :param requirements: Requested requirements, before resolution
+        :param str runtime_name: Lambda runtime that the requirements are resolved for
+        :param int ttl: Seconds that a cached resolution is valid for; ``0`` disables the cache
+        :rtype: ResolutionLookup
+        """
+        if ttl <= 0:
+            return ResolutionLookup(Status="disabled", TTL=ttl)
+
+        key = resolution_key(requirements, runtime_name)
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+            cached = json.loads(response["Body"].read().decode("utf-8"))
+            resolved_at = float(cached["ResolvedAt"])
+            resolved = [PackageDetails(**package) for package in cached["Resolved"]]
+        except ClientError:
+            # Without s3:ListBucket, S3 reports a missing key as access denied rather than not found.
+            _LOGGER.debug("Resolution cache miss: %s", key)
+            return ResolutionLookup(Status="miss", TTL=ttl)
+        except (ValueError, KeyError, TypeError):
+            _LOGGER.warning("Ignoring unreadable cached resolution: %s", key)
+            return ResolutionLookup(Status="miss", TTL=ttl)
+
+        age = round(max(0.0, time.time() - resolved_at), 3)
+        if age >= ttl:
+            _LOGGER.debug("Resolution cache entry expired %s seconds ago: %s", round(age - ttl, 3), key)
+            return ResolutionLookup(Status="expired", TTL=ttl, Age=age)
+
+        _LOGGER.debug("Resolution cache hit: %s", key)
+        return ResolutionLookup(Status="hit", TTL=ttl, Age=age, Resolved=resolved)
+
+    def store(self, requirements: Iterable[PackageDetails], runtime_name: str, resolved: Iterable[PackageDetails]):
+        """Store the resolution of ``requirements``, replacing any expired resolution.
+
+        :param requirements: Requested requirements, before resolution
+        :param str runtime_name: Lambda runtime that the requirements were resolved for
+        :param resolved: Fully resolved requirements
+        """
+        requirements = list(requirements)
+        key = resolution_key(requirements, runtime_name)
+        body = json.dumps(
+            dict(
+                Requirements=[package.to_dict() for package in requirements],
+                Runtime=runtime_name,
+                Resolved=[package.to_dict() for package in resolved],
+                ResolvedAt=time.time(),
+            ),
+            indent=4,
+        )
+        _LOGGER.debug("Adding to resolution cache: %s", key)
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=body)
@@ -0,0 +1,116 @@
+"""Split a resolved set of requirements into shards that can be installed in parallel."""
+import logging
+import os
+from typing import Dict, Iterable, List, Optional
+
+from packaging.requirements import InvalidRequirement, Requirement
+
+from accretion_common.util import PackageDetails, canonical_name
+
+from .metadata import select_wheel, wheel_metadata
+from .wheel_cache import parse_distribution_filename
+
+__all__ = ("plan_shards",)
+_LOGGER = logging.getLogger(__name__)
+
+
+def _find(parents: Dict[str, str], name: str) -> str:
+    """Find the package whose group ``name`` belongs to."""
+    while parents[name] != name:
+        parents[name] = parents[parents[name]]
+        name = parents[name]
+    return name
+
+
+def _dependencies(
+    package: PackageDetails, download_dir: str, filenames: List[str], supported: Dict[str, int]
+) -> List[str]:
+    """Read the canonical names of everything that a resolved package depends on from its wheel.
+
+    Markers are not evaluated: grouping a package with a dependency that it does not need here is harmless.
+    """
+    wheel = select_wheel(package, filenames, supported)
+    if wheel is None:
+        return []
+    metadata = wheel_metadata(os.path.join(download_dir, wheel))
+    if metadata is None:
+        return []
+
+    dependencies = []
+    for requirement in metadata.get_all("Requires-Dist", []):
+        try:
+            dependencies.append(canonical_name(Requirement(requirement).name))
+        except InvalidRequirement:
+            _LOGGER.debug("Ignoring unreadable dependency of %s: %s", package.Name, requirement)
+    return dependencies
+
+
+def _distribution_sizes(download_dir: str, filenames: Iterable[str]) -> Dict[str, int]:
+    """Find the largest distribution file for every project in ``download_dir``."""
+    sizes: Dict[str, int] = {}
+    for filename in filenames:
+        try:
+            name, _version = parse_distribution_filename(filename)
+        except ValueError:
+            continue
+        sizes[name] = max(sizes.get(name, 0), os.path.getsize(os.path.join(download_dir, filename)))
+    return sizes
+
+
+def plan_shards(
+    resolved: Iterable[PackageDetails],
+    download_dir: str,
+    shard_count: int,
+    supported: Optional[Dict[str, int]] = None,
+) -> List[List[PackageDetails]]:
+    """Split a resolved set of requirements into at most ``shard_count`` shards of about the same size.
+
+    Any dependency that only one package in the set depends on stays in the same shard as that package,
+    so that each shard is a package along with the dependencies that only it needs.
+    Dependencies that several packages share are placed on their own.
+    These groups are then packed into shards, largest first, by the size of their distribution files.
+
+    :param resolved: Pinned requirements
+    :param str download_dir: Directory containing the resolved distribution files
+    :param int shard_count: Maximum number of shards
+    :param dict supported: Wheel tags that can be installed, ranked from most to least specific
+        (optional: default is to not read any dependencies)
+    :returns: Shards of pinned requirements, largest first, each in the order that they were resolved
+    """
+    resolved = list(resolved)
+    names = [canonical_name(package.Name) for package in resolved]
+    filenames = os.listdir(download_dir) if os.path.isdir(download_dir) else []
+
+    dependents: Dict[str, List[str]] = {name: [] for name in names}
+    if supported is not None:
+        for name, package in zip(names, resolved):
+            for dependency in _dependencies(package, download_dir, filenames, supported):
+                if dependency in dependents and dependency != name:
+                    dependents[dependency].append(name)
+
+    parents = {name: name for name in names}
+    for dependency, packages in dependents.items():
+        if len(set(packages)) == 1:
+            parents[_find(parents, dependency)] = _find(parents, packages[0])
+
+    sizes = _distribution_sizes(download_dir, filenames)
+    grouped: Dict[str, List[int]] = {}
+    for index, name in enumerate(names):
+        grouped.setdefault(_find(parents, name), []).append(index)
+
+    # Every package counts for at least one byte so that packages without a distribution file still spread out.
+    weighted = sorted(
+        ((sum(max(sizes.get(names[index], 0), 1) for index in members), members) for members in grouped.values()),
+        key=lambda group: group[0],
+        reverse=True,
+    )
+    shards: List[List[int]] = [[] for _ in range(max(1, min(shard_count, len(weighted))))]
+    totals = [0] * len(shards)
+    for weight, members in weighted:
+        lightest = totals.index(min(totals))
+        shards[lightest].extend(members)
+        totals[lightest] += weight
+
+    _LOGGER.debug("Planned %d shards of %s bytes", len(shards), totals)
+    ordered = sorted(zip(totals, shards), key=lambda shard: shard[0], reverse=True)
+    return [[resolved[index] for index in sorted(shard)] for _total, shard in ordered if shard]
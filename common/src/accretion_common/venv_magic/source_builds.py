@@ -0,0 +1,184 @@
+"""Build wheels from sdists and cache them so that each sdist is only compiled once per runtime and platform."""
+import logging
+import math
+import os
+import shutil
+import sys
+import sysconfig
+import tempfile
+from typing import Dict, Optional
+
+import attr
+from botocore.client import BaseClient
+
+from accretion_common.constants import WHEELS_PREFIX
+from accretion_common.exceptions import BuildError
+from accretion_common.util import file_sha256
+
+from .execution import execute_in_venv
+from .timeline import BuildTimeline
+from .wheel_cache import parse_distribution_filename
+
+__all__ = ("SourceBuildCache", "build_jobs", "build_wheel")
+_LOGGER = logging.getLogger(__name__)
+# Canonical project names never contain "_", so this can never collide with a project in the wheel cache.
+_BUILT_WHEELS_PREFIX = f"{WHEELS_PREFIX}_built/"
+_MEMORY_SIZE_ENV = "AWS_LAMBDA_FUNCTION_MEMORY_SIZE"
+# Lambda allocates one vCPU for every 1769 MB of function memory, up to six.
+_MB_PER_VCPU = 1769
+_MAX_VCPUS = 6
+
+
+def build_jobs() -> int:
+    """Determine how many native compile jobs to run in parallel.
+
+    Lambda allocates CPU in proportion to the function memory size,
+    so there are usually fewer vCPUs available than there are CPUs visible.
+    """
+    cpus = os.cpu_count() or 1
+    try:
+        memory_size = int(os.environ[_MEMORY_SIZE_ENV])
+    except (KeyError, ValueError):
+        return cpus
+    return max(1, min(cpus, _MAX_VCPUS, math.ceil(memory_size / _MB_PER_VCPU)))
+
+
+def _build_environment(jobs: int) -> Dict[str, str]:
+    """Environment variables that set native compile parallelism for the common build systems."""
+    return {"MAKEFLAGS": f"-j{jobs}", "NPY_NUM_BUILD_JOBS": str(jobs), "MAX_JOBS": str(jobs)}
+
+
+def build_wheel(venv_dir: str, sdist: str, wheel_dir: str, find_links: str, jobs: Optional[int] = None) -> str:
+    """Build a wheel from an sdist.
+
+    :param str venv_dir: Path to venv to build with
+    :param str sdist: Path to sdist
+    :param str wheel_dir: Directory to write wheel to
+    :param str find_links: Directory containing any distributions needed to build the wheel
+    :param int jobs: Number of native compile jobs to run in parallel (optional: default is :func:`build_jobs`)
+    :returns: Path to built wheel
+    :raises BuildError: if the wheel cannot be built
+    """
+    jobs = jobs or build_jobs()
+    output_dir = tempfile.mkdtemp()
+    try:
+        _LOGGER.info("Building wheel from %s with %d jobs", os.path.basename(sdist), jobs)
+        execute_in_venv(
+            venv_dir=venv_dir,
+            command=["pip", "wheel", "--no-deps", "--no-cache-dir", "--find-links", find_links]
+            + ["--wheel-dir", output_dir, sdist],
+            extra_env=_build_environment(jobs),
+        )
+        wheels = [filename for filename in os.listdir(output_dir) if filename.endswith(".whl")]
+        if len(wheels) != 1:
+            raise BuildError(f"Expected one wheel from {sdist} but found: {wheels}")
+
+        os.makedirs(wheel_dir, exist_ok=True)
+        wheel = os.path.join(wheel_dir, wheels[0])
+        shutil.move(os.path.join(output_dir, wheels[0]), wheel)
+        return wheel
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def _default_runtime() -> str:
+    return f"python{sys.version_info.major}.{sys.version_info.minor}"
+
+
+def _default_platform() -> str:
+    return sysconfig.get_platform().replace("-", "_").replace(".", "_")
+
+
+@attr.s
+class SourceBuildCache:
+    """Two-tier cache of wheels built from sdists.
+
+    Wheels are keyed by the sdist hash, the runtime, and the platform,
+    so a cached wheel is only ever used in the same environment that it was built in.
+    The shared tier lives in the artifacts bucket under
+    ``accretion/wheels/_built/{sdist sha256}/{runtime}/{platform}/{filename}``.
+
+    :param str cache_dir: Local cache directory
+    :param str runtime: Lambda runtime that wheels are built for (optional: default is this interpreter)
+    :param str platform: Platform that wheels are built for (optional: default is this platform)
+    :param s3_client: Boto3 client to use for S3 interaction (optional: if not set, only the local tier is used)
+    :param str bucket_name: S3 bucket containing the shared tier (optional)
+    """
+
+    cache_dir: str = attr.ib()
+    runtime: str = attr.ib(default=attr.Factory(_default_runtime))
+    platform: str = attr.ib(default=attr.Factory(_default_platform))
+    s3_client: Optional[BaseClient] = attr.ib(default=None)
+    bucket_name: Optional[str] = attr.ib(default=None)
+
+    @property
+    def _has_shared_tier(self) -> bool:
+        return self.s3_client is not None and self.bucket_name is not None
+
+    def _local_dir(self, sdist_sha256: str) -> str:
+        return os.path.join(self.cache_dir, sdist_sha256, self.runtime, self.platform)
+
+    def _shared_prefix(self, sdist_sha256: str) -> str:
+        return f"{_BUILT_WHEELS_PREFIX}{sdist_sha256}/{self.runtime}/{self.platform}/"
+
+    def _find_local(self, sdist_sha256: str) -> Optional[str]:
+        local_dir = self._local_dir(sdist_sha256)
+        if not os.path.isdir(local_dir):
+            return None
+        for filename in os.listdir(local_dir):
+            if filename.endswith(".whl"):
+                return os.path.join(local_dir, filename)
+        return None
+
+    def _find_shared(self, sdist_sha256: str) -> Optional[str]:
+        if not self._has_shared_tier:
+            return None
+
+        response = self.s3_client.list_objects_v2(Bucket=self.bucket_name, Prefix=self._shared_prefix(sdist_sha256))
+        for entry in response.get("Contents", []):
+            if not entry["Key"].endswith(".whl"):
+                continue
+            local_dir = self._local_dir(sdist_sha256)
+            os.makedirs(local_dir, exist_ok=True)
+            wheel = os.path.join(local_dir, entry["Key"].rsplit("/", 1)[-1])
+            partial = f"{wheel}.partial"
+            self.s3_client.download_file(Bucket=self.bucket_name, Key=entry["Key"], Filename=partial)
+            os.rename(partial, wheel)
+            return wheel
+        return None
+
+    def _store(self, sdist_sha256: str, wheel: str):
+        if not self._has_shared_tier:
+            return
+        key = f"{self._shared_prefix(sdist_sha256)}{os.path.basename(wheel)}"
+        _LOGGER.debug("Adding to shared built wheel cache: %s", key)
+        self.s3_client.upload_file(Filename=wheel, Bucket=self.bucket_name, Key=key)
+
+    def wheel_for(self, venv_dir: str, sdist: str, find_links: str, timeline: Optional[BuildTimeline] = None) -> str:
+        """Find a cached wheel built from an sdist, building and caching one if there is none.
+
+        :param str venv_dir: Path to venv to build with
+        :param str sdist: Path to sdist
+        :param str find_links: Directory containing any distributions needed to build the wheel
+        :param BuildTimeline timeline: Timeline to record the build or cache hit in (optional)
+        :returns: Path to wheel
+        :raises BuildError: if there is no cached wheel and one cannot be built
+        """
+        timeline = timeline if timeline is not None else BuildTimeline()
+        with timeline.measure(parse_distribution_filename(os.path.basename(sdist))[0], "build") as entry:
+            sdist_sha256 = file_sha256(sdist)
+            wheel = self._find_local(sdist_sha256)
+            if wheel is None:
+                wheel = self._find_shared(sdist_sha256)
+                entry.Bytes = None if wheel is None else os.path.getsize(wheel)
+            if wheel is not None:
+                _LOGGER.debug("Built wheel cache hit for %s: %s", os.path.basename(sdist), os.path.basename(wheel))
+                entry.Cache = "hit"
+                return wheel
+
+            entry.Cache = "miss"
+            wheel = build_wheel(
+                venv_dir=venv_dir, sdist=sdist, wheel_dir=self._local_dir(sdist_sha256), find_links=find_links
+            )
+            self._store(sdist_sha256, wheel)
+            return wheel
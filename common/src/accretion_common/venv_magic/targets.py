@@ -0,0 +1,108 @@
+"""Descriptions of the Lambda runtimes that artifacts can be built for."""
+from typing import Any, Dict, Iterable, List, Tuple
+
+import attr
+from packaging.markers import default_environment
+from packaging.tags import compatible_tags, cpython_tags
+
+__all__ = ("RuntimeTarget", "RUNTIME_TARGETS", "is_runtime_independent")
+# Lambda Python runtimes run on Amazon Linux, which provides glibc 2.17.
+_LAMBDA_PLATFORMS = ("manylinux2014_x86_64", "manylinux2010_x86_64", "manylinux1_x86_64")
+
+
+def is_runtime_independent(tag: str) -> bool:
+    """Determine whether a wheel tag describes a pure Python wheel, which installs the same files for any runtime.
+
+    :param str tag: Wheel tag (ex: ``py3-none-any``)
+    """
+    try:
+        _interpreter, abi, platform = tag.split("-")
+    except ValueError:
+        return False
+    return abi == "none" and platform == "any"
+
+
+@attr.s(frozen=True)
+class RuntimeTarget:
+    """Interpreter and platform that a Lambda runtime provides.
+
+    :param str runtime: Lambda runtime name
+    :param tuple version: Python major and minor version
+    :param str abi: CPython ABI tag
+    :param tuple platforms: Supported platform tags, most preferred first
+    """
+
+    runtime: str = attr.ib()
+    version: Tuple[int, int] = attr.ib()
+    abi: str = attr.ib()
+    platforms: Tuple[str, ...] = attr.ib(default=_LAMBDA_PLATFORMS)
+
+    @property
+    def interpreter(self) -> str:
+        """Interpreter tag."""
+        return f"cp{self.version[0]}{self.version[1]}"
+
+    def tags(self) -> Dict[str, int]:
+        """Map every wheel tag supported by this runtime to its priority: lower is better."""
+        tags = list(cpython_tags(self.version, abis=[self.abi], platforms=self.platforms))
+        tags.extend(compatible_tags(self.version, interpreter=self.interpreter, platforms=self.platforms))
+        return {str(tag): rank for rank, tag in enumerate(tags)}
+
+    def can_share(self, installed: Iterable[Dict[str, Any]]) -> bool:
+        """Determine whether distributions that were installed for another runtime can be used as-is in this runtime.
+
+        Every distribution must have been installed from a pure Python wheel that this runtime supports.
+        Distributions that were not installed from a wheel have no tags and can never be shared.
+
+        :param installed: Installed distribution descriptions
+        """
+        supported = self.tags()
+        return all(
+            any(is_runtime_independent(tag) and tag in supported for tag in distribution.get("Tags") or [])
+            for distribution in installed
+        )
+
+    def marker_environment(self) -> Dict[str, str]:
+        """Build the environment that dependency markers are evaluated against in this runtime.
+
+        Only the patch version is not known ahead of time, so assume the first release.
+        """
+        environment = default_environment()
+        version = f"{self.version[0]}.{self.version[1]}"
+        environment.update(
+            dict(
+                python_version=version,
+                python_full_version=f"{version}.0",
+                implementation_name="cpython",
+                implementation_version=f"{version}.0",
+                platform_python_implementation="CPython",
+                sys_platform="linux",
+                platform_system="Linux",
+                platform_machine="x86_64",
+                os_name="posix",
+            )
+        )
+        return environment
+
+    def pip_args(self, platform: str) -> List[str]:
+        """Build the pip arguments that select distributions for this runtime on ``platform``."""
+        return [
+            "--only-binary=:all:",
+            "--implementation",
+            "cp",
+            "--python-version",
+            f"{self.version[0]}{self.version[1]}",
+            "--abi",
+            self.abi,
+            "--platform",
+            platform,
+        ]
+
+
+RUNTIME_TARGETS = {
+    target.runtime: target
+    for target in (
+        RuntimeTarget(runtime="python3.6", version=(3, 6), abi="cp36m"),
+        RuntimeTarget(runtime="python3.7", version=(3, 7), abi="cp37m"),
+    )
+}
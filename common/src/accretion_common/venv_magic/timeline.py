@@ -0,0 +1,229 @@
+"""Record how long each package took to download, build, and install during a build."""
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import attr
+
+from accretion_common.util import canonical_name
+
+from .execution import PipEvent
+from .wheel_cache import parse_distribution_filename
+
+__all__ = ("BuildTimeline", "TimelineEntry", "parse_pip_size")
+_LOGGER = logging.getLogger(__name__)
+_REQUIREMENT_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*")
+_PIP_SIZE = re.compile(r"^\s*(?P<value>[\d.]+)\s*(?P<unit>[kMG]?)B\s*$")
+# pip reports sizes in decimal units.
+_PIP_SIZE_UNITS = {"": 1, "k": 1000, "M": 1000**2, "G": 1000**3}
+# pip reports where each distribution came from: the index, the --find-links directory, or the --dest directory.
+_PIP_CACHE_STATUS = {"download": "miss", "process": "hit", "cached": "hit"}
+
+
+def parse_pip_size(size: Optional[str]) -> Optional[int]:
+    """Convert a size reported by pip (ex: ``57kB``) to bytes.
+
+    :param str size: Size reported by pip
+    :returns: Size in bytes, or ``None`` if the size could not be read
+    """
+    if size is None:
+        return None
+    match = _PIP_SIZE.match(size)
+    if match is None:
+        return None
+    return int(float(match.group("value")) * _PIP_SIZE_UNITS[match.group("unit")])
+
+
+def _event_package(package: str) -> str:
+    """Find the canonical project name in the package that a pip event refers to."""
+    try:
+        return parse_distribution_filename(os.path.basename(package))[0]
+    except ValueError:
+        pass
+    match = _REQUIREMENT_NAME.match(package)
+    return canonical_name(package if match is None else match.group(0))
+
+
+@attr.s(auto_attribs=True)
+class TimelineEntry:
+    """Time spent on one stage of building one package.
+
+    :param str Package: Canonical package name
+    :param str Stage: ``resolve``, ``download``, ``build``, or ``install``
+    :param float Start: Seconds from the start of the build until this stage started
+    :param float Seconds: How long this stage took
+    :param int Bytes: Bytes transferred during this stage (optional)
+    :param str Cache: ``hit`` or ``miss`` if this stage could be served from a cache (optional)
+    """
+
+    Package: str
+    Stage: str
+    Start: float
+    Seconds: float = 0.0
+    Bytes: Optional[int] = None
+    Cache: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Pack information into a dictionary."""
+        return dict(
+            Package=self.Package,
+            Stage=self.Stage,
+            Start=round(self.Start, 3),
+            Seconds=round(self.Seconds, 3),
+            Bytes=self.Bytes,
+            Cache=self.Cache,
+        )
+
+
+@attr.s
+class _PipEventRecorder:
+    """Attribute the time between pip progress events to the package that the earlier event was about.
+
+    pip reports each package before it works on it, so the time until the next event is time spent on that package.
+    """
+
+    timeline: "BuildTimeline" = attr.ib()
+    stage: str = attr.ib()
+    _entries: Dict[str, TimelineEntry] = attr.ib(default=attr.Factory(OrderedDict), init=False)
+    _current: Optional[TimelineEntry] = attr.ib(default=None, init=False)
+    _since: Optional[float] = attr.ib(default=None, init=False)
+
+    def _advance(self, timestamp: float):
+        if self._current is not None:
+            self._current.Seconds += max(0.0, timestamp - self._since)
+        self._since = timestamp
+
+    def __call__(self, event: PipEvent):
+        _LOGGER.info("pip %s: %s", event.Action, event.Package)
+        self._advance(event.Timestamp)
+        if event.Action in ("install", "installed"):
+            # These report every package at once, so they cannot be attributed to any one package.
+            self._current = None
+            return
+
+        package = _event_package(event.Package)
+        entry = self._entries.get(package)
+        if entry is None:
+            entry = TimelineEntry(Package=package, Stage=self.stage, Start=self.timeline.offset(time.monotonic()))
+            self._entries[package] = entry
+        self._current = entry
+
+        size = parse_pip_size(event.Size)
+        if size is not None:
+            entry.Bytes = (entry.Bytes or 0) + size
+        if event.Action in _PIP_CACHE_STATUS:
+            entry.Cache = _PIP_CACHE_STATUS[event.Action]
+
+    def close(self):
+        self._advance(time.time())
+        self._current = None
+        for entry in self._entries.values():
+            self.timeline.add(entry)
+
+
+@attr.s
+class BuildTimeline:
+    """Thread-safe record of the time spent on each stage of building each package.
+
+    Entries can be recorded directly, measured with :meth:`measure`,
+    or derived from pip output with :meth:`pip_events`.
+    """
+
+    _started: float = attr.ib(default=attr.Factory(time.monotonic), init=False)
+    _entries: List[TimelineEntry] = attr.ib(default=attr.Factory(list), init=False)
+    _lock: threading.Lock = attr.ib(default=attr.Factory(threading.Lock), init=False)
+
+    def offset(self, timestamp: float) -> float:
+        """Convert a :func:`time.monotonic` timestamp to seconds from the start of the build."""
+        return timestamp - self._started
+
+    def add(self, entry: TimelineEntry):
+        """Add an entry to the timeline.
+
+        :param TimelineEntry entry: Entry to add
+        """
+        with self._lock:
+            self._entries.append(entry)
+
+    def record(
+        self,
+        package: str,
+        stage: str,
+        seconds: float,
+        bytes_transferred: Optional[int] = None,
+        cache: Optional[str] = None,
+    ):
+        """Record a stage that just finished.
+
+        :param str package: Package name
+        :param str stage: Build stage
+        :param float seconds: How long the stage took
+        :param int bytes_transferred: Bytes transferred during the stage (optional)
+        :param str cache: ``hit`` or ``miss`` (optional)
+        """
+        self.add(
+            TimelineEntry(
+                Package=canonical_name(package),
+                Stage=stage,
+                Start=self.offset(time.monotonic() - seconds),
+                Seconds=seconds,
+                Bytes=bytes_transferred,
+                Cache=cache,
+            )
+        )
+
+    @contextmanager
+    def measure(self, package: str, stage: str):
+        """Measure a stage of building a package.
+
+        The yielded entry can be updated with the bytes transferred and the cache status before the stage ends.
+        The entry is recorded even if the stage fails.
+
+        :param str package: Package name
+        :param str stage: Build stage
+        """
+        start = time.monotonic()
+        entry = TimelineEntry(Package=canonical_name(package), Stage=stage, Start=self.offset(start))
+        try:
+            yield entry
+        finally:
+            entry.Seconds = time.monotonic() - start
+            self.add(entry)
+
+    @contextmanager
+    def pip_events(self, stage: str):
+        """Derive entries from the progress events of a pip command.
+
+        Yields a callback to pass as ``on_event`` when executing the command.
+
+        :param str stage: Build stage that the command performs
+        """
+        recorder = _PipEventRecorder(timeline=self, stage=stage)
+        try:
+            yield recorder
+        finally:
+            recorder.close()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Describe every entry, along with per-package totals with the slowest packages first."""
+        with self._lock:
+            entries = sorted(self._entries, key=lambda entry: entry.Start)
+
+        packages: Dict[str, Dict[str, Any]] = {}
+        for entry in entries:
+            package = packages.setdefault(entry.Package, dict(Package=entry.Package, Seconds=0.0, Bytes=0, Stages={}))
+            package["Seconds"] += entry.Seconds
+            package["Bytes"] += entry.Bytes or 0
+            package["Stages"][entry.Stage] = round(package["Stages"].get(entry.Stage, 0.0) + entry.Seconds, 3)
+        for package in packages.values():
+            package["Seconds"] = round(package["Seconds"], 3)
+
+        return dict(
+            Entries=[entry.to_dict() for entry in entries],
+            Packages=sorted(packages.values(), key=lambda package: package["Seconds"], reverse=True),
+        )
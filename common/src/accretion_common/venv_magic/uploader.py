@@ -1,42 +1,81 @@
 """Upload a built artifact to S3."""
 import hashlib
+import json
 import os
-from typing import Dict, Iterable, Optional
+from functools import partial
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Optional, Tuple
 
 from botocore.client import BaseClient
 from botocore.exceptions import ClientError
 
 from accretion_common.constants import ARTIFACTS_PREFIX
+from accretion_common.util import BuildOptions
 
+from .delta import DeltaPlan
+from .filters import FileFilter
+from .multipart import DEFAULT_PART_SIZE, MultipartUploadWriter
 from .zipper import build_zip
 
-__all__ = ("artifact_exists", "efficient_build_and_upload_zip")
+__all__ = ("artifact_exists", "artifact_key", "efficient_build_and_upload_zip", "upload_archive")
+_HASH_CHUNK_SIZE = 1024 * 1024
 
 
-def _key_hash(installed: Iterable[Dict[str, str]], runtime_name: str, force_new: bool) -> str:
-    """Construct a deterministic ID based on the installed requirements and the runtime.
+def _key_hash(
+    installed: Iterable[Dict[str, Any]], runtime_name: str, force_new: bool, options: Optional[BuildOptions] = None
+) -> str:
+    """Construct a deterministic ID based on the installed requirements, the runtime, and the build options.
+
+    Options that are set to their defaults or that do not change the artifact contents do not change the ID.
 
-    :param list installed: List of installed package names and versions.
+    :param list installed: Installed distribution descriptions. Only names and versions are used.
     :param str runtime_name: Lambda runtimes that this artifact supports.
     :param bool force_new: Should we force a new S3 object creation?
+    :param BuildOptions options: Options that the artifact was built with (optional)
     :return: Hash ID.
     :rtype: str
     """
     hasher = hashlib.sha256()
 
     hasher.update(b"===INSTALLED===")
-    for statement in sorted([package["Name"] + "-" + package["Details"] for package in installed]):
+    for statement in sorted([package["Name"] + "-" + package["Version"] for package in installed]):
         hasher.update(statement.encode("utf-8"))
 
     hasher.update(b"===RUNTIMES===")
     hasher.update(runtime_name.encode("utf-8"))
 
+    artifact_options = options.artifact_options() if options is not None else {}
+    if artifact_options:
+        hasher.update(b"===OPTIONS===")
+        for name, value in sorted(artifact_options.items()):
+            hasher.update(f"{name}={json.dumps(value, sort_keys=True)}".encode("utf-8"))
+
     if force_new:
         hasher.update(os.urandom(32))
 
     return hasher.hexdigest()
 
 
+def artifact_key(
+    project_name: str,
+    installed: Iterable[Dict[str, Any]],
+    runtime_name: str,
+    force_new: Optional[bool] = False,
+    options: Optional[BuildOptions] = None,
+) -> str:
+    """Determine the S3 key for an artifact.
+
+    :param str project_name: Project name to use in S3 key.
+    :param installed: Installed distribution descriptions. Only names and versions are used.
+    :param str runtime_name: Lambda runtime that this artifact supports.
+    :param bool force_new: Should we force a new S3 object creation?
+    :param BuildOptions options: Options that the artifact was built with (optional)
+    :return: S3 key
+    :rtype: str
+    """
+    artifact_id = _key_hash(installed=installed, runtime_name=runtime_name, force_new=force_new, options=options)
+    return f"{ARTIFACTS_PREFIX}{project_name}/{artifact_id}.zip"
+
+
 def artifact_exists(s3_client: BaseClient, bucket_name: str, artifact_key: str) -> bool:
     """Determine if the specified S3 object exists.
 
@@ -54,15 +93,65 @@ def artifact_exists(s3_client: BaseClient, bucket_name: str, artifact_key: str)
         return True
 
 
+def _file_sha256(file: BinaryIO) -> str:
+    hasher = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(partial(file.read, _HASH_CHUNK_SIZE), b""):
+        hasher.update(chunk)
+    file.seek(0)
+    return hasher.hexdigest()
+
+
+def upload_archive(
+    s3_client: BaseClient,
+    bucket_name: str,
+    key: str,
+    write: Callable[[BinaryIO], Any],
+    spill_path: Optional[str] = None,
+    part_size: int = DEFAULT_PART_SIZE,
+) -> str:
+    """Write an archive and upload it to S3.
+
+    By default, the archive is streamed to S3 in parts while it is being written,
+    so only about two parts are ever held in memory.
+
+    :param s3_client: Boto3 client to use for S3 interaction.
+    :param str bucket_name: S3 bucket to use.
+    :param str key: S3 key to upload to.
+    :param write: Callable that writes the archive to the binary file-like that it is given
+    :param str spill_path: Path to write the archive at before uploading it (optional: default is to stream it)
+    :param int part_size: Size in bytes of each uploaded part when streaming
+    :return: Hex SHA-256 digest of the archive
+    :rtype: str
+    """
+    if spill_path is None:
+        with MultipartUploadWriter(s3_client, bucket_name, key, part_size=part_size) as upload:
+            write(upload)
+        return upload.sha256
+
+    try:
+        with open(spill_path, "w+b") as archive:
+            write(archive)
+            checksum = _file_sha256(archive)
+            s3_client.upload_fileobj(archive, bucket_name, key)
+    finally:
+        os.remove(spill_path)
+    return checksum
+
+
 def efficient_build_and_upload_zip(
     s3_client: BaseClient,
     project_name: str,
-    installed: Iterable[Dict[str, str]],
+    installed: Iterable[Dict[str, Any]],
     bucket_name: str,
     build_dir: str,
     runtime_name: str,
     force_new: Optional[bool] = False,
-) -> str:
+    options: Optional[BuildOptions] = None,
+    delta: Optional[DeltaPlan] = None,
+    spill_path: Optional[str] = None,
+    workers: Optional[int] = None,
+) -> Tuple[str, Optional[str]]:
     """Construct zip file from built artifacts and upload it to S3.
 
     .. note::
@@ -71,23 +160,53 @@ def efficient_build_and_upload_zip(
         This lets us only upload a new object if it is actually new.
         If you want to override this and create a new object anyway, set ``force_new=True``.
 
+    .. note::
+
+        If ``delta`` is set, ``build_dir`` only contains newly installed distributions
+        and the rest are reused from the previous artifact.
+
+    .. note::
+
+        If ``spill_path`` is set, the zip file is built there rather than streamed to S3 as it is built.
+
+    .. note::
+
+        If ``options`` asks for a reproducible artifact, the zip file only depends on the files that it contains.
+        If ``options`` names a file filter, files that it matches are left out of the zip file.
+
     :param s3_client: Boto3 client to use for S3 interaction.
     :param str project_name: Project name to use in S3 key.
-    :param installed: List of all installed packages and versions. Used to calculate the S3 key.
+    :param installed: Installed distribution descriptions. Used to calculate the S3 key.
     :param str build_dir: Directory from which to collect built resources.
     :param str bucket_name: S3 bucket to use.
     :param str runtime_name: Lambda runtime that this artifact supports. Used to calculate the S3 key.
     :param bool force_new: Should we force a new S3 object creation? Used to calculate the S3 key.
-    :return: S3 key containing zip file.
-    :rtype: str
+    :param BuildOptions options: Options that the artifact was built with. Used to calculate the S3 key. (optional)
+    :param DeltaPlan delta: Plan for reusing a previous artifact (optional)
+    :param str spill_path: Path to build zip file at (optional: default is to stream zip file to S3)
+    :param int workers: Number of threads to compress files on (optional: default is to not compress files)
+    :return: S3 key containing zip file, and the hex SHA-256 digest of the zip file
+        (``None`` if the zip file already existed)
+    :rtype: tuple
     """
-    artifact_id = _key_hash(installed=installed, runtime_name=runtime_name, force_new=force_new)
-    key = f"{ARTIFACTS_PREFIX}{project_name}/{artifact_id}.zip"
+    key = artifact_key(
+        project_name=project_name,
+        installed=installed,
+        runtime_name=runtime_name,
+        force_new=force_new,
+        options=options,
+    )
 
     if artifact_exists(s3_client, bucket_name, key):
-        return key
-
-    zip_buffer = build_zip(build_dir)
-
-    s3_client.put_object(Bucket=bucket_name, Key=key, Body=zip_buffer)
-    return key
+        return key, None
+
+    zip_args = dict(workers=workers)
+    if options is not None:
+        zip_args.update(reproducible=options.Reproducible, file_filter=FileFilter.from_options(options))
+    if delta is not None:
+        zip_args.update(reuse_from=delta.previous_artifact, reused_members=delta.members)
+
+    checksum = upload_archive(
+        s3_client, bucket_name, key, lambda output: build_zip(build_dir, output=output, **zip_args), spill_path
+    )
+    return key, checksum
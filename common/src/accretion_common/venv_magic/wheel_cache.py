@@ -0,0 +1,230 @@
+"""Two-tier cache for distribution files: a size-bounded local directory and a shared S3 store."""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import attr
+from botocore.client import BaseClient
+from botocore.exceptions import ClientError
+from pkg_resources import Requirement, parse_version
+
+from accretion_common.constants import WHEELS_PREFIX
+from accretion_common.util import PackageDetails, canonical_name, file_sha256
+
+__all__ = ("WheelCache", "parse_distribution_filename")
+_LOGGER = logging.getLogger(__name__)
+_DISTRIBUTION_SUFFIXES = (".whl", ".tar.gz", ".tar.bz2", ".zip")
+# Listing the shared tier is I/O bound, so list several projects at once.
+_MAX_LISTING_WORKERS = 8
+
+
+def parse_distribution_filename(filename: str) -> Tuple[str, str]:
+    """Determine the canonical project name and version from a wheel or sdist filename.
+
+    :param str filename: Distribution filename
+    :returns: Project name and version
+    :rtype: tuple of str
+    """
+    if filename.endswith(".whl"):
+        name, version = filename.split("-")[:2]
+        return canonical_name(name), version
+
+    for suffix in _DISTRIBUTION_SUFFIXES:
+        if filename.endswith(suffix):
+            name, version = filename[: -len(suffix)].rsplit("-", 1)
+            return canonical_name(name), version
+
+    raise ValueError(f"Unknown distribution file type: {filename}")
+
+
+def _distribution_name(filename: str) -> str:
+    return parse_distribution_filename(filename)[0]
+
+
+@attr.s
+class WheelCache:
+    """Content-addressed cache of distribution files.
+
+    The local tier is a flat directory that can be handed to pip as ``--find-links``.
+    Because this lives in Lambda ``/tmp``, it is evicted in least-recently-used order
+    once it grows past ``max_bytes``.
+
+    The shared tier lives in the artifacts bucket under
+    ``accretion/wheels/{canonical name}/{sha256}/{filename}``.
+
+    :param str cache_dir: Local cache directory
+    :param int max_bytes: Maximum size of the local cache directory
+    :param s3_client: Boto3 client to use for S3 interaction (optional: if not set, only the local tier is used)
+    :param str bucket_name: S3 bucket containing the shared tier (optional)
+    """
+
+    cache_dir: str = attr.ib()
+    max_bytes: int = attr.ib()
+    s3_client: Optional[BaseClient] = attr.ib(default=None)
+    bucket_name: Optional[str] = attr.ib(default=None)
+    _shared: Dict[str, str] = attr.ib(default=attr.Factory(dict), init=False)
+
+    def __attrs_post_init__(self):
+        """Make sure that the local cache directory exists."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def _has_shared_tier(self) -> bool:
+        return self.s3_client is not None and self.bucket_name is not None
+
+    def _local_path(self, filename: str) -> str:
+        return os.path.join(self.cache_dir, filename)
+
+    def _local_files(self) -> Iterable[str]:
+        return [name for name in os.listdir(self.cache_dir) if name.endswith(_DISTRIBUTION_SUFFIXES)]
+
+    def _touch(self, filename: str):
+        os.utime(self._local_path(filename))
+
+    def _download(self, key: str, filename: str, sha256: str) -> Optional[int]:
+        """Download a shared tier entry into the local tier.
+
+        :returns: Size of the downloaded entry, or ``None`` if it was discarded
+        """
+        target = self._local_path(filename)
+        partial = f"{target}.partial"
+        self.s3_client.download_file(Bucket=self.bucket_name, Key=key, Filename=partial)
+        if file_sha256(partial) != sha256:
+            os.remove(partial)
+            _LOGGER.warning("Discarding shared cache entry with unexpected contents: %s", key)
+            return None
+        os.rename(partial, target)
+        return os.path.getsize(target)
+
+    def _shared_entries(self, name: str) -> Iterable[Tuple[str, str, str]]:
+        """List all shared tier entries for a project as (key, sha256, filename)."""
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=f"{WHEELS_PREFIX}{name}/"):
+            for entry in page.get("Contents", []):
+                key = entry["Key"]
+                sha256, filename = key.rsplit("/", 2)[-2:]
+                yield key, sha256, filename
+
+    def _list_shared(self, names: Iterable[str]) -> Dict[str, List[Tuple[str, str, str]]]:
+        """List the shared tier entries for several projects concurrently."""
+        names = sorted(set(names))
+        if not names:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(len(names), _MAX_LISTING_WORKERS)) as executor:
+            listings = executor.map(lambda name: list(self._shared_entries(name)), names)
+            return dict(zip(names, listings))
+
+    def _newest_matching(
+        self, specifier: Requirement, entries: Iterable[Tuple[str, str, str]]
+    ) -> List[Tuple[str, str, str]]:
+        """Select the entries for the newest version that satisfies a requirement."""
+        candidates = []
+        for key, sha256, filename in entries:
+            self._shared[filename] = sha256
+            version = parse_distribution_filename(filename)[1]
+            if version in specifier:
+                candidates.append((parse_version(version), (key, sha256, filename)))
+
+        if not candidates:
+            return []
+
+        newest = max(version for version, _ in candidates)
+        return [entry for version, entry in candidates if version == newest]
+
+    def _pull(self, key: str, sha256: str, filename: str, on_download: Optional[Callable[[str, float, int], None]]):
+        if os.path.isfile(self._local_path(filename)):
+            self._touch(filename)
+            return
+
+        _LOGGER.debug("Shared wheel cache hit: %s", filename)
+        start = time.monotonic()
+        size = self._download(key=key, filename=filename, sha256=sha256)
+        if size is not None and on_download is not None:
+            on_download(filename, time.monotonic() - start, size)
+
+    def prefetch(
+        self,
+        requirements: Iterable[PackageDetails],
+        on_download: Optional[Callable[[str, float, int], None]] = None,
+    ):
+        """Pull shared tier entries that can satisfy the requirements into the local tier.
+
+        Only entries for the newest cached version that satisfies each requirement are pulled.
+        The shared tier is listed for all requested projects concurrently before anything is pulled.
+
+        :param requirements: Requirements to prefetch
+        :param on_download: Callback to receive the filename, seconds taken, and size of each pulled entry (optional)
+        """
+        if not self._has_shared_tier:
+            return
+
+        specifiers = []
+        for requirement in requirements:
+            try:
+                specifier = Requirement.parse(f"{requirement.Name}{requirement.Details}")
+            except ValueError:
+                continue
+            # Direct references and the like can never be served from the cache.
+            if specifier.url is None:
+                specifiers.append(specifier)
+
+        listings = self._list_shared(canonical_name(specifier.project_name) for specifier in specifiers)
+        for specifier in specifiers:
+            for key, sha256, filename in self._newest_matching(
+                specifier, listings[canonical_name(specifier.project_name)]
+            ):
+                self._pull(key, sha256, filename, on_download)
+
+    def mark_used(self, filenames: Iterable[str]):
+        """Mark local tier entries as recently used.
+
+        :param filenames: Distribution filenames
+        """
+        for filename in filenames:
+            if os.path.isfile(self._local_path(filename)):
+                self._touch(filename)
+
+    def _store(self, filename: str):
+        sha256 = file_sha256(self._local_path(filename))
+        key = f"{WHEELS_PREFIX}{_distribution_name(filename)}/{sha256}/{filename}"
+        try:
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+        except ClientError:
+            _LOGGER.debug("Adding to shared wheel cache: %s", filename)
+            self.s3_client.upload_file(Filename=self._local_path(filename), Bucket=self.bucket_name, Key=key)
+        self._shared[filename] = sha256
+
+    def store(self):
+        """Write any local tier entries that are not yet known to be in the shared tier back to the shared tier."""
+        if not self._has_shared_tier:
+            return
+
+        for filename in self._local_files():
+            if filename not in self._shared:
+                self._store(filename)
+
+    def evict(self, max_bytes: Optional[int] = None, keep: Iterable[str] = ()):
+        """Evict least-recently-used entries from the local tier until it fits in ``max_bytes``.
+
+        :param int max_bytes: Size to shrink the local tier to (optional: default is the cache ``max_bytes``)
+        :param keep: Filenames of entries that must not be evicted
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        keep = set(keep)
+        entries = []
+        total = 0
+        for filename in self._local_files():
+            stat = os.stat(self._local_path(filename))
+            total += stat.st_size
+            if filename not in keep:
+                entries.append((stat.st_mtime, stat.st_size, filename))
+
+        for _, size, filename in sorted(entries):
+            if total <= max_bytes:
+                break
+            _LOGGER.debug("Evicting from local wheel cache: %s", filename)
+            os.remove(self._local_path(filename))
+            total -= size
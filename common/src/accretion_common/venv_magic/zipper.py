@@ -1,52 +1,496 @@
 """Create a venv, build requirements into it, and package that into a zip."""
+import calendar
+import collections
+import contextlib
+import copy
 import io
+import itertools
 import logging
 import os
-from zipfile import ZipFile
+import stat
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, BinaryIO, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
 
-__all__ = ("build_zip",)
+import attr
+
+from .filters import FileFilter
+
+__all__ = ("COMPRESSION_WINDOW_SIZE", "REPRODUCIBLE_TIMESTAMP", "build_zip", "compression_stats", "merge_zips")
 _LOGGER = logging.getLogger(__name__)
+_LOCAL_HEADER_SIZE = 30
+_LOCAL_HEADER_LENGTHS = struct.Struct("<HH")
+_DATA_DESCRIPTOR_FLAG = 0x08
+_DATA_DESCRIPTOR = struct.Struct("<LLLL")
+_DATA_DESCRIPTOR_SIGNATURE = 0x08074B50
+_READ_CHUNK_SIZE = 1024 * 1024
+# Negative window bits make zlib write a raw deflate stream, without the zlib header and checksum that zip does not use.
+_RAW_DEFLATE_WINDOW_BITS = -15
+# Files that are compressed but not yet written, for each compression worker.
+_PENDING_PER_WORKER = 2
+# Files that are compressed but not yet written are held in memory, so their total size is bounded too.
+_PENDING_SIZE = 32 * 1024 * 1024
+# Larger files are compressed as they are written rather than ahead of time, so they are never held in memory.
+_STREAMED_SIZE = 8 * 1024 * 1024
+# Most file data that building a zip file holds in memory at once.
+COMPRESSION_WINDOW_SIZE = _PENDING_SIZE + _STREAMED_SIZE
+# Set explicitly rather than left to the zlib default, so that the same input always deflates the same way.
+_COMPRESSION_LEVEL = 6
+# Text and bytecode deflate well, so they are worth the extra time that the highest level takes.
+_TEXT_COMPRESSION_LEVEL = 9
+_TEXT_SUFFIXES = frozenset(
+    (".py", ".pyc", ".pyi", ".txt", ".json", ".cfg", ".ini", ".toml", ".yaml", ".yml", ".xml", ".html", ".css", ".js")
+    + (".rst", ".md", ".csv", ".pem", ".typed")
+)
+# Files that are already compressed and that deflating would barely shrink, if at all.
+_COMPRESSED_SUFFIXES = frozenset(
+    (".gz", ".tgz", ".bz2", ".xz", ".lzma", ".zst", ".zip", ".whl", ".egg", ".jar", ".npz")
+    + (".png", ".jpg", ".jpeg", ".gif", ".webp", ".woff", ".woff2")
+)
+# Any other file is stored if quickly deflating its start saves less than this much of it.
+_PROBE_SIZE = 64 * 1024
+_PROBE_COMPRESSION_LEVEL = 1
+_INCOMPRESSIBLE_RATIO = 0.95
+# Reproducible zips give every member the earliest time that a zip file can store.
+_REPRODUCIBLE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+# Zip files store local times without a time zone, and Lambda extracts layers in UTC.
+REPRODUCIBLE_TIMESTAMP = calendar.timegm(_REPRODUCIBLE_DATE_TIME + (0, 0, 0))
+# ``ZipFile`` internals that writing already compressed entries relies on.
+# These have been stable since Python 3.5, but they are not public, so check for them rather than fail mid-write.
+_RAW_WRITE_ATTRIBUTES = ("fp", "filelist", "NameToInfo", "start_dir")
+_UNIX_SYSTEM = 3
 
 
-def _file_filter(filename: str) -> bool:  # pylint: disable=unused-argument
+def _file_filter(path: str, file_filter: Optional[FileFilter] = None) -> bool:
     """Determine whether this file should be included in the zip file.
 
-    :param str filename: Filename
+    :param str path: Path of file relative to the directory being zipped, with ``/`` separators
+    :param FileFilter file_filter: Rules that leave files out (optional: default is to leave everything in)
     :rtype: bool
     """
-    # For now, leave everything in.
-    return True
+    return file_filter is None or not file_filter.drops(path)
+
+
+def _normalize(info: ZipInfo):
+    """Replace everything about a member that depends on when and where it was built rather than on its contents.
+
+    Only whether the file is executable is kept from its permissions.
+    """
+    executable = (info.external_attr >> 16) & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    info.date_time = _REPRODUCIBLE_DATE_TIME
+    info.create_system = _UNIX_SYSTEM
+    info.external_attr = (stat.S_IFREG | (0o755 if executable else 0o644)) << 16
+    info.extra = b""
+
+
+def _zip_info(filepath: str, arcname: str, reproducible: bool) -> ZipInfo:
+    """Describe a file as a member of a zip file.
+
+    ``ZipInfo.from_file`` converts the modification time to local time,
+    which is before 1980 for sources that reproducible builds give the earliest zip time in UTC
+    wherever local time is behind UTC, and ``zipfile`` refuses those times.
+    Reproducible members replace the time anyway, so it is never read from the file.
+    """
+    if not reproducible:
+        return ZipInfo.from_file(filepath, arcname)
+    info = ZipInfo(arcname, _REPRODUCIBLE_DATE_TIME)
+    status = os.stat(filepath)
+    info.external_attr = (status.st_mode & 0xFFFF) << 16
+    info.file_size = status.st_size
+    _normalize(info)
+    return info
+
+
+def _require_raw_writes(target: ZipFile):
+    """Make sure that this version of ``zipfile`` has the internals that writing already compressed entries uses.
+
+    :raises RuntimeError: if any of them are missing
+    """
+    missing = [name for name in _RAW_WRITE_ATTRIBUTES if not hasattr(target, name)]
+    if missing:
+        raise RuntimeError(f"zipfile.ZipFile is missing internals needed to write zip files: {', '.join(missing)}")
+
+
+def _write_raw(target: ZipFile, info: ZipInfo, data: Iterable[bytes]):
+    """Write an entry whose data is already compressed.
+
+    ``zipfile`` has no public interface for this, so this writes the entry the same way that ``ZipFile.write`` does.
+    The sizes and CRC are already known, so they go in the local header rather than in a data descriptor.
+    """
+    info.flag_bits &= ~_DATA_DESCRIPTOR_FLAG
+    info.header_offset = target.fp.tell()
+    target.fp.write(info.FileHeader())
+    for chunk in data:
+        target.fp.write(chunk)
+    _add_entry(target, info)
+
+
+def _add_entry(target: ZipFile, info: ZipInfo):
+    """Record an entry that has been written so that it is listed in the central directory."""
+    target.filelist.append(info)
+    target.NameToInfo[info.filename] = info
+    target.start_dir = target.fp.tell()
+
 
+def _copy_member(source: ZipFile, target: ZipFile, info: ZipInfo, reproducible: bool = False):
+    """Copy a member from one zip file to another without decompressing or recompressing it."""
+    source.fp.seek(info.header_offset + _LOCAL_HEADER_SIZE - _LOCAL_HEADER_LENGTHS.size)
+    name_length, extra_length = _LOCAL_HEADER_LENGTHS.unpack(source.fp.read(_LOCAL_HEADER_LENGTHS.size))
+    source.fp.seek(name_length + extra_length, io.SEEK_CUR)
+    copied = copy.copy(info)
+    if reproducible:
+        _normalize(copied)
+    remaining = info.compress_size
 
-#    Leaving this here as an example of what this function might do later.
-#    if filename.endswith(".pyc"):
-#        return False
+    def _chunks() -> Iterator[bytes]:
+        nonlocal remaining
+        while remaining:
+            chunk = source.fp.read(min(remaining, _READ_CHUNK_SIZE))
+            remaining -= len(chunk)
+            yield chunk
+
+    _write_raw(target, copied, _chunks())
+
+
+def _suffix(name: str) -> str:
+    return os.path.splitext(name)[1].lower()
+
+
+def _compression_level(arcname: str, sample: bytes) -> Optional[int]:
+    """Choose how hard to deflate a file from its type and, if its type says nothing, from how well its start deflates.
+
+    :param str arcname: Name of file in the zip file
+    :param bytes sample: Start of file
+    :returns: zlib compression level, or ``None`` if the file should be stored without compression
+    """
+    suffix = _suffix(arcname)
+    if suffix in _COMPRESSED_SUFFIXES:
+        return None
+    if suffix in _TEXT_SUFFIXES:
+        return _TEXT_COMPRESSION_LEVEL
+    probe = sample[:_PROBE_SIZE]
+    if probe and len(zlib.compress(probe, _PROBE_COMPRESSION_LEVEL)) > len(probe) * _INCOMPRESSIBLE_RATIO:
+        return None
+    return _COMPRESSION_LEVEL
+
+
+def _read(chunks: Iterable[bytes], level: Optional[int], write: Callable[[bytes], Any]) -> int:
+    """Read file contents into the form that they are stored in a zip file, as a raw deflate stream if deflated.
+
+    :param write: Callable to pass the data to store to, a chunk at a time
+    :returns: CRC of the contents
+    """
+    compressor = None
+    if level is not None:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, _RAW_DEFLATE_WINDOW_BITS)
+    crc = 0
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        write(chunk if compressor is None else compressor.compress(chunk))
+    if compressor is not None:
+        write(compressor.flush())
+    return crc
+
+
+def _compress(filepath: str, arcname: str, compress_type: int, reproducible: bool) -> Tuple[ZipInfo, List[bytes]]:
+    """Read a file into the form that it is stored in a zip file.
+
+    If ``compress_type`` is deflate, each file is deflated as hard as its type deserves,
+    or stored without compression if deflating it would not make it meaningfully smaller.
+
+    zlib releases the GIL while it compresses, so several files can be compressed at once on threads.
+    """
+    info = _zip_info(filepath, arcname, reproducible)
+    level = None
+    data: List[bytes] = []
+    with open(filepath, "rb") as source:
+        first = source.read(_READ_CHUNK_SIZE)
+        if compress_type == ZIP_DEFLATED:
+            level = _compression_level(arcname, first)
+        crc = _read(itertools.chain((first,), iter(partial(source.read, _READ_CHUNK_SIZE), b"")), level, data.append)
+    if level is not None and sum(map(len, data)) >= info.file_size:
+        # The probe only sees the start of the file, so the rest can still turn out not to deflate.
+        level = None
+        data = []
+        with open(filepath, "rb") as source:
+            crc = _read(iter(partial(source.read, _READ_CHUNK_SIZE), b""), level, data.append)
+    info.compress_type = ZIP_STORED if level is None else ZIP_DEFLATED
+    info.CRC = crc
+    info.compress_size = sum(map(len, data))
+    return info, data
+
+
+def _write_streamed(target: ZipFile, filepath: str, arcname: str, compress_type: int, reproducible: bool):
+    """Write a file that is too large to hold in memory, compressing it as it is written.
+
+    The sizes and CRC are only known once the whole file has been read,
+    so they follow the data in a data descriptor rather than going in the local header.
+    Unlike :func:`_compress`, this cannot go back and store the file if it turns out not to deflate.
+    """
+    info = _zip_info(filepath, arcname, reproducible)
+    with open(filepath, "rb") as source:
+        first = source.read(_READ_CHUNK_SIZE)
+        level = _compression_level(arcname, first) if compress_type == ZIP_DEFLATED else None
+        info.compress_type = ZIP_STORED if level is None else ZIP_DEFLATED
+        info.flag_bits |= _DATA_DESCRIPTOR_FLAG
+        info.header_offset = target.fp.tell()
+        target.fp.write(info.FileHeader())
+        start = target.fp.tell()
+        info.CRC = _read(
+            itertools.chain((first,), iter(partial(source.read, _READ_CHUNK_SIZE), b"")), level, target.fp.write
+        )
+    info.compress_size = target.fp.tell() - start
+    target.fp.write(_DATA_DESCRIPTOR.pack(_DATA_DESCRIPTOR_SIGNATURE, info.CRC, info.compress_size, info.file_size))
+    _add_entry(target, info)
 
-#    if f"{os.path.sep}__pycache__{os.path.sep}" in filename:
-#        return False
 
-#    return True
+@attr.s
+class _CompressionStats:
+    """Running totals of how well members with the same extension compressed."""
 
+    files: int = attr.ib(default=0)
+    stored: int = attr.ib(default=0)
+    size: int = attr.ib(default=0)
+    compressed_size: int = attr.ib(default=0)
 
-def build_zip(build_dir: str, layer: bool = True) -> io.BytesIO:
+
+def compression_stats(members: Iterable[ZipInfo]) -> Dict[str, Dict[str, int]]:
+    """Summarize how well the members of a zip file compressed, for each file extension.
+
+    :param members: Members of zip file
+    :returns: Mapping of lowercase extension (empty for files without one) to numbers of ``Files``,
+        of those ``Stored`` without compression, and total ``Size`` and ``CompressedSize`` in bytes,
+        from the most to the least total size
+    """
+    stats: Dict[str, _CompressionStats] = collections.defaultdict(_CompressionStats)
+    for info in members:
+        extension = stats[_suffix(info.filename)]
+        extension.files += 1
+        extension.stored += info.compress_type == ZIP_STORED
+        extension.size += info.file_size
+        extension.compressed_size += info.compress_size
+    return {
+        suffix: dict(
+            Files=extension.files,
+            Stored=extension.stored,
+            Size=extension.size,
+            CompressedSize=extension.compressed_size,
+        )
+        for suffix, extension in sorted(stats.items(), key=lambda item: (-item[1].size, item[0]))
+    }
+
+
+def _log_compression_stats(zipper: ZipFile):
+    for suffix, extension in compression_stats(zipper.infolist()).items():
+        _LOGGER.info(
+            "Compression of %s files: %d files (%d stored), %d bytes compressed to %d bytes",
+            suffix or "extensionless",
+            extension["Files"],
+            extension["Stored"],
+            extension["Size"],
+            extension["CompressedSize"],
+        )
+
+
+def _log_size(buffer: BinaryIO):
+    # Outputs that cannot seek need not be able to tell either.
+    try:
+        _LOGGER.debug("Zip file size: %s bytes", buffer.tell())
+    except OSError:
+        pass
+
+
+def _walk(build_dir: str, prefix: str, file_filter: Optional[FileFilter]) -> Iterator[Tuple[str, str]]:
+    """Find every file in ``build_dir`` that should be included, along with its name in the zip file."""
+    dropped = 0
+    for root, _dirs, files in os.walk(build_dir):
+        for filename in files:
+            filepath = os.path.join(root, filename)
+            path = filepath[len(build_dir) + 1 :].replace(os.sep, "/")
+            if not _file_filter(path, file_filter):
+                dropped += 1
+                continue
+
+            yield filepath, f"{prefix}{path}"
+    if dropped:
+        _LOGGER.debug("File filter %s left out %d files", file_filter.name, dropped)
+
+
+def _write_entries(
+    zipper: ZipFile,
+    entries: Iterable[Tuple[str, Optional[str]]],
+    previous: Optional[ZipFile],
+    workers: Optional[int],
+    reproducible: bool,
+):
+    """Write files and reused members in order.
+
+    If ``workers`` is set, files are deflated on a pool of threads.
+    Only a few files per worker, and only so many bytes of them, are compressed ahead of the writer,
+    and large files are compressed by the writer as it writes them, so memory stays bounded.
+
+    :param entries: Pairs of member name and path to file, or ``None`` to copy the member from ``previous``
+    """
+    compress_type = ZIP_STORED if workers is None else ZIP_DEFLATED
+    compress = partial(_compress, compress_type=compress_type, reproducible=reproducible)
+    window = 0 if workers is None else workers * _PENDING_PER_WORKER
+
+    def _written(compressed: Callable[[], Tuple[ZipInfo, List[bytes]]]) -> Callable[[], None]:
+        return lambda: _write_raw(zipper, *compressed())
+
+    with contextlib.ExitStack() as stack:
+        executor = None
+        if workers is not None:
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=workers))
+        # Each pending write, along with how many bytes of file data it holds in memory until it is written.
+        pending: Deque[Tuple[int, Callable[[], None]]] = collections.deque()
+        pending_size = 0
+        for arcname, filepath in entries:
+            size = 0
+            if filepath is None:
+                write = partial(_copy_member, previous, zipper, previous.getinfo(arcname), reproducible)
+            elif executor is None and not reproducible:
+                write = partial(zipper.write, filename=filepath, arcname=arcname)
+            elif os.path.getsize(filepath) > _STREAMED_SIZE:
+                write = partial(_write_streamed, zipper, filepath, arcname, compress_type, reproducible)
+            elif executor is None:
+                write = _written(partial(compress, filepath, arcname))
+            else:
+                size = os.path.getsize(filepath)
+                write = _written(executor.submit(compress, filepath, arcname).result)
+            pending.append((size, write))
+            pending_size += size
+            while len(pending) > window or pending_size > _PENDING_SIZE:
+                written_size, write = pending.popleft()
+                write()
+                pending_size -= written_size
+        while pending:
+            pending.popleft()[1]()
+
+
+def build_zip(
+    build_dir: str,
+    layer: bool = True,
+    reuse_from: Optional[str] = None,
+    reused_members: Iterable[str] = (),
+    output: Optional[BinaryIO] = None,
+    workers: Optional[int] = None,
+    reproducible: bool = False,
+    file_filter: Optional[FileFilter] = None,
+) -> BinaryIO:
     """Build a Lambda Layer zip from a given directory.
 
+    .. note::
+
+        If ``reuse_from`` is set, ``reused_members`` are copied as-is from that zip
+        unless a file in ``build_dir`` replaces them.
+
+    .. note::
+
+        If ``workers`` is set, files are deflated on that many threads at once
+        and written in the same order as they would be otherwise.
+        Text and bytecode are deflated at the highest level,
+        and files that are already compressed, by type or by a quick probe of their start, are stored as-is.
+        Otherwise, files are stored without compression.
+
+    .. note::
+
+        If ``reproducible`` is set, members are written in order of name, all with the same timestamp,
+        and with permissions that only record whether each file is executable.
+        The same files then always make the same zip file, byte for byte.
+
     :param str build_dir: Directory to pack into Layer zip
     :param bool layer: Is this zip being build for a layer (True) or a Function (False)?
-    :returns: Binary file-like of zip
-    :rtype: io.BytesIO
+    :param str reuse_from: Path to previous zip to reuse members from (optional)
+    :param reused_members: Names of members to reuse from previous zip
+    :param output: Binary file-like to write zip to, which need not be seekable
+        (optional: default is a new in-memory buffer)
+    :param int workers: Number of threads to deflate files on (optional: default is to not compress files)
+    :param bool reproducible: Should the zip file only depend on the names and contents of the files?
+    :param FileFilter file_filter: Rules that leave files in ``build_dir`` out (optional: default is to keep them all)
+    :returns: Binary file-like of zip, rewound to the start if it is seekable
     """
     prefix = "python/" if layer else ""
-    buffer = io.BytesIO()
-    with ZipFile(buffer, mode="w") as zipper:
-        for root, _dirs, files in os.walk(build_dir):
-            for filename in files:
-                if not _file_filter(filename):
-                    continue
-
-                filepath = os.path.join(root, filename)
-                zipper.write(filename=filepath, arcname=f"{prefix}{filepath[len(build_dir) + 1:]}")
-
-    _LOGGER.debug("Zip file size: %s bytes", buffer.tell())
-    buffer.seek(0)
+    buffer = io.BytesIO() if output is None else output
+    with ZipFile(buffer, mode="w") as zipper, contextlib.ExitStack() as stack:
+        _require_raw_writes(zipper)
+        entries: List[Tuple[str, Optional[str]]] = [
+            (arcname, filepath) for filepath, arcname in _walk(build_dir, prefix, file_filter)
+        ]
+        previous = None
+        if reuse_from is not None:
+            previous = stack.enter_context(ZipFile(reuse_from))
+            names = {arcname for arcname, _filepath in entries}
+            entries.extend((member, None) for member in reused_members if member not in names)
+        if reproducible:
+            entries.sort(key=lambda entry: entry[0])
+        _write_entries(zipper, entries, previous, workers, reproducible)
+        _log_compression_stats(zipper)
+
+    _log_size(buffer)
+    if buffer.seekable():
+        buffer.seek(0)
+    return buffer
+
+
+def merge_zips(
+    archives: Iterable[str],
+    reuse_from: Optional[str] = None,
+    reused_members: Iterable[str] = (),
+    output: Optional[BinaryIO] = None,
+    reproducible: bool = False,
+) -> BinaryIO:
+    """Splice the members of several zips into one zip without decompressing or recompressing them.
+
+    .. note::
+
+        If more than one zip has a member with the same name, the member from the first of them is kept.
+
+    .. note::
+
+        If ``reuse_from`` is set, ``reused_members`` are copied from that zip
+        unless one of ``archives`` already has a member with the same name.
+
+    .. note::
+
+        If ``reproducible`` is set, members are written in order of name and normalized as in :func:`build_zip`.
+
+    :param archives: Paths to zips to merge, in order of precedence
+    :param str reuse_from: Path to previous zip to reuse members from (optional)
+    :param reused_members: Names of members to reuse from previous zip
+    :param output: Binary file-like to write zip to, which need not be seekable
+        (optional: default is a new in-memory buffer)
+    :param bool reproducible: Should the zip file only depend on the names and contents of the members?
+    :returns: Binary file-like of zip, rewound to the start if it is seekable
+    """
+    buffer = io.BytesIO() if output is None else output
+    with ZipFile(buffer, mode="w") as zipper, contextlib.ExitStack() as stack:
+        _require_raw_writes(zipper)
+        selected: Dict[str, Tuple[ZipFile, ZipInfo]] = {}
+        for archive in archives:
+            source = stack.enter_context(ZipFile(archive))
+            for info in source.infolist():
+                existing = selected.get(info.filename)
+                if existing is None:
+                    selected[info.filename] = (source, info)
+                elif existing[1].CRC != info.CRC:
+                    _LOGGER.warning("Keeping the first of several different copies of %s", info.filename)
+
+        if reuse_from is not None:
+            previous = stack.enter_context(ZipFile(reuse_from))
+            for member in reused_members:
+                if member not in selected:
+                    selected[member] = (previous, previous.getinfo(member))
+
+        for name in sorted(selected) if reproducible else selected:
+            source, info = selected[name]
+            _copy_member(source, zipper, info, reproducible)
+        _log_compression_stats(zipper)
+
+    _log_size(buffer)
+    if buffer.seekable():
+        buffer.seek(0)
     return buffer
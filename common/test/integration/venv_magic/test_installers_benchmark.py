@@ -0,0 +1,67 @@
+"""Benchmark installer backends against each other on real requirement sets."""
+import os
+import time
+
+import pytest
+
+from accretion_common.util import PackageDetails
+from accretion_common.venv_magic.builder import build_requirements, resolve_requirements
+from accretion_common.venv_magic.installers import NativeWheelInstaller, PipInstaller
+from accretion_common.venv_magic.wheel_cache import WheelCache
+
+pytestmark = [pytest.mark.integ]
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+VECTORS = os.path.join(HERE, "..", "..", "vectors")
+# pip generates scripts and records metadata differently, but everything else should be identical.
+_EXPECTED_DIFFERENCES = ("bin/", "INSTALLER", "RECORD")
+
+
+def _requirements(name):
+    with open(os.path.join(VECTORS, name)) as vector:
+        return [PackageDetails.from_requirements_entry(line) for line in vector if line.strip()]
+
+
+def _tree(build_dir):
+    contents = {}
+    for root, _dirs, files in os.walk(build_dir):
+        for filename in files:
+            path = os.path.join(root, filename)
+            relative = os.path.relpath(path, build_dir)
+            if relative.startswith(_EXPECTED_DIFFERENCES) or relative.endswith(_EXPECTED_DIFFERENCES):
+                continue
+            with open(path, "rb") as source:
+                contents[relative] = source.read()
+    return contents
+
+
+@pytest.mark.parametrize("vector_name", ("requirements_simple", "requirements_complex"))
+def test_installer_backends(tmpdir, record_property, vector_name):
+    venv_dir = str(tmpdir.join("venv"))
+    wheel_cache = WheelCache(cache_dir=str(tmpdir.join("cache")), max_bytes=1024 * 1024 * 1024)
+    resolved = resolve_requirements(venv_dir=venv_dir, requirements=_requirements(vector_name), wheel_cache=wheel_cache)
+
+    results = {}
+    for name, installer in (("pip", PipInstaller()), ("native", NativeWheelInstaller())):
+        build_dir = str(tmpdir.join(name))
+        start = time.perf_counter()
+        installed = build_requirements(
+            build_dir=build_dir,
+            venv_dir=venv_dir,
+            requirements=resolved,
+            persistent_venv=True,
+            wheel_cache=wheel_cache,
+            resolved=True,
+            installer=installer,
+        )
+        elapsed = time.perf_counter() - start
+        record_property(f"{name}_distributions", len(installed))
+        record_property(f"{name}_seconds", round(elapsed, 2))
+        results[name] = (installed, _tree(build_dir))
+
+    pip_installed, pip_tree = results["pip"]
+    native_installed, native_tree = results["native"]
+    assert [(dist["Name"], dist["Version"]) for dist in native_installed] == [
+        (dist["Name"], dist["Version"]) for dist in pip_installed
+    ]
+    assert native_tree == pip_tree
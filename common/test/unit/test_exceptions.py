@@ -0,0 +1,74 @@
+"""Unit tests for ``accretion_common.exceptions``."""
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from accretion_common.exceptions import (
+    FATAL_ERRORS,
+    RETRIABLE_ERRORS,
+    BuildError,
+    FatalError,
+    RetriableError,
+    TransientExecutionError,
+    classified_handler,
+    classify_error,
+)
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+def _client_error(code: str, status: int) -> ClientError:
+    return ClientError({"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}, "GetObject")
+
+
+@pytest.mark.parametrize(
+    "error",
+    (
+        pytest.param(BuildError("nope"), id="fatal"),
+        pytest.param(TransientExecutionError("later"), id="retriable"),
+        pytest.param(_client_error("NoSuchKey", 404), id="client error"),
+        pytest.param(KeyError("Name"), id="unknown"),
+    ),
+)
+def test_classify_error_unchanged(error):
+    assert classify_error(error) is error
+
+
+@pytest.mark.parametrize(
+    "error",
+    (
+        pytest.param(_client_error("SlowDown", 503), id="throttled"),
+        pytest.param(_client_error("Unknown", 500), id="server error"),
+        pytest.param(EndpointConnectionError(endpoint_url="https://s3.amazonaws.com"), id="connection"),
+    ),
+)
+def test_classify_error_retriable(error):
+    test = classify_error(error)
+
+    assert isinstance(test, RetriableError)
+    assert type(test).__name__ in RETRIABLE_ERRORS
+
+
+def test_classified_handler():
+    @classified_handler
+    def handler(event, context):
+        raise event["error"]
+
+    with pytest.raises(RetriableError) as excinfo:
+        handler(dict(error=_client_error("SlowDown", 503)), None)
+    assert isinstance(excinfo.value.__cause__, ClientError)
+
+    with pytest.raises(KeyError):
+        handler(dict(error=KeyError("Name")), None)
+
+
+def test_classified_handler_returns():
+    @classified_handler
+    def handler(event, context):
+        return dict(Event=event)
+
+    assert handler("example", None) == dict(Event="example")
+
+
+def test_error_names_are_disjoint():
+    assert not set(RETRIABLE_ERRORS) & set(FATAL_ERRORS)
+    assert FatalError.__name__ in FATAL_ERRORS
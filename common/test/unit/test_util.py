@@ -1,7 +1,7 @@
 """Unit tests for ``accretion_common.util``."""
 import pytest
 
-from accretion_common.util import PackageDetails
+from accretion_common.util import BuildOptions, PackageDetails, file_sha256
 
 pytestmark = [pytest.mark.local, pytest.mark.functional]
 
@@ -60,3 +60,81 @@ def test_packageversion_from_requirements_entry(entry: str, name: str, details:
 
     assert test.Name == name
     assert test.Details == details
+
+
+def test_build_options_defaults():
+    test = BuildOptions.from_dict(None)
+
+    assert test.to_dict() == dict(
+        Precompile=False,
+        ValidateDelta=False,
+        ResolutionTTL=0,
+        Shards=1,
+        ExcludeRuntimeProvided=False,
+        BaseLayer=None,
+        Reproducible=False,
+        FileFilter=None,
+        FileFilterOverrides=None,
+    )
+    assert test.artifact_options() == {}
+
+
+def test_build_options_from_dict():
+    test = BuildOptions.from_dict(dict(Precompile=True))
+
+    assert test.to_dict() == dict(
+        Precompile=True,
+        ValidateDelta=False,
+        ResolutionTTL=0,
+        Shards=1,
+        ExcludeRuntimeProvided=False,
+        BaseLayer=None,
+        Reproducible=False,
+        FileFilter=None,
+        FileFilterOverrides=None,
+    )
+
+
+def test_build_options_artifact_options():
+    test = BuildOptions.from_dict(dict(Precompile=True, ValidateDelta=True, ResolutionTTL=3600, Shards=4))
+
+    assert test.artifact_options() == dict(Precompile=True)
+
+
+def test_build_options_canonical_file_filter():
+    test = BuildOptions.from_dict(
+        dict(FileFilter="slim + caches+slim", FileFilterOverrides=dict(docs=["example", "other", "example"]))
+    )
+
+    assert test.FileFilter == "caches+slim"
+    assert test.FileFilterOverrides == dict(docs=["example", "other"])
+    assert (
+        test.artifact_options()
+        == BuildOptions.from_dict(
+            dict(FileFilter="caches+slim", FileFilterOverrides=dict(docs=["other", "example"]))
+        ).artifact_options()
+    )
+
+
+@pytest.mark.parametrize(
+    "options, error_type, error",
+    (
+        (dict(Unknown=True, Other=1), ValueError, r"Unknown build options: Other, Unknown"),
+        (dict(Precompile="true"), TypeError, r"'Precompile' must be <class 'bool'> *"),
+        (dict(ResolutionTTL="3600"), TypeError, r"'ResolutionTTL' must be <class 'int'> *"),
+        (dict(Shards=0), ValueError, r"'Shards' must be at least 1"),
+        (dict(FileFilterOverrides=dict(docs="example")), TypeError, r"'FileFilterOverrides' must be <class 'list'> *"),
+    ),
+)
+def test_build_options_invalid(options, error_type, error):
+    with pytest.raises(error_type) as excinfo:
+        BuildOptions.from_dict(options)
+
+    excinfo.match(error)
+
+
+def test_file_sha256(tmpdir):
+    source = tmpdir.join("source")
+    source.write_binary(b"example")
+
+    assert file_sha256(str(source)) == "50d858e0985ecc7f60418aaf0cc5ab587f42c2570a884095a9e8ccacd0f6545c"
@@ -1,5 +1,5 @@
 """Unit tests for ``accretion_common.venv_magic.builder``."""
-from typing import Iterable
+import sys
 
 import pytest
 
@@ -9,34 +9,61 @@ from accretion_common.venv_magic import builder
 pytestmark = [pytest.mark.local, pytest.mark.functional]
 
 
+def _fake_venv(venv_dir, marker_contents=None):
+    version_dir = f"python{sys.version_info.major}.{sys.version_info.minor}"
+    venv_dir.join("bin", "python").write("", ensure=True)
+    venv_dir.join("lib", version_dir, "site-packages", "pip", "__init__.py").write("", ensure=True)
+    if marker_contents is not None:
+        venv_dir.join(builder._VENV_MARKER).write(marker_contents)
+
+
+def test_venv_is_valid(tmpdir):
+    _fake_venv(tmpdir, builder._venv_marker_contents())
+
+    assert builder._venv_is_valid(str(tmpdir))
+
+
 @pytest.mark.parametrize(
-    "requirements, expected_file_contents",
+    "marker_contents",
     (
-        (
-            (
-                PackageDetails(Name="attrs", Details="==19.1.0"),
-                PackageDetails(Name="awacs", Details="==0.9.2"),
-                PackageDetails(Name="Click", Details="==7.0"),
-                PackageDetails(Name="boto3", Details="==1.9.169"),
-                PackageDetails(Name="botocore", Details="==1.12.169"),
-            ),
-            "attrs==19.1.0\nawacs==0.9.2\nClick==7.0\nboto3==1.9.169\nbotocore==1.12.169\n",
-        ),
-        (
-            (
-                PackageDetails(Name="attrs"),
-                PackageDetails(Name="awacs"),
-                PackageDetails(Name="Click"),
-                PackageDetails(Name="boto3"),
-                PackageDetails(Name="botocore"),
-            ),
-            "attrs\nawacs\nClick\nboto3\nbotocore\n",
-        ),
+        None,
+        "",
+        f"{sys.version}\npip==0.0.1\nwheel=={builder.WHEEL_VERSION}\n",
+        f"{sys.version}\npip=={builder.PIP_VERSION}\n",
+        f"2.7.16 (default)\npip=={builder.PIP_VERSION}\nwheel=={builder.WHEEL_VERSION}\n",
     ),
 )
-def test_build_requirements_file(tmpdir, requirements: Iterable[PackageDetails], expected_file_contents: str):
-    requirements_file = tmpdir.join("requirements.txt")
+def test_venv_is_valid_rejects_unmarked_or_stale(tmpdir, marker_contents):
+    _fake_venv(tmpdir, marker_contents)
+
+    assert not builder._venv_is_valid(str(tmpdir))
+
+
+def test_venv_is_valid_rejects_missing_pip(tmpdir):
+    _fake_venv(tmpdir, builder._venv_marker_contents())
+    tmpdir.join("lib").remove()
+
+    assert not builder._venv_is_valid(str(tmpdir))
+
+
+def test_collect_resolution(tmpdir):
+    resolution_dir = tmpdir.mkdir("resolution")
+    download_dir = tmpdir.mkdir("downloads")
+    resolution_dir.join("attrs-19.3.0-py2.py3-none-any.whl").write("new")
+    resolution_dir.join("PyYAML-5.1.2.tar.gz").write("new")
+    resolution_dir.join("six-1.12.0-py2.py3-none-any.whl").write("new")
+    download_dir.join("six-1.12.0-py2.py3-none-any.whl").write("cached")
 
-    builder._build_requirements_file(str(requirements_file), *requirements)
+    test = builder._collect_resolution(str(resolution_dir), str(download_dir))
 
-    assert requirements_file.read() == expected_file_contents
+    assert test == [
+        PackageDetails(Name="attrs", Details="==19.3.0"),
+        PackageDetails(Name="pyyaml", Details="==5.1.2"),
+        PackageDetails(Name="six", Details="==1.12.0"),
+    ]
+    assert sorted(path.basename for path in download_dir.listdir()) == [
+        "PyYAML-5.1.2.tar.gz",
+        "attrs-19.3.0-py2.py3-none-any.whl",
+        "six-1.12.0-py2.py3-none-any.whl",
+    ]
+    assert download_dir.join("six-1.12.0-py2.py3-none-any.whl").read() == "cached"
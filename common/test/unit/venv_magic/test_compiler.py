@@ -0,0 +1,83 @@
+"""Unit tests for ``accretion_common.venv_magic.compiler``."""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+from accretion_common.venv_magic import compiler
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+def _build_tree(build_dir):
+    build_dir.join("example", "__init__.py").write("VALUE = 1\n", ensure=True)
+    build_dir.join("example", "nested", "deep", "module.py").write("VALUE = 2\n", ensure=True)
+    build_dir.join("example", "broken.py").write("def nope(:\n", ensure=True)
+    build_dir.join("single_module.py").write("VALUE = 3\n")
+    build_dir.join("example-1.0.dist-info", "METADATA").write("Name: example\n", ensure=True)
+    build_dir.join("bin", "example").write("#!python\n", ensure=True)
+    build_dir.join("data_only", "data.json").write("{}", ensure=True)
+
+
+def test_compile_targets(tmpdir):
+    _build_tree(tmpdir)
+
+    test = compiler._compile_targets(str(tmpdir))
+
+    assert test == {str(tmpdir.join("example")): 3, str(tmpdir.join("single_module.py")): 1}
+
+
+def test_partition():
+    targets = {"a": 10, "b": 6, "c": 5, "d": 1}
+
+    test = compiler._partition(targets, 2)
+
+    assert test == [["a", "d"], ["b", "c"]]
+
+
+def test_partition_more_groups_than_targets():
+    assert compiler._partition({"a": 1}, 4) == [["a"]]
+
+
+def test_normalize_source_mtimes(tmpdir):
+    source = tmpdir.join("module.py")
+    source.write("")
+    os.utime(str(source), (1561000001.5, 1561000001.5))
+
+    compiler._normalize_source_mtimes(str(tmpdir))
+
+    assert os.stat(str(source)).st_mtime == 1561000000
+
+
+def test_normalize_source_mtimes_fixed(tmpdir):
+    source = tmpdir.join("module.py")
+    source.write("")
+
+    compiler._normalize_source_mtimes(str(tmpdir), source_mtime=315532800)
+
+    assert os.stat(str(source)).st_mtime == 315532800
+
+
+def test_precompile(tmpdir):
+    _build_tree(tmpdir)
+
+    compiler.precompile(str(tmpdir), sys.executable, max_workers=2)
+
+    for source in ("example/__init__.py", "example/nested/deep/module.py", "single_module.py"):
+        assert os.path.isfile(importlib.util.cache_from_source(str(tmpdir.join(source))))
+    assert not os.path.exists(importlib.util.cache_from_source(str(tmpdir.join("example", "broken.py"))))
+    assert not tmpdir.join("bin", "__pycache__").exists()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="Hash-based pycs require Python 3.7+")
+def test_precompile_unchecked_hash(tmpdir):
+    tmpdir.join("module.py").write("VALUE = 1\n")
+
+    compiler.precompile(str(tmpdir), sys.executable)
+
+    with open(importlib.util.cache_from_source(str(tmpdir.join("module.py"))), "rb") as pyc:
+        pyc.read(4)
+        flags = int.from_bytes(pyc.read(4), "little")
+    # Hash-based (0b01) and not checked against the source (no 0b10).
+    assert flags == 0b01
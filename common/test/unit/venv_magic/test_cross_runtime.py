@@ -0,0 +1,94 @@
+"""Unit tests for ``accretion_common.venv_magic.cross_runtime``."""
+import zipfile
+
+import pytest
+
+from accretion_common.util import PackageDetails
+from accretion_common.venv_magic.cross_runtime import cross_runtime_blocker
+from accretion_common.venv_magic.targets import RUNTIME_TARGETS
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+HOST = RUNTIME_TARGETS["python3.7"]
+TARGET = RUNTIME_TARGETS["python3.6"]
+
+
+def _build_wheel(download_dir, name, metadata=""):
+    with zipfile.ZipFile(str(download_dir.join(f"{name}-1.0-py3-none-any.whl")), "w") as wheel:
+        wheel.writestr(
+            f"{name}-1.0.dist-info/METADATA", f"Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n{metadata}"
+        )
+
+
+def _blocker(download_dir, requirements=None, resolved=None):
+    return cross_runtime_blocker(
+        requirements=requirements or [PackageDetails(Name="example", Details="")],
+        resolved=resolved or [PackageDetails(Name="example", Details="==1.0")],
+        download_dir=str(download_dir),
+        host=HOST,
+        target=TARGET,
+    )
+
+
+def test_cross_runtime_blocker_none(tmpdir):
+    _build_wheel(tmpdir, "example", "Requires-Python: >=3.5\nRequires-Dist: other (>=1.0)\n")
+
+    assert _blocker(tmpdir) is None
+
+
+def test_cross_runtime_blocker_same_runtime(tmpdir):
+    test = cross_runtime_blocker(
+        requirements=[PackageDetails(Name="example", Details="")],
+        resolved=[PackageDetails(Name="example", Details="==1.0")],
+        download_dir=str(tmpdir),
+        host=HOST,
+        target=HOST,
+    )
+
+    assert test is None
+
+
+@pytest.mark.parametrize(
+    "metadata, reason",
+    (
+        pytest.param("Requires-Python: >=3.7\n", "example requires Python >=3.7", id="requires python"),
+        pytest.param(
+            'Requires-Dist: dataclasses ; python_version < "3.7"\n',
+            "example dependency markers select different dependencies",
+            id="dependency marker",
+        ),
+        pytest.param(
+            'Requires-Dist: dataclasses ; python_version < "3.7" and extra == "fast"\n',
+            "example dependency markers select different dependencies",
+            id="extra dependency marker",
+        ),
+        pytest.param(
+            "Requires-Dist: dataclasses ; python_version <\n",
+            "example has a dependency that we cannot evaluate",
+            id="invalid dependency",
+        ),
+    ),
+)
+def test_cross_runtime_blocker_metadata(tmpdir, metadata, reason):
+    _build_wheel(tmpdir, "example", metadata)
+
+    assert _blocker(tmpdir).startswith(reason)
+
+
+def test_cross_runtime_blocker_linux_only_marker(tmpdir):
+    _build_wheel(tmpdir, "example", 'Requires-Dist: uvloop ; sys_platform == "linux"\n')
+
+    assert _blocker(tmpdir) is None
+
+
+def test_cross_runtime_blocker_requested_marker(tmpdir):
+    _build_wheel(tmpdir, "example")
+    requirements = [PackageDetails(Name="example", Details='; python_version >= "3.7"')]
+
+    assert _blocker(tmpdir, requirements=requirements).startswith("Requirement markers select different dependencies")
+
+
+def test_cross_runtime_blocker_sdist(tmpdir):
+    tmpdir.join("example-1.0.tar.gz").write("")
+
+    assert _blocker(tmpdir).startswith("No wheel available to read dependencies from")
@@ -0,0 +1,139 @@
+"""Unit tests for ``accretion_common.venv_magic.delta``."""
+import io
+import zipfile
+
+import pytest
+
+from accretion_common.util import PackageDetails
+from accretion_common.venv_magic.delta import compare_archives, plan_delta
+from accretion_common.venv_magic.filters import FileFilter
+from accretion_common.venv_magic.zipper import build_zip
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+def _install(build_dir, name, version, script=False):
+    """Lay out a distribution the way pip --target installs it."""
+    dist_info = build_dir.mkdir(f"{name}-{version}.dist-info")
+    dist_info.join("METADATA").write(f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n")
+    module = build_dir.mkdir(name)
+    module.join("__init__.py").write(f"VERSION = {version!r}\n")
+    module.mkdir("__pycache__").join("__init__.cpython-37.pyc").write_binary(b"\x42\x0d\x0d\x0a" + bytes(12) + b"code")
+    records = [
+        f"{name}-{version}.dist-info/METADATA,,",
+        f"{name}-{version}.dist-info/RECORD,,",
+        f"{name}/__init__.py,,",
+        f"{name}/__pycache__/__init__.cpython-37.pyc,,",
+    ]
+    if script:
+        build_dir.ensure_dir("bin").join(name).write("#!/opt/venv/bin/python\n")
+        records.append(f"../../bin/{name},,")
+    dist_info.join("RECORD").write("\n".join(records) + "\n")
+    return dict(Name=name, Version=version)
+
+
+def _previous_artifact(tmpdir, *distributions):
+    build_dir = tmpdir.mkdir("previous")
+    installed = [_install(build_dir, *distribution) for distribution in distributions]
+    artifact = tmpdir.join("previous.zip")
+    artifact.write_binary(build_zip(str(build_dir)).getvalue())
+    return str(artifact), installed
+
+
+def test_plan_delta(tmpdir):
+    previous, installed = _previous_artifact(tmpdir, ("unchanged", "1.0", True), ("changed", "1.0"), ("removed", "1.0"))
+    resolved = [
+        PackageDetails(Name="unchanged", Details="==1.0"),
+        PackageDetails(Name="changed", Details="==2.0"),
+        PackageDetails(Name="added", Details="==1.0"),
+    ]
+
+    test = plan_delta(previous, installed, resolved)
+
+    assert test.reused == [dict(Name="unchanged", Version="1.0")]
+    assert test.install == resolved[1:]
+    assert test.members == [
+        "python/bin/unchanged",
+        "python/unchanged-1.0.dist-info/METADATA",
+        "python/unchanged-1.0.dist-info/RECORD",
+        "python/unchanged/__init__.py",
+        "python/unchanged/__pycache__/__init__.cpython-37.pyc",
+    ]
+
+
+def test_plan_delta_missing_recorded_file(tmpdir):
+    build_dir = tmpdir.mkdir("previous")
+    installed = [_install(build_dir, "example", "1.0")]
+    build_dir.join("example-1.0.dist-info", "RECORD").write("example/missing.py,,\n", mode="a")
+    previous = str(tmpdir.join("previous.zip"))
+    with open(previous, "wb") as artifact:
+        artifact.write(build_zip(str(build_dir)).getvalue())
+    resolved = [PackageDetails(Name="example", Details="==1.0")]
+
+    test = plan_delta(previous, installed, resolved)
+
+    assert test.reused == []
+    assert test.install == resolved
+
+
+def test_plan_delta_filtered_recorded_file(tmpdir):
+    build_dir = tmpdir.mkdir("previous")
+    installed = [_install(build_dir, "example", "1.0")]
+    build_dir.join("example", "tests", "test_example.py").write("", ensure=True)
+    build_dir.join("example-1.0.dist-info", "RECORD").write("example/tests/test_example.py,,\n", mode="a")
+    file_filter = FileFilter.from_name("tests")
+    previous = str(tmpdir.join("previous.zip"))
+    with open(previous, "wb") as artifact:
+        artifact.write(build_zip(str(build_dir), file_filter=file_filter).getvalue())
+    resolved = [PackageDetails(Name="example", Details="==1.0")]
+
+    test = plan_delta(previous, installed, resolved, file_filter=file_filter)
+
+    assert test.reused == [dict(Name="example", Version="1.0")]
+    assert "python/example/tests/test_example.py" not in test.members
+
+
+def test_delta_build_matches_clean_build(tmpdir):
+    previous, installed = _previous_artifact(tmpdir, ("unchanged", "1.0", True), ("changed", "1.0"), ("removed", "1.0"))
+    resolved = [PackageDetails(Name="unchanged", Details="==1.0"), PackageDetails(Name="changed", Details="==2.0")]
+    plan = plan_delta(previous, installed, resolved)
+    delta_dir = tmpdir.mkdir("delta")
+    _install(delta_dir, "changed", "2.0")
+    clean_dir = tmpdir.mkdir("clean")
+    _install(clean_dir, "unchanged", "1.0", True)
+    _install(clean_dir, "changed", "2.0")
+
+    delta = build_zip(str(delta_dir), reuse_from=plan.previous_artifact, reused_members=plan.members)
+    clean = build_zip(str(clean_dir))
+
+    assert compare_archives(delta, clean) == []
+    with zipfile.ZipFile(delta) as archive:
+        assert archive.testzip() is None
+
+
+def test_compare_archives():
+    def _archive(members):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for name, contents in members.items():
+                archive.writestr(name, contents)
+        return buffer
+
+    left = _archive(
+        {
+            "same.py": b"A = 1\n",
+            "changed.py": b"B = 1\n",
+            "left.py": b"",
+            "__pycache__/same.cpython-37.pyc": b"\x42\x0d\x0d\x0a" + b"\x01" * 12 + b"code",
+        }
+    )
+    right = _archive(
+        {
+            "same.py": b"A = 1\n",
+            "changed.py": b"B = 2\n",
+            "right.py": b"",
+            "__pycache__/same.cpython-37.pyc": b"\x42\x0d\x0d\x0a" + b"\x02" * 12 + b"code",
+        }
+    )
+
+    assert compare_archives(left, right) == ["changed.py", "left.py", "right.py"]
@@ -0,0 +1,69 @@
+"""Unit tests for ``accretion_common.venv_magic.engine``."""
+import pytest
+
+from accretion_common.exceptions import ExecutionError, ResolutionError
+from accretion_common.util import PackageDetails
+from accretion_common.venv_magic import engine
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+@pytest.mark.parametrize(
+    "package, version",
+    (
+        (PackageDetails(Name="attrs", Details="==19.1.0"), "19.1.0"),
+        (PackageDetails(Name="six", Details=" == 1.12"), "1.12"),
+    ),
+)
+def test_pinned_version(package: PackageDetails, version: str):
+    assert engine._pinned_version(package) == version
+
+
+@pytest.mark.parametrize("details", ("", ">=19.1.0", "[policy]"))
+def test_pinned_version_not_pinned(details: str):
+    with pytest.raises(ExecutionError) as excinfo:
+        engine._pinned_version(PackageDetails(Name="attrs", Details=details))
+
+    excinfo.match(r"Requirement is not pinned: *")
+
+
+def test_with_retries(mocker):
+    mocker.patch.object(engine.time, "sleep")
+    func = mocker.Mock(side_effect=[ExecutionError(), ExecutionError(), "done"])
+
+    assert engine._with_retries(func, retries=2) == "done"
+    assert func.call_count == 3
+
+
+def test_with_retries_exhausted(mocker):
+    mocker.patch.object(engine.time, "sleep")
+    func = mocker.Mock(side_effect=ExecutionError())
+
+    with pytest.raises(ExecutionError):
+        engine._with_retries(func, retries=2)
+
+    assert func.call_count == 3
+
+
+def test_with_retries_fatal(mocker):
+    mocker.patch.object(engine.time, "sleep")
+    func = mocker.Mock(side_effect=ResolutionError())
+
+    with pytest.raises(ResolutionError):
+        engine._with_retries(func, retries=2)
+
+    assert func.call_count == 1
+
+
+def test_merge_tree(tmpdir):
+    target = tmpdir.mkdir("target")
+    target.join("google", "protobuf", "__init__.py").write("protobuf", ensure=True)
+    source = tmpdir.mkdir("source")
+    source.join("google", "api", "__init__.py").write("api", ensure=True)
+    source.join("googleapis_common_protos-1.6.0.dist-info", "RECORD").write("record", ensure=True)
+
+    engine._merge_tree(str(source), str(target))
+
+    assert target.join("google", "protobuf", "__init__.py").read() == "protobuf"
+    assert target.join("google", "api", "__init__.py").read() == "api"
+    assert target.join("googleapis_common_protos-1.6.0.dist-info", "RECORD").read() == "record"
@@ -0,0 +1,117 @@
+"""Unit tests for ``accretion_common.venv_magic.exclusions``."""
+import zipfile
+
+import pytest
+
+from accretion_common.util import PackageDetails
+from accretion_common.venv_magic.exclusions import (
+    RUNTIME_PROVIDED,
+    archive_requires,
+    installed_requires,
+    plan_exclusions,
+    remove_distribution,
+)
+from accretion_common.venv_magic.targets import RUNTIME_TARGETS
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+PROVIDED = {"boto3": "1.9.42", "botocore": "1.12.42", "jmespath": "0.9.3"}
+INSTALLED = [
+    dict(Name="boto3", Version="1.9.100"),
+    dict(Name="botocore", Version="1.12.100"),
+    dict(Name="example", Version="1.0"),
+    dict(Name="jmespath", Version="0.9.4"),
+]
+
+
+def _install(build_dir, name, version, requires=(), script=False):
+    """Lay out a distribution the way pip --target installs it."""
+    dist_info = build_dir.mkdir(f"{name}-{version}.dist-info")
+    metadata = "".join(f"Requires-Dist: {requirement}\n" for requirement in requires)
+    dist_info.join("METADATA").write(f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n{metadata}")
+    module = build_dir.ensure_dir(name, "sub")
+    module.join("__init__.py").write("")
+    module.ensure_dir("__pycache__").join("__init__.cpython-37.pyc").write_binary(b"code")
+    records = [
+        f"{name}-{version}.dist-info/METADATA,,",
+        f"{name}-{version}.dist-info/RECORD,,",
+        f"{name}/sub/__init__.py,,",
+    ]
+    if script:
+        build_dir.ensure_dir("bin").join(name).write("#!/opt/venv/bin/python\n")
+        records.append(f"../../bin/{name},,")
+    dist_info.join("RECORD").write("\n".join(records) + "\n")
+
+
+def _names(excluded):
+    return [distribution["Name"] for distribution in excluded]
+
+
+def test_plan_exclusions():
+    requires = {"boto3": ["botocore (<1.13.0,>=1.12.100)", "jmespath (<1.0.0,>=0.7.1)"], "example": ["boto3"]}
+
+    test = plan_exclusions(INSTALLED, requires, [PackageDetails(Name="example", Details="")], PROVIDED)
+
+    assert test == [
+        dict(Name="boto3", Version="1.9.100", Provided="1.9.42"),
+        dict(Name="botocore", Version="1.12.100", Provided="1.12.42"),
+        dict(Name="jmespath", Version="0.9.4", Provided="0.9.3"),
+    ]
+
+
+def test_plan_exclusions_requested_version():
+    test = plan_exclusions(INSTALLED, {}, [PackageDetails(Name="boto3", Details=">=1.9.100")], PROVIDED)
+
+    assert _names(test) == ["botocore", "jmespath"]
+
+
+def test_plan_exclusions_kept_dependents():
+    # Once boto3 is kept, its dependency on a newer botocore counts, which keeps botocore too.
+    requires = {"example": ["boto3 (>=1.9.100)"], "boto3": ["botocore (>=1.12.100)", "jmespath"]}
+
+    test = plan_exclusions(INSTALLED, requires, [], PROVIDED)
+
+    assert _names(test) == ["jmespath"]
+
+
+def test_plan_exclusions_direct_reference():
+    test = plan_exclusions(
+        INSTALLED, {}, [PackageDetails(Name="jmespath", Details=" @ https://example.com/jmespath.zip")], PROVIDED
+    )
+
+    assert _names(test) == ["boto3", "botocore"]
+
+
+def test_remove_distribution(tmpdir):
+    _install(tmpdir, "jmespath", "0.9.4", script=True)
+    _install(tmpdir, "example", "1.0", requires=["jmespath"])
+
+    remove_distribution(str(tmpdir), "jmespath", "0.9.4")
+
+    assert sorted(path.basename for path in tmpdir.listdir()) == ["example", "example-1.0.dist-info"]
+
+
+def test_remove_distribution_missing(tmpdir):
+    with pytest.raises(ValueError) as excinfo:
+        remove_distribution(str(tmpdir), "jmespath", "0.9.4")
+
+    excinfo.match(r"Unable to find installed distribution: jmespath 0.9.4")
+
+
+def test_read_requires(tmpdir):
+    build_dir = tmpdir.mkdir("build")
+    _install(build_dir, "example", "1.0", requires=["jmespath (>=0.7)"])
+    _install(build_dir, "jmespath", "0.9.4")
+    archive = str(tmpdir.join("artifact.zip"))
+    with zipfile.ZipFile(archive, "w") as artifact:
+        artifact.write(
+            str(build_dir.join("example-1.0.dist-info", "METADATA")), "python/example-1.0.dist-info/METADATA"
+        )
+
+    assert installed_requires(str(build_dir)) == {"example": ["jmespath (>=0.7)"], "jmespath": []}
+    assert archive_requires(archive, ["python/example-1.0.dist-info/METADATA"]) == {"example": ["jmespath (>=0.7)"]}
+
+
+def test_runtime_provided_covers_every_target():
+    assert set(RUNTIME_PROVIDED) == set(RUNTIME_TARGETS)
+    assert all(provided["boto3"] for provided in RUNTIME_PROVIDED.values())
@@ -0,0 +1,129 @@
+"""Unit tests for ``accretion_common.venv_magic.execution``."""
+import sys
+
+import pytest
+
+from accretion_common.exceptions import BuildError, ExecutionError, ResolutionError, TransientExecutionError
+from accretion_common.venv_magic import execution
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+@pytest.mark.parametrize(
+    "line, action, package, size",
+    (
+        ("Collecting attrs==19.1.0", "collect", "attrs==19.1.0", None),
+        (
+            "  Downloading https://files.pythonhosted.org/packages/23/96/attrs-19.1.0-py2.py3-none-any.whl (35kB)",
+            "download",
+            "attrs-19.1.0-py2.py3-none-any.whl",
+            "35kB",
+        ),
+        (
+            "  File was already downloaded /tmp/cache/six-1.12.0-py2.py3-none-any.whl",
+            "cached",
+            "six-1.12.0-py2.py3-none-any.whl",
+            None,
+        ),
+        ("Processing /tmp/cache/six-1.12.0-py2.py3-none-any.whl", "process", "six-1.12.0-py2.py3-none-any.whl", None),
+        ("  Building wheel for cffi (setup.py): started", "build", "cffi", None),
+        ("  Building wheel for cffi (setup.py): finished with status 'done'", "built", "cffi", None),
+        ("Installing collected packages: attrs, six", "install", "attrs, six", None),
+        ("Successfully installed attrs-19.1.0 six-1.12.0", "installed", "attrs-19.1.0 six-1.12.0", None),
+    ),
+)
+def test_parse_pip_line(line, action, package, size):
+    test = execution.parse_pip_line(line)
+
+    assert test.Action == action
+    assert test.Package == package
+    assert test.Size == size
+
+
+@pytest.mark.parametrize("line", ("", "Requirement already satisfied: six", "    Uninstalling six-1.11.0:"))
+def test_parse_pip_line_not_an_event(line):
+    assert execution.parse_pip_line(line) is None
+
+
+def _python(script: str):
+    return [sys.executable, "-c", script]
+
+
+def test_execute_command_streams_events():
+    events = []
+
+    stdout, stderr = execution.execute_command(
+        _python("import sys; print('Collecting attrs'); print('deprecated', file=sys.stderr)"), on_event=events.append
+    )
+
+    assert stdout == "Collecting attrs"
+    assert stderr == "deprecated"
+    assert [(event.Action, event.Package) for event in events] == [("collect", "attrs")]
+
+
+def test_execute_command_keeps_bounded_tail():
+    stdout, _stderr = execution.execute_command(_python("for i in range(1000): print(i)"))
+
+    assert stdout.splitlines() == [str(i) for i in range(800, 1000)]
+
+
+def test_execute_command_non_zero_exit():
+    with pytest.raises(ExecutionError) as excinfo:
+        execution.execute_command(_python("import sys; print('bad things', file=sys.stderr); sys.exit(3)"))
+
+    excinfo.match(r"exit status 3")
+
+
+def test_execute_command_aborts_on_fatal_error():
+    script = (
+        "import time\n"
+        "print('ERROR: No matching distribution found for attrs==0.0.0', flush=True)\n"
+        "time.sleep(60)\n"
+    )
+
+    with pytest.raises(ResolutionError) as excinfo:
+        execution.execute_command(_python(script))
+
+    excinfo.match(r"Fatal error reported: ERROR: No matching distribution found for attrs==0.0.0")
+
+
+@pytest.mark.parametrize(
+    "script, error_type",
+    (
+        pytest.param(
+            'print("  Retrying (Retry(total=4, connect=None, read=None)) after connection broken by '
+            "'NewConnectionError'\", flush=True)\n"
+            "print('ERROR: No matching distribution found for attrs==19.3.0', flush=True)\n"
+            "time.sleep(60)\n",
+            TransientExecutionError,
+            id="index unreachable",
+        ),
+        pytest.param(
+            "import sys\nprint(\"    error: command 'gcc' failed with exit status 1\", flush=True)\nsys.exit(1)\n",
+            BuildError,
+            id="compile failure",
+        ),
+        pytest.param(
+            "import sys\nprint('ReadTimeoutError: Read timed out.', file=sys.stderr)\nsys.exit(2)\n",
+            TransientExecutionError,
+            id="timeout",
+        ),
+    ),
+)
+def test_execute_command_classifies_errors(script, error_type):
+    with pytest.raises(error_type):
+        execution.execute_command(_python("import time\n" + script))
+
+
+def test_execute_command_optional_extension():
+    script = (
+        "print('  Running setup.py install for simplejson: started', flush=True)\n"
+        "print(\"    error: command 'gcc' failed with exit status 1\", flush=True)\n"
+        "print('    WARNING: The C extension could not be compiled, speedups are not enabled.', flush=True)\n"
+        "print('    Plain-Python installation succeeded.', flush=True)\n"
+        "print('Successfully installed simplejson-3.16.0', flush=True)\n"
+    )
+
+    stdout, _stderr = execution.execute_command(_python(script))
+
+    assert stdout.splitlines()[-1] == "Successfully installed simplejson-3.16.0"
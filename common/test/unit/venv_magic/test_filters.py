@@ -0,0 +1,90 @@
+"""Unit tests for ``accretion_common.venv_magic.filters``."""
+import pytest
+
+from accretion_common.util import BuildOptions
+from accretion_common.venv_magic.filters import FileFilter
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+@pytest.mark.parametrize(
+    "name, path, dropped",
+    (
+        ("caches", "example/__pycache__/__init__.cpython-37.pyc", True),
+        ("caches", "example/module.pyc", True),
+        ("caches", "example/module.py", False),
+        ("tests", "example/tests/test_module.py", True),
+        ("tests", "example/testing.py", False),
+        ("docs", "example/docs/index.html", True),
+        ("docs", "example/README.rst", True),
+        ("docs", "example-1.0.dist-info/LICENSE.rst", False),
+        ("docs", "boto3/docs/client.py", False),
+        ("docs", "botocore/docs/method.py", False),
+        ("stubs", "example/__init__.pyi", True),
+        ("stubs", "example/py.typed", True),
+        ("dist-info", "example-1.0.dist-info/LICENSE", False),
+        ("dist-info", "example-1.0.dist-info/COPYING.txt", False),
+        ("dist-info", "example-1.0.dist-info/licenses/vendored.txt", False),
+        ("dist-info", "example-1.0.dist-info/AUTHORS", True),
+        ("docs", "example/LICENSE.md", False),
+        ("caches", "example/__pycache__/license.cpython-37.pyc", True),
+        ("dist-info", "example-1.0.dist-info/INSTALLER", True),
+        ("dist-info", "example-1.0.dist-info/METADATA", False),
+        ("dist-info", "example-1.0.dist-info/RECORD", False),
+        ("dist-info", "example-1.0.dist-info/entry_points.txt", False),
+        ("none", "example/tests/test_module.py", False),
+        (None, "example/tests/test_module.py", False),
+    ),
+)
+def test_rules(name, path, dropped):
+    assert FileFilter.from_name(name).drops(path) is dropped
+
+
+def test_rule_sets():
+    test = FileFilter.from_name("minimal")
+
+    assert test.rules == ("tests", "docs", "stubs", "dist-info", "caches")
+
+
+def test_combined():
+    test = FileFilter.from_name("slim+caches+tests")
+
+    assert test.name == "slim+caches+tests"
+    assert test.rules == ("tests", "docs", "stubs", "dist-info", "caches")
+    assert test.drops("example/__pycache__/__init__.cpython-37.pyc")
+    assert test.drops("example/tests/test_module.py")
+
+
+def test_unknown():
+    with pytest.raises(ValueError) as excinfo:
+        FileFilter.from_name("slim+everything")
+
+    excinfo.match("Unknown file filter: 'everything'")
+
+
+def test_from_options():
+    test = FileFilter.from_options(BuildOptions(FileFilter="slim"))
+
+    assert test.rules == ("tests", "docs", "stubs", "dist-info")
+
+
+def test_from_options_precompile_caches():
+    with pytest.raises(ValueError) as excinfo:
+        FileFilter.from_options(BuildOptions(Precompile=True, FileFilter="minimal"))
+
+    excinfo.match("FileFilter must not leave out caches when Precompile is set")
+
+
+def test_overrides():
+    test = FileFilter.from_options(BuildOptions(FileFilter="slim", FileFilterOverrides=dict(tests=["example"])))
+
+    assert not test.drops("example/tests/test_module.py")
+    assert test.drops("other/tests/test_module.py")
+    assert not test.drops("boto3/docs/client.py")
+
+
+def test_overrides_unknown_rule():
+    with pytest.raises(ValueError) as excinfo:
+        FileFilter.from_name("slim", dict(slim=["example"]))
+
+    excinfo.match("Unknown file filter rule in overrides: 'slim'")
@@ -0,0 +1,251 @@
+"""Unit tests for ``accretion_common.venv_magic.installers``."""
+import csv
+import os
+import zipfile
+from typing import Iterable
+
+import pytest
+
+from accretion_common.exceptions import ExecutionError
+from accretion_common.util import PackageDetails
+from accretion_common.venv_magic import installers
+from accretion_common.venv_magic.targets import RUNTIME_TARGETS
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+_WHEEL = "Wheel-Version: 1.0\nGenerator: test\nRoot-Is-Purelib: true\nTag: py3-none-any\n"
+_ENTRY_POINTS = "[console_scripts]\nexample-cli = example.cli:main\n"
+
+
+def _build_wheel(wheel_file, extra_members=None, wheel_metadata=_WHEEL):
+    members = {
+        "example/__init__.py": "VALUE = 1\n",
+        "example/cli.py": "def main():\n    return 0\n",
+        "example-1.0.data/purelib/example_extra.py": "EXTRA = 2\n",
+        "example-1.0.data/scripts/example-script": "#!python\nprint('hello')\n",
+        "example-1.0.dist-info/METADATA": "Metadata-Version: 2.1\nName: example\nVersion: 1.0\n",
+        "example-1.0.dist-info/WHEEL": wheel_metadata,
+        "example-1.0.dist-info/entry_points.txt": _ENTRY_POINTS,
+        "example-1.0.dist-info/RECORD": "this is replaced\n",
+    }
+    members.update(extra_members or {})
+    with zipfile.ZipFile(str(wheel_file), "w") as wheel:
+        for name, contents in members.items():
+            wheel.writestr(name, contents)
+    return str(wheel_file)
+
+
+def test_install_wheel(tmpdir):
+    wheel_file = _build_wheel(tmpdir.join("example-1.0-py3-none-any.whl"))
+    target = tmpdir.mkdir("target")
+
+    installers.install_wheel(wheel_file, str(target), "/opt/venv/bin/python")
+
+    assert target.join("example", "__init__.py").read() == "VALUE = 1\n"
+    assert target.join("example_extra.py").read() == "EXTRA = 2\n"
+    assert not target.join("example-1.0.data").exists()
+    assert target.join("bin", "example-script").read() == "#!/opt/venv/bin/python\nprint('hello')\n"
+    assert os.access(str(target.join("bin", "example-script")), os.X_OK)
+    assert target.join("bin", "example-cli").read().startswith("#!/opt/venv/bin/python\n")
+    assert "from example.cli import main\n" in target.join("bin", "example-cli").read()
+    assert "sys.exit(main())" in target.join("bin", "example-cli").read()
+    assert target.join("example-1.0.dist-info", "INSTALLER").read() == "accretion\n"
+
+
+def test_install_wheel_record(tmpdir):
+    wheel_file = _build_wheel(tmpdir.join("example-1.0-py3-none-any.whl"))
+    target = tmpdir.mkdir("target")
+
+    installers.install_wheel(wheel_file, str(target), "/opt/venv/bin/python")
+
+    with open(str(target.join("example-1.0.dist-info", "RECORD")), newline="") as record:
+        rows = {row[0]: row[1:] for row in csv.reader(record)}
+
+    assert sorted(rows) == [
+        "bin/example-cli",
+        "bin/example-script",
+        "example-1.0.dist-info/INSTALLER",
+        "example-1.0.dist-info/METADATA",
+        "example-1.0.dist-info/RECORD",
+        "example-1.0.dist-info/WHEEL",
+        "example-1.0.dist-info/entry_points.txt",
+        "example/__init__.py",
+        "example/cli.py",
+        "example_extra.py",
+    ]
+    assert rows["example-1.0.dist-info/RECORD"] == ["", ""]
+    assert rows["example/__init__.py"] == ["sha256=4T34xEr13qHkEkA5ELmcxaSPLMv2imazN01quc75_GU", "10"]
+    for path, (_, size) in rows.items():
+        if size:
+            assert target.join(path).size() == int(size)
+
+
+@pytest.mark.parametrize(
+    "extra_members, wheel_metadata, error",
+    (
+        ({"../escape.py": "nope"}, _WHEEL, r"Refusing to install file outside of target directory: *"),
+        ({"example-1.0.data/unknown/file": "nope"}, _WHEEL, r"Unknown install scheme in wheel: *"),
+        ({}, "Wheel-Version: 2.0\n", r"Unsupported wheel version 2.0 in wheel: *"),
+    ),
+)
+def test_install_wheel_fails(tmpdir, extra_members, wheel_metadata, error):
+    wheel_file = _build_wheel(tmpdir.join("example-1.0-py3-none-any.whl"), extra_members, wheel_metadata)
+
+    with pytest.raises(ExecutionError) as excinfo:
+        installers.install_wheel(wheel_file, str(tmpdir.mkdir("target")), "/opt/venv/bin/python")
+
+    excinfo.match(error)
+
+
+def test_native_wheel_installer_falls_back(tmpdir, mocker):
+    mocker.patch.object(installers, "fetch_resolved")
+    mocker.patch.object(installers, "_supported_tags", return_value={"py3-none-any": 0})
+    fallback = mocker.Mock()
+    download_dir = tmpdir.mkdir("downloads")
+    _build_wheel(download_dir.join("example-1.0-py3-none-any.whl"))
+    download_dir.join("sdist_only-2.0.tar.gz").write("")
+    build_dir = tmpdir.join("build")
+    requirements = [
+        PackageDetails(Name="example", Details="==1.0"),
+        PackageDetails(Name="sdist-only", Details="==2.0"),
+    ]
+
+    installers.NativeWheelInstaller(fallback=fallback).install(
+        build_dir=str(build_dir),
+        venv_dir="/opt/venv",
+        requirements=requirements,
+        download_dir=str(download_dir),
+        resolved=True,
+    )
+
+    assert build_dir.join("example", "__init__.py").check()
+    fallback.install.assert_called_once_with(
+        build_dir=str(build_dir),
+        venv_dir="/opt/venv",
+        requirements=[PackageDetails(Name="sdist-only", Details="==2.0")],
+        download_dir=str(download_dir),
+        resolved=True,
+        timeline=mocker.ANY,
+    )
+
+
+def test_native_wheel_installer_unresolved_uses_fallback(mocker):
+    fetch = mocker.patch.object(installers, "fetch_resolved")
+    fallback = mocker.Mock()
+    requirements = [PackageDetails(Name="example", Details=">=1.0")]
+
+    installers.NativeWheelInstaller(fallback=fallback).install(
+        build_dir="build", venv_dir="venv", requirements=requirements, download_dir="downloads"
+    )
+
+    fetch.assert_not_called()
+    fallback.install.assert_called_once_with(
+        build_dir="build",
+        venv_dir="venv",
+        requirements=requirements,
+        download_dir="downloads",
+        resolved=False,
+        timeline=mocker.ANY,
+    )
+
+
+def test_native_wheel_installer_target_missing_wheels(tmpdir, mocker):
+    fetch = mocker.patch.object(installers, "fetch_resolved")
+    fallback = mocker.Mock()
+    download_dir = tmpdir.mkdir("downloads")
+    download_dir.join("sdist_only-2.0.tar.gz").write("")
+    target = RUNTIME_TARGETS["python3.6"]
+
+    with pytest.raises(ExecutionError) as excinfo:
+        installers.NativeWheelInstaller(fallback=fallback, target=target).install(
+            build_dir=str(tmpdir.join("build")),
+            venv_dir="/opt/venv",
+            requirements=[PackageDetails(Name="sdist-only", Details="==2.0")],
+            download_dir=str(download_dir),
+            resolved=True,
+        )
+
+    excinfo.match("No compatible wheels found for python3.6")
+    assert [call[1]["pip_args"][-1] for call in fetch.call_args_list] == list(reversed(target.platforms))
+    fallback.install.assert_not_called()
+
+
+def test_native_wheel_installer_source_builds(tmpdir, mocker):
+    mocker.patch.object(installers, "fetch_resolved")
+    mocker.patch.object(installers, "_supported_tags", return_value={"py3-none-any": 0})
+    fallback = mocker.Mock()
+    download_dir = tmpdir.mkdir("downloads")
+    download_dir.join("example-1.0.tar.gz").write("")
+    download_dir.join("unbuildable-2.0.tar.gz").write("")
+    built_wheel = _build_wheel(tmpdir.join("example-1.0-py3-none-any.whl"))
+
+    def _wheel_for(venv_dir, sdist, find_links, timeline):
+        if sdist.endswith("unbuildable-2.0.tar.gz"):
+            raise ExecutionError("no compiler")
+        return built_wheel
+
+    source_builds = mocker.Mock()
+    source_builds.wheel_for.side_effect = _wheel_for
+    build_dir = tmpdir.join("build")
+
+    installers.NativeWheelInstaller(fallback=fallback, source_builds=source_builds).install(
+        build_dir=str(build_dir),
+        venv_dir="/opt/venv",
+        requirements=[
+            PackageDetails(Name="example", Details="==1.0"),
+            PackageDetails(Name="unbuildable", Details="==2.0"),
+        ],
+        download_dir=str(download_dir),
+        resolved=True,
+    )
+
+    assert build_dir.join("example", "__init__.py").check()
+    fallback.install.assert_called_once_with(
+        build_dir=str(build_dir),
+        venv_dir="/opt/venv",
+        requirements=[PackageDetails(Name="unbuildable", Details="==2.0")],
+        download_dir=str(download_dir),
+        resolved=True,
+        timeline=mocker.ANY,
+    )
+
+
+@pytest.mark.parametrize(
+    "requirements, expected_file_contents",
+    (
+        (
+            (
+                PackageDetails(Name="attrs", Details="==19.1.0"),
+                PackageDetails(Name="awacs", Details="==0.9.2"),
+                PackageDetails(Name="Click", Details="==7.0"),
+                PackageDetails(Name="boto3", Details="==1.9.169"),
+                PackageDetails(Name="botocore", Details="==1.12.169"),
+            ),
+            "attrs==19.1.0\nawacs==0.9.2\nClick==7.0\nboto3==1.9.169\nbotocore==1.12.169\n",
+        ),
+        (
+            (
+                PackageDetails(Name="attrs"),
+                PackageDetails(Name="awacs"),
+                PackageDetails(Name="Click"),
+                PackageDetails(Name="boto3"),
+                PackageDetails(Name="botocore"),
+            ),
+            "attrs\nawacs\nClick\nboto3\nbotocore\n",
+        ),
+    ),
+)
+def test_build_requirements_file(tmpdir, requirements: Iterable[PackageDetails], expected_file_contents: str):
+    requirements_file = tmpdir.join("requirements.txt")
+
+    installers.build_requirements_file(str(requirements_file), *requirements)
+
+    assert requirements_file.read() == expected_file_contents
+
+
+def test_installer_requires_install():
+    class _Incomplete(installers.Installer):
+        pass
+
+    with pytest.raises(TypeError):
+        _Incomplete()
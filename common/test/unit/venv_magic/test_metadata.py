@@ -0,0 +1,119 @@
+"""Unit tests for ``accretion_common.venv_magic.metadata``."""
+import zipfile
+
+import pytest
+
+from accretion_common.util import InstalledDistribution, PackageDetails
+from accretion_common.venv_magic import metadata
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+@pytest.mark.parametrize(
+    "filename, tags",
+    (
+        ("attrs-19.1.0-py2.py3-none-any.whl", {"py2-none-any", "py3-none-any"}),
+        ("cffi-1.12.3-cp37-cp37m-manylinux1_x86_64.whl", {"cp37-cp37m-manylinux1_x86_64"}),
+        (
+            "numpy-1.17.0-1-cp37-cp37m-manylinux1_x86_64.manylinux2010_x86_64.whl",
+            {"cp37-cp37m-manylinux1_x86_64", "cp37-cp37m-manylinux2010_x86_64"},
+        ),
+    ),
+)
+def test_wheel_filename_tags(filename, tags):
+    assert metadata.wheel_filename_tags(filename) == tags
+
+
+def test_select_wheel():
+    supported = {"cp37-cp37m-manylinux1_x86_64": 0, "py3-none-any": 1}
+    filenames = [
+        "example-1.0-py3-none-any.whl",
+        "example-1.0-cp37-cp37m-manylinux1_x86_64.whl",
+        "example-1.0-cp38-cp38-manylinux1_x86_64.whl",
+        "example-1.1-cp37-cp37m-manylinux1_x86_64.whl",
+        "example-1.0.tar.gz",
+        "other-1.0-py3-none-any.whl",
+    ]
+
+    test = metadata.select_wheel(PackageDetails(Name="Example", Details="==1.0"), filenames, supported)
+
+    assert test == "example-1.0-cp37-cp37m-manylinux1_x86_64.whl"
+
+
+def test_select_wheel_none_compatible():
+    filenames = ["example-1.0-cp38-cp38-manylinux1_x86_64.whl", "example-1.0.tar.gz"]
+
+    test = metadata.select_wheel(PackageDetails(Name="example", Details="==1.0"), filenames, {"py3-none-any": 0})
+
+    assert test is None
+
+
+def test_wheel_metadata(tmpdir):
+    wheel_file = str(tmpdir.join("example-1.0-py3-none-any.whl"))
+    with zipfile.ZipFile(wheel_file, "w") as wheel:
+        wheel.writestr("example/__init__.py", "")
+        wheel.writestr("example/vendored.dist-info/METADATA", "Name: vendored\n")
+        wheel.writestr("example-1.0.dist-info/METADATA", "Name: example\nRequires-Dist: attrs\n")
+
+    test = metadata.wheel_metadata(wheel_file)
+
+    assert test["Name"] == "example"
+    assert test.get_all("Requires-Dist") == ["attrs"]
+
+
+def test_wheel_metadata_missing(tmpdir):
+    wheel_file = str(tmpdir.join("example-1.0-py3-none-any.whl"))
+    with zipfile.ZipFile(wheel_file, "w") as wheel:
+        wheel.writestr("example/__init__.py", "")
+
+    assert metadata.wheel_metadata(wheel_file) is None
+
+
+def _dist_info(build_dir, name, version, tags, record):
+    dist_info = build_dir.mkdir(f"{name}-{version}.dist-info")
+    dist_info.join("METADATA").write(f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n\nDescription\n")
+    dist_info.join("WHEEL").write(
+        "Wheel-Version: 1.0\nRoot-Is-Purelib: true\n" + "".join(f"Tag: {tag}\n" for tag in tags)
+    )
+    dist_info.join("RECORD").write(record)
+
+
+def test_read_installed(tmpdir):
+    build_dir = tmpdir.mkdir("build")
+    download_dir = tmpdir.mkdir("download")
+    _dist_info(
+        build_dir,
+        "attrs",
+        "19.1.0",
+        ["py2-none-any", "py3-none-any"],
+        "attr/__init__.py,sha256=abc,1244\nattr/_compat.py,sha256=def,4583\nattrs-19.1.0.dist-info/RECORD,,\n",
+    )
+    _dist_info(build_dir, "Zope.Interface", "4.6.0", ["cp37-cp37m-manylinux1_x86_64"], "zope/__init__.py,sha256=a,10\n")
+    egg_info = build_dir.mkdir("pycparser-2.19-py3.7.egg-info")
+    egg_info.join("PKG-INFO").write("Metadata-Version: 1.1\nName: pycparser\nVersion: 2.19\n")
+    egg_info.join("installed-files.txt").write("../pycparser/__init__.py\nPKG-INFO\n")
+    build_dir.mkdir("pycparser").join("__init__.py").write("x" * 100)
+    build_dir.mkdir("attr")
+    download_dir.join("attrs-19.1.0-py2.py3-none-any.whl").write("x" * 35)
+    download_dir.join("attrs-19.1.0.tar.gz").write("x" * 50)
+    download_dir.join("pycparser-2.19.tar.gz").write("x" * 70)
+    download_dir.join("zope.interface-4.6.0-cp36-cp36m-manylinux1_x86_64.whl").write("x" * 20)
+
+    test = metadata.read_installed(build_dir=str(build_dir), download_dir=str(download_dir))
+
+    assert test == [
+        InstalledDistribution(
+            Name="attrs",
+            Version="19.1.0",
+            Tags=["py2-none-any", "py3-none-any"],
+            Source="attrs-19.1.0-py2.py3-none-any.whl",
+            DownloadSize=35,
+            InstalledSize=5827,
+        ),
+        InstalledDistribution(
+            Name="pycparser", Version="2.19", Source="pycparser-2.19.tar.gz", DownloadSize=70, InstalledSize=152
+        ),
+        InstalledDistribution(
+            Name="zope-interface", Version="4.6.0", Tags=["cp37-cp37m-manylinux1_x86_64"], InstalledSize=10
+        ),
+    ]
@@ -0,0 +1,85 @@
+"""Unit tests for ``accretion_common.venv_magic.multipart``."""
+import hashlib
+import io
+import os
+import zipfile
+
+import pytest
+
+from accretion_common.venv_magic.multipart import MultipartUploadWriter
+from accretion_common.venv_magic.zipper import build_zip
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+PART_SIZE = 5 * 1024 * 1024
+
+
+class _FakeS3:
+    def __init__(self):
+        self.objects = {}
+        self.parts = {}
+        self.aborted = []
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.parts[Key] = {}
+        return {"UploadId": Key}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.parts[UploadId][PartNumber] = Body
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.parts.pop(UploadId)
+        self.objects[Key] = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.parts.pop(UploadId)
+        self.aborted.append(Key)
+
+
+def test_small_upload_is_one_put():
+    s3 = _FakeS3()
+
+    with MultipartUploadWriter(s3, "bucket", "key", part_size=PART_SIZE) as test:
+        test.write(b"some data")
+
+    assert s3.objects == {"key": b"some data"}
+    assert not s3.parts
+    assert test.sha256 == hashlib.sha256(b"some data").hexdigest()
+
+
+def test_stream_zip(tmpdir):
+    build_dir = tmpdir.mkdir("build")
+    for index in range(3):
+        build_dir.join(f"data{index}.bin").write_binary(os.urandom(3 * 1024 * 1024))
+    s3 = _FakeS3()
+
+    with MultipartUploadWriter(s3, "bucket", "key", part_size=PART_SIZE) as test:
+        build_zip(str(build_dir), output=test)
+
+    assert test.tell() == len(s3.objects["key"]) > PART_SIZE
+    assert test.sha256 == hashlib.sha256(s3.objects["key"]).hexdigest()
+    with zipfile.ZipFile(io.BytesIO(s3.objects["key"])) as archive:
+        assert archive.testzip() is None
+        assert sorted(archive.namelist()) == ["python/data0.bin", "python/data1.bin", "python/data2.bin"]
+
+
+def test_abort_on_error():
+    s3 = _FakeS3()
+
+    with pytest.raises(RuntimeError):
+        with MultipartUploadWriter(s3, "bucket", "key", part_size=PART_SIZE) as test:
+            test.write(b"x" * (PART_SIZE + 1))
+            raise RuntimeError("failed")
+
+    assert s3.aborted == ["key"]
+    assert not s3.objects
+
+
+def test_part_size_minimum():
+    with pytest.raises(ValueError) as excinfo:
+        MultipartUploadWriter(_FakeS3(), "bucket", "key", part_size=1024)
+
+    excinfo.match("Parts must be at least")
@@ -0,0 +1,98 @@
+"""Unit tests for ``accretion_common.venv_magic.resolution_cache``."""
+import io
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+from accretion_common.util import PackageDetails
+from accretion_common.venv_magic import resolution_cache
+from accretion_common.venv_magic.resolution_cache import ResolutionCache, resolution_key
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+REQUESTED = [PackageDetails(Name="Requests", Details=">=2"), PackageDetails(Name="attrs")]
+RESOLVED = [
+    PackageDetails(Name="attrs", Details="==19.3.0"),
+    PackageDetails(Name="requests", Details="==2.22.0"),
+    PackageDetails(Name="urllib3", Details="==1.25.7"),
+]
+
+
+def test_resolution_key_canonical():
+    rewritten = [PackageDetails(Name="attrs"), PackageDetails(Name="requests", Details=" >= 2")]
+
+    assert resolution_key(REQUESTED, "python3.7") == resolution_key(rewritten, "python3.7")
+    assert resolution_key(REQUESTED, "python3.7").startswith("accretion/resolutions/")
+    assert resolution_key(REQUESTED, "python3.7").endswith(".json")
+
+
+@pytest.mark.parametrize(
+    "left, right",
+    (
+        pytest.param((REQUESTED, "python3.7"), (REQUESTED, "python3.6"), id="runtime"),
+        pytest.param((REQUESTED, "python3.7"), (REQUESTED[:1], "python3.7"), id="requirements"),
+        pytest.param(
+            (REQUESTED, "python3.7"),
+            ([PackageDetails(Name="requests", Details=">=2.1"), PackageDetails(Name="attrs")], "python3.7"),
+            id="specifier",
+        ),
+    ),
+)
+def test_resolution_key_differs(left, right):
+    assert resolution_key(*left) != resolution_key(*right)
+
+
+def _cache(mocker, stored_at=None, now=1000.0):
+    mocker.patch.object(resolution_cache.time, "time", return_value=now)
+    s3_client = mocker.Mock()
+    if stored_at is None:
+        s3_client.get_object.side_effect = ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+    else:
+        body = json.dumps(dict(Resolved=[package.to_dict() for package in RESOLVED], ResolvedAt=stored_at))
+        s3_client.get_object.return_value = {"Body": io.BytesIO(body.encode("utf-8"))}
+    return ResolutionCache(s3_client=s3_client, bucket_name="bucket")
+
+
+@pytest.mark.parametrize(
+    "stored_at, ttl, status, age, resolved",
+    (
+        pytest.param(None, 60, "miss", None, None, id="miss"),
+        pytest.param(990.0, 60, "hit", 10.0, RESOLVED, id="hit"),
+        pytest.param(900.0, 60, "expired", 100.0, None, id="expired"),
+    ),
+)
+def test_lookup(mocker, stored_at, ttl, status, age, resolved):
+    cache = _cache(mocker, stored_at)
+
+    test = cache.lookup(REQUESTED, "python3.7", ttl)
+
+    assert test.Status == status
+    assert test.Age == age
+    assert test.Resolved == resolved
+    assert test.hit is (resolved is not None)
+    assert test.to_dict() == dict(Status=status, TTL=ttl, Age=age)
+    cache.s3_client.get_object.assert_called_once_with(Bucket="bucket", Key=resolution_key(REQUESTED, "python3.7"))
+
+
+def test_lookup_disabled(mocker):
+    cache = _cache(mocker, 990.0)
+
+    test = cache.lookup(REQUESTED, "python3.7", 0)
+
+    assert test.Status == "disabled"
+    cache.s3_client.get_object.assert_not_called()
+
+
+def test_store(mocker):
+    cache = _cache(mocker)
+
+    cache.store(REQUESTED, "python3.7", RESOLVED)
+
+    kwargs = cache.s3_client.put_object.call_args[1]
+    assert kwargs["Bucket"] == "bucket"
+    assert kwargs["Key"] == resolution_key(REQUESTED, "python3.7")
+    body = json.loads(kwargs["Body"])
+    assert body["Runtime"] == "python3.7"
+    assert body["ResolvedAt"] == 1000.0
+    assert [PackageDetails(**package) for package in body["Resolved"]] == RESOLVED
@@ -0,0 +1,67 @@
+"""Unit tests for ``accretion_common.venv_magic.shards``."""
+import zipfile
+
+import pytest
+
+from accretion_common.util import PackageDetails
+from accretion_common.venv_magic.shards import plan_shards
+from accretion_common.venv_magic.targets import RUNTIME_TARGETS
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+SUPPORTED = RUNTIME_TARGETS["python3.7"].tags()
+
+
+def _build_wheel(download_dir, name, dependencies=(), padding=0):
+    metadata = "".join(f"Requires-Dist: {dependency}\n" for dependency in dependencies)
+    with zipfile.ZipFile(str(download_dir.join(f"{name}-1.0-py3-none-any.whl")), "w") as wheel:
+        wheel.writestr(
+            f"{name}-1.0.dist-info/METADATA", f"Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n{metadata}"
+        )
+        wheel.writestr(f"{name}/data.bin", bytes(padding))
+
+
+def _resolved(*names):
+    return [PackageDetails(Name=name, Details="==1.0") for name in names]
+
+
+def _names(shards):
+    return [[package.Name for package in shard] for shard in shards]
+
+
+def test_plan_shards_groups_private_dependencies(tmpdir):
+    _build_wheel(tmpdir, "alpha", ["alpha-helper (>=1.0)", "shared"])
+    _build_wheel(tmpdir, "alpha-helper")
+    _build_wheel(tmpdir, "beta", ["shared"])
+    _build_wheel(tmpdir, "shared")
+
+    test = plan_shards(_resolved("alpha", "alpha-helper", "beta", "shared"), str(tmpdir), 4, SUPPORTED)
+
+    assert sorted(_names(test)) == [["alpha", "alpha-helper"], ["beta"], ["shared"]]
+
+
+def test_plan_shards_balances_by_size(tmpdir):
+    _build_wheel(tmpdir, "large", padding=100000)
+    _build_wheel(tmpdir, "medium", padding=60000)
+    _build_wheel(tmpdir, "small", padding=50000)
+
+    test = plan_shards(_resolved("large", "medium", "small"), str(tmpdir), 2, SUPPORTED)
+
+    assert _names(test) == [["medium", "small"], ["large"]]
+
+
+def test_plan_shards_without_dependencies(tmpdir):
+    _build_wheel(tmpdir, "alpha", ["beta"])
+    _build_wheel(tmpdir, "beta")
+
+    test = plan_shards(_resolved("alpha", "beta"), str(tmpdir), 2)
+
+    assert sorted(_names(test)) == [["alpha"], ["beta"]]
+
+
+@pytest.mark.parametrize("shard_count", (1, 5))
+def test_plan_shards_count(tmpdir, shard_count):
+    test = plan_shards(_resolved("alpha", "beta", "gamma"), str(tmpdir), shard_count)
+
+    assert len(test) == min(shard_count, 3)
+    assert sorted(package.Name for shard in test for package in shard) == ["alpha", "beta", "gamma"]
@@ -0,0 +1,89 @@
+"""Unit tests for ``accretion_common.venv_magic.source_builds``."""
+import py
+import pytest
+
+from accretion_common.venv_magic import source_builds
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+SDIST_SHA256 = "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
+
+
+@pytest.mark.parametrize(
+    "memory_size, cpus, jobs",
+    (
+        pytest.param(None, 4, 4, id="not in Lambda"),
+        pytest.param("128", 2, 1, id="fraction of a vCPU"),
+        pytest.param("2048", 2, 2, id="two vCPUs"),
+        pytest.param("3008", 8, 2, id="fewer vCPUs than visible CPUs"),
+        pytest.param("10240", 2, 2, id="fewer visible CPUs than vCPUs"),
+    ),
+)
+def test_build_jobs(monkeypatch, memory_size, cpus, jobs):
+    monkeypatch.setattr(source_builds.os, "cpu_count", lambda: cpus)
+    if memory_size is None:
+        monkeypatch.delenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", raising=False)
+    else:
+        monkeypatch.setenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", memory_size)
+
+    assert source_builds.build_jobs() == jobs
+
+
+def _sdist(tmpdir):
+    sdist = tmpdir.join("example-1.0.tar.gz")
+    sdist.write("test")
+    return str(sdist)
+
+
+def test_wheel_for_builds_and_stores(tmpdir, mocker):
+    def _build(venv_dir, sdist, wheel_dir, find_links):
+        wheel = py.path.local(wheel_dir).ensure("example-1.0-cp37-cp37m-linux_x86_64.whl")
+        wheel.write("wheel")
+        return str(wheel)
+
+    build = mocker.patch.object(source_builds, "build_wheel", side_effect=_build)
+    s3_client = mocker.Mock()
+    s3_client.list_objects_v2.return_value = {}
+    cache = source_builds.SourceBuildCache(
+        cache_dir=str(tmpdir.join("cache")),
+        runtime="python3.7",
+        platform="linux_x86_64",
+        s3_client=s3_client,
+        bucket_name="bucket",
+    )
+
+    first = cache.wheel_for(venv_dir="venv", sdist=_sdist(tmpdir), find_links="downloads")
+    second = cache.wheel_for(venv_dir="venv", sdist=_sdist(tmpdir), find_links="downloads")
+
+    assert first == second
+    build.assert_called_once()
+    s3_client.upload_file.assert_called_once_with(
+        Filename=first,
+        Bucket="bucket",
+        Key=f"accretion/wheels/_built/{SDIST_SHA256}/python3.7/linux_x86_64/example-1.0-cp37-cp37m-linux_x86_64.whl",
+    )
+
+
+def test_wheel_for_shared_hit(tmpdir, mocker):
+    build = mocker.patch.object(source_builds, "build_wheel")
+    key = f"accretion/wheels/_built/{SDIST_SHA256}/python3.7/linux_x86_64/example-1.0-cp37-cp37m-linux_x86_64.whl"
+    s3_client = mocker.Mock()
+    s3_client.list_objects_v2.return_value = {"Contents": [{"Key": key}]}
+    s3_client.download_file.side_effect = lambda Bucket, Key, Filename: open(Filename, "w").write("wheel")
+    cache = source_builds.SourceBuildCache(
+        cache_dir=str(tmpdir.join("cache")),
+        runtime="python3.7",
+        platform="linux_x86_64",
+        s3_client=s3_client,
+        bucket_name="bucket",
+    )
+
+    test = cache.wheel_for(venv_dir="venv", sdist=_sdist(tmpdir), find_links="downloads")
+
+    assert test.endswith("/python3.7/linux_x86_64/example-1.0-cp37-cp37m-linux_x86_64.whl")
+    assert open(test).read() == "wheel"
+    s3_client.list_objects_v2.assert_called_once_with(
+        Bucket="bucket", Prefix=f"accretion/wheels/_built/{SDIST_SHA256}/python3.7/linux_x86_64/"
+    )
+    build.assert_not_called()
+    s3_client.upload_file.assert_not_called()
@@ -0,0 +1,72 @@
+"""Unit tests for ``accretion_common.venv_magic.targets``."""
+import pytest
+
+from accretion_common.venv_magic.targets import RUNTIME_TARGETS, is_runtime_independent
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+def test_tags_ranking():
+    tags = RUNTIME_TARGETS["python3.6"].tags()
+
+    assert tags["cp36-cp36m-manylinux2014_x86_64"] < tags["cp36-cp36m-manylinux1_x86_64"]
+    assert tags["cp36-cp36m-manylinux1_x86_64"] < tags["cp36-abi3-manylinux1_x86_64"]
+    assert tags["cp36-abi3-manylinux1_x86_64"] < tags["py3-none-any"]
+    assert "cp37-cp37m-manylinux1_x86_64" not in tags
+    assert "cp36-cp36m-macosx_10_9_x86_64" not in tags
+
+
+@pytest.mark.parametrize(
+    "tag, independent",
+    (
+        ("py3-none-any", True),
+        ("py2-none-any", True),
+        ("cp37-none-any", True),
+        ("cp34-abi3-manylinux1_x86_64", False),
+        ("py3-none-manylinux1_x86_64", False),
+        ("not-a-tag", False),
+    ),
+)
+def test_is_runtime_independent(tag, independent):
+    assert is_runtime_independent(tag) is independent
+
+
+@pytest.mark.parametrize(
+    "tags, can_share",
+    (
+        pytest.param([["py2-none-any", "py3-none-any"], ["py3-none-any"]], True, id="pure python"),
+        pytest.param([["py3-none-any"], ["cp36-cp36m-manylinux1_x86_64"]], False, id="native"),
+        pytest.param([["py3-none-any"], []], False, id="not installed from a wheel"),
+        pytest.param([["cp37-none-any"]], False, id="other interpreter"),
+        pytest.param([], True, id="nothing installed"),
+    ),
+)
+def test_can_share(tags, can_share):
+    installed = [dict(Name=f"example{index}", Version="1.0", Tags=tag) for index, tag in enumerate(tags)]
+
+    assert RUNTIME_TARGETS["python3.6"].can_share(installed) is can_share
+
+
+def test_marker_environment():
+    environment = RUNTIME_TARGETS["python3.7"].marker_environment()
+
+    assert environment["python_version"] == "3.7"
+    assert environment["python_full_version"] == "3.7.0"
+    assert environment["sys_platform"] == "linux"
+    assert environment["platform_machine"] == "x86_64"
+
+
+def test_pip_args():
+    test = RUNTIME_TARGETS["python3.6"].pip_args("manylinux1_x86_64")
+
+    assert test == [
+        "--only-binary=:all:",
+        "--implementation",
+        "cp",
+        "--python-version",
+        "36",
+        "--abi",
+        "cp36m",
+        "--platform",
+        "manylinux1_x86_64",
+    ]
@@ -0,0 +1,73 @@
+"""Unit tests for ``accretion_common.venv_magic.timeline``."""
+import pytest
+
+from accretion_common.venv_magic.execution import PipEvent
+from accretion_common.venv_magic.timeline import BuildTimeline, parse_pip_size
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+@pytest.mark.parametrize(
+    "size, expected",
+    (
+        ("57kB", 57000),
+        ("1.2MB", 1200000),
+        ("150 kB", 150000),
+        ("812B", 812),
+        (None, None),
+        ("unknown", None),
+    ),
+)
+def test_parse_pip_size(size, expected):
+    assert parse_pip_size(size) == expected
+
+
+def test_measure():
+    timeline = BuildTimeline()
+
+    with pytest.raises(ValueError):
+        with timeline.measure("Example_Package", "build") as entry:
+            entry.Cache = "miss"
+            raise ValueError("failed")
+
+    test = timeline.to_dict()
+    assert [(entry["Package"], entry["Stage"], entry["Cache"]) for entry in test["Entries"]] == [
+        ("example-package", "build", "miss")
+    ]
+
+
+def test_pip_events(mocker):
+    mocker.patch("accretion_common.venv_magic.timeline.time.time", return_value=20.0)
+    timeline = BuildTimeline()
+
+    with timeline.pip_events("resolve") as on_event:
+        on_event(PipEvent(Action="collect", Package="requests>=2", Timestamp=0.0))
+        on_event(
+            PipEvent(Action="download", Package="requests-2.22.0-py2.py3-none-any.whl", Size="57kB", Timestamp=1.0)
+        )
+        on_event(PipEvent(Action="process", Package="/tmp/cache/urllib3-1.25.7-py2.py3-none-any.whl", Timestamp=4.0))
+        on_event(PipEvent(Action="saved", Package="requests-2.22.0-py2.py3-none-any.whl", Timestamp=5.0))
+        on_event(PipEvent(Action="installed", Package="requests urllib3", Timestamp=6.0))
+
+    entries = {entry["Package"]: entry for entry in timeline.to_dict()["Entries"]}
+    assert set(entries) == {"requests", "urllib3"}
+    assert entries["requests"]["Seconds"] == 5.0
+    assert entries["requests"]["Bytes"] == 57000
+    assert entries["requests"]["Cache"] == "miss"
+    assert entries["urllib3"]["Seconds"] == 1.0
+    assert entries["urllib3"]["Cache"] == "hit"
+
+
+def test_to_dict_packages():
+    timeline = BuildTimeline()
+    timeline.record("fast", "download", 1.0, bytes_transferred=10, cache="miss")
+    timeline.record("slow", "download", 2.0, bytes_transferred=100, cache="miss")
+    timeline.record("slow", "build", 60.0, cache="miss")
+    timeline.record("fast", "install", 0.5)
+
+    test = timeline.to_dict()
+
+    assert test["Packages"] == [
+        dict(Package="slow", Seconds=62.0, Bytes=100, Stages=dict(download=2.0, build=60.0)),
+        dict(Package="fast", Seconds=1.5, Bytes=10, Stages=dict(download=1.0, install=0.5)),
+    ]
@@ -1,8 +1,9 @@
 """Unit tests for ``accretion_common.venv_magic.uploader``."""
-from typing import Dict, Iterable
+from typing import Any, Dict, Iterable
 
 import pytest
 
+from accretion_common.util import BuildOptions
 from accretion_common.venv_magic import uploader
 
 pytestmark = [pytest.mark.local, pytest.mark.functional]
@@ -13,18 +14,41 @@ pytestmark = [pytest.mark.local, pytest.mark.functional]
     (
         (
             (
-                dict(Name="asdf", Details="123"),
-                dict(Name="zz", Details="333"),
-                dict(Name="ff", Details="[3214];wutwut"),
+                dict(Name="asdf", Version="123"),
+                dict(Name="zz", Version="333"),
+                dict(Name="ff", Version="[3214];wutwut"),
             ),
             "python",
             "2babf317cda24b98133b8937ca952e64154f3c00a14bb83b7c20a2e2b13a0237",
         ),
     ),
 )
-def test_key_hash(installed: Iterable[Dict[str, str]], runtime_name: str, expected_hash: str):
+def test_key_hash(installed: Iterable[Dict[str, Any]], runtime_name: str, expected_hash: str):
     test = uploader._key_hash(installed=installed, runtime_name=runtime_name, force_new=False)
     test_unique = uploader._key_hash(installed=installed, runtime_name=runtime_name, force_new=True)
 
     assert test == expected_hash
     assert test_unique != expected_hash
+
+
+def test_artifact_key_matches_build_key():
+    installed = (dict(Name="asdf", Version="123"), dict(Name="zz", Version="333"))
+
+    test = uploader.artifact_key(project_name="my-project", installed=installed, runtime_name="python")
+
+    assert test == f"accretion/artifacts/my-project/{uploader._key_hash(installed, 'python', False)}.zip"
+
+
+def test_key_hash_options():
+    installed = (dict(Name="asdf", Version="123"),)
+    default = uploader._key_hash(installed=installed, runtime_name="python", force_new=False)
+
+    test_default = uploader._key_hash(
+        installed=installed, runtime_name="python", force_new=False, options=BuildOptions()
+    )
+    test_precompile = uploader._key_hash(
+        installed=installed, runtime_name="python", force_new=False, options=BuildOptions(Precompile=True)
+    )
+
+    assert test_default == default
+    assert test_precompile != default
@@ -0,0 +1,106 @@
+"""Unit tests for ``accretion_common.venv_magic.wheel_cache``."""
+import hashlib
+import os
+
+import pytest
+
+from accretion_common.constants import WHEELS_PREFIX
+from accretion_common.util import PackageDetails
+from accretion_common.venv_magic import wheel_cache
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+class _FakeS3:
+    def __init__(self, filenames):
+        self.objects = {}
+        for filename in filenames:
+            body = filename.encode("utf-8")
+            name = wheel_cache.parse_distribution_filename(filename)[0]
+            self.objects[f"{WHEELS_PREFIX}{name}/{hashlib.sha256(body).hexdigest()}/{filename}"] = body
+        self.listed = []
+
+    def get_paginator(self, operation_name):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        self.listed.append(Prefix)
+        yield {"Contents": [dict(Key=key) for key in sorted(self.objects) if key.startswith(Prefix)]}
+
+    def download_file(self, Bucket, Key, Filename):
+        with open(Filename, "wb") as target:
+            target.write(self.objects[Key])
+
+
+@pytest.mark.parametrize(
+    "filename, name, version",
+    (
+        ("attrs-19.1.0-py2.py3-none-any.whl", "attrs", "19.1.0"),
+        ("zope.interface-4.6.0-cp37-cp37m-manylinux1_x86_64.whl", "zope-interface", "4.6.0"),
+        ("Click-7.0-py2.py3-none-any.whl", "click", "7.0"),
+        ("awacs-0.9.2.tar.gz", "awacs", "0.9.2"),
+        ("python-dateutil-2.8.0.tar.gz", "python-dateutil", "2.8.0"),
+        ("some_project-1.0.zip", "some-project", "1.0"),
+    ),
+)
+def test_parse_distribution_filename(filename: str, name: str, version: str):
+    assert wheel_cache.parse_distribution_filename(filename) == (name, version)
+
+
+def test_parse_distribution_filename_unknown():
+    with pytest.raises(ValueError) as excinfo:
+        wheel_cache.parse_distribution_filename("attrs-19.1.0.exe")
+
+    excinfo.match(r"Unknown distribution file type: *")
+
+
+def test_evict_least_recently_used(tmpdir):
+    cache = wheel_cache.WheelCache(cache_dir=str(tmpdir), max_bytes=25)
+    for age, filename in enumerate(("c-1.0.tar.gz", "b-1.0-py3-none-any.whl", "a-1.0-py3-none-any.whl")):
+        entry = tmpdir.join(filename)
+        entry.write("x" * 10)
+        os.utime(str(entry), (1000 - age, 1000 - age))
+    tmpdir.join("not-a-distribution.txt").write("x" * 100)
+
+    cache.evict()
+
+    assert sorted(os.listdir(str(tmpdir))) == ["b-1.0-py3-none-any.whl", "c-1.0.tar.gz", "not-a-distribution.txt"]
+
+
+def test_evict_keep(tmpdir):
+    cache = wheel_cache.WheelCache(cache_dir=str(tmpdir), max_bytes=25)
+    for age, filename in enumerate(("c-1.0.tar.gz", "b-1.0-py3-none-any.whl", "a-1.0-py3-none-any.whl")):
+        entry = tmpdir.join(filename)
+        entry.write("x" * 10)
+        os.utime(str(entry), (1000 - age, 1000 - age))
+
+    cache.evict(max_bytes=0, keep=["c-1.0.tar.gz"])
+
+    assert os.listdir(str(tmpdir)) == ["c-1.0.tar.gz"]
+
+
+def test_prefetch_newest_matching(tmpdir):
+    s3 = _FakeS3(
+        (
+            "attrs-19.1.0-py2.py3-none-any.whl",
+            "attrs-19.3.0-py2.py3-none-any.whl",
+            "attrs-20.1.0-py2.py3-none-any.whl",
+            "Click-7.0-py2.py3-none-any.whl",
+            "six-1.12.0-py2.py3-none-any.whl",
+        )
+    )
+    cache = wheel_cache.WheelCache(cache_dir=str(tmpdir), max_bytes=1024, s3_client=s3, bucket_name="bucket")
+    downloaded = []
+
+    cache.prefetch(
+        [
+            PackageDetails(Name="attrs", Details="<20"),
+            PackageDetails(Name="click", Details=""),
+            PackageDetails(Name="example", Details=" @ https://example.com/example.zip"),
+        ],
+        on_download=lambda filename, seconds, size: downloaded.append(filename),
+    )
+
+    assert sorted(os.listdir(str(tmpdir))) == ["Click-7.0-py2.py3-none-any.whl", "attrs-19.3.0-py2.py3-none-any.whl"]
+    assert sorted(downloaded) == sorted(os.listdir(str(tmpdir)))
+    assert sorted(s3.listed) == [f"{WHEELS_PREFIX}attrs/", f"{WHEELS_PREFIX}click/"]
@@ -0,0 +1,288 @@
+"""Unit tests for ``accretion_common.venv_magic.zipper``."""
+import io
+import logging
+import os
+import time
+import zipfile
+
+import pytest
+
+from accretion_common.venv_magic import zipper
+from accretion_common.venv_magic.filters import FileFilter
+from accretion_common.venv_magic.zipper import build_zip, compression_stats, merge_zips
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+class _Unseekable(io.RawIOBase):
+    """Output stream that, like a streaming S3 upload, can only be written forwards."""
+
+    def __init__(self):
+        super().__init__()
+        self.buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+
+def _archive(tmpdir, name, files):
+    build_dir = tmpdir.mkdir(f"{name}-build")
+    for path, contents in files.items():
+        build_dir.join(path).write(contents, ensure=True)
+    archive = tmpdir.join(f"{name}.zip")
+    archive.write_binary(build_zip(str(build_dir)).getvalue())
+    return str(archive)
+
+
+def test_merge_zips(tmpdir):
+    first = _archive(tmpdir, "first", {"alpha/__init__.py": "A = 1\n", "shared/__init__.py": "FIRST = True\n"})
+    second = _archive(tmpdir, "second", {"beta/__init__.py": "B = 2\n", "shared/__init__.py": "FIRST = False\n"})
+
+    with zipfile.ZipFile(merge_zips([first, second])) as test:
+        assert sorted(test.namelist()) == [
+            "python/alpha/__init__.py",
+            "python/beta/__init__.py",
+            "python/shared/__init__.py",
+        ]
+        assert test.read("python/shared/__init__.py") == b"FIRST = True\n"
+        assert test.testzip() is None
+
+
+def test_merge_zips_copies_compressed_entries(tmpdir):
+    first = _archive(tmpdir, "first", {"alpha/data.txt": "alpha " * 1000})
+
+    with zipfile.ZipFile(first) as source, zipfile.ZipFile(merge_zips([first])) as test:
+        original = source.getinfo("python/alpha/data.txt")
+        merged = test.getinfo("python/alpha/data.txt")
+        assert (merged.CRC, merged.compress_size, merged.compress_type) == (
+            original.CRC,
+            original.compress_size,
+            original.compress_type,
+        )
+
+
+def test_merge_zips_reuse(tmpdir):
+    shard = _archive(tmpdir, "shard", {"beta/__init__.py": "B = 3\n"})
+    previous = _archive(tmpdir, "previous", {"alpha/__init__.py": "A = 1\n", "beta/__init__.py": "B = 2\n"})
+
+    with zipfile.ZipFile(merge_zips([shard], reuse_from=previous, reused_members=["python/alpha/__init__.py"])) as test:
+        assert sorted(test.namelist()) == ["python/alpha/__init__.py", "python/beta/__init__.py"]
+        assert test.read("python/beta/__init__.py") == b"B = 3\n"
+
+
+def test_build_zip_parallel(tmpdir):
+    build_dir = tmpdir.mkdir("build")
+    files = {f"package{index}/module{index}.py": f"VALUE = {index}\n" * 100 for index in range(20)}
+    for path, contents in files.items():
+        build_dir.join(path).write(contents, ensure=True)
+    build_dir.join("empty.txt").write("")
+
+    serial = zipfile.ZipFile(build_zip(str(build_dir)))
+    test = zipfile.ZipFile(build_zip(str(build_dir), workers=4))
+
+    assert test.testzip() is None
+    assert test.namelist() == serial.namelist()
+    for info in test.infolist():
+        original = serial.getinfo(info.filename)
+        assert info.compress_type == (zipfile.ZIP_DEFLATED if info.file_size else zipfile.ZIP_STORED)
+        assert (info.CRC, info.file_size, info.date_time) == (original.CRC, original.file_size, original.date_time)
+        assert test.read(info) == serial.read(original)
+    assert test.getinfo("python/package0/module0.py").compress_size < len(files["package0/module0.py"])
+
+
+def test_build_zip_adaptive_compression(tmpdir):
+    build_dir = tmpdir.mkdir("build")
+    build_dir.join("example/__init__.py").write("VALUE = 1\n" * 1000, ensure=True)
+    build_dir.join("example/data.gz").write_binary(b"\x1f\x8b" + bytes(4096))
+    build_dir.join("example/random.bin").write_binary(os.urandom(4096))
+    build_dir.join("example/zeros.bin").write_binary(bytes(4096))
+
+    test = zipfile.ZipFile(build_zip(str(build_dir), workers=2))
+
+    assert test.testzip() is None
+    assert {info.filename: info.compress_type for info in test.infolist()} == {
+        "python/example/__init__.py": zipfile.ZIP_DEFLATED,
+        "python/example/data.gz": zipfile.ZIP_STORED,
+        "python/example/random.bin": zipfile.ZIP_STORED,
+        "python/example/zeros.bin": zipfile.ZIP_DEFLATED,
+    }
+    assert compression_stats(test.infolist()) == {
+        ".bin": dict(
+            Files=2, Stored=1, Size=8192, CompressedSize=4096 + test.getinfo("python/example/zeros.bin").compress_size
+        ),
+        ".py": dict(
+            Files=1, Stored=0, Size=10000, CompressedSize=test.getinfo("python/example/__init__.py").compress_size
+        ),
+        ".gz": dict(Files=1, Stored=1, Size=4098, CompressedSize=4098),
+    }
+
+
+@pytest.mark.parametrize("reproducible", (False, True))
+def test_build_zip_streams_large_files(tmpdir, monkeypatch, reproducible):
+    monkeypatch.setattr(zipper, "_STREAMED_SIZE", 2048)
+    build_dir = tmpdir.mkdir("build")
+    build_dir.join("example/__init__.py").write("VALUE = 1\n" * 1000, ensure=True)
+    build_dir.join("example/random.bin").write_binary(os.urandom(4096))
+    build_dir.join("example/small.py").write("VALUE = 2\n" * 100, ensure=True)
+
+    test = zipfile.ZipFile(build_zip(str(build_dir), workers=2, reproducible=reproducible))
+
+    assert test.testzip() is None
+    assert test.read("python/example/__init__.py") == b"VALUE = 1\n" * 1000
+    # Streamed members put their sizes in a data descriptor after their data.
+    assert test.getinfo("python/example/__init__.py").flag_bits & 0x08
+    assert not test.getinfo("python/example/small.py").flag_bits & 0x08
+    assert {info.filename: info.compress_type for info in test.infolist()} == {
+        "python/example/__init__.py": zipfile.ZIP_DEFLATED,
+        "python/example/random.bin": zipfile.ZIP_STORED,
+        "python/example/small.py": zipfile.ZIP_DEFLATED,
+    }
+    archive = tmpdir.join("streamed.zip")
+    archive.write_binary(test.fp.getvalue())
+    with zipfile.ZipFile(merge_zips([str(archive)])) as merged:
+        assert merged.testzip() is None
+        assert merged.read("python/example/random.bin") == test.read("python/example/random.bin")
+
+
+def test_build_zip_bounds_pending_size(tmpdir, monkeypatch):
+    build_dir = tmpdir.mkdir("build")
+    for index in range(20):
+        build_dir.join(f"package{index}/module{index}.py").write(f"VALUE = {index}\n" * 100, ensure=True)
+    unbounded = build_zip(str(build_dir), workers=4, reproducible=True).getvalue()
+    monkeypatch.setattr(zipper, "_PENDING_SIZE", 1)
+
+    test = build_zip(str(build_dir), workers=4, reproducible=True).getvalue()
+
+    assert test == unbounded
+
+
+def _reproducible_build(tmpdir, name, files, mtime, mode):
+    build_dir = tmpdir.mkdir(name)
+    for path, contents in files:
+        build_dir.join(path).write(contents, ensure=True)
+        os.chmod(str(build_dir.join(path)), mode)
+        os.utime(str(build_dir.join(path)), (mtime, mtime))
+    return str(build_dir)
+
+
+@pytest.mark.parametrize("workers", (None, 2))
+def test_build_zip_reproducible(tmpdir, workers):
+    files = [("beta/__init__.py", "B = 2\n"), ("alpha/__init__.py", "A = 1\n"), ("alpha/bin/tool", "#!/bin/sh\n")]
+    first = _reproducible_build(tmpdir, "first", files, 1561000000, 0o664)
+    second = _reproducible_build(tmpdir, "second", list(reversed(files)), 1562000000, 0o644)
+    os.chmod(os.path.join(first, "alpha", "bin", "tool"), 0o775)
+    os.chmod(os.path.join(second, "alpha", "bin", "tool"), 0o755)
+
+    test = build_zip(first, workers=workers, reproducible=True).getvalue()
+
+    assert test == build_zip(second, workers=workers, reproducible=True).getvalue()
+    with zipfile.ZipFile(io.BytesIO(test)) as archive:
+        assert archive.namelist() == sorted(archive.namelist())
+        assert {info.date_time for info in archive.infolist()} == {(1980, 1, 1, 0, 0, 0)}
+        assert archive.getinfo("python/alpha/bin/tool").external_attr >> 16 == 0o100755
+        assert archive.getinfo("python/alpha/__init__.py").external_attr >> 16 == 0o100644
+
+
+@pytest.fixture
+def west_of_utc(monkeypatch):
+    monkeypatch.setenv("TZ", "America/Los_Angeles")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.parametrize("workers", (None, 2))
+def test_build_zip_reproducible_earliest_time(tmpdir, west_of_utc, workers):
+    files = [("alpha/__init__.py", "A = 1\n"), ("alpha/module.py", "VALUE = 1\n" * 1000)]
+    build_dir = _reproducible_build(tmpdir, "build", files, zipper.REPRODUCIBLE_TIMESTAMP, 0o644)
+
+    test = build_zip(build_dir, workers=workers, reproducible=True)
+
+    with zipfile.ZipFile(test) as archive:
+        assert archive.testzip() is None
+        assert {info.date_time for info in archive.infolist()} == {(1980, 1, 1, 0, 0, 0)}
+
+
+def test_merge_zips_reproducible(tmpdir):
+    first = _archive(tmpdir, "first", {"zeta/__init__.py": "Z = 1\n"})
+    second = _archive(tmpdir, "second", {"alpha/__init__.py": "A = 1\n"})
+
+    test = merge_zips([first, second], reproducible=True).getvalue()
+
+    assert test == merge_zips([second, first], reproducible=True).getvalue()
+    with zipfile.ZipFile(io.BytesIO(test)) as archive:
+        assert archive.namelist() == ["python/alpha/__init__.py", "python/zeta/__init__.py"]
+
+
+def test_build_zip_file_filter(tmpdir):
+    build_dir = tmpdir.mkdir("build")
+    for path in (
+        "example/__init__.py",
+        "example/tests/test_example.py",
+        "example-1.0.dist-info/INSTALLER",
+        "example-1.0.dist-info/LICENSE",
+    ):
+        build_dir.join(path).write("", ensure=True)
+
+    test = build_zip(str(build_dir), file_filter=FileFilter.from_name("slim"))
+
+    with zipfile.ZipFile(test) as archive:
+        assert sorted(archive.namelist()) == ["python/example-1.0.dist-info/LICENSE", "python/example/__init__.py"]
+
+
+def test_raw_writes_unseekable_output(tmpdir, monkeypatch):
+    monkeypatch.setattr(zipper, "_STREAMED_SIZE", 2048)
+    previous = _archive(tmpdir, "previous", {"example/reused.py": "VALUE = 0\n" * 100})
+    build_dir = tmpdir.mkdir("build")
+    build_dir.join("example/__init__.py").write("VALUE = 1\n" * 1000, ensure=True)
+    build_dir.join("example/random.bin").write_binary(os.urandom(4096))
+    build_dir.join("example/small.py").write("VALUE = 2\n" * 100, ensure=True)
+    output = _Unseekable()
+
+    build_zip(
+        str(build_dir), reuse_from=previous, reused_members=["python/example/reused.py"], output=output, workers=2
+    )
+
+    built = tmpdir.join("built.zip")
+    built.write_binary(output.buffer.getvalue())
+    with zipfile.ZipFile(str(built)) as archive:
+        assert archive.testzip() is None
+        assert archive.read("python/example/reused.py") == b"VALUE = 0\n" * 100
+        assert archive.read("python/example/__init__.py") == b"VALUE = 1\n" * 1000
+        assert archive.read("python/example/small.py") == b"VALUE = 2\n" * 100
+    merged = _Unseekable()
+    merge_zips([str(built), previous], output=merged)
+    with zipfile.ZipFile(io.BytesIO(merged.buffer.getvalue())) as archive:
+        assert archive.testzip() is None
+        assert sorted(archive.namelist()) == [
+            "python/example/__init__.py",
+            "python/example/random.bin",
+            "python/example/reused.py",
+            "python/example/small.py",
+        ]
+
+
+def test_require_raw_writes(monkeypatch):
+    with zipfile.ZipFile(io.BytesIO(), mode="w") as archive:
+        zipper._require_raw_writes(archive)
+        with monkeypatch.context() as patch, pytest.raises(RuntimeError) as excinfo:
+            patch.delattr(archive, "start_dir")
+            zipper._require_raw_writes(archive)
+
+    excinfo.match("zipfile.ZipFile is missing internals needed to write zip files: start_dir")
+
+
+def test_build_zip_logs_compression_stats(tmpdir, caplog):
+    build_dir = tmpdir.mkdir("build")
+    build_dir.join("example/__init__.py").write("VALUE = 1\n" * 100, ensure=True)
+
+    with caplog.at_level(logging.INFO, logger=zipper.__name__):
+        build_zip(str(build_dir), workers=1)
+
+    assert any(
+        record.getMessage().startswith("Compression of .py files: 1 files (0 stored)") for record in caplog.records
+    )
@@ -0,0 +1,189 @@
+"""Track and enforce the Lambda ``/tmp`` disk and memory budgets while building artifacts."""
+import logging
+import os
+import resource
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import attr
+from accretion_common.exceptions import ResourceLimitError
+from accretion_common.util import PackageDetails, canonical_name
+from accretion_common.venv_magic.multipart import DEFAULT_PART_SIZE
+from accretion_common.venv_magic.wheel_cache import parse_distribution_filename
+from accretion_common.venv_magic.zipper import COMPRESSION_WINDOW_SIZE
+
+__all__ = ("BuildBudget", "directory_size", "distribution_files", "projected_install_size")
+_LOGGER = logging.getLogger(__name__)
+_MEMORY_SIZE_ENV = "AWS_LAMBDA_FUNCTION_MEMORY_SIZE"
+_MIB = 1024 * 1024
+# Installed distributions are typically about three times the size of their compressed distribution files.
+_INSTALLED_EXPANSION = 3
+# Streaming an artifact holds one part that is being written and one more that is uploading,
+# along with the files that are being compressed into the next part.
+_STREAMING_MEMORY = 2 * DEFAULT_PART_SIZE + COMPRESSION_WINDOW_SIZE
+Evictor = Tuple[str, Callable[[], None]]
+
+
+def _memory_limit() -> Optional[int]:
+    try:
+        return int(os.environ[_MEMORY_SIZE_ENV]) * _MIB
+    except (KeyError, ValueError):
+        return None
+
+
+def _memory_used() -> int:
+    """Find the current resident memory of this process."""
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return _peak_memory_used()
+
+
+def _peak_memory_used() -> int:
+    """Find the peak resident memory of this process or any of its subprocesses."""
+    return 1024 * max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+
+
+def directory_size(path: str) -> int:
+    """Total the sizes of every file under ``path``."""
+    return sum(
+        os.path.getsize(os.path.join(root, filename))
+        for root, _dirs, files in os.walk(path)
+        for filename in files
+        if not os.path.islink(os.path.join(root, filename))
+    )
+
+
+def distribution_files(download_dir: str, resolved: Iterable[PackageDetails]) -> List[str]:
+    """Find every distribution file in ``download_dir`` for a resolved set of requirements."""
+    pinned = {(canonical_name(package.Name), package.Details[2:]) for package in resolved}
+    files = []
+    for filename in os.listdir(download_dir):
+        try:
+            if parse_distribution_filename(filename) in pinned:
+                files.append(filename)
+        except ValueError:
+            continue
+    return files
+
+
+def projected_install_size(download_dir: str, resolved: Iterable[PackageDetails]) -> int:
+    """Estimate how much space installing ``resolved`` from the distribution files in ``download_dir`` will use."""
+    return _INSTALLED_EXPANSION * sum(
+        os.path.getsize(os.path.join(download_dir, filename)) for filename in distribution_files(download_dir, resolved)
+    )
+
+
+@attr.s
+class BuildBudget:
+    """Track disk and memory use during each phase of a build and make room when a phase would run out.
+
+    Lambda ``/tmp`` is its own file system, so its total size is the disk budget.
+    The memory budget is the memory configured for the function.
+
+    :param str tmp_dir: Directory that all build files are written to
+    :param int memory_limit: Memory available to the build (optional: default is the Lambda function memory size)
+    :param float threshold: Fraction of each budget that a build may project to use before we make room
+    """
+
+    tmp_dir: str = attr.ib(default="/tmp")  # nosec : bandit B108 tempdir doesn't work in Lambda
+    memory_limit: Optional[int] = attr.ib(default=attr.Factory(_memory_limit))
+    threshold: float = attr.ib(default=0.9)
+    _phases: List[Dict[str, Any]] = attr.ib(default=attr.Factory(list), init=False)
+    _evicted: List[str] = attr.ib(default=attr.Factory(list), init=False)
+    _artifact_storage: Optional[str] = attr.ib(default=None, init=False)
+
+    @property
+    def disk_limit(self) -> int:
+        """Total size of the build file system."""
+        return shutil.disk_usage(self.tmp_dir).total
+
+    def disk_used(self) -> int:
+        """Find how much of the build file system is in use."""
+        return shutil.disk_usage(self.tmp_dir).used
+
+    def disk_available(self) -> int:
+        """Find how much more of the build file system a build can use."""
+        return int(self.disk_limit * self.threshold) - self.disk_used()
+
+    def memory_available(self) -> Optional[int]:
+        """Find how much more memory a build can use, if there is a known limit."""
+        if self.memory_limit is None:
+            return None
+        return int(self.memory_limit * self.threshold) - _memory_used()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Record resource use for a phase of the build.
+
+        :param str name: Phase name
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            record = dict(
+                Phase=name,
+                Seconds=round(time.monotonic() - start, 3),
+                DiskUsed=self.disk_used(),
+                MemoryUsed=_memory_used(),
+                PeakMemoryUsed=_peak_memory_used(),
+            )
+            _LOGGER.debug("Build phase resource use: %s", record)
+            self._phases.append(record)
+
+    def make_room(self, needed: int, evictors: Iterable[Evictor]) -> bool:
+        """Run evictors in order until ``needed`` bytes fit in the disk budget.
+
+        :param int needed: Bytes of disk that the next phase is projected to use
+        :param evictors: Pairs of name and action that each free up disk, in order of preference
+        :returns: Whether ``needed`` bytes now fit
+        """
+        for name, evict in evictors:
+            if self.disk_available() >= needed:
+                break
+            _LOGGER.info(
+                "Projected to need %d bytes of disk with %d available: evicting %s", needed, self.disk_available(), name
+            )
+            evict()
+            self._evicted.append(name)
+        return self.disk_available() >= needed
+
+    def artifact_storage(self, projected_size: int, evictors: Iterable[Evictor]) -> str:
+        """Decide where to build an artifact of about ``projected_size`` bytes.
+
+        Artifacts are streamed to S3 as they are built, which only needs memory for a couple of upload parts
+        and the files that are being compressed, whatever the size of the artifact.
+        If even that would exceed the memory budget, they are spilled to disk, making room first if necessary.
+
+        :param int projected_size: Projected artifact size in bytes
+        :param evictors: Pairs of name and action that each free up disk, in order of preference
+        :returns: ``stream`` or ``disk``
+        :raises ResourceLimitError: if the artifact fits in neither budget
+        """
+        memory_available = self.memory_available()
+        if memory_available is None or _STREAMING_MEMORY <= memory_available:
+            self._artifact_storage = "stream"
+        elif self.make_room(projected_size, evictors):
+            self._artifact_storage = "disk"
+        else:
+            raise ResourceLimitError(
+                f"Artifact of about {projected_size} bytes fits in neither the memory nor the disk budget"
+            )
+        _LOGGER.debug("Building %d byte artifact in %s", projected_size, self._artifact_storage)
+        return self._artifact_storage
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Describe the budgets and everything that was tracked against them."""
+        return dict(
+            DiskLimit=self.disk_limit,
+            MemoryLimit=self.memory_limit,
+            Phases=list(self._phases),
+            Evicted=list(self._evicted),
+            ArtifactStorage=self._artifact_storage,
+        )
@@ -1,9 +1,11 @@
 """Accretion requirements parser."""
 import logging
 import re
-from typing import Dict, Iterator, Union
+from typing import Any, Dict, Iterator, Optional, Union
 
-from accretion_common.util import PackageDetails
+from accretion_common.exceptions import InvalidRequestError, classified_handler
+from accretion_common.util import BuildOptions, PackageDetails
+from accretion_common.venv_magic.filters import FileFilter
 
 MAX_NAME_LENGTH = 70
 logger = logging.getLogger()
@@ -22,22 +24,22 @@ def _validate_name(project_name: str):
     :return:
     """
     if not re.fullmatch(r"[a-zA-Z0-9-_]+", project_name):
-        raise Exception(f"Project name must be a valid Lambda Layer name: {project_name!r}")
+        raise InvalidRequestError(f"Project name must be a valid Lambda Layer name: {project_name!r}")
 
     if len(project_name) > MAX_NAME_LENGTH:
-        raise Exception(f"Project name must not be longer than {MAX_NAME_LENGTH} characters")
+        raise InvalidRequestError(f"Project name must not be longer than {MAX_NAME_LENGTH} characters")
 
 
 def _validate_ready_requirements(requirements: Iterator[Dict[str, str]]):
     for req in requirements:
         if not req:
-            raise Exception(f"Invalid requirements: {req!r}")
+            raise InvalidRequestError(f"Invalid requirements: {req!r}")
 
 
 def _validate_languge(language: str) -> str:
     language = language.lower()
     if language != "python":
-        raise Exception(f"Unsupported language: {language!r}")
+        raise InvalidRequestError(f"Unsupported language: {language!r}")
 
     return language
 
@@ -50,7 +52,7 @@ def _normalize_requirements(
     try:
         parser = requirements_parsers[requirements_type]
     except KeyError:
-        raise Exception(f"Invalid requirements type: {requirements_type}")
+        raise InvalidRequestError(f"Invalid requirements type: {requirements_type}")
 
     logger.debug(f"Raw requirements: {requirements!r}")
     parsed_requirements = parser(requirements)
@@ -59,6 +61,16 @@ def _normalize_requirements(
     return parsed_requirements
 
 
+def _normalize_options(options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    try:
+        build_options = BuildOptions.from_dict(options)
+        FileFilter.from_options(build_options)
+        return build_options.to_dict()
+    except (TypeError, ValueError) as error:
+        raise InvalidRequestError(f"Invalid options: {error}")
+
+
+@classified_handler
 def lambda_handler(event, context):
     """Lambda entry point.
 
@@ -81,6 +93,9 @@ def lambda_handler(event, context):
             "Requirements": {
                 "Type": "requirements.txt",
                 "Requirements": "Raw contents of requirements.txt file format"
+            },
+            "Options": {
+                "Precompile": false
             }
         }
 
@@ -90,6 +105,12 @@ def lambda_handler(event, context):
         `runtime prefix <https://docs.aws.amazon.com/lambda/latest/dg/lambda-runtimes.html>`_
         (ex: "python", "java", etc).
 
+    .. note::
+
+        Options are optional. Any options that are not set use their defaults.
+
+        * **Precompile** : Compile all installed modules to bytecode for the target runtime (default: false)
+
     Return shape:
 
     .. code:: json
@@ -102,7 +123,10 @@ def lambda_handler(event, context):
                     "Name": "Requirement Name",
                     "Details": "Requirement version or other identifying details"
                 }
-            ]
+            ],
+            "Options": {
+                "Precompile": false
+            }
         }
 
     Required permissions:
@@ -121,7 +145,13 @@ def lambda_handler(event, context):
             requirements_type=event["Requirements"]["Type"], requirements=event["Requirements"]["Requirements"]
         )
 
-        return {"Name": event["Name"], "Language": valid_language, "Requirements": valid_requirements}
-    except Exception:
-        # TODO: Turn these into known-cause state machine failures.
-        raise
+        valid_options = _normalize_options(event.get("Options"))
+
+        return {
+            "Name": event["Name"],
+            "Language": valid_language,
+            "Requirements": valid_requirements,
+            "Options": valid_options,
+        }
+    except KeyError as error:
+        raise InvalidRequestError(f"Request is missing a required field: {error}") from error
@@ -0,0 +1,88 @@
+"""Stop starting new work in time to checkpoint a build before the Lambda timeout."""
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, TypeVar
+
+import attr
+
+__all__ = ("BuildWatchdog", "batches")
+_LOGGER = logging.getLogger(__name__)
+# Writing a checkpoint means packaging and uploading everything installed so far.
+CHECKPOINT_RESERVE_SECONDS = 180
+T = TypeVar("T")
+
+
+def _unbounded() -> int:
+    return sys.maxsize
+
+
+def batches(items: Iterable[T], size: int) -> List[List[T]]:
+    """Split ``items`` into batches of at most ``size`` items, in order."""
+    items = list(items)
+    return [items[index : index + size] for index in range(0, len(items), size)]
+
+
+@attr.s
+class BuildWatchdog:
+    """Decide whether there is enough time left in this invocation to start another unit of work.
+
+    Another unit of work is only started if, after it takes as long as the slowest unit so far,
+    there would still be ``reserve`` seconds left to checkpoint the build.
+
+    :param remaining_millis: Callable that returns the milliseconds left in this invocation
+        (optional: default is to never run out of time)
+    :param float reserve: Seconds to keep for writing a checkpoint
+    """
+
+    remaining_millis: Callable[[], int] = attr.ib(default=_unbounded)
+    reserve: float = attr.ib(default=CHECKPOINT_RESERVE_SECONDS)
+    _slowest: float = attr.ib(default=0.0, init=False)
+    _expired: bool = attr.ib(default=False, init=False)
+
+    @classmethod
+    def from_context(cls, context: Any, reserve: float = CHECKPOINT_RESERVE_SECONDS) -> "BuildWatchdog":
+        """Watch the deadline of a Lambda invocation.
+
+        :param context: Lambda context object (if it is not a Lambda context, we never run out of time)
+        :param float reserve: Seconds to keep for writing a checkpoint
+        """
+        remaining_millis = getattr(context, "get_remaining_time_in_millis", _unbounded)
+        return cls(remaining_millis=remaining_millis, reserve=reserve)
+
+    @property
+    def expired(self) -> bool:
+        """Whether we have already decided to stop starting new work."""
+        return self._expired
+
+    def remaining(self) -> float:
+        """Seconds left in this invocation."""
+        return self.remaining_millis() / 1000
+
+    @contextmanager
+    def unit(self):
+        """Measure a unit of work so that we can predict how long the next one will take."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._slowest = max(self._slowest, time.monotonic() - start)
+
+    def can_continue(self) -> bool:
+        """Determine whether there is time to start another unit of work and still write a checkpoint.
+
+        Once this returns ``False``, it always returns ``False``.
+        """
+        if not self._expired and self.remaining() - self._slowest < self.reserve:
+            _LOGGER.info(
+                "%.1f seconds left and the slowest step took %.1f seconds: stopping to checkpoint",
+                self.remaining(),
+                self._slowest,
+            )
+            self._expired = True
+        return not self._expired
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Describe the watchdog state."""
+        return dict(Remaining=round(self.remaining(), 3), Reserve=self.reserve, SlowestStep=round(self._slowest, 3))
@@ -1,28 +1,85 @@
 """Lambda Layer zip artifact_builder for Python dependencies."""
+import gzip
+import io
 import json
 import logging
 import os
 import shutil
 import sys
-from typing import Dict, Iterable
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import attr
 import boto3
-from accretion_common.constants import ARTIFACT_MANIFESTS_PREFIX
-from accretion_common.util import PackageDetails
-from accretion_common.venv_magic.builder import build_requirements
-from accretion_common.venv_magic.uploader import artifact_exists, efficient_build_and_upload_zip
+from accretion_common.constants import ARTIFACT_MANIFESTS_PREFIX, CHECKPOINTS_PREFIX, SHARDS_PREFIX
+from accretion_common.exceptions import BuildError, ExecutionError, InvalidRequestError, classified_handler
+from accretion_common.util import BuildOptions, PackageDetails
+from accretion_common.venv_magic.builder import build_requirements, resolve_requirements
+from accretion_common.venv_magic.compiler import precompile
+from accretion_common.venv_magic.cross_runtime import cross_runtime_blocker
+from accretion_common.venv_magic.delta import DeltaPlan, compare_archives, plan_delta
+from accretion_common.venv_magic.exclusions import (
+    RUNTIME_PROVIDED,
+    archive_requires,
+    installed_requires,
+    plan_exclusions,
+    remove_distribution,
+)
+from accretion_common.venv_magic.filters import FileFilter
+from accretion_common.venv_magic.installers import NativeWheelInstaller
+from accretion_common.venv_magic.resolution_cache import ResolutionCache, ResolutionLookup
+from accretion_common.venv_magic.shards import plan_shards
+from accretion_common.venv_magic.source_builds import SourceBuildCache
+from accretion_common.venv_magic.targets import RUNTIME_TARGETS, RuntimeTarget
+from accretion_common.venv_magic.timeline import BuildTimeline, TimelineEntry
+from accretion_common.venv_magic.uploader import (
+    artifact_exists,
+    artifact_key,
+    efficient_build_and_upload_zip,
+    upload_archive,
+)
+from accretion_common.venv_magic.wheel_cache import WheelCache
+from accretion_common.venv_magic.zipper import REPRODUCIBLE_TIMESTAMP, build_zip, merge_zips
+from botocore.exceptions import ClientError
+
+from accretion_workers.artifact_builder.budget import (
+    BuildBudget,
+    directory_size,
+    distribution_files,
+    projected_install_size,
+)
+from accretion_workers.artifact_builder.watchdog import BuildWatchdog, batches
 
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
 WORKING_DIR = "/tmp/accretion"  # nosec : bandit B108 tempdir doesn't work in Lambda; we have to use /tmp/ directly
-VENV_DIR = f"{WORKING_DIR}/venv"
+# The venv lives outside of WORKING_DIR so that warm invocations can reuse it.
+VENV_ROOT = "/tmp/accretion-venv"  # nosec : bandit B108 tempdir doesn't work in Lambda; we have to use /tmp/ directly
+VENV_DIR = f"{VENV_ROOT}/python{sys.version_info.major}.{sys.version_info.minor}"
+# The local wheel cache also lives outside of WORKING_DIR and is bounded to leave room for builds.
+WHEEL_CACHE_DIR = "/tmp/accretion-cache/wheels"  # nosec : bandit B108 tempdir doesn't work in Lambda
+WHEEL_CACHE_MAX_BYTES = 128 * 1024 * 1024
+SOURCE_BUILD_CACHE_DIR = "/tmp/accretion-cache/built-wheels"  # nosec : bandit B108 tempdir doesn't work in Lambda
 BUILD_DIR = f"{WORKING_DIR}/build"
+VALIDATION_BUILD_DIR = f"{WORKING_DIR}/validation-build"
+PREVIOUS_ARTIFACT = f"{WORKING_DIR}/previous-artifact.zip"
+CHECKPOINT_ARTIFACT = f"{WORKING_DIR}/checkpoint.zip"
+SHARD_ARTIFACTS_DIR = f"{WORKING_DIR}/shards"
+SPILLED_ARTIFACT = f"{WORKING_DIR}/artifact.zip"
 BUILD_INPUT = f"{WORKING_DIR}/build-input"
 BUILD_REQUIREMENTS = f"{WORKING_DIR}/build-requirements"
 BUILD_LOG = f"{WORKING_DIR}/build-log"
+BUILD_LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
 S3_BUCKET = "S3_BUCKET"
 _RUNTIME_NAMES = {3: {6: "python3.6", 7: "python3.7"}}
+# Only the most recent few manifests are checked when looking for a previous build to reuse.
+_PREVIOUS_BUILD_CANDIDATES = 5
+# Installs are split into batches of this many distributions so that a build can be checkpointed between them.
+_INSTALL_BATCH_SIZE = 10
+# Artifacts are deflated on every core that the builder has.
+_COMPRESSION_WORKERS = os.cpu_count() or 1
+# Without s3:ListBucket, S3 reports a missing key as access denied rather than not found.
+_MISSING_KEY_ERRORS = ("NoSuchKey", "404", "AccessDenied", "403")
 _is_setup = False
 
 
@@ -33,6 +90,19 @@ def _setup():
     global _s3
     _s3 = boto3.client("s3")
 
+    global _wheel_cache
+    _wheel_cache = WheelCache(
+        cache_dir=WHEEL_CACHE_DIR, max_bytes=WHEEL_CACHE_MAX_BYTES, s3_client=_s3, bucket_name=_bucket_name
+    )
+
+    global _source_builds
+    _source_builds = SourceBuildCache(
+        cache_dir=SOURCE_BUILD_CACHE_DIR, runtime=_runtime_name(), s3_client=_s3, bucket_name=_bucket_name
+    )
+
+    global _resolution_cache
+    _resolution_cache = ResolutionCache(s3_client=_s3, bucket_name=_bucket_name)
+
     global _is_setup
     _is_setup = True
 
@@ -41,11 +111,114 @@ def _clean_env():
     shutil.rmtree(WORKING_DIR, ignore_errors=True)
 
 
+def _start_build_log() -> logging.Handler:
+    """Capture everything logged during this build, including all pip output, in BUILD_LOG."""
+    os.makedirs(WORKING_DIR, exist_ok=True)
+    handler = logging.FileHandler(BUILD_LOG, encoding="utf-8")
+    handler.setLevel(logging.DEBUG)
+    handler.setFormatter(logging.Formatter(BUILD_LOG_FORMAT))
+    logger.addHandler(handler)
+    return handler
+
+
+def _stop_build_log(handler: logging.Handler):
+    logger.removeHandler(handler)
+    handler.close()
+
+
+def _manifest_key(project_name: str, artifact_key: str) -> str:
+    artifact_id = artifact_key[artifact_key.rindex("/") + 1 : artifact_key.rindex(".")]
+    return f"{ARTIFACT_MANIFESTS_PREFIX}{project_name}/{artifact_id}.manifest"
+
+
+def _build_record_keys(manifest_key: str) -> Tuple[str, str]:
+    """The timeline and build log live next to the manifest that they describe.
+
+    :returns: Timeline key and build log key
+    """
+    base = manifest_key[: manifest_key.rindex(".")]
+    return f"{base}.timeline.json", f"{base}.log.gz"
+
+
+def _write_build_records(
+    project_name: str, artifact_key: str, runtime_name: str, timeline: BuildTimeline
+) -> Tuple[str, str]:
+    """Upload the build timeline and the compressed build log.
+
+    :returns: Timeline key and build log key
+    """
+    timeline_key, log_key = _build_record_keys(_manifest_key(project_name=project_name, artifact_key=artifact_key))
+
+    body = json.dumps(
+        dict(ProjectName=project_name, ArtifactS3Key=artifact_key, Runtime=runtime_name, **timeline.to_dict()),
+        indent=4,
+    )
+    _s3.put_object(Bucket=_bucket_name, Key=timeline_key, Body=body)
+
+    compressed = io.BytesIO()
+    with gzip.GzipFile(fileobj=compressed, mode="wb") as log, open(BUILD_LOG, "rb") as raw_log:
+        shutil.copyfileobj(raw_log, log)
+    compressed.seek(0)
+    _s3.put_object(Bucket=_bucket_name, Key=log_key, Body=compressed, ContentEncoding="gzip", ContentType="text/plain")
+
+    return timeline_key, log_key
+
+
+def _load_manifest(key: str) -> Dict[str, Any]:
+    response = _s3.get_object(Bucket=_bucket_name, Key=key)
+    return json.loads(response["Body"].read().decode("utf-8"))
+
+
+def _checkpoint_keys(project_name: str, artifact_key: str) -> Tuple[str, str]:
+    """Checkpoints are named after the artifact that they are a partial build of.
+
+    :returns: Checkpoint record key and partial artifact key
+    """
+    artifact_id = artifact_key[artifact_key.rindex("/") + 1 : artifact_key.rindex(".")]
+    base = f"{CHECKPOINTS_PREFIX}{project_name}/{artifact_id}"
+    return f"{base}.json", f"{base}.zip"
+
+
+def _shard_prefix(project_name: str, artifact_key: str) -> str:
+    """Distributed builds are named after the artifact that they build."""
+    artifact_id = artifact_key[artifact_key.rindex("/") + 1 : artifact_key.rindex(".")]
+    return f"{SHARDS_PREFIX}{project_name}/{artifact_id}/"
+
+
+def _missing_key(error: ClientError) -> bool:
+    return error.response.get("Error", {}).get("Code") in _MISSING_KEY_ERRORS
+
+
+def _load_checkpoint(key: str) -> Optional[Dict[str, Any]]:
+    """Load a checkpoint record.
+
+    Any failure other than the record not existing is raised, so that it is classified rather than restarting the build.
+
+    :returns: Checkpoint record, or ``None`` if there is no checkpoint
+    """
+    try:
+        return _load_manifest(key)
+    except ClientError as error:
+        if _missing_key(error):
+            return None
+        raise
+
+
 def _write_manifest(
-    project_name: str, artifact_key: str, requirements=Iterable[str], installed=Iterable[str], runtimes=Iterable[str]
+    project_name: str,
+    artifact_key: str,
+    requirements: Iterable[Dict[str, str]],
+    installed: Iterable[Dict[str, Any]],
+    runtimes: Iterable[str],
+    options: BuildOptions,
+    resources: Dict[str, Any],
+    resolution: Dict[str, Any],
+    build_records: Tuple[str, str],
+    excluded: Iterable[Dict[str, str]] = (),
+    base: Optional[Dict[str, Any]] = None,
+    artifact_sha256: Optional[str] = None,
 ) -> str:
-    artifact_id = artifact_key[artifact_key.rindex("/") + 1 : artifact_key.rindex(".")]
-    key = f"{ARTIFACT_MANIFESTS_PREFIX}{project_name}/{artifact_id}.manifest"
+    key = _manifest_key(project_name=project_name, artifact_key=artifact_key)
 
     if artifact_exists(_s3, _bucket_name, key):
         return key
@@ -54,9 +227,19 @@ def _write_manifest(
         dict(
             ProjectName=project_name,
             ArtifactS3Key=artifact_key,
-            Requirements=requirements,
-            Installed=installed,
-            Runtimes=runtimes,
+            ArtifactSha256=artifact_sha256,
+            Requirements=list(requirements),
+            Installed=list(installed),
+            Runtimes=list(runtimes),
+            Options=options.to_dict(),
+            Resources=resources,
+            ResolutionCache=resolution,
+            Excluded=list(excluded),
+            BaseLayer=(
+                None if base is None else dict(ProjectName=base["ProjectName"], ArtifactS3Key=base["ArtifactS3Key"])
+            ),
+            TimelineS3Key=build_records[0],
+            BuildLogS3Key=build_records[1],
         ),
         indent=4,
     )
@@ -72,25 +255,999 @@ def _runtime_name():
         raise Exception(f"Unexpected runtime: {sys.version_info}")
 
 
-def _upload_artifacts(name: str, requirements: Iterable[str], installed: Iterable[Dict[str, str]]):
-    artifact_key = efficient_build_and_upload_zip(
-        s3_client=_s3,
+def _resolve(
+    requirements: Iterable[PackageDetails], options: BuildOptions, timeline: BuildTimeline
+) -> Tuple[List[PackageDetails], ResolutionLookup]:
+    """Resolve requirements, reusing a cached resolution of the same request if it is within the TTL.
+
+    :returns: Resolved requirements and the resolution cache lookup result
+    """
+    requirements = list(requirements)
+    runtime_name = _runtime_name()
+    lookup = _resolution_cache.lookup(requirements, runtime_name, options.ResolutionTTL)
+    # Logged on its own so that hit rates can be tracked from the logs, including for builds that are skipped.
+    logger.info("Resolution cache lookup: %s", json.dumps(lookup.to_dict()))
+    if lookup.hit:
+        return lookup.Resolved, lookup
+
+    resolved = resolve_requirements(
+        venv_dir=VENV_DIR,
+        requirements=requirements,
+        persistent_venv=True,
+        wheel_cache=_wheel_cache,
+        timeline=timeline,
+    )
+    if lookup.Status != "disabled":
+        _resolution_cache.store(requirements, runtime_name, resolved)
+    return resolved, lookup
+
+
+def _artifact_runtime(runtime_names: Iterable[str]) -> str:
+    """An artifact that several runtimes share is identified by all of them, so it never collides with theirs."""
+    return ",".join(sorted(runtime_names))
+
+
+def _pinned(resolved: Iterable[PackageDetails]) -> List[Dict[str, str]]:
+    return [dict(Name=package.Name, Version=package.Details[2:]) for package in resolved]
+
+
+def _expected_artifact_key(
+    name: str, resolved: Iterable[PackageDetails], options: BuildOptions, runtime_name: str
+) -> str:
+    """Determine the artifact key that a build of exactly this resolved set will have.
+
+    Artifacts are identified by the whole resolved set and the options,
+    rather than by what they contain, so builds that leave out provided distributions can find them again.
+    """
+    return artifact_key(project_name=name, installed=_pinned(resolved), runtime_name=runtime_name, options=options)
+
+
+def _existing_build(
+    name: str, resolved: Iterable[PackageDetails], options: BuildOptions, runtime_name: str
+) -> Optional[Dict[str, Any]]:
+    """Find a previous build of exactly this resolved set for this runtime with these options.
+
+    :returns: Handler response describing the previous build, or ``None`` if there is no complete previous build
+    """
+    existing_artifact_key = _expected_artifact_key(name, resolved, options, runtime_name)
+    manifest_key = _manifest_key(project_name=name, artifact_key=existing_artifact_key)
+
+    if not (
+        artifact_exists(_s3, _bucket_name, existing_artifact_key) and artifact_exists(_s3, _bucket_name, manifest_key)
+    ):
+        return None
+
+    manifest = _load_manifest(manifest_key)
+    return {
+        "Installed": manifest["Installed"],
+        "Runtimes": manifest["Runtimes"],
+        "ArtifactKey": existing_artifact_key,
+        "ManifestKey": manifest_key,
+        "Continue": False,
+        "Distribute": False,
+    }
+
+
+def _recent_manifests(name: str) -> Iterator[Dict[str, Any]]:
+    """Load the manifests of the most recent builds of a project, newest first."""
+    paginator = _s3.get_paginator("list_objects_v2")
+    manifests = [
+        summary
+        for page in paginator.paginate(Bucket=_bucket_name, Prefix=f"{ARTIFACT_MANIFESTS_PREFIX}{name}/")
+        for summary in page.get("Contents", [])
+        if summary["Key"].endswith(".manifest")
+    ]
+    manifests.sort(key=lambda summary: summary["LastModified"], reverse=True)
+
+    for summary in manifests[:_PREVIOUS_BUILD_CANDIDATES]:
+        yield _load_manifest(summary["Key"])
+
+
+def _base_build(base_name: str, runtime_name: str) -> Optional[Dict[str, Any]]:
+    """Find the manifest of the most recent build of a base layer project for this runtime.
+
+    :returns: Base layer manifest, or ``None`` if the base layer has not been built for this runtime
+    """
+    for manifest in _recent_manifests(base_name):
+        if runtime_name in manifest["Runtimes"]:
+            return manifest
+    return None
+
+
+def _key_options(options: BuildOptions, base: Optional[Dict[str, Any]]) -> BuildOptions:
+    """Artifacts built on a base layer are identified by the base artifact, so a new base means a new artifact."""
+    if base is None:
+        return options
+    return attr.evolve(options, BaseLayer=base["ArtifactS3Key"])
+
+
+def _previous_build(name: str, runtime_name: str, options: BuildOptions) -> Optional[Dict[str, Any]]:
+    """Find the manifest of the most recent build of this project for this runtime with these options.
+
+    :returns: Previous build manifest, or ``None`` if there is no previous build
+    """
+    for manifest in _recent_manifests(name):
+        try:
+            previous_options = BuildOptions.from_dict(manifest.get("Options"))
+        except (TypeError, ValueError):
+            continue
+        if runtime_name in manifest["Runtimes"] and previous_options.artifact_options() == options.artifact_options():
+            return manifest
+    return None
+
+
+def _delta_plan(
+    name: str, resolved: Iterable[PackageDetails], options: BuildOptions, runtime_name: str
+) -> Optional[DeltaPlan]:
+    """Plan how to build on top of the previous build of this project, if there is one with anything to reuse."""
+    previous = _previous_build(name, runtime_name, options)
+    if previous is None:
+        return None
+
+    _s3.download_file(_bucket_name, previous["ArtifactS3Key"], PREVIOUS_ARTIFACT)
+    plan = plan_delta(
+        previous_artifact=PREVIOUS_ARTIFACT,
+        previous_installed=previous["Installed"],
+        resolved=resolved,
+        file_filter=FileFilter.from_options(options),
+    )
+    if not plan.reused:
+        return None
+
+    logger.info(
+        "Building on %s: reusing %d distributions and installing %d",
+        previous["ArtifactS3Key"],
+        len(plan.reused),
+        len(plan.install),
+    )
+    return attr.evolve(plan, source=previous["ArtifactS3Key"])
+
+
+def _checkpoint_plan(checkpoint_key: str, resolved: Iterable[PackageDetails]) -> Optional[DeltaPlan]:
+    """Plan how to resume a build from a checkpoint of it, if there is one with anything to reuse."""
+    checkpoint = _load_checkpoint(checkpoint_key)
+    if checkpoint is None:
+        return None
+
+    try:
+        _s3.download_file(_bucket_name, checkpoint["PartialArtifactS3Key"], CHECKPOINT_ARTIFACT)
+    except ClientError as error:
+        if not _missing_key(error):
+            raise
+        logger.warning("Ignoring checkpoint without a partial artifact: %s", checkpoint_key)
+        return None
+    plan = plan_delta(
+        previous_artifact=CHECKPOINT_ARTIFACT,
+        previous_installed=checkpoint["Installed"],
+        resolved=resolved,
+        file_filter=FileFilter.from_options(BuildOptions.from_dict(checkpoint["Options"])),
+    )
+    if not plan.reused:
+        return None
+
+    logger.info(
+        "Resuming from %s: %d distributions already installed and %d left to install",
+        checkpoint_key,
+        len(plan.reused),
+        len(plan.install),
+    )
+    return plan
+
+
+def _wheel_cache_evictor(keep: Iterable[str] = ()):
+    return "WheelCache", lambda: _wheel_cache.evict(max_bytes=0, keep=keep)
+
+
+def _source_build_cache_evictor():
+    return "SourceBuildCache", lambda: shutil.rmtree(SOURCE_BUILD_CACHE_DIR, ignore_errors=True)
+
+
+def _venv_evictor():
+    return "Venv", lambda: shutil.rmtree(VENV_ROOT, ignore_errors=True)
+
+
+def _install(
+    build_dir: str,
+    requirements: Iterable[PackageDetails],
+    options: BuildOptions,
+    target: Optional[RuntimeTarget],
+    budget: BuildBudget,
+    timeline: Optional[BuildTimeline] = None,
+    watchdog: Optional[BuildWatchdog] = None,
+) -> Tuple[List[Dict[str, Any]], List[PackageDetails]]:
+    """Install resolved requirements into ``build_dir``.
+
+    If ``watchdog`` is set, requirements are installed in batches
+    and no new batch is started once there is only enough time left to write a checkpoint.
+    At least one batch is always installed so that every invocation makes progress.
+
+    :returns: Installed distribution descriptions and the requirements that were not installed
+    """
+    shutil.rmtree(build_dir, ignore_errors=True)
+    requirements = list(requirements)
+    if not requirements:
+        os.makedirs(build_dir)
+        return [], []
+
+    batched = [requirements] if watchdog is None else batches(requirements, _INSTALL_BATCH_SIZE)
+    watchdog = watchdog if watchdog is not None else BuildWatchdog()
+    installed: List[Dict[str, Any]] = []
+    remaining: List[PackageDetails] = []
+    with budget.phase("install"):
+        for index, batch in enumerate(batched):
+            if index and not watchdog.can_continue():
+                remaining = [package for later in batched[index:] for package in later]
+                break
+
+            with watchdog.unit():
+                # Only distribution files that we are about to install from need to stay in the local wheel cache.
+                needed_files = distribution_files(_wheel_cache.cache_dir, batch)
+                budget.make_room(
+                    projected_install_size(_wheel_cache.cache_dir, batch), [_wheel_cache_evictor(keep=needed_files)]
+                )
+                # Every distribution in build_dir is described, so this includes earlier batches.
+                installed = build_requirements(
+                    build_dir=build_dir,
+                    venv_dir=VENV_DIR,
+                    requirements=batch,
+                    persistent_venv=True,
+                    wheel_cache=_wheel_cache,
+                    resolved=True,
+                    # Wheels can only be built from sdists for the runtime that we are running in.
+                    installer=NativeWheelInstaller(
+                        target=target, source_builds=_source_builds if target is None else None
+                    ),
+                    timeline=timeline,
+                )
+
+    if options.Precompile:
+        with budget.phase("precompile"):
+            precompile(
+                build_dir=build_dir,
+                python=os.path.join(VENV_DIR, "bin", "python"),
+                source_mtime=REPRODUCIBLE_TIMESTAMP if options.Reproducible else None,
+            )
+    return installed, remaining
+
+
+def _validate_delta(
+    delta: DeltaPlan,
+    resolved: Iterable[PackageDetails],
+    options: BuildOptions,
+    target: Optional[RuntimeTarget],
+    budget: BuildBudget,
+    excluded: Iterable[Dict[str, str]] = (),
+):
+    """Make sure that building on top of a previous artifact produced the same contents as a clean build.
+
+    :param excluded: Distributions that were left out of the build
+    :raises BuildError: if the contents differ
+    """
+    file_filter = FileFilter.from_options(options)
+    with budget.phase("validate"):
+        _install(VALIDATION_BUILD_DIR, resolved, options, target, budget)
+        for distribution in excluded:
+            remove_distribution(VALIDATION_BUILD_DIR, distribution["Name"], distribution["Version"])
+        differences = compare_archives(
+            build_zip(
+                BUILD_DIR, reuse_from=delta.previous_artifact, reused_members=delta.members, file_filter=file_filter
+            ),
+            build_zip(VALIDATION_BUILD_DIR, file_filter=file_filter),
+        )
+        shutil.rmtree(VALIDATION_BUILD_DIR, ignore_errors=True)
+    if differences:
+        raise BuildError(f"Delta build does not match clean build: {differences}")
+    logger.info("Delta build matches clean build")
+
+
+def _provided(options: BuildOptions, runtime_name: str, base: Optional[Dict[str, Any]]) -> Dict[str, Tuple[str, str]]:
+    """Find the distributions that will already be available at run time, and what provides them.
+
+    Layers come before the runtime on the Python path, so distributions in the base layer win.
+
+    :returns: Version and provider of each provided distribution
+    """
+    provided = {}
+    if options.ExcludeRuntimeProvided:
+        provided.update({name: (version, "runtime") for name, version in RUNTIME_PROVIDED[runtime_name].items()})
+    if base is not None:
+        provided.update(
+            {distribution["Name"]: (distribution["Version"], base["ProjectName"]) for distribution in base["Installed"]}
+        )
+    return provided
+
+
+def _without_reused(delta: DeltaPlan, removed: Iterable[Dict[str, str]], options: BuildOptions) -> DeltaPlan:
+    """Plan the same delta without some of the distributions that it reused."""
+    removed_names = {distribution["Name"] for distribution in removed}
+    reused = [distribution for distribution in delta.reused if distribution["Name"] not in removed_names]
+    replanned = plan_delta(
+        previous_artifact=delta.previous_artifact,
+        previous_installed=reused,
+        resolved=[
+            PackageDetails(Name=distribution["Name"], Details=f"=={distribution['Version']}") for distribution in reused
+        ],
+        file_filter=FileFilter.from_options(options),
+    )
+    return attr.evolve(delta, reused=replanned.reused, members=replanned.members, reused_size=replanned.reused_size)
+
+
+def _exclude_provided(
+    requirements: Iterable[Dict[str, str]],
+    installed: List[Dict[str, Any]],
+    delta: Optional[DeltaPlan],
+    provided: Dict[str, Tuple[str, str]],
+    shared: Dict[str, Dict[str, Tuple[str, str]]],
+    options: BuildOptions,
+    resumed: bool = False,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]], List[str], Optional[DeltaPlan]]:
+    """Remove distributions that will already be available at run time from the artifact.
+
+    Anything reused from a previous artifact is kept, so only distributions that were just installed are removed.
+    A checkpoint is part of this same build, so distributions reused from a checkpoint are removed too:
+    they are left out of the members that the artifact reuses.
+
+    :param installed: Every installed distribution description, including any reused ones
+    :param delta: Plan that the build reused distributions with (optional)
+    :param provided: Version and provider of each distribution that is available in this runtime
+    :param shared: What is available in each of the other runtimes that might use the same artifact
+    :param options: Options that the build uses
+    :param bool resumed: Was ``delta`` planned from a checkpoint of this build?
+    :returns: Installed distributions that are kept, distributions that were removed,
+        the ``shared`` runtimes that would remove exactly the same distributions, and the plan to reuse the rest with
+    """
+    requires = installed_requires(BUILD_DIR)
+    kept_reused = []
+    if delta is not None:
+        requires.update(archive_requires(delta.previous_artifact, delta.members))
+        if not resumed:
+            kept_reused = delta.reused
+    requested = [PackageDetails(**reqs) for reqs in requirements]
+    candidates = [distribution for distribution in installed if distribution not in kept_reused]
+
+    def _plan(available: Dict[str, Tuple[str, str]]) -> List[Dict[str, str]]:
+        versions = {name: version for name, (version, _provider) in available.items()}
+        planned = plan_exclusions(candidates, requires, requested, versions)
+        for distribution in planned:
+            distribution["ProvidedBy"] = available[distribution["Name"]][1]
+        return planned
+
+    excluded = _plan(provided)
+    shared_runtimes = [other for other, available in shared.items() if _plan(available) == excluded]
+    reused_names = set() if delta is None else {distribution["Name"] for distribution in delta.reused}
+    for distribution in excluded:
+        if distribution["Name"] not in reused_names:
+            remove_distribution(BUILD_DIR, distribution["Name"], distribution["Version"])
+    if reused_names.intersection(distribution["Name"] for distribution in excluded):
+        delta = _without_reused(delta, excluded, options)
+    if excluded:
+        logger.info(
+            "Left out distributions that are already provided: %s",
+            ", ".join(
+                f"{distribution['Name']} {distribution['Version']} ({distribution['ProvidedBy']})"
+                for distribution in excluded
+            ),
+        )
+
+    excluded_names = {distribution["Name"] for distribution in excluded}
+    kept = [distribution for distribution in installed if distribution["Name"] not in excluded_names]
+    return kept, excluded, shared_runtimes, delta
+
+
+def _spill_path(storage: str) -> Optional[str]:
+    return SPILLED_ARTIFACT if storage == "disk" else None
+
+
+def _build_and_upload_zip(key: str, storage: str, options: BuildOptions, delta: Optional[DeltaPlan] = None) -> str:
+    """Build a zip of everything in BUILD_DIR and upload it to ``key``, streaming it unless ``storage`` is disk.
+
+    :returns: Hex SHA-256 digest of the zip
+    """
+    zip_args = dict(
+        workers=_COMPRESSION_WORKERS,
+        reproducible=options.Reproducible,
+        file_filter=FileFilter.from_options(options),
+    )
+    if delta is not None:
+        zip_args.update(reuse_from=delta.previous_artifact, reused_members=delta.members)
+
+    return upload_archive(
+        _s3, _bucket_name, key, lambda output: build_zip(BUILD_DIR, output=output, **zip_args), _spill_path(storage)
+    )
+
+
+def _write_checkpoint(
+    name: str,
+    final_key: str,
+    resolved: Iterable[PackageDetails],
+    installed: Iterable[Dict[str, Any]],
+    remaining: Iterable[PackageDetails],
+    options: BuildOptions,
+    runtime_name: str,
+    budget: BuildBudget,
+    resolution: ResolutionLookup,
+    watchdog: BuildWatchdog,
+    delta: Optional[DeltaPlan] = None,
+) -> Dict[str, Any]:
+    """Upload everything installed so far so that a later invocation can resume the build.
+
+    The partial artifact is built exactly like the final artifact would be,
+    so resuming from it works the same way as building on top of a previous artifact.
+
+    :param final_key: Artifact key that the finished build will have
+    :returns: Handler response asking the state machine to resume the build
+    """
+    installed = list(installed)
+    remaining = list(remaining)
+    checkpoint_key, partial_key = _checkpoint_keys(project_name=name, artifact_key=final_key)
+    with budget.phase("checkpoint"):
+        projected_size = directory_size(BUILD_DIR) + (delta.reused_size if delta is not None else 0)
+        storage = budget.artifact_storage(
+            projected_size, [_wheel_cache_evictor(), _source_build_cache_evictor(), _venv_evictor()]
+        )
+        _build_and_upload_zip(partial_key, storage, options, delta)
+
+    body = json.dumps(
+        dict(
+            ProjectName=name,
+            ArtifactS3Key=final_key,
+            PartialArtifactS3Key=partial_key,
+            Runtime=runtime_name,
+            Options=options.to_dict(),
+            Resolved=[package.to_dict() for package in resolved],
+            Installed=installed,
+            Remaining=[package.to_dict() for package in remaining],
+            ResolutionCache=resolution.to_dict(),
+            Resources=budget.to_dict(),
+            Watchdog=watchdog.to_dict(),
+        ),
+        indent=4,
+    )
+    _s3.put_object(Bucket=_bucket_name, Key=checkpoint_key, Body=body)
+    logger.info(
+        "Checkpointed %s with %d distributions installed and %d left to install",
+        checkpoint_key,
+        len(installed),
+        len(remaining),
+    )
+    return {
+        "Continue": True,
+        "Distribute": False,
+        "Checkpoint": checkpoint_key,
+        "Progress": {"Installed": len(installed), "Remaining": len(remaining)},
+    }
+
+
+def _delete_checkpoint(name: str, final_key: str):
+    for key in _checkpoint_keys(project_name=name, artifact_key=final_key):
+        _s3.delete_object(Bucket=_bucket_name, Key=key)
+
+
+def _distributed(options: BuildOptions) -> bool:
+    """Shards cannot tell what the other shards depend on, so they cannot exclude provided distributions."""
+    return options.Shards > 1 and not options.ExcludeRuntimeProvided and options.BaseLayer is None
+
+
+def _distribute(
+    name: str,
+    requirements: Iterable[Dict[str, str]],
+    resolved: Iterable[PackageDetails],
+    install: Iterable[PackageDetails],
+    options: BuildOptions,
+    runtime_name: str,
+    resolution: ResolutionLookup,
+    final_key: str,
+    delta: Optional[DeltaPlan] = None,
+) -> Optional[Dict[str, Any]]:
+    """Split the requirements that need to be installed into shards for parallel builders to install.
+
+    The plan is written to S3 for the shard builders and the merge to read.
+
+    :param install: Pinned requirements that need to be installed
+    :param final_key: Artifact key that the finished build will have
+    :returns: Handler response asking the state machine to run the shards,
+        or ``None`` if there is not enough to install to split up
+    """
+    install = list(install)
+    # The dependency metadata and sizes that shards are planned from are in the distribution files.
+    _wheel_cache.prefetch(install)
+    shards = plan_shards(install, _wheel_cache.cache_dir, options.Shards, RUNTIME_TARGETS[runtime_name].tags())
+    if len(shards) < 2:
+        return None
+
+    prefix = _shard_prefix(project_name=name, artifact_key=final_key)
+    plan_key = f"{prefix}plan.json"
+    previous = None
+    if delta is not None:
+        previous = dict(ArtifactS3Key=delta.source, Reused=delta.reused, Members=delta.members)
+    body = json.dumps(
+        dict(
+            ProjectName=name,
+            ArtifactS3Key=final_key,
+            Runtime=runtime_name,
+            Options=options.to_dict(),
+            Requirements=list(requirements),
+            Resolved=[package.to_dict() for package in resolved],
+            ResolutionCache=resolution.to_dict(),
+            Previous=previous,
+            Shards=[[package.to_dict() for package in shard] for shard in shards],
+        ),
+        indent=4,
+    )
+    _s3.put_object(Bucket=_bucket_name, Key=plan_key, Body=body)
+    logger.info("Distributing %d distributions across %d shards: %s", len(install), len(shards), plan_key)
+    return {
+        "Continue": False,
+        "Distribute": True,
+        "Plan": plan_key,
+        "Shards": [{"Plan": plan_key, "Index": index} for index in range(len(shards))],
+    }
+
+
+def _build_shard(plan_key: str, index: int, budget: BuildBudget, timeline: BuildTimeline) -> Dict[str, Any]:
+    """Install and zip one shard of a distributed build.
+
+    What was installed is written next to the shard zip for the merge to read.
+    """
+    plan = _load_manifest(plan_key)
+    options = BuildOptions.from_dict(plan["Options"])
+    shard = [PackageDetails(**package) for package in plan["Shards"][index]]
+    shard_base = f"{plan_key[: plan_key.rindex('/') + 1]}{index}"
+
+    installed, _remaining = _install(BUILD_DIR, shard, options, None, budget, timeline)
+    with budget.phase("package"):
+        storage = budget.artifact_storage(
+            directory_size(BUILD_DIR), [_wheel_cache_evictor(), _source_build_cache_evictor(), _venv_evictor()]
+        )
+        _build_and_upload_zip(f"{shard_base}.zip", storage, options)
+
+    body = json.dumps(dict(Installed=installed, Timeline=timeline.to_dict()["Entries"]), indent=4)
+    _s3.put_object(Bucket=_bucket_name, Key=f"{shard_base}.json", Body=body)
+    return {"Index": index, "Installed": len(installed)}
+
+
+def _merge_shards(plan_key: str, budget: BuildBudget, timeline: BuildTimeline) -> Dict[str, Any]:
+    """Build the artifact for a distributed build by splicing together the shard zips without recompressing them.
+
+    :returns: Handler response describing the build
+    """
+    plan = _load_manifest(plan_key)
+    name = plan["ProjectName"]
+    final_key = plan["ArtifactS3Key"]
+    runtime_name = plan["Runtime"]
+    options = BuildOptions.from_dict(plan["Options"])
+    previous = plan["Previous"]
+    prefix = plan_key[: plan_key.rindex("/") + 1]
+
+    installed = list(previous["Reused"]) if previous is not None else []
+    archives = []
+    merge_args = {}
+    with budget.phase("merge"):
+        os.makedirs(SHARD_ARTIFACTS_DIR, exist_ok=True)
+        for index in range(len(plan["Shards"])):
+            record = _load_manifest(f"{prefix}{index}.json")
+            installed.extend(record["Installed"])
+            for entry in record["Timeline"]:
+                timeline.add(TimelineEntry(**entry))
+            archive = os.path.join(SHARD_ARTIFACTS_DIR, f"{index}.zip")
+            _s3.download_file(_bucket_name, f"{prefix}{index}.zip", archive)
+            archives.append(archive)
+        if previous is not None:
+            _s3.download_file(_bucket_name, previous["ArtifactS3Key"], PREVIOUS_ARTIFACT)
+            merge_args.update(reuse_from=PREVIOUS_ARTIFACT, reused_members=previous["Members"])
+
+        projected_size = sum(os.path.getsize(archive) for archive in archives)
+        if previous is not None:
+            projected_size += os.path.getsize(PREVIOUS_ARTIFACT)
+        storage = budget.artifact_storage(projected_size, [_wheel_cache_evictor(), _source_build_cache_evictor()])
+        checksum = upload_archive(
+            _s3,
+            _bucket_name,
+            final_key,
+            lambda output: merge_zips(archives, output=output, reproducible=options.Reproducible, **merge_args),
+            _spill_path(storage),
+        )
+
+    installed.sort(key=lambda distribution: distribution["Name"])
+    build_records = _write_build_records(
+        project_name=name, artifact_key=final_key, runtime_name=runtime_name, timeline=timeline
+    )
+    manifest_key = _write_manifest(
         project_name=name,
+        artifact_key=final_key,
+        requirements=plan["Requirements"],
         installed=installed,
-        bucket_name=_bucket_name,
-        build_dir=BUILD_DIR,
-        runtime_name=_runtime_name(),
+        runtimes=[runtime_name],
+        options=options,
+        resources=budget.to_dict(),
+        resolution=plan["ResolutionCache"],
+        build_records=build_records,
+        artifact_sha256=checksum,
+    )
+
+    shard_keys = [f"{prefix}{index}.{suffix}" for index in range(len(plan["Shards"])) for suffix in ("zip", "json")]
+    _s3.delete_objects(
+        Bucket=_bucket_name, Delete={"Objects": [{"Key": key} for key in shard_keys + [plan_key]], "Quiet": True}
+    )
+    return {
+        "Installed": installed,
+        "Runtimes": [runtime_name],
+        "ArtifactKey": final_key,
+        "ManifestKey": manifest_key,
+        "ResolutionCache": plan["ResolutionCache"],
+        "Continue": False,
+        "Distribute": False,
+    }
+
+
+def _upload_artifacts(
+    name: str,
+    requirements: Iterable[str],
+    resolved: Iterable[PackageDetails],
+    installed: Iterable[Dict[str, Any]],
+    options: BuildOptions,
+    runtime_names: List[str],
+    budget: BuildBudget,
+    resolution: ResolutionLookup,
+    timeline: BuildTimeline,
+    delta: Optional[DeltaPlan] = None,
+    excluded: Iterable[Dict[str, str]] = (),
+    base: Optional[Dict[str, Any]] = None,
+):
+    """Upload the artifact and its manifest.
+
+    :param resolved: Resolved set that the artifact was built for, which identifies it
+    :param installed: Distributions that the artifact contains
+    :param runtime_names: Runtimes that the artifact is compatible with, starting with the runtime it was built for
+    :param excluded: Distributions that were left out because they are already provided
+    :param base: Manifest of the base layer that the artifact was built on (optional)
+    """
+    with budget.phase("package"):
+        projected_size = directory_size(BUILD_DIR) + (delta.reused_size if delta is not None else 0)
+        # Everything has been installed, so neither the local caches nor the venv are needed any more.
+        storage = budget.artifact_storage(
+            projected_size, [_wheel_cache_evictor(), _source_build_cache_evictor(), _venv_evictor()]
+        )
+        artifact_key, checksum = efficient_build_and_upload_zip(
+            s3_client=_s3,
+            project_name=name,
+            installed=_pinned(resolved),
+            bucket_name=_bucket_name,
+            build_dir=BUILD_DIR,
+            runtime_name=_artifact_runtime(runtime_names),
+            options=_key_options(options, base),
+            delta=delta,
+            spill_path=_spill_path(storage),
+            workers=_COMPRESSION_WORKERS,
+        )
+    build_records = _write_build_records(
+        project_name=name, artifact_key=artifact_key, runtime_name=runtime_names[0], timeline=timeline
     )
     manifest_key = _write_manifest(
         project_name=name,
         artifact_key=artifact_key,
         requirements=requirements,
         installed=installed,
-        runtimes=[_runtime_name()],
+        runtimes=sorted(runtime_names),
+        options=options,
+        resources=budget.to_dict(),
+        resolution=resolution.to_dict(),
+        build_records=build_records,
+        excluded=excluded,
+        base=base,
+        artifact_sha256=checksum,
     )
     return artifact_key, manifest_key
 
 
+def _base_and_shared(
+    options: BuildOptions, runtime_name: str, shared: Iterable[str]
+) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """Find the base layer build that this build is on, if any, and the other runtimes that could share the artifact.
+
+    Runtimes can only share an artifact if they share the base artifact that it was built on.
+
+    :returns: Base layer manifest (or ``None``) and the ``shared`` runtimes that can still share the artifact
+    :raises InvalidRequestError: if the base layer has not been built for this runtime
+    """
+    shared = [other for other in shared if other != runtime_name]
+    if options.BaseLayer is None:
+        return None, shared
+
+    base = _base_build(options.BaseLayer, runtime_name)
+    if base is None:
+        raise InvalidRequestError(f"Base layer {options.BaseLayer} has not been built for {runtime_name}")
+    shared = [
+        other
+        for other in shared
+        if (_base_build(options.BaseLayer, other) or {}).get("ArtifactS3Key") == base["ArtifactS3Key"]
+    ]
+    return base, shared
+
+
+def _find_existing(
+    name: str, resolved: Iterable[PackageDetails], key_options: BuildOptions, runtime_name: str, shared: List[str]
+) -> Optional[Dict[str, Any]]:
+    """Find an existing artifact for this resolved set, preferring one that every ``shared`` runtime can use."""
+    existing = None
+    if shared:
+        existing = _existing_build(name, resolved, key_options, _artifact_runtime([runtime_name] + shared))
+    if existing is None:
+        existing = _existing_build(name, resolved, key_options, runtime_name)
+    return existing
+
+
+def _plan_build(
+    name: str, resolved: Iterable[PackageDetails], options: BuildOptions, runtime_name: str, final_key: str
+) -> Tuple[Optional[DeltaPlan], bool]:
+    """Plan what to reuse: a checkpoint of this build if there is one, otherwise a previous artifact if there is one.
+
+    :returns: Plan to reuse distributions with (or ``None``) and whether the plan resumes from a checkpoint
+    """
+    delta = _checkpoint_plan(_checkpoint_keys(project_name=name, artifact_key=final_key)[0], resolved)
+    if delta is not None:
+        return delta, True
+    return _delta_plan(name, resolved, options, runtime_name), False
+
+
+def _install_planned(
+    resolved: Iterable[PackageDetails],
+    delta: Optional[DeltaPlan],
+    options: BuildOptions,
+    target: Optional[RuntimeTarget],
+    budget: BuildBudget,
+    timeline: BuildTimeline,
+    watchdog: Optional[BuildWatchdog],
+) -> Tuple[List[Dict[str, Any]], List[PackageDetails]]:
+    """Install everything that ``delta`` does not reuse.
+
+    :returns: Every installed distribution, including any reused ones, and the requirements not yet installed
+    """
+    if delta is None:
+        return _install(BUILD_DIR, resolved, options, target, budget, timeline, watchdog)
+
+    installed, remaining = _install(BUILD_DIR, delta.install, options, target, budget, timeline, watchdog)
+    return sorted(list(delta.reused) + installed, key=lambda distribution: distribution["Name"]), remaining
+
+
+def _build(
+    name: str,
+    requirements: Iterable[str],
+    resolved: Iterable[PackageDetails],
+    options: BuildOptions,
+    budget: BuildBudget,
+    resolution: ResolutionLookup,
+    timeline: BuildTimeline,
+    target: Optional[RuntimeTarget] = None,
+    watchdog: Optional[BuildWatchdog] = None,
+    shared: Iterable[str] = (),
+) -> Dict[str, Any]:
+    """Build and upload an artifact and manifest for a resolved set of requirements.
+
+    If everything installed is pure Python and compatible with any of the ``shared`` runtimes,
+    a single artifact is built for all of those runtimes.
+
+    If there is a checkpoint of this build, the build resumes from it.
+    Otherwise, if there is a previous build of this project for this runtime,
+    only distributions that changed since then are installed and the rest are reused from the previous artifact.
+
+    If ``watchdog`` runs out of time before everything is installed,
+    everything installed so far is checkpointed and the response asks the state machine to resume the build.
+    If the ``Shards`` option is set, the response instead asks the state machine to install shards in parallel.
+    Builds that exclude provided distributions are never distributed.
+
+    If the ``BaseLayer`` option is set, distributions that the most recent build of that project
+    for this runtime provides are left out.
+    Delta validation would reinstall everything, so builds that resume from a checkpoint
+    and distributed builds are not validated.
+
+    :param budget: Resource budget to track the build against
+    :param resolution: Result of looking up ``resolved`` in the resolution cache
+    :param timeline: Timeline to record each download, build, and install in
+    :param target: Runtime to build for (optional: default is this runtime)
+    :param watchdog: Watchdog for the invocation deadline (optional: default is to never checkpoint)
+    :param shared: Other runtimes that can use the same artifact if everything installed is compatible with them
+    :returns: Handler response describing the build or the checkpoint
+    :raises InvalidRequestError: if the base layer has not been built for this runtime
+    """
+    runtime_name = _runtime_name() if target is None else target.runtime
+    base, shared = _base_and_shared(options, runtime_name, shared)
+    key_options = _key_options(options, base)
+
+    existing = _find_existing(name, resolved, key_options, runtime_name, shared)
+    if existing is not None:
+        logger.info("Reusing existing artifact: %s", existing["ArtifactKey"])
+        existing["ResolutionCache"] = resolution.to_dict()
+        return existing
+
+    final_key = _expected_artifact_key(name, resolved, key_options, runtime_name)
+    delta, resumed = _plan_build(name, resolved, options, runtime_name, final_key)
+
+    if _distributed(options) and target is None and not resumed:
+        distributed = _distribute(
+            name,
+            requirements,
+            resolved,
+            resolved if delta is None else delta.install,
+            options,
+            runtime_name,
+            resolution,
+            final_key,
+            delta,
+        )
+        if distributed is not None:
+            return distributed
+
+    installed, remaining = _install_planned(resolved, delta, options, target, budget, timeline, watchdog)
+    if remaining:
+        return _write_checkpoint(
+            name, final_key, resolved, installed, remaining, options, runtime_name, budget, resolution, watchdog, delta
+        )
+
+    excluded: List[Dict[str, str]] = []
+    if options.ExcludeRuntimeProvided or base is not None:
+        installed, excluded, shared, delta = _exclude_provided(
+            requirements,
+            installed,
+            delta,
+            _provided(options, runtime_name, base),
+            {other: _provided(options, other, base) for other in shared},
+            options,
+            resumed,
+        )
+
+    if delta is not None and not resumed and options.ValidateDelta:
+        _validate_delta(delta, resolved, options, target, budget, excluded)
+
+    runtime_names = [runtime_name] + [other for other in shared if RUNTIME_TARGETS[other].can_share(installed)]
+    if len(runtime_names) > 1:
+        logger.info("Everything installed is pure Python: building one artifact for %s", ", ".join(runtime_names))
+    artifact_key, manifest_key = _upload_artifacts(
+        name,
+        requirements,
+        resolved,
+        installed,
+        options,
+        runtime_names,
+        budget,
+        resolution,
+        timeline,
+        delta,
+        excluded,
+        base,
+    )
+    if resumed:
+        _delete_checkpoint(name, final_key)
+    return {
+        "Installed": installed,
+        "Runtimes": sorted(runtime_names),
+        "ArtifactKey": artifact_key,
+        "ManifestKey": manifest_key,
+        "ResolutionCache": resolution.to_dict(),
+        "Continue": False,
+        "Distribute": False,
+    }
+
+
+def _target_result_key(runtime_name: str) -> str:
+    """State machine paths cannot contain ``.``, so ``python3.6`` results are reported under ``Python36``."""
+    return runtime_name.replace("python", "Python").replace(".", "")
+
+
+def _target_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    if result["Continue"]:
+        # The runtime's own builder resumes from the checkpoint if it resolves the same set.
+        return dict(Built=False, Reason=f"Checkpointed before the Lambda timeout: {result['Checkpoint']}")
+    return dict(Built=True, Result=result)
+
+
+def _cross_runtime_blocker(
+    requirements: Iterable[Dict[str, str]],
+    resolved: Iterable[PackageDetails],
+    options: BuildOptions,
+    target: RuntimeTarget,
+    host: RuntimeTarget,
+    resolution: ResolutionLookup,
+) -> Optional[str]:
+    """Determine why we cannot build for ``target`` from here, if there is a reason."""
+    if target == host:
+        return None
+    if options.Precompile:
+        return "Precompile requires the target runtime"
+    if resolution.hit:
+        # A cached resolution did not download anything, but the blocker check reads the resolved wheels.
+        _wheel_cache.prefetch(resolved)
+    return cross_runtime_blocker(
+        requirements=[PackageDetails(**reqs) for reqs in requirements],
+        resolved=resolved,
+        download_dir=_wheel_cache.cache_dir,
+        host=host,
+        target=target,
+    )
+
+
+def _buildable_runtimes(
+    requirements: Iterable[Dict[str, str]],
+    resolved: Iterable[PackageDetails],
+    options: BuildOptions,
+    runtime_names: Iterable[str],
+    host_runtime: str,
+    resolution: ResolutionLookup,
+) -> Tuple[List[str], Dict[str, Dict[str, Any]]]:
+    """Determine which runtimes we can build for from ``host_runtime``.
+
+    :returns: Runtimes that we can build for, and results for the rest that say why we cannot
+    """
+    host = RUNTIME_TARGETS[host_runtime]
+    results = {}
+    buildable = []
+    for runtime_name in runtime_names:
+        if _distributed(options):
+            blocker = "Distributed builds are sharded by each runtime's builder"
+        else:
+            blocker = _cross_runtime_blocker(
+                requirements, resolved, options, RUNTIME_TARGETS[runtime_name], host, resolution
+            )
+        if blocker is None:
+            buildable.append(runtime_name)
+        else:
+            logger.info("Unable to build for %s from %s: %s", runtime_name, host_runtime, blocker)
+            results[_target_result_key(runtime_name)] = dict(Built=False, Reason=blocker)
+    return buildable, results
+
+
+def _cross_runtime_build(
+    name: str,
+    requirements: Iterable[Dict[str, str]],
+    resolved: Iterable[PackageDetails],
+    options: BuildOptions,
+    runtime_names: Iterable[str],
+    budget: BuildBudget,
+    resolution: ResolutionLookup,
+    timeline: BuildTimeline,
+    watchdog: BuildWatchdog,
+) -> Dict[str, Dict[str, Any]]:
+    """Build artifacts for several runtimes, reusing a single resolution.
+
+    Any runtime that we cannot safely build for from here, or that we run out of time to build,
+    is reported as not built, along with the reason, so that it can be built by that runtime's own builder instead.
+    If everything installed is pure Python, one artifact is built for every runtime that can use it
+    and it is reported as the result for each of them.
+    """
+    host_runtime = _runtime_name()
+    buildable, results = _buildable_runtimes(requirements, resolved, options, runtime_names, host_runtime, resolution)
+
+    # Sdists can only be built for this runtime, so build for it first in case the others can share its artifact.
+    buildable.sort(key=lambda runtime_name: runtime_name != host_runtime)
+    for runtime_name in buildable:
+        result_key = _target_result_key(runtime_name)
+        if result_key in results:
+            continue
+
+        if not watchdog.can_continue():
+            results[result_key] = dict(Built=False, Reason="Not enough time left in this invocation")
+            continue
+
+        target = None if runtime_name == host_runtime else RUNTIME_TARGETS[runtime_name]
+        shared = [other for other in buildable if _target_result_key(other) not in results]
+        try:
+            result = _build(
+                name, requirements, resolved, options, budget, resolution, timeline, target, watchdog, shared
+            )
+        except ExecutionError as error:
+            if target is None:
+                raise
+            logger.info("Unable to build for %s from %s: %s", runtime_name, host_runtime, error)
+            results[result_key] = dict(Built=False, Reason=str(error))
+            continue
+
+        # Checkpoints only ever cover the runtime that they were built for.
+        for built_runtime in result.get("Runtimes", [runtime_name]):
+            results[_target_result_key(built_runtime)] = _target_result(result)
+    return results
+
+
+@classified_handler
 def lambda_handler(event, context):
     """
     Event shape:
@@ -104,43 +1261,193 @@ def lambda_handler(event, context):
                     "Name": "Requirement Name",
                     "Details": "Requirement version or other identifying details"
                 }
-            ]
+            ],
+            "Options": {
+                "Precompile": false,
+                "ResolutionTTL": 0
+            },
+            "Targets": ["Lambda runtime name"],
+            "Checkpoint": "S3 key containing checkpoint to resume from"
+        }
+
+    Event shape for one shard of a distributed build:
+
+    ..code:: json
+
+        {
+            "Shard": {
+                "Plan": "S3 key containing distributed build plan",
+                "Index": index of shard in plan
+            }
+        }
+
+    Event shape to merge the shards of a distributed build:
+
+    ..code:: json
+
+        {
+            "Merge": "S3 key containing distributed build plan"
         }
 
+    .. note::
+
+        ``Targets`` is optional.
+        If it is set, artifacts are built for each listed runtime from a single resolution in this runtime.
+        Any target runtime that cannot be built from here is reported as not built
+        so that it can be built by that runtime's builder instead.
+        If everything installed is pure Python, runtimes that share one artifact all report the same result.
+
+    .. note::
+
+        ``Checkpoint`` is optional.
+        If it is set, the build resumes from that checkpoint with the same resolution that it started with.
+
     Return shape:
 
     ..code:: json
 
         {
-            "Installed": ["Actual versions of all installed requirements"],
+            "Installed": [
+                {
+                    "Name": "Canonical package name",
+                    "Version": "Installed version",
+                    "Tags": ["Wheel tags that the installed distribution was built for"],
+                    "Source": "Filename of distribution that was installed",
+                    "DownloadSize": size in bytes of distribution that was installed,
+                    "InstalledSize": size in bytes of all installed files
+                }
+            ],
             "Runtimes": ["Lambda runtime name"],
             "ArtifactKey": "S3 key containing built zip",
-            "ManifestKey": "S3 key containing job manifest"
+            "ManifestKey": "S3 key containing job manifest",
+            "ResolutionCache": {
+                "Status": "hit, miss, expired, or disabled",
+                "TTL": seconds that cached resolutions were valid for,
+                "Age": seconds since the cached resolution was stored
+            },
+            "Continue": false,
+            "Distribute": false
+        }
+
+    Return shape if the build needs to be resumed by another invocation:
+
+    ..code:: json
+
+        {
+            "Continue": true,
+            "Distribute": false,
+            "Checkpoint": "S3 key containing checkpoint",
+            "Progress": {
+                "Installed": number of distributions installed so far,
+                "Remaining": number of distributions left to install
+            }
+        }
+
+    Return shape if the build should be split into shards:
+
+    ..code:: json
+
+        {
+            "Continue": false,
+            "Distribute": true,
+            "Plan": "S3 key containing distributed build plan",
+            "Shards": [
+                {
+                    "Plan": "S3 key containing distributed build plan",
+                    "Index": index of shard in plan
+                }
+            ]
+        }
+
+    Return shape for one shard of a distributed build:
+
+    ..code:: json
+
+        {
+            "Index": index of shard in plan,
+            "Installed": number of distributions installed
+        }
+
+    Return shape for the merge of a distributed build is the same as for a build.
+
+    Return shape if ``Targets`` is set:
+
+    ..code:: json
+
+        {
+            "Python36": {
+                "Built": true,
+                "Result": {return shape above}
+            },
+            "Python37": {
+                "Built": false,
+                "Reason": "Reason that this runtime could not be built here"
+            }
         }
 
     Required permissions:
 
-    * s3:PutObject for S3_BUCKET/accretion/artifacts/*
-    * s3:PutObject for S3_BUCKET/accretion/manifests/*
+    * s3:GetObject and s3:PutObject for S3_BUCKET/accretion/artifacts/*
+    * s3:GetObject, s3:PutObject, and s3:DeleteObject for S3_BUCKET/accretion/checkpoints/*
+    * s3:GetObject, s3:PutObject, and s3:DeleteObject for S3_BUCKET/accretion/shards/*
+    * s3:GetObject and s3:PutObject for S3_BUCKET/accretion/manifests/*
+    * s3:GetObject and s3:PutObject for S3_BUCKET/accretion/resolutions/*
+    * s3:GetObject and s3:PutObject for S3_BUCKET/accretion/wheels/*
+    * s3:ListBucket for S3_BUCKET with prefixes accretion/manifests/ and accretion/wheels/
 
     :param event:
     :param context:
     :return:
     """
+    if not _is_setup:
+        _setup()
+
+    _clean_env()
+    build_log = _start_build_log()
     try:
-        if not _is_setup:
-            _setup()
+        if "Shard" in event:
+            return _build_shard(event["Shard"]["Plan"], event["Shard"]["Index"], BuildBudget(), BuildTimeline())
+        if "Merge" in event:
+            return _merge_shards(event["Merge"], BuildBudget(), BuildTimeline())
 
-        _clean_env()
         requirements = [PackageDetails(**reqs) for reqs in event["Requirements"]]
-        installed = build_requirements(build_dir=BUILD_DIR, venv_dir=VENV_DIR, requirements=requirements)
-        artifact_key, manifest_key = _upload_artifacts(event["Name"], event["Requirements"], installed)
-        return {
-            "Installed": installed,
-            "Runtimes": [_runtime_name()],
-            "ArtifactKey": artifact_key,
-            "ManifestKey": manifest_key,
-        }
-    except Exception:
-        # TODO: Turn these into known-cause state machine failures.
-        raise
+        options = BuildOptions.from_dict(event.get("Options"))
+
+        budget = BuildBudget()
+        timeline = BuildTimeline()
+        watchdog = BuildWatchdog.from_context(context)
+
+        checkpoint = _load_checkpoint(event["Checkpoint"]) if "Checkpoint" in event else None
+        if checkpoint is not None:
+            # Resolving again could change the resolved set and lose everything that was checkpointed.
+            resolved = [PackageDetails(**package) for package in checkpoint["Resolved"]]
+            resolution = ResolutionLookup(**checkpoint["ResolutionCache"])
+        else:
+            # Resolve first so that we can skip installing anything if this exact set was already built.
+            with budget.phase("resolve"):
+                resolved, resolution = _resolve(requirements, options, timeline)
+        if "Targets" in event:
+            return _cross_runtime_build(
+                event["Name"],
+                event["Requirements"],
+                resolved,
+                options,
+                event["Targets"],
+                budget,
+                resolution,
+                timeline,
+                watchdog,
+            )
+
+        return _build(
+            event["Name"],
+            event["Requirements"],
+            resolved,
+            options,
+            budget,
+            resolution,
+            timeline,
+            watchdog=watchdog,
+        )
+    finally:
+        _stop_build_log(build_log)
@@ -4,6 +4,7 @@ import os
 from typing import Dict
 
 import boto3
+from accretion_common.exceptions import classified_handler
 from botocore.exceptions import ClientError
 
 S3_BUCKET = "S3_BUCKET"
@@ -35,6 +36,7 @@ def _load_manifest(manifest_key: str) -> Dict:
     return json.loads(response["Body"].read().decode("utf-8"))
 
 
+@classified_handler
 def lambda_handler(event, context):
     """
     Since we are depending on S3 Cross-Region Replication to replicate both
@@ -77,23 +79,19 @@ def lambda_handler(event, context):
     :param context:
     :return:
     """
-    try:
-        if not _is_setup:
-            _setup()
-
-        previous_attempts = event.get("Artifact", dict(ReadAttempts=0))["ReadAttempts"]
-
-        manifest = _load_manifest(event["ResourceKey"])
-        artifact_location = dict(S3Bucket=_bucket_name, S3Key=manifest["ArtifactS3Key"])
-        artifact_exists = _artifact_exists(manifest["ArtifactS3Key"])
-
-        return dict(
-            Found=artifact_exists,
-            ReadAttempts=previous_attempts + 1,
-            Location=artifact_location,
-            ProjectName=manifest["ProjectName"],
-            Runtimes=manifest["Runtimes"],
-        )
-    except Exception:
-        # TODO: Turn these into known-cause state machine failures.
-        raise
+    if not _is_setup:
+        _setup()
+
+    previous_attempts = event.get("Artifact", dict(ReadAttempts=0))["ReadAttempts"]
+
+    manifest = _load_manifest(event["ResourceKey"])
+    artifact_location = dict(S3Bucket=_bucket_name, S3Key=manifest["ArtifactS3Key"])
+    artifact_exists = _artifact_exists(manifest["ArtifactS3Key"])
+
+    return dict(
+        Found=artifact_exists,
+        ReadAttempts=previous_attempts + 1,
+        Location=artifact_location,
+        ProjectName=manifest["ProjectName"],
+        Runtimes=manifest["Runtimes"],
+    )
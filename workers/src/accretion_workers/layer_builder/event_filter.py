@@ -1,4 +1,5 @@
 """Filter CloudWatch Events for layer creation workflow."""
+from accretion_common.exceptions import classified_handler
 
 try:
     from accretion_workers._util import ARTIFACTS_PREFIX, ARTIFACT_MANIFESTS_PREFIX
@@ -6,7 +7,10 @@ except ImportError:
     ARTIFACTS_PREFIX = "accretion/artifacts/"
     ARTIFACT_MANIFESTS_PREFIX = "accretion/manifests/"
 
+ARTIFACT_MANIFEST_SUFFIX = ".manifest"
 
+
+@classified_handler
 def lambda_handler(event, context):
     """We only want to process events for artifact manifests.
 
@@ -33,9 +37,7 @@ def lambda_handler(event, context):
     :param context:
     :return:
     """
-    try:
-        s3_key = event["detail"]["requestParameters"]["key"]
-        return {"ProcessEvent": s3_key.startswith(ARTIFACT_MANIFESTS_PREFIX), "ResourceKey": s3_key}
-    except Exception:
-        # TODO: Turn these into known-cause state machine failures.
-        raise
+    s3_key = event["detail"]["requestParameters"]["key"]
+    # Build timelines and logs are written next to the manifests, but only the manifests describe an artifact.
+    process_event = s3_key.startswith(ARTIFACT_MANIFESTS_PREFIX) and s3_key.endswith(ARTIFACT_MANIFEST_SUFFIX)
+    return {"ProcessEvent": process_event, "ResourceKey": s3_key}
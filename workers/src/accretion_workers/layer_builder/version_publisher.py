@@ -4,6 +4,7 @@ import os
 from typing import Iterator
 
 import boto3
+from accretion_common.exceptions import InvalidRequestError, classified_handler
 
 try:
     from accretion_workers._util import LAYER_MANIFESTS_PREFIX
@@ -46,7 +47,7 @@ def _layer_name(*, project_name: str, runtimes: Iterator[str]):
 
     layer_name = f"{project_name}-{squashed_runtimes}"
     if len(layer_name) > 140:
-        raise Exception(f"Unable to compress project name: {layer_name}")
+        raise InvalidRequestError(f"Unable to compress project name: {layer_name}")
 
     return layer_name
 
@@ -101,6 +102,7 @@ def _publish_layer_manifest(
     return s3_key
 
 
+@classified_handler
 def lambda_handler(event, context):
     """
 
@@ -146,33 +148,29 @@ def lambda_handler(event, context):
     :param context:
     :return:
     """
-    try:
-        if not _is_setup:
-            _setup()
-
-        project_name = event["Artifact"]["ProjectName"]
-        manifest_bucket = artifact_bucket = event["Artifact"]["Location"]["S3Bucket"]
-        artifact_key = event["Artifact"]["Location"]["S3Key"]
-        manifest_key = event["ResourceKey"]
-        runtimes = event["Artifact"]["Runtimes"]
-
-        layer_name = _layer_name(project_name=project_name, runtimes=runtimes)
-        layer_arn, layer_version = _publish_layer(
-            project_name=project_name, artifact_bucket=artifact_bucket, artifact_key=artifact_key, runtimes=runtimes
-        )
-        _set_layer_permissions(layer_arn=layer_arn, layer_version=layer_version, manifest_key=manifest_key)
-        layer_manifest_key = _publish_layer_manifest(
-            layer_name=layer_name,
-            layer_arn=layer_arn,
-            layer_version=layer_version,
-            manifest_bucket=manifest_bucket,
-            manifest_key=manifest_key,
-        )
-        return dict(
-            ProjectName=project_name,
-            Layer=dict(Arn=layer_arn, Version=layer_version),
-            Manifest=dict(S3Bucket=_bucket_name, S3Key=layer_manifest_key),
-        )
-    except Exception:
-        # TODO: Turn these into known-cause state machine failures.
-        raise
+    if not _is_setup:
+        _setup()
+
+    project_name = event["Artifact"]["ProjectName"]
+    manifest_bucket = artifact_bucket = event["Artifact"]["Location"]["S3Bucket"]
+    artifact_key = event["Artifact"]["Location"]["S3Key"]
+    manifest_key = event["ResourceKey"]
+    runtimes = event["Artifact"]["Runtimes"]
+
+    layer_name = _layer_name(project_name=project_name, runtimes=runtimes)
+    layer_arn, layer_version = _publish_layer(
+        project_name=project_name, artifact_bucket=artifact_bucket, artifact_key=artifact_key, runtimes=runtimes
+    )
+    _set_layer_permissions(layer_arn=layer_arn, layer_version=layer_version, manifest_key=manifest_key)
+    layer_manifest_key = _publish_layer_manifest(
+        layer_name=layer_name,
+        layer_arn=layer_arn,
+        layer_version=layer_version,
+        manifest_bucket=manifest_bucket,
+        manifest_key=manifest_key,
+    )
+    return dict(
+        ProjectName=project_name,
+        Layer=dict(Arn=layer_arn, Version=layer_version),
+        Manifest=dict(S3Bucket=_bucket_name, S3Key=layer_manifest_key),
+    )
@@ -0,0 +1,86 @@
+"""Unit tests for ``accretion_workers.artifact_builder.budget``."""
+import pytest
+from accretion_common.exceptions import ResourceLimitError
+from accretion_common.util import PackageDetails
+
+from accretion_workers.artifact_builder import budget
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+def test_projected_install_size(tmpdir):
+    tmpdir.join("example-1.0-py3-none-any.whl").write("x" * 10)
+    tmpdir.join("example-2.0-py3-none-any.whl").write("x" * 100)
+    tmpdir.join("other-1.0.tar.gz").write("x" * 20)
+    tmpdir.join("not-a-distribution.txt").write("x" * 1000)
+    resolved = [PackageDetails(Name="Example", Details="==1.0"), PackageDetails(Name="other", Details="==1.0")]
+
+    assert sorted(budget.distribution_files(str(tmpdir), resolved)) == [
+        "example-1.0-py3-none-any.whl",
+        "other-1.0.tar.gz",
+    ]
+    assert budget.projected_install_size(str(tmpdir), resolved) == 90
+
+
+def test_make_room(tmpdir, mocker):
+    evicted = []
+    # Only the second eviction frees up any space.
+    mocker.patch.object(budget.BuildBudget, "disk_available", side_effect=lambda: 50 if len(evicted) >= 2 else 10)
+    test = budget.BuildBudget(tmp_dir=str(tmpdir))
+
+    assert test.make_room(
+        40,
+        [
+            ("first", lambda: evicted.append("first")),
+            ("second", lambda: evicted.append("second")),
+            ("third", lambda: evicted.append("third")),
+        ],
+    )
+    assert evicted == ["first", "second"]
+    assert test.to_dict()["Evicted"] == ["first", "second"]
+
+
+@pytest.mark.parametrize(
+    "memory_limit, disk_available, storage",
+    (
+        pytest.param(None, 0, "stream", id="no memory limit"),
+        pytest.param(1024**4, 0, "stream", id="fits in memory"),
+        pytest.param(1, 1024**2, "disk", id="spill to disk"),
+    ),
+)
+def test_artifact_storage(tmpdir, mocker, memory_limit, disk_available, storage):
+    mocker.patch.object(budget.BuildBudget, "disk_available", return_value=disk_available)
+    test = budget.BuildBudget(tmp_dir=str(tmpdir), memory_limit=memory_limit)
+
+    assert test.artifact_storage(1024, []) == storage
+    assert test.to_dict()["ArtifactStorage"] == storage
+
+
+def test_artifact_storage_counts_compression_window(tmpdir, mocker):
+    mocker.patch.object(budget, "_memory_used", return_value=0)
+    mocker.patch.object(budget.BuildBudget, "disk_available", return_value=1024**2)
+    test = budget.BuildBudget(tmp_dir=str(tmpdir), memory_limit=3 * budget.DEFAULT_PART_SIZE, threshold=1.0)
+
+    assert test.artifact_storage(1024, []) == "disk"
+
+
+def test_artifact_storage_no_room(tmpdir, mocker):
+    mocker.patch.object(budget.BuildBudget, "disk_available", return_value=0)
+    test = budget.BuildBudget(tmp_dir=str(tmpdir), memory_limit=1)
+
+    with pytest.raises(ResourceLimitError) as excinfo:
+        test.artifact_storage(1024, [])
+
+    excinfo.match("Artifact of about 1024 bytes fits in neither the memory nor the disk budget")
+
+
+def test_phase(tmpdir):
+    test = budget.BuildBudget(tmp_dir=str(tmpdir), memory_limit=1024)
+
+    with test.phase("install"):
+        pass
+
+    resources = test.to_dict()
+    assert resources["MemoryLimit"] == 1024
+    assert [phase["Phase"] for phase in resources["Phases"]] == ["install"]
+    assert set(resources["Phases"][0]) == {"Phase", "Seconds", "DiskUsed", "MemoryUsed", "PeakMemoryUsed"}
@@ -11,6 +11,17 @@ LAYER_NAME = "test-layer-name"
 PYTHON = "python"
 READY = "accretion"
 REQUIREMENTS = "requirements.txt"
+DEFAULT_OPTIONS = dict(
+    Precompile=False,
+    ValidateDelta=False,
+    ResolutionTTL=0,
+    Shards=1,
+    ExcludeRuntimeProvided=False,
+    BaseLayer=None,
+    Reproducible=False,
+    FileFilter=None,
+    FileFilterOverrides=None,
+)
 
 
 @pytest.mark.parametrize(
@@ -41,6 +52,7 @@ REQUIREMENTS = "requirements.txt"
                     dict(Name="boto3", Details="==1.9.169"),
                     dict(Name="botocore", Details="==1.12.169"),
                 ],
+                Options=DEFAULT_OPTIONS,
             ),
         ),
         (
@@ -70,6 +82,7 @@ REQUIREMENTS = "requirements.txt"
                     dict(Name="boto3", Details=""),
                     dict(Name="botocore", Details=""),
                 ],
+                Options=DEFAULT_OPTIONS,
             ),
         ),
         (
@@ -93,6 +106,7 @@ REQUIREMENTS = "requirements.txt"
                     dict(Name="boto3", Details="==1.9.169"),
                     dict(Name="botocore", Details="==1.12.169"),
                 ],
+                Options=DEFAULT_OPTIONS,
             ),
         ),
         (
@@ -117,6 +131,7 @@ REQUIREMENTS = "requirements.txt"
                     dict(Name="boto3", Details=""),
                     dict(Name="botocore", Details=""),
                 ],
+                Options=DEFAULT_OPTIONS,
             ),
         ),
     ),
@@ -125,3 +140,62 @@ def test_parse_requirements(request_body, expected_response):
     test = requirements_parser.lambda_handler(request_body, None)
 
     assert json.dumps(test, sort_keys=True) == json.dumps(expected_response, sort_keys=True)
+
+
+@pytest.mark.parametrize(
+    "options, expected_options",
+    (
+        (None, DEFAULT_OPTIONS),
+        ({}, DEFAULT_OPTIONS),
+        (
+            dict(Precompile=True),
+            dict(
+                Precompile=True,
+                ValidateDelta=False,
+                ResolutionTTL=0,
+                Shards=1,
+                ExcludeRuntimeProvided=False,
+                BaseLayer=None,
+                Reproducible=False,
+                FileFilter=None,
+                FileFilterOverrides=None,
+            ),
+        ),
+    ),
+)
+def test_parse_options(options, expected_options):
+    request_body = dict(
+        Name=LAYER_NAME, Language=PYTHON, Requirements=dict(Type=REQUIREMENTS, Requirements="attrs==19.1.0")
+    )
+    if options is not None:
+        request_body["Options"] = options
+
+    test = requirements_parser.lambda_handler(request_body, None)
+
+    assert test["Options"] == expected_options
+
+
+@pytest.mark.parametrize(
+    "options, error",
+    (
+        (dict(Unknown=True), r"Invalid options: Unknown build options: Unknown"),
+        (dict(Precompile="yes"), r"Invalid options: *"),
+        (dict(FileFilter="slim+everything"), r"Invalid options: Unknown file filter: 'everything'"),
+        (
+            dict(Precompile=True, FileFilter="minimal"),
+            r"Invalid options: FileFilter must not leave out caches when Precompile is set",
+        ),
+    ),
+)
+def test_parse_options_invalid(options, error):
+    request_body = dict(
+        Name=LAYER_NAME,
+        Language=PYTHON,
+        Requirements=dict(Type=REQUIREMENTS, Requirements="attrs==19.1.0"),
+        Options=options,
+    )
+
+    with pytest.raises(Exception) as excinfo:
+        requirements_parser.lambda_handler(request_body, None)
+
+    excinfo.match(error)
@@ -0,0 +1,47 @@
+"""Unit tests for ``accretion_workers.artifact_builder.watchdog``."""
+import pytest
+
+from accretion_workers.artifact_builder import watchdog
+from accretion_workers.artifact_builder.watchdog import BuildWatchdog, batches
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+def test_batches():
+    assert batches(range(5), 2) == [[0, 1], [2, 3], [4]]
+    assert batches([], 2) == []
+
+
+def test_unbounded():
+    test = BuildWatchdog.from_context(None)
+
+    assert test.can_continue()
+    assert not test.expired
+
+
+def test_from_context(mocker):
+    context = mocker.Mock()
+    context.get_remaining_time_in_millis.return_value = 200 * 1000
+
+    test = BuildWatchdog.from_context(context, reserve=180)
+
+    assert test.remaining() == 200
+    assert test.can_continue()
+
+
+def test_can_continue_allows_for_slowest_unit(mocker):
+    remaining = [600 * 1000]
+    clock = iter([0.0, 300.0])
+    mocker.patch.object(watchdog.time, "monotonic", side_effect=lambda: next(clock))
+    test = BuildWatchdog(remaining_millis=lambda: remaining[0], reserve=180)
+
+    with test.unit():
+        pass
+    remaining[0] = 400 * 1000
+
+    # 400 seconds left, but another 300 second unit would leave less than the reserve.
+    assert not test.can_continue()
+    assert test.expired
+
+    remaining[0] = 900 * 1000
+    assert not test.can_continue()
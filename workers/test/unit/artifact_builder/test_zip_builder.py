@@ -0,0 +1,546 @@
+"""Unit tests for ``accretion_workers.artifact_builder.zip_builder``."""
+import io
+import itertools
+import json
+import os
+import zipfile
+from typing import Dict, List, Set
+
+import pytest
+from accretion_common.constants import CHECKPOINTS_PREFIX, SHARDS_PREFIX
+from accretion_common.exceptions import InvalidRequestError, RetriableError
+from accretion_common.util import PackageDetails
+from accretion_common.venv_magic.resolution_cache import ResolutionCache
+from accretion_common.venv_magic.wheel_cache import WheelCache
+from botocore.exceptions import ClientError
+
+from accretion_workers.artifact_builder import zip_builder
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+BUCKET = "bucket"
+RUNTIME = "python3.7"
+
+
+class _FakeS3:
+    """Just enough of an S3 client for the builder, keeping every object in memory."""
+
+    def __init__(self):
+        self.objects: Dict[str, bytes] = {}
+        self.errors: Dict[str, str] = {}
+        self._modified: Dict[str, int] = {}
+        self._clock = itertools.count()
+
+    def _check(self, key: str, missing_code: str):
+        if key in self.errors:
+            raise ClientError({"Error": {"Code": self.errors[key]}}, "Fake")
+        if key not in self.objects:
+            raise ClientError({"Error": {"Code": missing_code}}, "Fake")
+
+    def put_object(self, Bucket, Key, Body, **_kwargs):
+        if hasattr(Body, "read"):
+            Body = Body.read()
+        self.objects[Key] = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body)
+        self._modified[Key] = next(self._clock)
+
+    def upload_fileobj(self, Fileobj, Bucket, Key):
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj)
+
+    def get_object(self, Bucket, Key):
+        self._check(Key, "NoSuchKey")
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def head_object(self, Bucket, Key):
+        self._check(Key, "404")
+        return {}
+
+    def download_file(self, Bucket, Key, Filename):
+        self._check(Key, "404")
+        with open(Filename, "wb") as target:
+            target.write(self.objects[Key])
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+    def delete_objects(self, Bucket, Delete):
+        for entry in Delete["Objects"]:
+            self.delete_object(Bucket=Bucket, Key=entry["Key"])
+
+    def get_paginator(self, operation_name):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        yield {
+            "Contents": [
+                dict(Key=key, LastModified=self._modified[key])
+                for key in sorted(self.objects)
+                if key.startswith(Prefix)
+            ]
+        }
+
+    def keys(self, prefix: str) -> List[str]:
+        return sorted(key for key in self.objects if key.startswith(prefix))
+
+    def json(self, key: str):
+        return json.loads(self.objects[key].decode("utf-8"))
+
+    def namelist(self, key: str) -> List[str]:
+        with zipfile.ZipFile(io.BytesIO(self.objects[key])) as archive:
+            return sorted(archive.namelist())
+
+
+class _FakeIndex:
+    """Package index that resolves and installs pure Python distributions without running pip.
+
+    Resolving writes a wheel for every resolved distribution to the wheel cache, as pip download would.
+    """
+
+    def __init__(self, wheel_dir: str):
+        self.wheel_dir = wheel_dir
+        self.versions: Dict[str, str] = {}
+        self.requires: Dict[str, List[str]] = {}
+        # Distributions that install as if from a wheel that only this runtime can use.
+        self.native: Set[str] = set()
+        self.resolutions = 0
+        self.installs: List[List[str]] = []
+
+    def add(self, name: str, version: str, *requires: str):
+        self.versions[name] = version
+        self.requires[name] = list(requires)
+
+    def _metadata(self, name: str) -> str:
+        lines = ["Metadata-Version: 2.1", f"Name: {name}", f"Version: {self.versions[name]}"]
+        lines.extend(f"Requires-Dist: {requirement}" for requirement in self.requires[name])
+        return "\n".join(lines) + "\n"
+
+    def _write_wheel(self, name: str):
+        version = self.versions[name]
+        with zipfile.ZipFile(os.path.join(self.wheel_dir, f"{name}-{version}-py3-none-any.whl"), "w") as wheel:
+            wheel.writestr(f"{name}-{version}.dist-info/METADATA", self._metadata(name))
+
+    def resolve_requirements(self, venv_dir, requirements, **_kwargs) -> List[PackageDetails]:
+        self.resolutions += 1
+        pending = [requirement.Name for requirement in requirements]
+        resolved = set()
+        while pending:
+            name = pending.pop()
+            if name not in resolved:
+                resolved.add(name)
+                pending.extend(self.requires[name])
+        for name in resolved:
+            self._write_wheel(name)
+        return [PackageDetails(Name=name, Details=f"=={self.versions[name]}") for name in sorted(resolved)]
+
+    def _install(self, build_dir: str, name: str, version: str):
+        dist_info = f"{name}-{version}.dist-info"
+        files = {
+            f"{dist_info}/METADATA": self._metadata(name),
+            f"{name}/__init__.py": f"VERSION = {version!r}\n",
+        }
+        files[f"{dist_info}/RECORD"] = "".join(f"{path},,\n" for path in list(files) + [f"{dist_info}/RECORD"])
+        for path, contents in files.items():
+            os.makedirs(os.path.join(build_dir, os.path.dirname(path)), exist_ok=True)
+            with open(os.path.join(build_dir, path), "w") as installed_file:
+                installed_file.write(contents)
+
+    def build_requirements(self, build_dir, venv_dir, requirements, **_kwargs) -> List[Dict]:
+        requirements = list(requirements)
+        self.installs.append([requirement.Name for requirement in requirements])
+        os.makedirs(build_dir, exist_ok=True)
+        for requirement in requirements:
+            self._install(build_dir, requirement.Name, requirement.Details[2:])
+        # Like pip, describe everything in the build directory, including earlier installs.
+        installed = []
+        for entry in sorted(os.listdir(build_dir)):
+            if entry.endswith(".dist-info"):
+                name, version = entry[: -len(".dist-info")].rsplit("-", 1)
+                installed.append(
+                    dict(
+                        Name=name,
+                        Version=version,
+                        Tags=["cp37-cp37m-manylinux1_x86_64" if name in self.native else "py3-none-any"],
+                        Source=f"{name}-{version}-py3-none-any.whl",
+                        DownloadSize=1,
+                        InstalledSize=1,
+                    )
+                )
+        return installed
+
+
+class _FakeContext:
+    def __init__(self, remaining_seconds: float):
+        self.remaining_seconds = remaining_seconds
+
+    def get_remaining_time_in_millis(self) -> int:
+        return int(self.remaining_seconds * 1000)
+
+
+@pytest.fixture
+def s3(tmpdir, monkeypatch) -> _FakeS3:
+    fake = _FakeS3()
+    working_dir = str(tmpdir.join("accretion"))
+    paths = dict(
+        WORKING_DIR=working_dir,
+        BUILD_DIR=f"{working_dir}/build",
+        VALIDATION_BUILD_DIR=f"{working_dir}/validation-build",
+        PREVIOUS_ARTIFACT=f"{working_dir}/previous-artifact.zip",
+        CHECKPOINT_ARTIFACT=f"{working_dir}/checkpoint.zip",
+        SHARD_ARTIFACTS_DIR=f"{working_dir}/shards",
+        SPILLED_ARTIFACT=f"{working_dir}/artifact.zip",
+        BUILD_LOG=f"{working_dir}/build-log",
+        VENV_ROOT=str(tmpdir.join("venv")),
+        VENV_DIR=str(tmpdir.join("venv", "python")),
+        SOURCE_BUILD_CACHE_DIR=str(tmpdir.join("built-wheels")),
+    )
+    for name, path in paths.items():
+        monkeypatch.setattr(zip_builder, name, path)
+    globals_ = dict(
+        _is_setup=True,
+        _bucket_name=BUCKET,
+        _s3=fake,
+        _wheel_cache=WheelCache(cache_dir=str(tmpdir.join("wheels")), max_bytes=zip_builder.WHEEL_CACHE_MAX_BYTES),
+        _source_builds=None,
+        _resolution_cache=ResolutionCache(s3_client=fake, bucket_name=BUCKET),
+    )
+    for name, value in globals_.items():
+        monkeypatch.setattr(zip_builder, name, value, raising=False)
+    monkeypatch.setattr(zip_builder, "_runtime_name", lambda: RUNTIME)
+    return fake
+
+
+@pytest.fixture
+def index(s3, monkeypatch) -> _FakeIndex:
+    fake = _FakeIndex(zip_builder._wheel_cache.cache_dir)
+    monkeypatch.setattr(zip_builder, "resolve_requirements", fake.resolve_requirements)
+    monkeypatch.setattr(zip_builder, "build_requirements", fake.build_requirements)
+    return fake
+
+
+def _event(name: str, *requirements: str, **options) -> Dict:
+    return dict(
+        Name=name,
+        Requirements=[dict(Name=requirement, Details="") for requirement in requirements],
+        Options=options,
+    )
+
+
+def _members(*distributions: str) -> List[str]:
+    members = []
+    for distribution in distributions:
+        name, version = distribution.split("-")
+        members.extend(
+            [
+                f"python/{name}-{version}.dist-info/METADATA",
+                f"python/{name}-{version}.dist-info/RECORD",
+                f"python/{name}/__init__.py",
+            ]
+        )
+    return sorted(members)
+
+
+def test_build(s3, index):
+    index.add("alpha", "1.0", "beta")
+    index.add("beta", "2.0")
+
+    test = zip_builder.lambda_handler(_event("example", "alpha"), None)
+
+    assert not test["Continue"]
+    assert [(distribution["Name"], distribution["Version"]) for distribution in test["Installed"]] == [
+        ("alpha", "1.0"),
+        ("beta", "2.0"),
+    ]
+    assert s3.namelist(test["ArtifactKey"]) == _members("alpha-1.0", "beta-2.0")
+    manifest = s3.json(test["ManifestKey"])
+    assert manifest["ArtifactS3Key"] == test["ArtifactKey"]
+    assert manifest["Runtimes"] == [RUNTIME]
+    assert manifest["TimelineS3Key"] in s3.objects
+    assert manifest["BuildLogS3Key"] in s3.objects
+
+
+def test_checkpoint_and_resume(s3, index, monkeypatch):
+    monkeypatch.setattr(zip_builder, "_INSTALL_BATCH_SIZE", 2)
+    for name in ("alpha", "beta", "gamma", "delta", "epsilon"):
+        index.add(name, "1.0")
+    event = _event("example", "alpha", "beta", "gamma", "delta", "epsilon")
+
+    # Less time than the checkpoint reserve is left, so only the first batch is installed.
+    checkpointed = zip_builder.lambda_handler(event, _FakeContext(remaining_seconds=60))
+
+    assert checkpointed["Continue"]
+    assert checkpointed["Progress"] == {"Installed": 2, "Remaining": 3}
+    assert index.installs == [["alpha", "beta"]]
+    record = s3.json(checkpointed["Checkpoint"])
+    assert [distribution["Name"] for distribution in record["Installed"]] == ["alpha", "beta"]
+    assert [package["Name"] for package in record["Remaining"]] == ["delta", "epsilon", "gamma"]
+    assert s3.namelist(record["PartialArtifactS3Key"]) == _members("alpha-1.0", "beta-1.0")
+
+    # A new release must not change the resolved set that the checkpoint was built from.
+    index.add("alpha", "2.0")
+    test = zip_builder.lambda_handler(dict(event, Checkpoint=checkpointed["Checkpoint"]), _FakeContext(900))
+
+    assert not test["Continue"]
+    assert index.resolutions == 1
+    assert index.installs[1:] == [["delta", "epsilon"], ["gamma"]]
+    assert test["ArtifactKey"] == record["ArtifactS3Key"]
+    assert s3.namelist(test["ArtifactKey"]) == _members(
+        "alpha-1.0", "beta-1.0", "delta-1.0", "epsilon-1.0", "gamma-1.0"
+    )
+    assert [distribution["Name"] for distribution in s3.json(test["ManifestKey"])["Installed"]] == [
+        "alpha",
+        "beta",
+        "delta",
+        "epsilon",
+        "gamma",
+    ]
+    assert s3.keys(CHECKPOINTS_PREFIX) == []
+
+
+def test_checkpoint_without_partial_artifact(s3, index):
+    index.add("alpha", "1.0")
+    event = _event("example", "alpha")
+    final_key = zip_builder._expected_artifact_key(
+        "example", [PackageDetails(Name="alpha", Details="==1.0")], zip_builder.BuildOptions(), RUNTIME
+    )
+    checkpoint_key, partial_key = zip_builder._checkpoint_keys("example", final_key)
+    s3.put_object(Bucket=BUCKET, Key=checkpoint_key, Body=json.dumps(dict(PartialArtifactS3Key=partial_key)))
+
+    test = zip_builder.lambda_handler(event, None)
+
+    assert index.installs == [["alpha"]]
+    assert s3.namelist(test["ArtifactKey"]) == _members("alpha-1.0")
+
+
+@pytest.mark.parametrize("code", ("NoSuchKey", "AccessDenied"))
+def test_load_checkpoint_missing(s3, code):
+    s3.errors["checkpoint.json"] = code
+
+    assert zip_builder._load_checkpoint("checkpoint.json") is None
+
+
+def test_load_checkpoint_error(s3, index):
+    s3.errors["checkpoint.json"] = "SlowDown"
+
+    with pytest.raises(RetriableError):
+        zip_builder.lambda_handler(dict(_event("example", "alpha"), Checkpoint="checkpoint.json"), None)
+
+
+def test_resume_excludes_runtime_provided(s3, index, monkeypatch):
+    monkeypatch.setattr(zip_builder, "_INSTALL_BATCH_SIZE", 2)
+    index.add("boto3", "1.9.100", "botocore", "jmespath")
+    index.add("botocore", "1.12.100", "jmespath")
+    index.add("jmespath", "0.9.4")
+    index.add("zeta", "1.0", "boto3")
+    event = _event("example", "zeta", ExcludeRuntimeProvided=True)
+
+    # boto3 and botocore are installed before the checkpoint and reused from it when the build resumes.
+    checkpointed = zip_builder.lambda_handler(event, _FakeContext(remaining_seconds=60))
+    assert index.installs == [["boto3", "botocore"]]
+    test = zip_builder.lambda_handler(dict(event, Checkpoint=checkpointed["Checkpoint"]), None)
+
+    manifest = s3.json(test["ManifestKey"])
+    assert s3.namelist(test["ArtifactKey"]) == _members("zeta-1.0")
+    assert [distribution["Name"] for distribution in manifest["Installed"]] == ["zeta"]
+    assert [(distribution["Name"], distribution["ProvidedBy"]) for distribution in manifest["Excluded"]] == [
+        ("boto3", "runtime"),
+        ("botocore", "runtime"),
+        ("jmespath", "runtime"),
+    ]
+
+    s3.objects.clear()
+    clean = zip_builder.lambda_handler(event, None)
+
+    assert clean["ArtifactKey"] == test["ArtifactKey"]
+    assert s3.json(clean["ManifestKey"])["Excluded"] == manifest["Excluded"]
+
+
+def test_repeat_build_excludes_runtime_provided(s3, index):
+    index.add("boto3", "1.9.100", "botocore", "jmespath")
+    index.add("botocore", "1.12.100", "jmespath")
+    index.add("jmespath", "0.9.4")
+    index.add("zeta", "1.0", "boto3")
+    event = _event("example", "zeta", ExcludeRuntimeProvided=True)
+    first = zip_builder.lambda_handler(event, None)
+
+    test = zip_builder.lambda_handler(event, None)
+
+    assert index.installs == [["boto3", "botocore", "jmespath", "zeta"]]
+    assert test["ArtifactKey"] == first["ArtifactKey"]
+    assert test["ManifestKey"] == first["ManifestKey"]
+
+
+def test_delta_build(s3, index):
+    index.add("alpha", "1.0")
+    index.add("beta", "1.0")
+    previous = zip_builder.lambda_handler(_event("example", "alpha", "beta"), None)
+    index.add("beta", "2.0")
+
+    test = zip_builder.lambda_handler(_event("example", "alpha", "beta", ValidateDelta=True), None)
+
+    # Only beta is installed for the artifact; validation then installs everything for a clean build.
+    assert index.installs == [["alpha", "beta"], ["beta"], ["alpha", "beta"]]
+    assert test["ArtifactKey"] != previous["ArtifactKey"]
+    assert s3.namelist(test["ArtifactKey"]) == _members("alpha-1.0", "beta-2.0")
+
+
+def test_delta_build_different_options(s3, index):
+    index.add("alpha", "1.0")
+    index.add("beta", "1.0")
+    zip_builder.lambda_handler(_event("example", "alpha", "beta"), None)
+    index.add("beta", "2.0")
+
+    test = zip_builder.lambda_handler(_event("example", "alpha", "beta", Reproducible=True), None)
+
+    assert index.installs == [["alpha", "beta"], ["alpha", "beta"]]
+    assert s3.namelist(test["ArtifactKey"]) == _members("alpha-1.0", "beta-2.0")
+
+
+def _run_distributed(distributed: Dict) -> Dict:
+    """Run every shard and then the merge, as the state machine would."""
+    assert distributed["Distribute"]
+    for shard in distributed["Shards"]:
+        result = zip_builder.lambda_handler(dict(Shard=shard), None)
+        assert result["Index"] == shard["Index"]
+    return zip_builder.lambda_handler(dict(Merge=distributed["Plan"]), None)
+
+
+def test_distributed_build(s3, index):
+    for name in ("alpha", "beta", "gamma"):
+        index.add(name, "1.0")
+
+    distributed = zip_builder.lambda_handler(_event("example", "alpha", "beta", "gamma", Shards=2), None)
+
+    plan = s3.json(distributed["Plan"])
+    assert plan["Previous"] is None
+    assert sorted(package["Name"] for shard in plan["Shards"] for package in shard) == ["alpha", "beta", "gamma"]
+    assert len(distributed["Shards"]) == 2
+    assert index.installs == []
+
+    test = _run_distributed(distributed)
+
+    assert sorted(index.installs) == sorted([package["Name"] for package in shard] for shard in plan["Shards"])
+    assert test["ArtifactKey"] == plan["ArtifactS3Key"]
+    assert s3.namelist(test["ArtifactKey"]) == _members("alpha-1.0", "beta-1.0", "gamma-1.0")
+    assert [distribution["Name"] for distribution in s3.json(test["ManifestKey"])["Installed"]] == [
+        "alpha",
+        "beta",
+        "gamma",
+    ]
+    assert s3.keys(SHARDS_PREFIX) == []
+
+
+def test_distributed_delta_build(s3, index):
+    for name in ("alpha", "beta", "gamma"):
+        index.add(name, "1.0")
+    previous = zip_builder.lambda_handler(_event("example", "alpha", "beta", "gamma"), None)
+    index.add("alpha", "2.0")
+    index.add("beta", "2.0")
+
+    distributed = zip_builder.lambda_handler(_event("example", "alpha", "beta", "gamma", Shards=2), None)
+
+    plan = s3.json(distributed["Plan"])
+    assert plan["Previous"]["ArtifactS3Key"] == previous["ArtifactKey"]
+    assert [distribution["Name"] for distribution in plan["Previous"]["Reused"]] == ["gamma"]
+    assert sorted(package["Name"] for shard in plan["Shards"] for package in shard) == ["alpha", "beta"]
+
+    test = _run_distributed(distributed)
+
+    assert sorted(index.installs[1:]) == [["alpha"], ["beta"]]
+    assert s3.namelist(test["ArtifactKey"]) == _members("alpha-2.0", "beta-2.0", "gamma-1.0")
+    assert s3.keys(SHARDS_PREFIX) == []
+
+
+def test_distributed_build_too_small(s3, index):
+    index.add("alpha", "1.0")
+
+    test = zip_builder.lambda_handler(_event("example", "alpha", Shards=2), None)
+
+    assert not test["Distribute"]
+    assert s3.namelist(test["ArtifactKey"]) == _members("alpha-1.0")
+
+
+def test_shared_runtimes(s3, index):
+    index.add("alpha", "1.0")
+    event = dict(_event("example", "alpha"), Targets=["python3.6", "python3.7"])
+
+    test = zip_builder.lambda_handler(event, None)
+
+    assert index.installs == [["alpha"]]
+    assert test["Python36"] == test["Python37"]
+    assert test["Python37"]["Built"]
+    result = test["Python37"]["Result"]
+    assert result["Runtimes"] == ["python3.6", "python3.7"]
+    assert s3.json(result["ManifestKey"])["Runtimes"] == ["python3.6", "python3.7"]
+
+    again = zip_builder.lambda_handler(event, None)
+
+    assert index.installs == [["alpha"]]
+    assert again["Python36"]["Result"]["ArtifactKey"] == result["ArtifactKey"]
+    assert again["Python37"]["Result"]["ArtifactKey"] == result["ArtifactKey"]
+
+
+def test_shared_runtimes_native(s3, index):
+    index.add("alpha", "1.0")
+    index.native.add("alpha")
+
+    test = zip_builder.lambda_handler(dict(_event("example", "alpha"), Targets=["python3.6", "python3.7"]), None)
+
+    # The host runtime is built first, and its artifact cannot be shared, so each runtime gets its own artifact.
+    assert index.installs == [["alpha"], ["alpha"]]
+    assert test["Python37"]["Result"]["Runtimes"] == ["python3.7"]
+    assert test["Python36"]["Result"]["Runtimes"] == ["python3.6"]
+    assert test["Python36"]["Result"]["ArtifactKey"] != test["Python37"]["Result"]["ArtifactKey"]
+
+
+def test_base_layer(s3, index):
+    index.add("boto3", "1.9.100", "botocore", "jmespath")
+    index.add("botocore", "1.12.100", "jmespath")
+    index.add("jmespath", "0.9.4")
+    index.add("six", "1.12.0")
+    index.add("zeta", "1.0", "boto3", "six")
+    base = zip_builder.lambda_handler(_event("base", "boto3"), None)
+
+    test = zip_builder.lambda_handler(_event("example", "zeta", BaseLayer="base"), None)
+
+    manifest = s3.json(test["ManifestKey"])
+    assert s3.namelist(test["ArtifactKey"]) == _members("six-1.12.0", "zeta-1.0")
+    assert manifest["BaseLayer"] == dict(ProjectName="base", ArtifactS3Key=base["ArtifactKey"])
+    assert manifest["Options"]["BaseLayer"] == "base"
+    assert [(distribution["Name"], distribution["ProvidedBy"]) for distribution in manifest["Excluded"]] == [
+        ("boto3", "base"),
+        ("botocore", "base"),
+        ("jmespath", "base"),
+    ]
+
+    # A new base artifact means a new artifact for the same resolved set.
+    zip_builder.lambda_handler(_event("base", "boto3", "six"), None)
+    rebuilt = zip_builder.lambda_handler(_event("example", "zeta", BaseLayer="base"), None)
+
+    assert rebuilt["ArtifactKey"] != test["ArtifactKey"]
+    # Only what the previous artifact left out is installed again.
+    # Distributions reused from the previous artifact are kept, even if the new base layer provides them.
+    assert index.installs[-1] == ["boto3", "botocore", "jmespath"]
+    assert s3.namelist(rebuilt["ArtifactKey"]) == _members("six-1.12.0", "zeta-1.0")
+
+
+def test_repeat_build_on_base_layer(s3, index):
+    index.add("boto3", "1.9.100", "botocore", "jmespath")
+    index.add("botocore", "1.12.100", "jmespath")
+    index.add("jmespath", "0.9.4")
+    index.add("zeta", "1.0", "boto3")
+    zip_builder.lambda_handler(_event("base", "boto3"), None)
+    first = zip_builder.lambda_handler(_event("example", "zeta", BaseLayer="base"), None)
+
+    test = zip_builder.lambda_handler(_event("example", "zeta", BaseLayer="base"), None)
+
+    assert len(index.installs) == 2
+    assert test["ArtifactKey"] == first["ArtifactKey"]
+    assert s3.namelist(test["ArtifactKey"]) == _members("zeta-1.0")
+
+
+def test_base_layer_not_built(s3, index):
+    index.add("alpha", "1.0")
+
+    with pytest.raises(InvalidRequestError) as excinfo:
+        zip_builder.lambda_handler(_event("example", "alpha", BaseLayer="base"), None)
+
+    excinfo.match("Base layer base has not been built for python3.7")
@@ -0,0 +1,23 @@
+"""Unit tests for ``accretion_workers.layer_builder.event_filter``."""
+import pytest
+
+from accretion_workers.layer_builder import event_filter
+
+pytestmark = [pytest.mark.local, pytest.mark.functional]
+
+
+@pytest.mark.parametrize(
+    "key, process",
+    (
+        ("accretion/manifests/example/abc.manifest", True),
+        ("accretion/manifests/example/abc.timeline.json", False),
+        ("accretion/manifests/example/abc.log.gz", False),
+        ("accretion/artifacts/example/abc.zip", False),
+    ),
+)
+def test_event_filter(key, process):
+    event = {"detail": {"requestParameters": {"key": key}}}
+
+    test = event_filter.lambda_handler(event, None)
+
+    assert test == {"ProcessEvent": process, "ResourceKey": key}